@@ -0,0 +1,109 @@
+import re
+import ast
+import time
+import threading
+from contextlib import redirect_stdout
+from io import StringIO
+import pandas as pd
+from agents.worker_pool import WorkerPool, ResourceLimitError, FRAMES_DIR, publish_frame, load_frame
+
+# --- Sandbox Settings ---
+DEFAULT_SANDBOX_WORKERS = 2
+DEFAULT_CODE_TIMEOUT = 60       # Wall-clock seconds per snippet
+DEFAULT_CPU_SECONDS = 30        # CPU seconds per snippet
+DEFAULT_MEMORY_MB = 2048        # Memory a snippet may allocate on top of the loaded frame
+MAX_OUTPUT_CHARS = 10_000       # Longer outputs are truncated before they reach the LLM
+
+# --- Worker Side ---
+def sanitize_code(code: str) -> str:
+    """
+    Strips whitespace, backticks and a leading `python` the LLM sometimes adds.
+    """
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+def _truncate(text: str) -> str:
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    return f"{text[:MAX_OUTPUT_CHARS]}\n... (output truncated, {len(text):,} characters)"
+
+def run_code(task: dict) -> dict:
+    """
+    Worker handler: runs a snippet against `df` the way the pandas agent's
+    Python REPL does (the value of the last expression, or what was printed)
+    and returns its output as text. Errors in the snippet are part of the
+    output; a MemoryError is left to the pool, which replaces the worker.
+    """
+    import numpy as np
+
+    start = time.perf_counter()
+    namespace = {"df": load_frame(task["frame_path"]), "pd": pd, "np": np}
+    output = StringIO()
+    try:
+        tree = ast.parse(sanitize_code(task["code"]))
+        with redirect_stdout(output):
+            exec(ast.unparse(ast.Module(tree.body[:-1], type_ignores=[])), namespace)
+            last = ast.unparse(ast.Module(tree.body[-1:], type_ignores=[]))
+            try:
+                value = eval(last, namespace)
+            except SyntaxError:
+                # The last statement is not an expression (an assignment, a loop, ...)
+                exec(last, namespace)
+                value = None
+        text = output.getvalue() if value is None else f"{output.getvalue()}{value}"
+    except MemoryError:
+        raise
+    except Exception as e:
+        text = f"{output.getvalue()}{type(e).__name__}: {e}"
+    return {"output": _truncate(text), "seconds": time.perf_counter() - start}
+
+# --- Sandbox (parent side) ---
+class CodeSandbox:
+    """
+    Runs agent-written pandas code in a pool of worker processes with a
+    wall-clock timeout, a CPU-time limit and a memory limit per snippet.
+    Workers attach to the session frame through a shared Arrow IPC file and
+    see a private copy of it: changes to `df` and variables do not carry over
+    between snippets.
+    """
+
+    def __init__(self, workers: int = DEFAULT_SANDBOX_WORKERS, timeout: float = DEFAULT_CODE_TIMEOUT,
+                 cpu_seconds: float = DEFAULT_CPU_SECONDS, memory_mb: float = DEFAULT_MEMORY_MB,
+                 frames_dir: str = FRAMES_DIR):
+        self.timeout = timeout
+        self.frames_dir = frames_dir
+        self.pool = WorkerPool("agents.code_sandbox:run_code", size=workers, name="code-sandbox",
+                               cpu_seconds=cpu_seconds, memory_mb=memory_mb)
+
+    def run(self, code: str, df: pd.DataFrame, dataset_key: str) -> str:
+        """
+        Runs `code` with `df` and returns its output, or an error message the
+        agent can act on when the snippet was stopped.
+        """
+        frame_path = publish_frame(df, dataset_key, self.frames_dir)
+        try:
+            return self.pool.run({"code": code, "frame_path": frame_path}, timeout=self.timeout)["output"]
+        except (TimeoutError, ResourceLimitError) as e:
+            return f"Error: {e}. Use a cheaper approach (vectorized operations, fewer rows or columns)."
+        except RuntimeError as e:
+            return f"Error executing code: {e}"
+
+    def stats(self) -> dict:
+        """
+        Snippet count, latency percentiles and stopped snippets by reason.
+        """
+        return self.pool.stats()
+
+# --- Shared Instance ---
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+def get_code_sandbox() -> CodeSandbox:
+    """
+    Returns the process-wide sandbox; its worker pool is shared by all sessions.
+    """
+    global _sandbox
+    with _sandbox_lock:
+        if _sandbox is None:
+            _sandbox = CodeSandbox()
+        return _sandbox
@@ -1,44 +1,74 @@
-from langchain_openai import ChatOpenAI
+from embedding.store_registry import get_chat_llm, get_embeddings
+from agents.response_cache import CachedAgent
 from langchain_experimental.agents import create_pandas_dataframe_agent
 from langchain.agents.agent_types import AgentType
 # Import the new factory functions
-from agents.tools import get_vector_search_tool, get_plotting_tool
+from agents.tools import get_vector_search_tool, get_plotting_tool, get_pandas_tool, get_sql_tool
 import pandas as pd
 
-def get_data_analyst_agent(df: pd.DataFrame, api_key: str):
+# Datasets from this size on are aggregated with the SQL tool first (pandas scans are slow and memory-bound)
+LARGE_DATASET_ROWS = 1_000_000
+
+def get_data_analyst_agent(df: pd.DataFrame, api_key: str, dataset_key: str = None, index_path: str = "faiss_index",
+                           context_path: str = "data/context.json", plots_dir: str = "plots", index_state: str = "ready",
+                           checkpoint_path: str = None, parquet_path: str = None):
     """
     Creates and returns a LangChain Data Analyst Agent.
     This agent has access to:
     1. The pandas DataFrame (for quantitative analysis)
-    2. A Vector Search tool (for qualitative retrieval)
-    3. A Plotting tool (for visualization)
+    2. A SQL tool over the Parquet copy of the data (for aggregations over large data)
+    3. A Vector Search tool (for qualitative retrieval)
+    4. A Plotting tool (for visualization)
+
+    With `dataset_key` (the dataset fingerprint), the agent and the vector
+    search synthesis answer repeated questions from the response cache.
+    `index_path`, `context_path` and `plots_dir` point the tools at the
+    session's workspace (see `ingestion.workspace`).
+    `index_state` follows a background build (see `ingestion.jobs`): while
+    "building" the agent only has the pandas and plotting tools; when
+    "partial" the vector search covers the rows in `checkpoint_path` so far.
+    Answers are only cached once the index is "ready".
+    `parquet_path` (the session's `clean_path`) enables the SQL tool; from
+    `LARGE_DATASET_ROWS` rows on, the agent is told to aggregate with it first.
+    Run a turn with `agents.streaming.stream_turn` to receive its tokens,
+    steps and tool calls as they happen (and to be able to stop it).
     """
     
-    # Initialize LLM (using gpt-4o for robust reasoning)
-    llm = ChatOpenAI(
-        model_name="gpt-4o",
-        temperature=0, # Ensure factual responses
-        openai_api_key=api_key
-    )
+    # Initialize LLM (using gpt-4o for robust reasoning, temperature 0 for factual responses)
+    # The client is shared with the tools through the store registry
+    llm = get_chat_llm(api_key, model_name="gpt-4o", temperature=0)
     
     # Define tools for the agent
     # We invoke the factory functions to get the configured tools
-    tools = [
-        get_vector_search_tool(api_key),
-        get_plotting_tool(df)
-    ]
+    tools = [get_plotting_tool(df, dataset_key, plots_dir)]
+    if parquet_path is not None:
+        tools.insert(0, get_sql_tool(parquet_path))
+        sql_line = """**sql_tool**: Runs DuckDB SQL over the whole dataset stored on disk (table `data`). Use it for aggregations over many rows (counts, sums, averages, GROUP BY, top-N, percentiles): it only reads the columns it needs and uses every core."""
+    else:
+        sql_line = """**sql_tool**: Not available for this dataset, use pandas_tool."""
+    if parquet_path is not None and len(df) >= LARGE_DATASET_ROWS:
+        routing_line = f"""-   The dataset is large ({len(df):,} rows): answer numerical questions with the `sql_tool` first (GROUP BY in SQL instead of `df.groupby`), and use pandas only for what SQL cannot express."""
+    else:
+        routing_line = """-   **Always** try to answer the user's question directly using the pandas dataframe first if it's a numerical query."""
+    if index_state != "building":
+        tools.insert(0, get_vector_search_tool(api_key, df, dataset_key, index_path, context_path, llm,
+                                               checkpoint_path if index_state == "partial" else None))
+        search_line = """**vector_search_tool**: Use this for qualitative questions that require understanding the context or descriptions within the data (e.g., "Find products related to 'eco-friendly'", "What are the key themes in the feedback?")."""
+    else:
+        search_line = """**vector_search_tool**: Not available yet, the knowledge base is still being built. Answer qualitative questions with pandas (e.g. filtering text columns) and say that semantic search will be available shortly."""
 
     # The core prompt that defines the agent's personality and instructions
-    prefix = """
+    prefix = f"""
     You are an expert Autonomous Data Analyst Agent. Your goal is to assist the user in understanding their dataset.
     You have access to the following tools:
     
     1.  **pandas_tool**: This is your primary tool for any quantitative question (e.g., "What is the average sales?", "Filter for region X"). The dataframe is available as `df`. You can write and execute python code to manipulate it.
-    2.  **vector_search_tool**: Use this for qualitative questions that require understanding the context or descriptions within the data (e.g., "Find products related to 'eco-friendly'", "What are the key themes in the feedback?").
-    3.  **plotting_tool**: Use this whenever the user asks for a visualization, chart, graph, or plot. You must generate valid python code using `matplotlib.pyplot` (as `plt`) or `seaborn` (as `sns`).
+    2.  {sql_line}
+    3.  {search_line}
+    4.  **plotting_tool**: Use this whenever the user asks for a visualization, chart, graph, or plot. You must generate valid python code using `matplotlib.pyplot` (as `plt`) or `seaborn` (as `sns`).
     
     **Important Instructions:**
-    -   **Always** try to answer the user's question directly using the pandas dataframe first if it's a numerical query.
+    {routing_line}
     -   If the query is ambiguous or qualitative, use the `vector_search_tool` to gain context.
     -   If the user asks for a plot, you **MUST** use the `plotting_tool`. The tool will automatically save the image to the 'plots' directory.
     -   After using the plotting tool, your final answer should be a summary of what the plot shows. You do NOT need to show the image yourself, the UI will handle it.
@@ -65,5 +95,13 @@ def get_data_analyst_agent(df: pd.DataFrame, api_key: str):
         extra_tools=tools,
         allow_dangerous_code=True # Required for the plotting tool's exec() and pandas operations
     )
+    # Swap the in-process Python REPL for the sandboxed one (same name and input),
+    # so agent-written code runs in worker processes with time and memory limits
+    pandas_tool = get_pandas_tool(df, dataset_key)
+    agent.tools = [pandas_tool if t.name == pandas_tool.name else t for t in agent.tools]
     
+    if dataset_key and index_state == "ready":
+        # Filters implied by a question (region, year, ...) must match for a semantic hit
+        from embedding.hybrid_retrieval import MetadataIndex
+        return CachedAgent(agent, dataset_key, llm.model_name, get_embeddings(api_key), MetadataIndex(df), plots_dir=plots_dir)
     return agent
\ No newline at end of file
@@ -0,0 +1,323 @@
+import re
+import time
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+from monitoring.tracing import traced, current_span
+
+# --- Router Settings ---
+MAX_RESULT_ROWS = 50            # Grouped answers with more groups are left to the agent
+DEFAULT_TOP_N = 5               # "top regions by sales" without a number
+ROUTER_HISTORY = 1000           # Recent questions kept for the hit rate and latency percentiles
+YEAR = "year"                   # Groups by the year of the first date column ("sales per year")
+AGGREGATES = {
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "total": "sum", "sum": "sum",
+    "median": "median",
+    "minimum": "min", "min": "min", "lowest": "min", "smallest": "min",
+    "maximum": "max", "max": "max", "highest": "max", "largest": "max", "biggest": "max",
+}
+# Ranking word -> ascending order
+RANKS = {
+    "top": False, "highest": False, "most": False, "largest": False, "biggest": False, "best": False,
+    "bottom": True, "lowest": True, "least": True, "smallest": True, "fewest": True, "worst": True,
+}
+# Words a routed question may contain besides the phrases matched, column names, filter values and
+# stopwords: any other word ("plot", "trend", "not", "between", ...) means the question needs the agent
+ROUTER_WORDS = frozenset("""
+what's whats much there overall value values please grouped broken down split
+""".split())
+LABELS = {"mean": "Average", "sum": "Total", "median": "Median", "min": "Minimum", "max": "Maximum"}
+
+def _format_value(value) -> str:
+    if value is None or pd.isna(value):
+        return "n/a"
+    if isinstance(value, (int, np.integer)) or float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.2f}" if abs(value) >= 1 else f"{value:.4g}"
+
+# --- Router ---
+class IntentRouter:
+    """
+    Answers simple aggregate questions without the agent: counts, sums,
+    averages, medians, minimums and maximums of a numeric column, optionally
+    by a column (or year) and for filtered rows, distinct counts and top-N
+    rankings, e.g. "average Amount by Region in 2023", "how many orders in
+    the West", "top 5 products by total sales".
+
+    Questions are matched against the column names, and their filters parsed
+    like the vector search parses them (see `MetadataIndex.parse`). Every word
+    must be accounted for, so anything the router does not fully understand
+    (a plot, a trend, a negation, a second metric) is left to the agent.
+    Answers come from the precomputed aggregate cube when it holds the
+    question's dimensions (see `ingestion.aggregate_cube`), otherwise from
+    vectorized pandas over the filtered rows.
+    """
+
+    def __init__(self, df: pd.DataFrame, cube_path: str = None):
+        from embedding.hybrid_retrieval import MetadataIndex, tokenize
+
+        self.df = df
+        self.cube_path = cube_path
+        self.metadata = MetadataIndex(df)
+        self.date = next((col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])), None)
+        self._cube = None
+
+        # Column names as the tokens a question spells them with, plurals included ("regions", "categories");
+        # "year" stands for the year of the date column unless a column is called so
+        self.columns = {}
+        names = [(" ".join(tokenize(col)), col) for col in df.columns]
+        if self.date is not None:
+            names.append((YEAR, YEAR))
+        for key, col in names:
+            if not key:
+                continue
+            forms = [key, key + "s", key + "es"] + ([key[:-1] + "ies"] if key.endswith("y") else [])
+            for form in forms:
+                self.columns.setdefault(form, col)
+        column = "(?:" + "|".join(re.escape(form) for form in sorted(self.columns, key=len, reverse=True)) + ")" if self.columns else "(?!)"
+        aggregate = "|".join(AGGREGATES)
+        rank = "|".join(RANKS)
+        metric = rf"(?:the\s+)?(?:(?P<agg>{aggregate})\s+(?:of\s+)?)?(?P<metric>{column})"
+        self.patterns = {
+            # "top 5 regions by total sales", "bottom 3 products by profit"
+            "top": re.compile(rf"(?<!\S)(?P<rank>top|bottom)\s+(?:(?P<n>\d+)\s+)?(?P<group>{column})\s+(?:by|in|for)\s+{metric}(?!\S)"),
+            # "which region has the highest sales", "which category has the most rows"
+            "which": re.compile(rf"(?<!\S)(?:which|what)\s+(?P<group>{column})\s+(?:(?:has|had|have|with|sold|made)\s+)?"
+                                rf"(?:the\s+)?(?P<rank>{rank})(?:\s+(?:(?P<agg>{aggregate})\s+(?:of\s+)?)?(?P<metric>{column}))?(?!\S)"),
+            # "average sales", "sum of the profit"
+            "aggregate": re.compile(rf"(?<!\S)(?P<agg>{aggregate})\s+(?:(?:of|the)\s+)*(?P<metric>{column})(?!\S)"),
+            # "how many orders", "number of unique customers", "row count"
+            "count": re.compile(rf"(?<!\S)(?:how\s+many|count(?:\s+of)?|number\s+of)(?:\s+(?P<distinct>unique|distinct|different))?"
+                                rf"(?:\s+(?P<target>{column}))?(?=\s+(?P<noun>\S+)|$)"),
+            # "by region", "per year", "for each category"
+            "group": re.compile(rf"(?<!\S)(?:by|per|each|every|across)\s+(?:the\s+)?(?P<group>{column})(?!\S)"),
+            "column": re.compile(rf"(?<!\S){column}(?!\S)"),
+        }
+
+    @property
+    def cube(self):
+        """
+        The dataset's aggregate cube, once the pipeline has written it (see `ingestion.aggregate_cube`).
+        """
+        if self._cube is None and self.cube_path:
+            from ingestion.aggregate_cube import AggregateCube
+            self._cube = AggregateCube.load(self.cube_path, rows=len(self.df))
+        return self._cube
+
+    def _column(self, text: str):
+        """
+        The column a matched name refers to, YEAR for the year of the date column.
+        """
+        return self.columns.get(text)
+
+    def parse(self, query: str):
+        """
+        The intent of a question, or None when the router is not sure it understands all of it.
+
+        Returns:
+            dict: "kind" ("aggregate", "count", "distinct" or "top"), "agg",
+            "metric", "group", "n", "ascending" and the parsed "filters".
+        """
+        from embedding.hybrid_retrieval import tokenize
+
+        filters, remaining = self.metadata.parse(query)
+        text = original = " ".join(tokenize(query))
+        intent = {"kind": None, "agg": None, "metric": None, "group": None, "n": None, "ascending": False, "filters": filters}
+        spans, allowed = [], set()
+
+        def consume(match):
+            nonlocal text
+            spans.append(match.span())
+            allowed.update(match.group().split())
+            text = text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+
+        # Rankings first: their "by <metric>" is not a grouping
+        for name in ("top", "which"):
+            match = self.patterns[name].search(text)
+            if match is None:
+                continue
+            metric = self._column(match["metric"]) if match["metric"] else None
+            agg = AGGREGATES[match["agg"]] if match["agg"] else ("sum" if metric else "count")
+            n = int(match["n"]) if name == "top" and match["n"] else (DEFAULT_TOP_N if name == "top" else 1)
+            intent.update(kind="top", agg=agg, metric=metric, group=self._column(match["group"]), n=n, ascending=RANKS[match["rank"]])
+            consume(match)
+            break
+        for match in list(self.patterns["aggregate"].finditer(text)):
+            if intent["kind"] is not None:
+                return None     # A second metric, or a metric next to a ranking
+            intent.update(kind="aggregate", agg=AGGREGATES[match["agg"]], metric=self._column(match["metric"]))
+            consume(match)
+        match = self.patterns["count"].search(text)
+        if match is not None:
+            if intent["kind"] is not None:
+                return None
+            target = self._column(match["target"]) if match["target"] else None
+            numeric_filter = any(flt["column"] == target and flt["op"] not in ("in", "year") for flt in filters)
+            if match["distinct"] and target is not None:
+                intent.update(kind="distinct", agg="nunique", metric=target)
+            elif target is not None and not numeric_filter:
+                return None     # "how many customers": rows or distinct customers?
+            else:
+                intent.update(kind="count", agg="count")
+            if match["noun"]:
+                allowed.add(match["noun"])     # What the rows are ("how many orders")
+            consume(match)
+        for match in list(self.patterns["group"].finditer(text)):
+            if intent["group"] is not None or intent["kind"] is None:
+                return None     # Two groupings, or a grouping of nothing ("sales by region")
+            intent["group"] = self._column(match["group"])
+            consume(match)
+        if intent["kind"] is None:
+            return None
+
+        # Everything said must be accounted for: words, columns and filter values
+        if any(token not in ROUTER_WORDS and token not in allowed for token in remaining):
+            return None
+        for flt in filters:
+            if flt["op"] != "in":
+                continue
+            for value in flt["value"]:
+                key = " ".join(tokenize(value))
+                for found in list(re.finditer(rf"(?<!\S){re.escape(key)}(?!\S)", original)):
+                    if any(start < found.end() and found.start() < end for start, end in spans):
+                        return None     # A value read as part of the question ("Total" in a column)
+                    consume(found)
+        explained = {intent["metric"], intent["group"]} | {flt["column"] for flt in filters if flt["op"] not in ("in", "year")}
+        for match in self.patterns["column"].finditer(text):
+            if self._column(match.group()) not in explained:
+                return None     # "Product" in "Product B1" is a value, not a column
+        if sum(flt["op"] == "year" for flt in filters) > 1:
+            return None     # "in 2022 and 2023" would filter for both at once
+        values = [value for flt in filters if flt["op"] == "in" for value in flt["value"]]
+        if len(values) != len(set(values)):
+            return None     # A value found in several columns: which one is meant?
+
+        # What the columns must be
+        if intent["metric"] is not None and intent["kind"] != "distinct":
+            if intent["metric"] == YEAR or not pd.api.types.is_numeric_dtype(self.df[intent["metric"]]) \
+                    or pd.api.types.is_bool_dtype(self.df[intent["metric"]]):
+                return None
+        if intent["metric"] is not None and intent["metric"] in (YEAR, intent["group"]):
+            return None
+        if intent["group"] == YEAR and self.date is None:
+            return None
+        return intent
+
+    def _compute(self, intent: dict) -> tuple:
+        """
+        Returns:
+            tuple: (value or Series by group, matching rows, "cube" or "pandas")
+        """
+        agg, metric, group, filters = intent["agg"], intent["metric"], intent["group"], intent["filters"]
+        if self.cube is not None and intent["kind"] != "distinct":
+            from ingestion.aggregate_cube import year_dimension
+            dimension = year_dimension(self.date) if group == YEAR else group
+            result = self.cube.query(agg, metric, dimension, filters)
+            if result is not None:
+                return (*result, "cube")
+
+        mask = self.metadata.mask(filters) if filters else None
+        rows = int(mask.sum()) if mask is not None else len(self.df)
+        values = self.df[metric] if metric is not None else None
+        if values is not None and mask is not None:
+            values = values[mask]
+        if group is None:
+            if agg == "count":
+                return rows, rows, "pandas"
+            return getattr(values, agg)(), rows, "pandas"
+        keys = self.df[self.date].dt.year if group == YEAR else self.df[group]
+        if mask is not None:
+            keys = keys[mask]
+        if agg == "count":
+            result = keys.groupby(keys, observed=True).size()
+        else:
+            result = values.groupby(keys, observed=True).agg(agg)
+        if group == YEAR:
+            result.index = result.index.astype(np.int64)
+        return result, rows, "pandas"
+
+    def _describe(self, intent: dict, value, rows: int) -> str:
+        """
+        The answer as markdown: the value, or a table by group.
+        """
+        from embedding.hybrid_retrieval import describe_filter
+
+        if intent["kind"] == "distinct":
+            label = f"Distinct {intent['metric']} values"
+        elif intent["agg"] == "count":
+            label = "Rows"
+        else:
+            label = f"{LABELS[intent['agg']]} {intent['metric']}"
+        where = f" where {' and '.join(describe_filter(flt) for flt in intent['filters'])}" if intent["filters"] else ""
+        if intent["group"] is None:
+            return f"{label}{where}: **{_format_value(value)}** ({rows:,} rows)"
+        group = "Year" if intent["group"] == YEAR else intent["group"]
+        if intent["kind"] == "top":
+            title = f"{'Bottom' if intent['ascending'] else 'Top'} {len(value)} {group} by {label.lower() if label == 'Rows' else label}{where}"
+        else:
+            title = f"{label} by {group}{where} ({rows:,} rows)"
+        lines = [f"{title}:", "", f"| {group} | {label} |", "|---|---:|"]
+        lines += [f"| {key} | {_format_value(item)} |" for key, item in value.items()]
+        return "\n".join(lines)
+
+    @traced("fast_path")
+    def answer(self, query: str):
+        """
+        Answers `query` directly when it is a simple aggregate question.
+
+        Returns:
+            dict: "output" (markdown, like an agent response), the "value"
+            (a number, or a Series by group), the parsed "intent", the "source"
+            ("cube" or "pandas") and the "seconds" taken; None when the
+            question is left to the agent.
+        """
+        start = time.perf_counter()
+        result = None
+        try:
+            intent = self.parse(query)
+            if intent is not None:
+                value, rows, source = self._compute(intent)
+                if isinstance(value, pd.Series):
+                    if intent["kind"] == "top":
+                        value = value.dropna().sort_values(ascending=intent["ascending"], kind="stable").head(intent["n"])
+                    elif len(value) > MAX_RESULT_ROWS:
+                        value = None    # A long table is better summarized by the agent
+                if value is not None:
+                    result = {"output": self._describe(intent, value, rows), "value": value, "intent": intent, "source": source}
+        except Exception:
+            # Never worse than asking the agent
+            result = None
+        seconds = time.perf_counter() - start
+        if result is not None:
+            result["seconds"] = seconds
+        record_route(result is not None, seconds, result["source"] if result else None)
+        current_span().set(hit=result is not None, source=result["source"] if result else None)
+        return result
+
+# --- Router History ---
+_routes = deque(maxlen=ROUTER_HISTORY)
+_routes_lock = threading.Lock()
+
+def record_route(hit: bool, seconds: float, source: str = None):
+    with _routes_lock:
+        _routes.append({"hit": hit, "seconds": seconds, "source": source})
+
+def router_stats() -> dict:
+    """
+    Share of recent questions answered by the router (and from the cube),
+    and percentiles of their latency in milliseconds (None before the first).
+    """
+    with _routes_lock:
+        routes = list(_routes)
+    hits = [route for route in routes if route["hit"]]
+    latencies = np.array([route["seconds"] * 1000 for route in hits], dtype=float)
+    return {
+        "questions": len(routes),
+        "hits": len(hits),
+        "hit_rate": len(hits) / len(routes) if routes else 0.0,
+        "cube_hits": sum(route["source"] == "cube" for route in hits),
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+    }
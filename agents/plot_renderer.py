@@ -0,0 +1,240 @@
+import os
+import ast
+import time
+import shutil
+import hashlib
+import resource
+import threading
+import uuid
+import pandas as pd
+from agents.worker_pool import WorkerPool, FRAMES_DIR, publish_frame, load_frame
+
+# --- Renderer Settings ---
+PLOT_CACHE_DIR = "plot_cache"                   # Rendered images by command + dataset; survives `reset_pipeline`
+PLOT_CACHE_MAX_FILES = 500                      # Least recently used images are removed beyond this
+DEFAULT_MAX_POINTS = 100_000                    # Rows drawn by point/line plots before the data is reduced
+DEFAULT_RENDER_TIMEOUT = 30                     # Seconds before a render is stopped
+DEFAULT_RENDER_WORKERS = 2
+RENDER_VERSION = 1                              # Part of the cache key: bump when rendering changes
+FIGURE_SIZE = (10, 6)
+# Plotting calls that draw one mark per row
+POINT_FUNCTIONS = frozenset({
+    "scatter", "scatterplot", "plot", "lineplot", "relplot", "stripplot", "swarmplot", "regplot",
+    "lmplot", "jointplot", "pairplot", "plot_date", "step", "stem", "fill_between", "errorbar", "line", "area",
+})
+LINE_KEYWORDS = frozenset({"data", "x", "y", "hue", "style", "kind", "ax", "color", "palette", "label", "marker", "linewidth"})
+
+# --- Frame Fingerprint ---
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Content fingerprint of a DataFrame, for callers without the upload hash.
+    """
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(str(list(df.columns)).encode("utf-8"))
+    return digest.hexdigest()
+
+# --- Data Reduction ---
+def _is_frame_ref(node, allowed_attrs=()) -> bool:
+    """
+    True for `df`, `df['a']`, `df[['a', 'b']]` and attribute chains in `allowed_attrs` (`df.plot`).
+    """
+    while isinstance(node, (ast.Subscript, ast.Attribute)):
+        if isinstance(node, ast.Attribute) and node.attr not in allowed_attrs:
+            return False
+        node = node.value
+    return isinstance(node, ast.Name) and node.id == "df"
+
+def _frame_names(node) -> list:
+    return [child for child in ast.walk(node) if isinstance(child, ast.Name) and child.id == "df"]
+
+def _call_name(call: ast.Call) -> str:
+    func = call.func
+    return func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else ""
+
+def analyze_command(command: str) -> dict:
+    """
+    Finds the plotting calls of a command that draw the rows of `df` directly
+    (not an aggregate of it).
+
+    Returns:
+        dict: {"raw_only": every use of df is such a call, "line": keyword
+        arguments of a seaborn line plot over df, or None}.
+    """
+    tree = ast.parse(command)
+    raw, line = set(), None
+    for call in (node for node in ast.walk(tree) if isinstance(node, ast.Call)):
+        name = _call_name(call)
+        if name not in POINT_FUNCTIONS:
+            continue
+        sources = []
+        # df.plot(), df['a'].plot(), df.plot.scatter(...)
+        if isinstance(call.func, ast.Attribute) and _is_frame_ref(call.func.value, allowed_attrs=("plot",)):
+            sources.append(call.func.value)
+        # sns.scatterplot(data=df, ...), plt.plot(df['a'], df['b'])
+        sources += [arg for arg in call.args if _is_frame_ref(arg)]
+        sources += [kw.value for kw in call.keywords if kw.arg == "data" and _is_frame_ref(kw.value)]
+        for source in sources:
+            raw.update(id(name_node) for name_node in _frame_names(source))
+
+        keywords = {kw.arg: kw.value for kw in call.keywords}
+        is_line = name == "lineplot" or (name == "relplot" and isinstance(keywords.get("kind"), ast.Constant) and keywords["kind"].value == "line")
+        if is_line and "data" in keywords and isinstance(keywords["data"], ast.Name) and set(keywords) <= LINE_KEYWORDS:
+            values = {key: node.value for key, node in keywords.items() if isinstance(node, ast.Constant) and isinstance(node.value, str)}
+            if "x" in values and "y" in values:
+                line = values
+    uses = _frame_names(tree)
+    return {"raw_only": bool(uses) and all(id(node) in raw for node in uses), "line": line}
+
+def _bin_line(df: pd.DataFrame, line: dict, max_points: int):
+    """
+    Mean of y per x bin (and per hue/style group): the line a lineplot would
+    draw, from at most `max_points` points.
+    """
+    x, y = line["x"], line["y"]
+    groups = [line[key] for key in ("hue", "style") if key in line and line[key] in df.columns]
+    if x not in df.columns or y not in df.columns or not pd.api.types.is_numeric_dtype(df[y]):
+        return None
+    is_datetime = pd.api.types.is_datetime64_any_dtype(df[x])
+    if not (is_datetime or pd.api.types.is_numeric_dtype(df[x])):
+        return None
+    n_groups = len(df[groups].drop_duplicates()) if groups else 1
+    n_bins = max(max_points // max(n_groups, 1), 10)
+    values = df[x].astype("int64") if is_datetime else df[x]
+    bins = pd.cut(values, n_bins, labels=False)
+    binned = df[groups + [x, y]].groupby(groups + [bins], observed=True, sort=True).mean()
+    return binned.reset_index(level=groups).reset_index(drop=True)
+
+def reduce_frame(df: pd.DataFrame, command: str, max_points: int = DEFAULT_MAX_POINTS):
+    """
+    Returns the frame a command should run on. When its plots draw more than
+    `max_points` rows of df directly, line plots are bin-aggregated and other
+    plots get a uniform sample (in row order). Commands that also aggregate df
+    run on the full frame, so their numbers are never computed from a sample.
+
+    Returns:
+        tuple: (frame, note) with note None when the frame is unchanged.
+    """
+    if len(df) <= max_points:
+        return df, None
+    try:
+        analysis = analyze_command(command)
+    except SyntaxError:
+        return df, None
+    if not analysis["raw_only"]:
+        return df, None
+    if analysis["line"] is not None:
+        binned = _bin_line(df, analysis["line"], max_points)
+        if binned is not None:
+            return binned, f"binned {len(df):,} rows into {len(binned):,} points"
+    sample = df.sample(n=max_points, random_state=0).sort_index()
+    return sample, f"sampled {max_points:,} of {len(df):,} rows"
+
+# --- Worker Side ---
+def render_plot(task: dict) -> dict:
+    """
+    Worker handler: runs a plotting command with the Agg backend and saves the
+    figure to `task["output_path"]`.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+
+    start = time.perf_counter()
+    df = load_frame(task["frame_path"])
+    frame, note = reduce_frame(df, task["command"], task.get("max_points", DEFAULT_MAX_POINTS))
+    try:
+        plt.figure(figsize=FIGURE_SIZE)
+        exec(task["command"], {'plt': plt, 'sns': sns, 'df': frame, 'pd': pd, 'np': np})
+        tmp_path = f"{task['output_path']}.{os.getpid()}.tmp.png"
+        plt.savefig(tmp_path)
+        os.replace(tmp_path, task["output_path"])
+    finally:
+        plt.close("all")
+    return {
+        "path": task["output_path"],
+        "note": note,
+        "seconds": time.perf_counter() - start,
+        "worker_peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+# --- Renderer (parent side) ---
+class PlotRenderer:
+    """
+    Renders plotting commands in a pool of worker processes, with a timeout
+    per render and an on-disk cache of the images keyed by the command, the
+    dataset fingerprint and the point budget.
+    """
+
+    def __init__(self, workers: int = DEFAULT_RENDER_WORKERS, timeout: float = DEFAULT_RENDER_TIMEOUT,
+                 max_points: int = DEFAULT_MAX_POINTS, cache_dir: str = PLOT_CACHE_DIR, frames_dir: str = FRAMES_DIR):
+        self.timeout = timeout
+        self.max_points = max_points
+        self.cache_dir = cache_dir
+        self.frames_dir = frames_dir
+        self.pool = WorkerPool("agents.plot_renderer:render_plot", size=workers, name="plot-renderer")
+        self.hits = 0
+        self.renders = 0
+
+    def cache_key(self, command: str, dataset_key: str) -> str:
+        text = "\0".join([command.strip(), dataset_key, str(self.max_points), str(RENDER_VERSION)])
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    def _evict(self):
+        names = [name for name in os.listdir(self.cache_dir) if name.endswith(".png")]
+        if len(names) <= PLOT_CACHE_MAX_FILES:
+            return
+        paths = sorted((os.path.join(self.cache_dir, name) for name in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - PLOT_CACHE_MAX_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def render(self, command: str, df: pd.DataFrame, dataset_key: str, output_dir: str = "plots") -> dict:
+        """
+        Renders (or reuses) the image of `command` over `df` and places it in
+        `output_dir` under a new name the UI can display directly.
+
+        Returns:
+            dict: {"path", "cached", "seconds", "note", "worker_peak_mb"}.
+        """
+        start = time.perf_counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached_path = os.path.join(self.cache_dir, f"{self.cache_key(command, dataset_key)}.png")
+        info = {"cached": os.path.exists(cached_path), "note": None, "worker_peak_mb": None}
+        if info["cached"]:
+            self.hits += 1
+            os.utime(cached_path)
+        else:
+            frame_path = publish_frame(df, dataset_key, self.frames_dir)
+            result = self.pool.run({"command": command, "frame_path": frame_path,
+                                    "output_path": os.path.abspath(cached_path), "max_points": self.max_points},
+                                   timeout=self.timeout)
+            self.renders += 1
+            info.update(note=result["note"], worker_peak_mb=result["worker_peak_mb"])
+            self._evict()
+
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"plot_{uuid.uuid4()}.png")
+        try:
+            os.link(cached_path, path)
+        except OSError:
+            shutil.copyfile(cached_path, path)
+        info.update({"path": path, "seconds": time.perf_counter() - start})
+        return info
+
+# --- Shared Instance ---
+_renderer = None
+_renderer_lock = threading.Lock()
+
+def get_plot_renderer() -> PlotRenderer:
+    """
+    Returns the process-wide renderer; its worker pool is shared by all sessions.
+    """
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PlotRenderer()
+        return _renderer
@@ -0,0 +1,379 @@
+import os
+import re
+import json
+import time
+import atexit
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+# --- Cache Settings ---
+DEFAULT_CACHE_DIR = "response_cache"    # Survives `reset_pipeline`; entries of other datasets are dropped on upload
+DEFAULT_MAX_ENTRIES = 500               # LRU-evicted beyond this many responses
+DEFAULT_TTL_SECONDS = 24 * 60 * 60      # Older responses are never served
+DEFAULT_SIMILARITY = 0.95               # Cosine similarity of two questions needed for a semantic hit
+QUERY_VECTOR_MEMO = 64                  # Recently embedded questions kept so a miss is not embedded twice
+SAVE_INTERVAL_SECONDS = 30              # Hit counters and LRU order are written at most this often between stores
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+PLOTS_DIR = "plots"                     # Where the plotting tool saves figures
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Canonical form of a question for the exact layer: unicode-normalized,
+    lowercased, whitespace collapsed, trailing punctuation dropped.
+    """
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!. ")
+
+def question_signature(question: str, metadata=None) -> str:
+    """
+    The parts of a question two paraphrases must share to count as a semantic
+    hit: the numbers it mentions and, given a `MetadataIndex`, the filters it
+    implies. "Sales in the West" and "Sales in the East" embed almost identically.
+    """
+    parts = sorted(set(NUMBER_PATTERN.findall(question)))
+    if metadata is not None:
+        from embedding.hybrid_retrieval import describe_filter
+        filters, _ = metadata.parse(question)
+        parts += sorted(describe_filter(flt) for flt in filters)
+    return "|".join(parts)
+
+def _embedding_model(embeddings) -> str:
+    return getattr(embeddings, "model", type(embeddings).__name__)
+
+def _entry_key(namespace: str, prompt: str, dataset: str, model: str) -> str:
+    text = "\0".join([namespace, normalize_prompt(prompt), dataset or "", model or ""])
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses with two layers:
+    - exact: keyed on the normalized prompt, the dataset fingerprint and the model
+    - semantic: the most similar cached question (cosine of the question
+      embeddings above `similarity`) with the same dataset, model and signature
+
+    Entries expire after `ttl_seconds` and the least recently used ones are
+    evicted beyond `max_entries`. Stores and evictions are written at once;
+    lookups only update the hit counters and LRU order in memory, written
+    every SAVE_INTERVAL_SECONDS and by `flush`. Layout of `<cache_dir>/`:
+    - entries.json: entries in LRU order (oldest first) and the hit counters
+    - vectors.npz: unit-length question embeddings, by entry key
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, similarity: float = DEFAULT_SIMILARITY):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer.")
+        self.path = cache_dir
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._vectors = {}
+        self._counters = {}
+        self._query_vectors = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._load()
+
+    # --- Persistence ---
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if not os.path.exists(self._file("entries.json")):
+            return
+        try:
+            with open(self._file("entries.json"), "r") as f:
+                state = json.load(f)
+            self._entries = OrderedDict((entry["key"], entry) for entry in state["entries"])
+            self._counters = state.get("counters", {})
+            if os.path.exists(self._file("vectors.npz")):
+                with np.load(self._file("vectors.npz")) as vectors:
+                    self._vectors = {key: vectors[key] for key in vectors.files if key in self._entries}
+        except Exception as e:
+            # A corrupt cache is only a performance loss: start over
+            print(f"⚠️ Response cache at {self.path} unreadable, resetting: {e}")
+            self._entries, self._vectors, self._counters = OrderedDict(), {}, {}
+
+    def _save(self, vectors: bool = True):
+        """
+        Rewrites both files atomically (only entries.json without `vectors`,
+        when no entry was added or removed). Called with the lock held.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("entries.json.tmp"), "w") as f:
+            json.dump({"entries": list(self._entries.values()), "counters": self._counters}, f)
+        if vectors:
+            with open(self._file("vectors.npz.tmp"), "wb") as f:
+                np.savez(f, **self._vectors)
+            os.replace(self._file("vectors.npz.tmp"), self._file("vectors.npz"))
+        os.replace(self._file("entries.json.tmp"), self._file("entries.json"))
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _touched(self):
+        """
+        Records an in-memory change of the counters or LRU order; written once
+        SAVE_INTERVAL_SECONDS passed since the last save. Called with the lock held.
+        """
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= SAVE_INTERVAL_SECONDS:
+            self._save(vectors=False)
+
+    def flush(self):
+        """
+        Writes the hit counters and LRU order changed since the last save.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save(vectors=False)
+
+    # --- Helpers ---
+    def _count(self, namespace: str, outcome: str, seconds_saved: float = 0.0):
+        counters = self._counters.setdefault(namespace, {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "seconds_saved": 0.0})
+        counters[outcome] += 1
+        counters["seconds_saved"] += seconds_saved
+
+    def _drop(self, key: str):
+        self._entries.pop(key, None)
+        self._vectors.pop(key, None)
+
+    def _expire(self, now: float) -> bool:
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            self._drop(key)
+        return bool(expired)
+
+    def _embed(self, prompt: str, embeddings):
+        """
+        Unit-length embedding of a normalized question, or None when no backend
+        is given or it fails (the semantic layer is then skipped).
+        """
+        if embeddings is None:
+            return None
+        text = normalize_prompt(prompt)
+        model = _embedding_model(embeddings)
+        memo_key = (model, text)
+        with self._memo_lock:
+            if memo_key in self._query_vectors:
+                self._query_vectors.move_to_end(memo_key)
+                return self._query_vectors[memo_key]
+        try:
+            vector = np.asarray(embeddings.embed_query(text), dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Response cache: question embedding failed, semantic lookup skipped: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm else vector
+        with self._memo_lock:
+            self._query_vectors[memo_key] = vector
+            if len(self._query_vectors) > QUERY_VECTOR_MEMO:
+                self._query_vectors.popitem(last=False)
+        return vector
+
+    def _semantic_match(self, vector, namespace, dataset, model, embedding_model, signature, validate):
+        candidates = [key for key, entry in self._entries.items()
+                      if key in self._vectors and entry["namespace"] == namespace and entry["dataset"] == dataset
+                      and entry["model"] == model and entry["embedding_model"] == embedding_model
+                      and entry["signature"] == signature and len(self._vectors[key]) == len(vector)]
+        if not candidates:
+            return None, 0.0
+        scores = np.stack([self._vectors[key] for key in candidates]) @ vector
+        for position in np.argsort(-scores):
+            if scores[position] < self.similarity:
+                break
+            key = candidates[position]
+            if validate is None or validate(self._entries[key]["extras"]):
+                return key, float(scores[position])
+            self._drop(key)
+        return None, 0.0
+
+    # --- Lookup / Insert ---
+    def lookup(self, prompt: str, dataset: str, model: str, namespace: str = "agent", embeddings=None,
+               signature: str = "", validate=None):
+        """
+        Finds a cached response for `prompt`, first by exact match, then by
+        question similarity when `embeddings` is given.
+
+        Args:
+            prompt (str): The question as asked.
+            dataset (str): Fingerprint of the dataset the answer was computed on.
+            model (str): Name of the model that produced the answer.
+            namespace (str): Separates callers ("agent", "synthesis").
+            embeddings: Embeddings backend for the semantic layer (optional).
+            signature (str): See `question_signature`; must match for a semantic hit.
+            validate (callable): Optional check of a hit's extras; failing entries are dropped.
+
+        Returns:
+            dict: {"key", "response", "extras", "layer", "similarity", "seconds_saved"} or None on a miss.
+        """
+        key = _entry_key(namespace, prompt, dataset, model)
+        with self._lock:
+            changed = self._expire(time.time())
+            if key in self._entries:
+                if validate is None or validate(self._entries[key]["extras"]):
+                    return self._hit(key, namespace, "exact", 1.0, changed)
+                self._drop(key)
+                changed = True
+
+        # Embedded outside the lock: a remote call must not block other sessions
+        vector = self._embed(prompt, embeddings)
+        with self._lock:
+            if vector is not None:
+                count = len(self._entries)
+                embedding_model = _embedding_model(embeddings)
+                match, similarity = self._semantic_match(vector, namespace, dataset, model, embedding_model, signature, validate)
+                changed = changed or len(self._entries) != count
+                if match is not None:
+                    return self._hit(match, namespace, "semantic", similarity, changed)
+            self._count(namespace, "misses")
+            if changed:
+                self._save()
+            else:
+                self._touched()
+            return None
+
+    def _hit(self, key: str, namespace: str, layer: str, similarity: float, changed: bool = False) -> dict:
+        """
+        Records a hit on `key` and returns it; `changed` when the lookup expired
+        or dropped entries, written at once. Called with the lock held.
+        """
+        entry = self._entries[key]
+        entry["last_used"] = time.time()
+        entry["hits"] += 1
+        self._entries.move_to_end(key)
+        self._count(namespace, f"{layer}_hits", entry["seconds"])
+        if changed:
+            self._save()
+        else:
+            self._touched()
+        return {"key": key, "response": entry["response"], "extras": entry["extras"], "layer": layer,
+                "similarity": similarity, "seconds_saved": entry["seconds"]}
+
+    def store(self, prompt: str, response: str, dataset: str, model: str, namespace: str = "agent", seconds: float = 0.0,
+              embeddings=None, signature: str = "", extras: dict = None):
+        """
+        Caches a response. `seconds` is how long it took to produce, reported
+        as latency saved by every later hit.
+        """
+        key = _entry_key(namespace, prompt, dataset, model)
+        vector = self._embed(prompt, embeddings)
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            self._drop(key)
+            self._entries[key] = {
+                "key": key, "namespace": namespace, "dataset": dataset, "model": model,
+                "prompt": prompt, "response": response, "extras": extras or {},
+                "signature": signature, "seconds": seconds, "created": now, "last_used": now, "hits": 0,
+                "embedding_model": _embedding_model(embeddings) if embeddings is not None else None,
+            }
+            if vector is not None:
+                self._vectors[key] = vector
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+            self._save()
+
+    def retain_datasets(self, datasets) -> int:
+        """
+        Drops every entry computed on a dataset not in `datasets` (called when a
+        new file is processed, with the datasets sessions still use). Returns
+        the number of entries removed.
+        """
+        datasets = set(datasets)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["dataset"] not in datasets]
+            for key in stale:
+                self._drop(key)
+            if stale:
+                self._save()
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._vectors, self._counters = OrderedDict(), {}, {}
+            self._save()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self, namespace: str = None) -> dict:
+        """
+        Hit counters and latency saved, for one namespace or all of them.
+        """
+        with self._lock:
+            totals = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "seconds_saved": 0.0}
+            for name, counters in self._counters.items():
+                if namespace is None or name == namespace:
+                    for field in totals:
+                        totals[field] += counters[field]
+            lookups = totals["exact_hits"] + totals["semantic_hits"] + totals["misses"]
+            totals.update({
+                "entries": len(self._entries),
+                "lookups": lookups,
+                "hit_rate": (totals["exact_hits"] + totals["semantic_hits"]) / lookups if lookups else 0.0,
+            })
+            return totals
+
+# --- Agent Wrapper ---
+class CachedAgent:
+    """
+    Wraps the agent with the response cache: a question already answered on the
+    same dataset (word for word, or rephrased) is served from the cache,
+    together with the plot it produced.
+
+    `invoke` returns the agent's output plus "plot_path" (the plot created in
+    this turn, or None) and "cache" (the hit, or None when the agent ran).
+    """
+
+    def __init__(self, agent, dataset_key: str, model: str, embeddings=None, metadata=None, cache=None, plots_dir: str = PLOTS_DIR):
+        self.agent = agent
+        self.dataset_key = dataset_key
+        self.model = model
+        self.embeddings = embeddings
+        self.metadata = metadata
+        self.cache = cache if cache is not None else get_response_cache()
+        self.plots_dir = plots_dir
+
+    def invoke(self, inputs: dict, **kwargs) -> dict:
+        question = inputs["input"]
+        signature = question_signature(question, self.metadata)
+        # Plots are wiped with the pipeline; an answer whose plot is gone is recomputed
+        hit = self.cache.lookup(question, self.dataset_key, self.model, "agent", self.embeddings, signature,
+                                validate=lambda extras: extras.get("plot_path") is None or os.path.exists(extras["plot_path"]))
+        if hit is not None:
+            return {"input": question, "output": hit["response"], "plot_path": hit["extras"].get("plot_path"), "cache": hit}
+
+        existing_plots = set(os.listdir(self.plots_dir)) if os.path.exists(self.plots_dir) else set()
+        start = time.perf_counter()
+        response = self.agent.invoke(inputs, **kwargs)
+        seconds = time.perf_counter() - start
+        current_plots = set(os.listdir(self.plots_dir)) if os.path.exists(self.plots_dir) else set()
+        new_plots = current_plots - existing_plots
+        # Sorting ensures deterministic behavior if multiple plots are created
+        plot_path = os.path.join(self.plots_dir, sorted(new_plots)[-1]) if new_plots else None
+
+        self.cache.store(question, response["output"], self.dataset_key, self.model, "agent", seconds,
+                         self.embeddings, signature, extras={"plot_path": plot_path})
+        return {**response, "plot_path": plot_path, "cache": None}
+
+# --- Shared Instances ---
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_response_cache(cache_dir: str = DEFAULT_CACHE_DIR) -> ResponseCache:
+    """
+    Returns the process-wide response cache, opening it on first use.
+    """
+    with _caches_lock:
+        key = os.path.abspath(cache_dir)
+        if key not in _caches:
+            _caches[key] = ResponseCache(cache_dir)
+            # Counters and LRU order of the last lookups
+            atexit.register(_caches[key].flush)
+        return _caches[key]
@@ -0,0 +1,205 @@
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from agents.code_sandbox import MAX_OUTPUT_CHARS
+
+# --- SQL Engine Settings ---
+DEFAULT_SQL_THREADS = os.cpu_count() or 1
+DEFAULT_SQL_MEMORY_MB = 1024    # Per dataset; larger aggregations spill to SQL_TEMP_DIR
+DEFAULT_SQL_TIMEOUT = 60        # Wall-clock seconds per query
+DEFAULT_MAX_ROWS = 50           # Rows of a result returned to the LLM
+MAX_OPEN_DATASETS = 4           # Datasets kept attached (least recently queried ones are closed)
+SQL_TEMP_DIR = os.path.join("workspaces", "sql_tmp")
+TABLE_NAME = "data"
+RELATED_TABLES_DIR = "tables"   # Next to the Parquet copy: other tables of a multi-file upload (see `Workspace.tables_dir`)
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def _columns(con, parquet_path: str) -> list:
+    """
+    (name, type) of the file's data columns; the index pandas stores with the frame is left out.
+    """
+    columns = con.execute(f"DESCRIBE SELECT * FROM read_parquet({_quote(parquet_path)})").fetchall()
+    return [(name, dtype) for name, dtype, *_ in columns if not name.startswith("__index_level_")]
+
+def related_tables(parquet_path: str) -> dict:
+    """
+    Name -> Parquet path of the related tables stored next to the dataset's Parquet copy.
+    """
+    tables_dir = os.path.join(os.path.dirname(parquet_path), RELATED_TABLES_DIR)
+    if not os.path.isdir(tables_dir):
+        return {}
+    return {os.path.splitext(name)[0]: os.path.join(tables_dir, name)
+            for name in sorted(os.listdir(tables_dir)) if name.endswith(".parquet")}
+
+def _select(con, parquet_path: str) -> str:
+    columns = ", ".join('"' + name.replace('"', '""') + '"' for name, _ in _columns(con, parquet_path))
+    return f"SELECT {columns} FROM read_parquet({_quote(parquet_path)})"
+
+def describe_table(parquet_path: str, max_columns: int = 60) -> str:
+    """
+    Column names and types of the Parquet file as the SQL tool sees them, read
+    from its footer, followed by the columns of its related tables.
+
+    Args:
+        parquet_path (str): Columnar copy of the cleaned data.
+        max_columns (int): Columns listed; the rest are counted.
+
+    Returns:
+        str: e.g. '"Sales" DOUBLE, "Region" VARCHAR, ... (1,250,000 rows)'.
+    """
+    import duckdb
+
+    def describe(path):
+        columns = _columns(con, path)
+        rows = con.execute(f"SELECT SUM(num_rows) FROM parquet_file_metadata({_quote(path)})").fetchone()[0]
+        listed = ", ".join(f'"{name}" {dtype}' for name, dtype in columns[:max_columns])
+        if len(columns) > max_columns:
+            listed += f", ... ({len(columns) - max_columns} more columns)"
+        return f"{listed} ({int(rows or 0):,} rows)"
+
+    con = duckdb.connect()
+    try:
+        text = describe(parquet_path)
+        for name, path in related_tables(parquet_path).items():
+            text += f"\nRelated table `{name}`: {describe(path)}"
+    finally:
+        con.close()
+    return text
+
+# --- Engine ---
+class SQLEngine:
+    """
+    Runs read-only SQL over the Parquet copy of a dataset with DuckDB, without
+    loading it in memory: only the columns and row groups a query needs are
+    read (projection and filter pushdown), aggregations run on all cores and
+    spill to disk past the memory limit.
+    Each dataset gets its own in-memory database with a view `data` (and one
+    per related table of a multi-file upload, see `related_tables`); file
+    access is then restricted to the dataset's directory and the configuration
+    locked, so queries cannot read or write other files.
+    """
+
+    def __init__(self, threads: int = DEFAULT_SQL_THREADS, memory_mb: float = DEFAULT_SQL_MEMORY_MB,
+                 timeout: float = DEFAULT_SQL_TIMEOUT, max_rows: int = DEFAULT_MAX_ROWS,
+                 temp_dir: str = SQL_TEMP_DIR):
+        self.threads = threads
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.temp_dir = temp_dir
+        self._connections = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"queries": 0, "errors": 0, "timeouts": 0}
+
+    def _connect(self, parquet_path: str):
+        import duckdb
+
+        os.makedirs(self.temp_dir, exist_ok=True)
+        con = duckdb.connect(config={"threads": self.threads, "memory_limit": f"{int(self.memory_mb)}MB",
+                                     "temp_directory": os.path.abspath(self.temp_dir)})
+        con.execute(f"CREATE VIEW {TABLE_NAME} AS {_select(con, parquet_path)}")
+        for name, path in related_tables(parquet_path).items():
+            if name != TABLE_NAME:
+                con.execute(f'CREATE VIEW "{name}" AS {_select(con, path)}')
+        con.execute(f"SET allowed_directories = [{_quote(os.path.dirname(parquet_path) + os.sep)}]")
+        con.execute("SET enable_external_access = false")
+        con.execute("SET lock_configuration = true")
+        return con
+
+    def connection(self, parquet_path: str):
+        """
+        The database of the dataset at `parquet_path` (opened on first use).
+        """
+        parquet_path = os.path.abspath(parquet_path)
+        key = (parquet_path, os.path.getmtime(parquet_path))
+        with self._lock:
+            con = self._connections.get(key)
+            if con is None:
+                con = self._connections[key] = self._connect(parquet_path)
+                while len(self._connections) > MAX_OPEN_DATASETS:
+                    self._connections.popitem(last=False)[1].close()
+            self._connections.move_to_end(key)
+            return con
+
+    def query(self, sql: str, parquet_path: str) -> pd.DataFrame:
+        """
+        Runs a single SELECT statement against the `data` view (and the related tables).
+
+        Args:
+            sql (str): The query (one SELECT, WITH ... SELECT or a table expression).
+            parquet_path (str): Columnar copy of the cleaned data (see `Workspace.clean_path`).
+
+        Returns:
+            pd.DataFrame: At most `max_rows` + 1 rows, so callers can tell the result was cut.
+        """
+        import duckdb
+
+        sql = sql.strip().strip("`").removeprefix("sql").strip().rstrip(";")
+        con = self.connection(parquet_path)
+        cursor = con.cursor()
+        try:
+            statements = cursor.extract_statements(sql)
+            if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+                raise ValueError("only a single SELECT statement is allowed")
+            timer = threading.Timer(self.timeout, cursor.interrupt)
+            timer.start()
+            try:
+                # The row limit is pushed into the query plan, large results are never materialized
+                return cursor.sql(sql).limit(self.max_rows + 1).df()
+            except duckdb.InterruptException:
+                with self._lock:
+                    self.counters["timeouts"] += 1
+                raise TimeoutError(f"query stopped after {self.timeout:.0f}s")
+            finally:
+                timer.cancel()
+        except Exception:
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self.counters["queries"] += 1
+            cursor.close()
+
+    def run(self, sql: str, parquet_path: str) -> str:
+        """
+        Runs `sql` and returns its result as text for the LLM, or an error message it can act on.
+        """
+        try:
+            result = self.query(sql, parquet_path)
+        except TimeoutError as e:
+            return f"Error: {e}. Aggregate in SQL (GROUP BY) or filter with WHERE before returning rows."
+        except Exception as e:
+            return f"Error executing SQL: {e}"
+        note = ""
+        if len(result) > self.max_rows:
+            result = result.head(self.max_rows)
+            note = f"\n(first {self.max_rows} rows only: aggregate or add a LIMIT)"
+        text = result.to_string(index=False)
+        if len(text) > MAX_OUTPUT_CHARS:
+            text = f"{text[:MAX_OUTPUT_CHARS]}\n... (output truncated, {len(text):,} characters)"
+        return text + note
+
+    def stats(self) -> dict:
+        """
+        Query counters and the number of datasets attached.
+        """
+        with self._lock:
+            return {**self.counters, "open_datasets": len(self._connections)}
+
+# --- Shared Instance ---
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_sql_engine() -> SQLEngine:
+    """
+    Returns the process-wide SQL engine; its databases are shared by all sessions on a dataset.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SQLEngine()
+        return _engine
@@ -0,0 +1,259 @@
+import time
+import queue
+import threading
+from collections import deque
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from monitoring.tracing import get_tracer
+
+# --- Streaming Settings ---
+SYNTHESIS_TAG = "synthesis"     # Tags the vector search synthesis chain, so its tokens are told apart from the agent's
+TURN_HISTORY = 1000             # Recent turns kept for the latency percentiles
+DEFAULT_POLL_SECONDS = 0.25     # How often `events` yields a "wait" event while nothing happens
+
+class TurnCancelled(Exception):
+    """
+    Raised inside the agent's thread, at its next callback, when the user stops a turn.
+    """
+
+# --- Callback Handler ---
+class StreamHandler(BaseCallbackHandler):
+    """
+    Forwards the LLM tokens, agent steps and tool calls of a run to `emit` as
+    they happen, and stops the run at the next callback once `cancelled` is set.
+    """
+
+    # Lets TurnCancelled propagate instead of being logged and ignored
+    raise_error = True
+
+    def __init__(self, emit, cancelled: threading.Event):
+        self.emit = emit
+        self.cancelled = cancelled
+        self._tools = {}
+
+    def _check(self):
+        if self.cancelled.is_set():
+            raise TurnCancelled("Stopped by the user")
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._check()
+
+    def on_llm_new_token(self, token, *, tags=None, **kwargs):
+        self._check()
+        # Function-call chunks come with an empty token
+        if isinstance(token, str) and token:
+            self.emit("token", text=token, source=SYNTHESIS_TAG if tags and SYNTHESIS_TAG in tags else "agent")
+
+    def on_agent_action(self, action, **kwargs):
+        self._check()
+        self.emit("step", tool=action.tool, input=action.tool_input, log=action.log)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._check()
+        name = (serialized or {}).get("name") or kwargs.get("name", "tool")
+        self._tools[run_id] = (name, time.perf_counter())
+        self.emit("tool_start", tool=name, input=input_str)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        name, start = self._tools.pop(run_id, ("tool", time.perf_counter()))
+        # A tool that swallowed the cancellation (it returns errors as text) stops the run here
+        self._check()
+        self.emit("tool_end", tool=name, output=str(getattr(output, "content", output)), seconds=time.perf_counter() - start)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._tools.pop(run_id, None)
+
+def _token_usage(response) -> tuple:
+    """
+    (prompt, completion) tokens reported for an LLM call, (0, 0) when unknown.
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    if not (prompt or completion):
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt += metadata.get("input_tokens", 0)
+                completion += metadata.get("output_tokens", 0)
+    return prompt, completion
+
+class TraceHandler(BaseCallbackHandler):
+    """
+    Records the LLM calls (with their token counts) and tool calls of a run as
+    spans of the current trace (see `monitoring.tracing`): "llm.agent",
+    "llm.synthesis" and "tool.<name>". Spans opened inside a tool (retrieval,
+    FAISS search) nest under its span.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self._spans = {}
+
+    def _start_llm(self, run_id, tags, serialized, kwargs):
+        model = (kwargs.get("invocation_params") or {}).get("model_name") or (serialized or {}).get("name")
+        source = SYNTHESIS_TAG if tags and SYNTHESIS_TAG in tags else "agent"
+        self._spans[run_id] = {"span": self.tracer.start(f"llm.{source}", model=model), "streamed": 0}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        self._start_llm(run_id, tags, serialized, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        self._start_llm(run_id, tags, serialized, kwargs)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._spans and token:
+            self._spans[run_id]["streamed"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        entry = self._spans.pop(run_id, None)
+        if entry is None:
+            return
+        prompt, completion = _token_usage(response)
+        if not (prompt or completion):
+            # No usage reported: count the streamed tokens
+            completion = entry["streamed"]
+            entry["span"].set(tokens_estimated=True)
+        entry["span"].add_tokens(prompt, completion)
+        self.tracer.finish(entry["span"])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        entry = self._spans.pop(run_id, None)
+        if entry is not None:
+            self.tracer.finish(entry["span"], error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name", "tool")
+        span = self.tracer.start(f"tool.{name}")
+        self._spans[run_id] = {"span": span, "previous": self.tracer.activate(span)}
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        entry = self._spans.pop(run_id, None)
+        if entry is not None:
+            self.tracer.deactivate(entry["previous"])
+            self.tracer.finish(entry["span"])
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        entry = self._spans.pop(run_id, None)
+        if entry is not None:
+            self.tracer.deactivate(entry["previous"])
+            self.tracer.finish(entry["span"], error=error)
+
+# --- Turn History ---
+_turns = deque(maxlen=TURN_HISTORY)
+_turns_lock = threading.Lock()
+
+def record_turn(metrics: dict):
+    with _turns_lock:
+        _turns.append(dict(metrics))
+
+def turn_stats() -> dict:
+    """
+    Turn counts by outcome and percentiles of the time to first token and of
+    the total latency of completed turns (seconds, None before the first turn).
+    """
+    with _turns_lock:
+        turns = list(_turns)
+    done = [turn for turn in turns if turn["status"] == "done"]
+    stats = {
+        "turns": len(turns),
+        "cancelled": sum(turn["status"] == "cancelled" for turn in turns),
+        "errors": sum(turn["status"] == "error" for turn in turns),
+    }
+    for name, key in (("ttft", "ttft"), ("total", "seconds")):
+        values = np.array([turn[key] for turn in done], dtype=float)
+        stats[f"{name}_p50"] = float(np.percentile(values, 50)) if len(values) else None
+        stats[f"{name}_p95"] = float(np.percentile(values, 95)) if len(values) else None
+    return stats
+
+# --- Streaming Turn ---
+class StreamingTurn:
+    """
+    Runs one agent turn in a background thread and hands its events to the
+    caller as they arrive, so the UI can show the answer while the agent works.
+
+    Events are dicts with a "type" and the seconds "elapsed" since the start:
+    "token" (text, source "agent" or "synthesis"), "step" (tool, input, log),
+    "tool_start" (tool, input), "tool_end" (tool, output, seconds), "wait" when
+    nothing happened for a while, and last one of "final" (response),
+    "cancelled" or "error" (error). `metrics` holds the time to first token
+    ("ttft"; a cached answer counts when it arrives), the total "seconds",
+    the token and tool counts and the "status".
+    """
+
+    def __init__(self, agent, inputs: dict):
+        self.agent = agent
+        self.inputs = inputs
+        self.cancelled = threading.Event()
+        self.metrics = {"ttft": None, "seconds": None, "tokens": 0, "tools": 0, "status": "running"}
+        self._events = queue.Queue()
+        self._start = None
+        self._thread = threading.Thread(target=self._run, name="agent-turn", daemon=True)
+
+    def _emit(self, kind: str, **data):
+        elapsed = time.perf_counter() - self._start
+        if kind == "token":
+            self.metrics["tokens"] += 1
+            if self.metrics["ttft"] is None:
+                self.metrics["ttft"] = elapsed
+        elif kind == "tool_start":
+            self.metrics["tools"] += 1
+        self._events.put({"type": kind, "elapsed": elapsed, **data})
+
+    def _run(self):
+        tracer = get_tracer()
+        # The tracing handler goes first, so its tool spans close before a cancellation is raised
+        handlers = [StreamHandler(self._emit, self.cancelled)]
+        if tracer.enabled:
+            handlers.insert(0, TraceHandler(tracer))
+        with tracer.span("chat_turn") as span:
+            try:
+                response = self.agent.invoke(self.inputs, config={"callbacks": handlers})
+                status, kind, data = "done", "final", {"response": response}
+            except TurnCancelled:
+                status, kind, data = "cancelled", "cancelled", {}
+            except Exception as e:
+                status, kind, data = "error", "error", {"error": e}
+            seconds = time.perf_counter() - self._start
+            if status == "done" and self.metrics["ttft"] is None:
+                self.metrics["ttft"] = seconds
+            self.metrics.update(status=status, seconds=seconds)
+            span.set(status=status, ttft_s=self.metrics["ttft"], tools=self.metrics["tools"],
+                     cached=status == "done" and bool(response.get("cache")))
+        record_turn(self.metrics)
+        self._emit(kind, **data)
+        self._events.put(None)
+
+    def start(self) -> "StreamingTurn":
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """
+        Stops the turn at the agent's next LLM token or tool call; does nothing once it ended.
+        A pandas snippet or plot already running finishes in its worker and is discarded.
+        """
+        self.cancelled.set()
+
+    def events(self, poll: float = DEFAULT_POLL_SECONDS):
+        """
+        Yields the turn's events until it ends.
+        """
+        while True:
+            try:
+                event = self._events.get(timeout=poll)
+            except queue.Empty:
+                yield {"type": "wait", "elapsed": time.perf_counter() - self._start}
+                continue
+            if event is None:
+                return
+            yield event
+
+def stream_turn(agent, inputs: dict) -> StreamingTurn:
+    """
+    Starts a streaming turn of `agent` (the AgentExecutor or its `CachedAgent`) on `inputs`.
+    """
+    return StreamingTurn(agent, inputs).start()
@@ -1,20 +1,43 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import io
 import os
-import uuid
+import pandas as pd
+import time
 from langchain.tools import tool
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
-import json
 
 # --- Factory Function for Vector Search Tool ---
-def get_vector_search_tool(api_key: str):
+def get_vector_search_tool(api_key: str, df: pd.DataFrame = None, dataset_key: str = None,
+                           index_path: str = "faiss_index", context_path: str = "data/context.json", llm=None,
+                           checkpoint_path: str = None):
     """
     Creates a tool with the API key pre-bound.
+    With the DataFrame, retrieval goes through the hybrid engine (metadata
+    filters, BM25 and vector search), using the cheapest path per query.
+    With the dataset fingerprint, synthesized answers go through the response cache.
+    `index_path` and `context_path` locate the session's index and global context.
+    `llm` synthesizes the answer (the shared gpt-4o client by default); its
+    tokens are streamed under the "synthesis" tag (see `agents.streaming`).
+    With `checkpoint_path`, a build still in progress is searched over the
+    rows indexed so far, and answers say how much of the data they cover.
     """
+    from embedding.hybrid_retrieval import HybridRetriever
+    from embedding.store_registry import get_vector_store, get_partial_vector_store
+    from agents.response_cache import get_response_cache
+    cache = get_response_cache() if dataset_key else None
+
+    def search_store():
+        """
+        (store, share of the rows it covers): the complete index, or else the partial one.
+        """
+        store = get_vector_store(api_key, index_path)
+        if store is not None or checkpoint_path is None:
+            return store, 1.0
+        store = get_partial_vector_store(api_key, checkpoint_path)
+        if store is None:
+            return None, 0.0
+        return store, retriever.coverage(store) if retriever is not None else None
+
+    retriever = HybridRetriever(df, lambda: search_store()[0]) if df is not None else None
     
     @tool
     def vector_search_tool(query: str) -> str:
@@ -25,25 +48,57 @@ def get_vector_search_tool(api_key: str):
         """
         try:
             # Lazy import to avoid circular dependencies
-            from embedding.vectorstore import load_vector_store
+            from embedding.store_registry import get_global_context, get_chat_llm, get_embeddings
+            from agents.response_cache import question_signature
+            from embedding.embedding_service import format_global_context
+            from agents.streaming import SYNTHESIS_TAG
+            from monitoring.tracing import get_tracer
 
-            # Load the Vector DB
-            vectorstore = load_vector_store(api_key)
-            if vectorstore is None:
-                return "Error: Vector store not found. Please ensure data is indexed."
+            # Same (or rephrased) query on the same dataset: reuse the synthesized answer
+            synthesis_llm = llm if llm is not None else get_chat_llm(api_key)
+            if cache is not None:
+                embeddings = get_embeddings(api_key)
+                signature = question_signature(query, retriever.metadata if retriever is not None else None)
+                hit = cache.lookup(query, dataset_key, synthesis_llm.model_name, "synthesis", embeddings, signature)
+                if hit is not None:
+                    return hit["response"]
+            start = time.perf_counter()
 
-            # Perform similarity search (Top 5 results)
-            docs = vectorstore.similarity_search(query, k=5)
-            
-            # Load Global Context for better answer synthesis
-            try:
-                with open("data/context.json", "r") as f:
-                    global_context = json.load(f)
-            except FileNotFoundError:
+            coverage = 1.0
+            groups = []
+            if retriever is not None:
+                # Filters / keywords / vectors, whichever answers the query most cheaply (Top 5 results)
+                docs, retrieval = retriever.retrieve(query, k=5)
+                if retrieval["embedding_calls"]:
+                    coverage = search_store()[1]
+                elif not docs and retrieval["path"] != "filter" and search_store()[0] is None:
+                    return "Error: Vector store not found. Please ensure data is indexed."
+                groups = retrieval["groups"]
+                filters = ", ".join(retrieval["filters"]) or "none"
+                retrieval_note = f"{retrieval['path']} search, filters: {filters}, {retrieval['matches']:,} matching rows"
+            else:
+                # Get the Vector DB (kept loaded across calls, reloaded when the index is rebuilt)
+                vectorstore, coverage = search_store()
+                if vectorstore is None:
+                    return "Error: Vector store not found. Please ensure data is indexed."
+
+                # Perform similarity search (Top 5 results)
+                with get_tracer().span("faiss_search"):
+                    docs = vectorstore.similarity_search(query, k=5)
+                retrieval_note = "vector search"
+            partial = coverage is None or coverage < 1.0
+            if partial:
+                covered = f"{coverage:.0%} of the rows" if coverage is not None else "part of the rows"
+                retrieval_note += f", index still being built: covers {covered}"
+            
+            # Global Context for better answer synthesis (compact, token-budgeted text)
+            global_context = get_global_context(context_path)
+            if global_context is None:
                 global_context = "No global context available."
+            else:
+                global_context = format_global_context(global_context)
 
             # Use an LLM to synthesize the retrieved documents into a coherent answer
-            llm = ChatOpenAI(model_name="gpt-4o", temperature=0, openai_api_key=api_key)
             
             # Prompt for synthesis
             template = """
@@ -51,7 +106,7 @@ def get_vector_search_tool(api_key: str):
             
             Global Dataset Context: {global_context}
             
-            Retrieved relevant rows from the dataset:
+            Retrieved relevant rows from the dataset ({retrieval}):
             {context}
             
             User Query: {query}
@@ -61,16 +116,26 @@ def get_vector_search_tool(api_key: str):
             prompt = ChatPromptTemplate.from_template(template)
             output_parser = StrOutputParser()
             
-            chain = prompt | llm | output_parser
+            chain = prompt | synthesis_llm | output_parser
             
             # Format retrieved docs as a single string
             context_str = "\n\n".join([f"Row {i+1}: {doc.page_content}" for i, doc in enumerate(docs)])
+            if groups:
+                # Index of grouped documents: the summaries of the matched groups come first
+                context_str = "Matching groups of rows:\n" + "\n".join(f"- {group}" for group in groups) + "\n\n" + context_str
             
-            response = chain.invoke({
+            # Streamed, so a streaming turn shows the answer as it is written (same text as invoke)
+            response = "".join(chain.stream({
                 "global_context": global_context,
                 "context": context_str,
+                "retrieval": retrieval_note,
                 "query": query
-            })
+            }, config={"tags": [SYNTHESIS_TAG]}))
+            if partial:
+                # The complete index may find other rows: not cached, and the coverage is stated
+                return f"{response}\n\n(Searched a partial index covering {covered}; the knowledge base is still being built.)"
+            if cache is not None:
+                cache.store(query, response, dataset_key, synthesis_llm.model_name, "synthesis", time.perf_counter() - start, embeddings, signature)
             
             return response
             
@@ -80,11 +145,15 @@ def get_vector_search_tool(api_key: str):
     return vector_search_tool
 
 # --- Factory Function for Plotting Tool ---
-def get_plotting_tool(df: pd.DataFrame):
+def get_plotting_tool(df: pd.DataFrame, dataset_key: str = None, plots_dir: str = "plots"):
     """
     Creates a tool with the DataFrame pre-bound.
-    Saves plots to the 'plots' directory.
+    Plots are rendered by a pool of worker processes (see `agents.plot_renderer`),
+    cached per command and dataset, and saved to `plots_dir` (the session's 'plots' directory).
     """
+    from agents.plot_renderer import get_plot_renderer, frame_fingerprint
+    if dataset_key is None:
+        dataset_key = frame_fingerprint(df)
     
     @tool
     def plotting_tool(command: str) -> str:
@@ -97,27 +166,75 @@ def get_plotting_tool(df: pd.DataFrame):
         It returns the path of the saved file.
         """
         try:
-            # Ensure plots directory exists
-            if not os.path.exists("plots"):
-                os.makedirs("plots")
-                
-            # Create a new figure to avoid conflicts
-            plt.figure(figsize=(10, 6))
-            
-            # Execute the plotting command
-            # We use the outer scope 'df' here which is captured by the closure
-            exec(command, {'plt': plt, 'sns': sns, 'df': df, 'pd': pd})
-            
-            # Generate unique filename
-            filename = f"plots/plot_{uuid.uuid4()}.png"
-            
-            # Save plot to file
-            plt.savefig(filename)
-            plt.close() # Close the figure to free memory
-            
-            return f"Plot generated and saved to {filename}"
+            # Rendered out of process with a timeout; plots of millions of rows are sampled or binned first
+            rendered = get_plot_renderer().render(command, df, dataset_key, plots_dir)
+            note = f" ({rendered['note']})" if rendered["note"] else ""
+            return f"Plot generated and saved to {rendered['path']}{note}"
             
         except Exception as e:
             return f"Error generating plot: {str(e)}"
 
-    return plotting_tool
\ No newline at end of file
+    return plotting_tool
+
+# --- Factory Function for Pandas Tool ---
+def get_pandas_tool(df: pd.DataFrame, dataset_key: str = None):
+    """
+    Creates the agent's Python tool with the DataFrame pre-bound.
+    Code runs in a pool of sandboxed worker processes (see `agents.code_sandbox`)
+    with time and memory limits, instead of inside the app process. The tool
+    keeps the name and input of the pandas agent's REPL tool it replaces.
+    """
+    from agents.code_sandbox import get_code_sandbox
+    from agents.plot_renderer import frame_fingerprint
+    if dataset_key is None:
+        dataset_key = frame_fingerprint(df)
+    sandbox = get_code_sandbox()
+    # Spawn the workers now so the first question does not wait for them
+    sandbox.pool.start()
+
+    @tool("python_repl_ast")
+    def pandas_tool(query: str) -> str:
+        """
+        A Python shell. Use this to execute python commands on the dataframe `df`.
+        Input should be a valid python command. The value of the last expression is returned.
+        Each command starts from the original `df`: changes and variables are not kept between
+        commands, so include every step in one command.
+        """
+        return sandbox.run(query, df, dataset_key)
+
+    return pandas_tool
+
+# --- Factory Function for SQL Tool ---
+def get_sql_tool(parquet_path: str):
+    """
+    Creates the agent's SQL tool over the columnar copy of the cleaned data
+    (`parquet_path`, see `Workspace.clean_path`), queried out of core by
+    DuckDB (see `agents.sql_engine`). The tool description lists the table's
+    columns once the file exists, and the related tables of a multi-file upload.
+    """
+    from agents.sql_engine import get_sql_engine, describe_table, TABLE_NAME
+    engine = get_sql_engine()
+
+    @tool
+    def sql_tool(query: str) -> str:
+        """
+        Runs a read-only DuckDB SQL query over the whole dataset, stored on disk as the table `data`.
+        Use this for aggregations over many rows (COUNT, SUM, AVG, GROUP BY, ORDER BY ... LIMIT, percentiles).
+        Input should be a single SELECT statement. Quote column names with double quotes, e.g.
+        SELECT "Region", SUM("Sales") AS sales FROM data GROUP BY "Region" ORDER BY sales DESC LIMIT 10
+        Only the first rows of a result are returned: aggregate or add a LIMIT.
+        Related tables listed below (other sheets or files of the upload) can be joined to `data`.
+        """
+        if not os.path.exists(parquet_path):
+            return "Error: the on-disk copy of the data is still being written. Use python_repl_ast for now."
+        from monitoring.tracing import get_tracer
+
+        with get_tracer().span("sql_query"):
+            return engine.run(query, parquet_path)
+
+    if os.path.exists(parquet_path):
+        try:
+            sql_tool.description += f"\nColumns of `{TABLE_NAME}`: {describe_table(parquet_path)}"
+        except Exception as e:
+            print(f"⚠️ Could not read the columns of {parquet_path}: {e}")
+    return sql_tool
@@ -0,0 +1,294 @@
+import os
+import time
+import uuid
+import atexit
+import signal
+import resource
+import importlib
+import multiprocessing
+import queue
+import threading
+from collections import deque
+
+import numpy as np
+
+# --- Pool Settings ---
+DEFAULT_WORKERS = 2
+START_METHOD = "spawn"      # Fork is unsafe from Streamlit's threads; spawned workers import only what they need
+DURATION_HISTORY = 1000     # Task durations kept for the latency percentiles
+FRAMES_DIR = os.path.join("workspaces", "frames")   # Arrow IPC copies of the session frames read by the workers
+
+class ResourceLimitError(RuntimeError):
+    """
+    A task exceeded its CPU-time or memory limit; its worker was replaced.
+    """
+
+# --- Shared Frames ---
+_publish_lock = threading.Lock()
+_frames = {}
+
+def frame_path(dataset_key: str, frames_dir: str = FRAMES_DIR) -> str:
+    """
+    Where the Arrow copy of a dataset's frame is published.
+    """
+    return os.path.abspath(os.path.join(frames_dir, f"{dataset_key[:32]}.arrow"))
+
+def publish_frame(df, dataset_key: str, frames_dir: str = FRAMES_DIR) -> str:
+    """
+    Writes `df` once as an uncompressed Arrow IPC file the workers
+    memory-map, instead of pickling the frame into every task.
+
+    Returns:
+        str: Absolute path of the Arrow file.
+    """
+    import pyarrow as pa
+
+    path = frame_path(dataset_key, frames_dir)
+    with _publish_lock:
+        if not os.path.exists(path):
+            os.makedirs(frames_dir, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+    return path
+
+def publish_parquet(parquet_path: str, dataset_key: str, frames_dir: str = FRAMES_DIR) -> str:
+    """
+    Like `publish_frame`, for a frame only on disk: copies the Parquet file
+    into the Arrow copy one record batch at a time, so the frame is never
+    loaded to write it.
+
+    Returns:
+        str: Absolute path of the Arrow file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = frame_path(dataset_key, frames_dir)
+    with _publish_lock:
+        if not os.path.exists(path):
+            os.makedirs(frames_dir, exist_ok=True)
+            parquet = pq.ParquetFile(parquet_path)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, parquet.schema_arrow) as writer:
+                for batch in parquet.iter_batches():
+                    writer.write_batch(batch)
+            os.replace(tmp_path, path)
+    return path
+
+def load_frame(path: str):
+    """
+    Worker side: attaches to a published frame and returns a private view of it.
+
+    The file is memory-mapped once per worker (the two most recent are kept);
+    numeric columns stay backed by the shared page cache. Copy-on-Write is
+    enabled in the worker, so every call gets a shallow copy a task can modify
+    without affecting the next one.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    pd.options.mode.copy_on_write = True
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _frames:
+        with pa.memory_map(path, "r") as source:
+            df = pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+        while len(_frames) >= 2:
+            _frames.pop(next(iter(_frames)))
+        _frames[key] = df
+    return _frames[key].copy(deep=False)
+
+# --- Worker Side ---
+def _set_limits(cpu_seconds: float = None, memory_mb: float = None):
+    """
+    Caps the CPU time and address space of the current task, relative to what
+    the worker has already used (so imports and mapped frames are not counted).
+    No arguments lifts the limits again.
+    """
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if cpu_hard == resource.RLIM_INFINITY else min(soft, cpu_hard), cpu_hard))
+    else:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+
+    _, as_hard = resource.getrlimit(resource.RLIMIT_AS)
+    if memory_mb:
+        with open("/proc/self/statm") as f:
+            mapped = int(f.read().split()[0]) * resource.getpagesize()
+        soft = mapped + int(memory_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (soft if as_hard == resource.RLIM_INFINITY else min(soft, as_hard), as_hard))
+    else:
+        resource.setrlimit(resource.RLIMIT_AS, (as_hard, as_hard))
+
+def _worker_main(conn, handler_path: str, limits: dict):
+    """
+    Worker loop: receives task payloads, runs `handler(payload)` under the
+    pool's limits and sends back ("ok", result), ("error", message) or
+    ("memory", message). Stops on None, a closed pipe or a MemoryError (the
+    pool replaces it). Exceeding the CPU limit ends the process with SIGXCPU.
+    """
+    module, name = handler_path.split(":")
+    handler = getattr(importlib.import_module(module), name)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        try:
+            _set_limits(**limits)
+            result = handler(task)
+            _set_limits()
+            conn.send(("ok", result))
+        except MemoryError as e:
+            _set_limits()
+            conn.send(("memory", f"MemoryError: {e}"))
+            return
+        except Exception as e:
+            _set_limits()
+            conn.send(("error", f"{e.__class__.__name__}: {e}"))
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+    def kill(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+class WorkerPool:
+    """
+    Fixed-size pool of worker processes that run `handler` ("module:function")
+    on task payloads, one task per worker at a time. A task that exceeds its
+    wall-clock timeout, CPU-time limit or memory limit gets its worker killed
+    and replaced, so a runaway task never blocks the pool. Workers are started
+    on first use.
+    """
+
+    def __init__(self, handler: str, size: int = DEFAULT_WORKERS, name: str = "worker",
+                 cpu_seconds: float = None, memory_mb: float = None):
+        if size <= 0:
+            raise ValueError("size must be a positive integer.")
+        self.handler = handler
+        self.size = size
+        self.name = name
+        self.limits = {"cpu_seconds": cpu_seconds, "memory_mb": memory_mb}
+        self.kills = 0
+        self.kill_reasons = {"timeout": 0, "cpu": 0, "memory": 0, "crashed": 0}
+        self.tasks = 0
+        self.durations = deque(maxlen=DURATION_HISTORY)
+        self._context = multiprocessing.get_context(START_METHOD)
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, self.handler, self.limits),
+                                        name=f"{self.name}-{len(self._workers)}", daemon=True)
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        return self._spawn()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        atexit.register(self.shutdown)
+
+    def _record(self, start: float, reason: str = None):
+        with self._lock:
+            self.tasks += 1
+            self.durations.append(time.perf_counter() - start)
+            if reason:
+                self.kills += 1
+                self.kill_reasons[reason] += 1
+
+    def run(self, task, timeout: float = None):
+        """
+        Runs one task on an idle worker (waiting for one if all are busy).
+
+        Raises:
+            TimeoutError: The task took longer than `timeout` seconds; its worker was replaced.
+            ResourceLimitError: The task exceeded the CPU-time or memory limit; its worker was replaced.
+            RuntimeError: The handler raised (message included) or the worker died.
+        """
+        self.start()
+        worker = self._idle.get()
+        start = time.perf_counter()
+        try:
+            try:
+                worker.conn.send(task)
+                finished = worker.conn.poll(timeout)
+                result = worker.conn.recv() if finished else None
+            except (EOFError, OSError) as e:
+                worker.process.join(timeout=5)
+                exitcode = worker.process.exitcode
+                worker = self._replace(worker)
+                if exitcode == -signal.SIGXCPU:
+                    self._record(start, "cpu")
+                    raise ResourceLimitError(f"{self.name} task exceeded {self.limits['cpu_seconds']:.0f}s of CPU time and was stopped") from None
+                self._record(start, "crashed")
+                raise RuntimeError(f"{self.name} process exited unexpectedly ({e.__class__.__name__}, exit code {exitcode})") from None
+            if not finished:
+                worker = self._replace(worker)
+                self._record(start, "timeout")
+                raise TimeoutError(f"{self.name} task exceeded {timeout:.0f}s and was stopped")
+            if result[0] == "memory":
+                worker = self._replace(worker)
+                self._record(start, "memory")
+                raise ResourceLimitError(f"{self.name} task exceeded {self.limits['memory_mb']:.0f} MB of memory and was stopped")
+        finally:
+            self._idle.put(worker)
+        self._record(start)
+        status, value = result
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    def stats(self) -> dict:
+        """
+        Task count, latency percentiles (seconds, over the recent tasks
+        including stopped ones) and workers killed by reason.
+        """
+        with self._lock:
+            durations = np.array(self.durations)
+            stats = {"tasks": self.tasks, "kills": self.kills, "kill_reasons": dict(self.kill_reasons)}
+        for label, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)):
+            stats[label] = float(np.percentile(durations, q)) if len(durations) else 0.0
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._started = False
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+                worker.process.join(timeout=1)
+            except (OSError, ValueError):
+                pass
+            worker.kill()
+        self._idle = queue.Queue()
@@ -2,56 +2,136 @@ import streamlit as st
 import pandas as pd
 import os
 import sys
-import shutil
-import matplotlib.pyplot as plt
+import uuid
+import time
 
 # Add the current directory to sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from ingestion.data_ingestion import load_data
-from ingestion.preprocessing import preprocess_data
-from embedding.embedding_service import create_row_documents, generate_global_context
-from embedding.vectorstore import build_vector_store
-from agents.data_analyst_agent import get_data_analyst_agent
+# Light imports only: every rerun executes this script, and the first render waits for them.
+# LangChain, OpenAI, FAISS and matplotlib are imported where they are first used (agent, pipeline, tools)
+# and stay loaded for the process; clients, indexes and frames are shared through their registries.
+from agents.response_cache import get_response_cache
+from agents.code_sandbox import get_code_sandbox
+from agents.streaming import stream_turn, turn_stats
+from agents.intent_router import router_stats
+from monitoring.tracing import get_tracer
+from ingestion.workspace import get_workspace_manager, content_hash
+from ingestion.jobs import get_job_executor, run_upload_pipeline
+
+# Uploads larger than this are streamed through the chunked pipeline
+STREAMING_THRESHOLD_MB = 100
+# How often the sidebar refreshes the status of a pipeline running in the background
+JOB_POLL_SECONDS = 1.0
 
 # --- Page Config ---
 st.set_page_config(page_title="Agentic Data Analyst", page_icon="🤖", layout="wide", initial_sidebar_state="expanded")
 
-# --- HARD RESET LOGIC ---
-if "startup_processed" not in st.session_state:
-    cleanup_paths = ["data", "faiss_index", "plots"] # Added plots to cleanup
-    for path in cleanup_paths:
-        if os.path.exists(path):
-            try:
-                shutil.rmtree(path)
-                print(f"🧹 Cleanup: Removed {path}")
-            except Exception as e:
-                print(f"⚠️ Error cleaning {path}: {e}")
-    
-    # Create necessary folders
-    os.makedirs("data", exist_ok=True)
-    os.makedirs("plots", exist_ok=True) # Ensure plots folder exists
-    
-    st.session_state.startup_processed = True
-
 # --- Session State Initialization ---
+if "session_id" not in st.session_state: st.session_state.session_id = uuid.uuid4().hex
 if "messages" not in st.session_state: st.session_state.messages = []
-if "df" not in st.session_state: st.session_state.df = None
 if "openai_api_key" not in st.session_state: st.session_state.openai_api_key = ""
 if "processed_file" not in st.session_state: st.session_state.processed_file = None
-if "agent" not in st.session_state: st.session_state.agent = None
+if "incremental_mode" not in st.session_state: st.session_state.incremental_mode = False
+if "ingestion_job" not in st.session_state: st.session_state.ingestion_job = None
+if "agent_state" not in st.session_state: st.session_state.agent_state = None
+if "failed_file" not in st.session_state: st.session_state.failed_file = None
+if "all_sheets" not in st.session_state: st.session_state.all_sheets = False
+if "grouped_documents" not in st.session_state: st.session_state.grouped_documents = False
+if "turn_running" not in st.session_state: st.session_state.turn_running = False
+
+# --- Session Workspace ---
+# Each session works in its own directory under workspaces/ (plots); the uploaded file, cleaned
+# data, context and index of an upload are shared with sessions that uploaded the same file.
+# The frame and agent live on the workspace, so an idle session can be evicted from memory.
+workspaces = get_workspace_manager()
+workspace = workspaces.open(st.session_state.session_id)
+
+# --- Background Ingestion ---
+# The upload pipeline runs as a job that outlives reruns and page reloads; the session follows it by id
+jobs = get_job_executor()
+
+def current_job():
+    return jobs.get(st.session_state.ingestion_job) if st.session_state.ingestion_job else None
+
+job = current_job()
+if job is not None and job.status in ("failed", "cancelled"):
+    # Not retried until the file is uploaded again
+    st.session_state.failed_file = st.session_state.processed_file
+    st.session_state.pipeline_error = job.error or "the pipeline was stopped"
+    workspaces.release(workspace)
+    st.session_state.processed_file = None
+    st.session_state.ingestion_job = None
+elif st.session_state.processed_file is not None and (workspace.dataset_hash is None or workspace.expired):
+    # Idle for long enough that its data was removed to stay within the disk budget
+    workspaces.release(workspace)
+    st.session_state.processed_file = None
+    st.session_state.messages = []
+    st.toast("Your session expired; the dataset is processed again.", icon="⌛")
 
 def reset_pipeline():
-    """Helper to wipe data when a NEW file is uploaded."""
-    cleanup_paths = ["data", "faiss_index", "plots"]
-    for path in cleanup_paths:
-        if os.path.exists(path): shutil.rmtree(path)
-    os.makedirs("data", exist_ok=True)
-    os.makedirs("plots", exist_ok=True)
-    st.session_state.df = None
+    """Helper to detach the session from its data when a NEW file is uploaded.
+    The shared artifacts stay on disk for other sessions and incremental updates;
+    a pipeline still running goes on only if another session follows it."""
+    if st.session_state.ingestion_job:
+        jobs.detach(st.session_state.ingestion_job, workspace.session_id)
+        st.session_state.ingestion_job = None
+    workspaces.release(workspace)
     st.session_state.messages = []
     st.session_state.processed_file = None
-    st.session_state.agent = None
+
+def build_agent(readiness: str = "ready"):
+    # While the index is being built the agent starts without vector search, then searches the rows indexed so far
+    from agents.data_analyst_agent import get_data_analyst_agent
+    return get_data_analyst_agent(workspace.df, st.session_state.openai_api_key, dataset_key=workspace.dataset_hash,
+                                  index_path=workspace.index_path, context_path=workspace.context_path,
+                                  plots_dir=workspace.plots_dir, index_state="building" if readiness == "data" else readiness,
+                                  checkpoint_path=workspace.checkpoint_path, parquet_path=workspace.clean_path)
+
+def build_router():
+    # Simple aggregate questions are answered from the data (and its precomputed cube) before the agent is asked
+    from agents.intent_router import IntentRouter
+    return IntentRouter(workspace.df, cube_path=workspace.cube_path)
+
+def show_ingestion(snapshot: dict):
+    """Stages, log lines and indexing progress of the session's pipeline."""
+    progress = snapshot["progress"]
+    if snapshot["status"] == "queued":
+        label, state = "⏳ Waiting for a free pipeline worker...", "running"
+    elif snapshot["status"] == "running":
+        label, state = {
+            "data": "🚀 Building Knowledge Base... (ask quantitative questions now)",
+            "partial": "🚀 Building Knowledge Base... (search covers the rows indexed so far)",
+        }.get(snapshot["readiness"], "🚀 Processing Data Pipeline..."), "running"
+    elif snapshot["status"] == "done":
+        label, state = "✅ System Ready! AI Agent is Online.", "complete"
+    else:
+        label, state = "❌ Pipeline stopped", "error"
+    with st.status(label, state=state, expanded=state == "running"):
+        for line in snapshot["log"]:
+            st.write(line)
+        if snapshot["status"] == "running" and progress["indexed"]:
+            unit = progress.get("unit", "rows")
+            text = f"🧠 Embedded {progress['indexed']:,} {unit} ({progress['docs_per_sec']:,.0f} {unit}/s, {progress.get('retries', 0)} retries)"
+            if progress["total"]:
+                st.progress(min(progress["indexed"] / progress["total"], 1.0), text=text)
+            else:
+                st.write(text)
+        timings = [f"{stage['label']} {stage['seconds']:.1f}s" for stage in snapshot["stages"] if stage["status"] == "done"]
+        if timings:
+            st.caption(" · ".join(timings))
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def follow_ingestion(job_id: str):
+    """Refreshes the pipeline status while it runs, and reruns the app when the
+    agent can do more or the pipeline ended (but never in the middle of an answer)."""
+    job = jobs.get(job_id)
+    if job is None:
+        return
+    snapshot = job.snapshot()
+    show_ingestion(snapshot)
+    if (snapshot["readiness"] != st.session_state.agent_state or not job.active) and not st.session_state.turn_running:
+        st.rerun()
 
 # --- Sidebar ---
 with st.sidebar:
@@ -61,52 +141,158 @@ with st.sidebar:
 
     st.divider()
     st.header("📂 Data Source")
-    uploaded_file = st.file_uploader("Upload Dataset", type=["csv", "xlsx"])
+    uploaded_files = st.file_uploader("Upload Dataset", type=["csv", "xlsx", "parquet", "feather"], accept_multiple_files=True,
+                                      help="Several files are combined into one dataset: tables with the same columns are stacked, lookup tables joined on their key column.")
+    st.toggle("🔁 Incremental re-upload", key="incremental_mode", help="Treat a new upload as a newer export of the current dataset: only added and removed rows are re-indexed.")
+    st.toggle("📑 Read every sheet", key="all_sheets", help="Combine every sheet of an Excel workbook (parsed in parallel) instead of reading only the first one.")
+    st.toggle("🧩 Grouped documents", key="grouped_documents", help="Index datasets of 100,000 rows or more as grouped documents: much faster and cheaper to embed; each search then embeds up to 50 rows of the matched groups.")
     
-    if uploaded_file is not None:
-        is_new_file = st.session_state.processed_file != uploaded_file.name
-        if is_new_file and st.session_state.openai_api_key:
+    if uploaded_files:
+        # Several files, or a workbook read sheet by sheet, are parsed in parallel and combined (see ingestion.multi_source)
+        combine = len(uploaded_files) > 1 or (st.session_state.all_sheets and uploaded_files[0].name.lower().endswith((".xlsx", ".xls")))
+        upload_name = ", ".join(f.name for f in uploaded_files) + (" (all sheets)" if combine and len(uploaded_files) == 1 else "")
+        is_new_file = st.session_state.processed_file != upload_name
+        if upload_name == st.session_state.failed_file:
+            st.error(f"Pipeline Error: {st.session_state.pipeline_error}")
+        elif is_new_file and st.session_state.openai_api_key:
             try:
+                streaming = not combine and uploaded_files[0].size > STREAMING_THRESHOLD_MB * 1024 * 1024
+                # The same content (and, combined, the same names) gives the same dataset, also after a restart
+                dataset_hash = content_hash([(f.name, f.getbuffer()) for f in uploaded_files], combined=combine,
+                                            grouped=st.session_state.grouped_documents)
+                previous_hash = workspace.dataset_hash
+                previous_index = (workspace.index_path, workspace.baseline_path) if previous_hash else None
                 reset_pipeline()
-                st.toast("System Reset: New analysis started.", icon="🧹")
-                file_path = os.path.join("data", uploaded_file.name)
-                with open(file_path, "wb") as f: f.write(uploaded_file.getbuffer())
-                st.session_state.processed_file = uploaded_file.name
-
-                # --- PIPELINE START ---
-                with st.status("🚀 Processing Data Pipeline...", expanded=True) as status:
-                    status.write("📥 Loading data...")
-                    raw_df = load_data(file_path)
-                    status.write("🧹 Cleaning & Preprocessing...")
-                    clean_df = preprocess_data(raw_df)
-                    st.session_state.df = clean_df
-                    status.write("🌍 Generating Global Context...")
-                    generate_global_context(clean_df)
-                    status.write("🧠 Building Knowledge Base...")
-                    documents = create_row_documents(clean_df)
-                    build_vector_store(documents, st.session_state.openai_api_key)
-                    
-                    # --- AGENT INITIALIZATION ---
-                    status.write("🤖 Initializing AI Agent...")
-                    st.session_state.agent = get_data_analyst_agent(st.session_state.df, st.session_state.openai_api_key)
-                    
-                    status.update(label="✅ System Ready! AI Agent is Online.", state="complete", expanded=False)
-                st.success(f"Processed: {uploaded_file.name}")
+                st.session_state.failed_file = None
+                reuse = workspaces.is_ready(dataset_hash)
+                from embedding.incremental_index import has_baseline
+                incremental = (not reuse and st.session_state.incremental_mode and not streaming
+                               and previous_index is not None and has_baseline(None, *previous_index))
+                workspaces.assign(workspace, dataset_hash)
+                st.session_state.processed_file = upload_name
+                # Cached answers are only valid for the datasets they were computed on
+                get_response_cache().retain_datasets(workspaces.datasets())
+                if reuse:
+                    # Restored from the stored artifacts: the frame is memory-mapped, the index opened on first search
+                    start = time.perf_counter()
+                    workspaces.load_frame(workspace)
+                    st.toast(f"Same file as an earlier analysis: restored its data and index in {time.perf_counter() - start:.2f}s.", icon="♻️")
+                    st.success(f"Processed: {upload_name}")
+                else:
+                    if incremental:
+                        st.toast("Incremental update: comparing with the indexed data.", icon="🔁")
+                    else:
+                        st.toast("System Reset: New analysis started.", icon="🧹")
+                    # Kept with the dataset (not the session), so the pipeline does not depend on this session;
+                    # a session uploading the same file while it runs follows the same job
+                    if combine:
+                        upload_path = workspace.uploads_dir
+                        os.makedirs(upload_path, exist_ok=True)
+                        files = [(os.path.join(upload_path, os.path.basename(f.name)), f) for f in uploaded_files]
+                    else:
+                        upload_path = workspace.upload_path(uploaded_files[0].name)
+                        files = [(upload_path, uploaded_files[0])]
+                    for path, uploaded_file in files:
+                        if not os.path.exists(path):
+                            partial_path = f"{path}.{workspace.session_id}.part"
+                            with open(partial_path, "wb") as f: f.write(uploaded_file.getbuffer())
+                            os.replace(partial_path, path)
+                    # --- PIPELINE START (in the background) ---
+                    job = jobs.submit(dataset_hash, upload_name, workspace.session_id, run_upload_pipeline,
+                                      workspaces, upload_path, st.session_state.openai_api_key, streaming=streaming,
+                                      incremental=incremental, fingerprint=st.session_state.incremental_mode,
+                                      source_hash=previous_hash if incremental else None,
+                                      grouped=st.session_state.grouped_documents)
+                    st.session_state.ingestion_job = job.job_id
             except Exception as e:
                 st.error(f"Pipeline Error: {e}")
-                st.session_state.processed_file = None
+                reset_pipeline()
         elif not st.session_state.openai_api_key:
             st.warning("⚠️ Please enter your OpenAI API Key above.")
     else:
+        st.session_state.failed_file = None
         if st.session_state.processed_file is not None:
             reset_pipeline()
             st.rerun()
+
+    # --- AGENT INITIALIZATION ---
+    # The agent gets the tools the data is ready for: pandas and plots once it is cleaned, vector search
+    # from the first index checkpoint. It is rebuilt when that changes, and after an idle session was evicted.
+    job = current_job()
+    readiness = (job.readiness if job is not None else "ready") if st.session_state.processed_file is not None else None
+    if st.session_state.agent_state != readiness:
+        st.session_state.agent_state = readiness
+        workspace.agent = None
+    if workspace.agent is None and readiness in ("data", "partial", "ready") and st.session_state.openai_api_key:
+        if workspace.df is None and job is not None and job.df is not None:
+            # Published by the pipeline before the dataset is complete
+            workspaces.attach_frame(workspace, job.df)
+        if workspace.df is not None:
+            with st.spinner("🤖 Initializing AI Agent..."):
+                workspace.agent = build_agent(readiness)
+    if workspace.router is None and workspace.agent is not None:
+        workspace.router = build_router()
+    if job is not None:
+        if job.active:
+            follow_ingestion(job.job_id)
+        else:
+            show_ingestion(job.snapshot())
     
     st.divider()
     st.markdown("### System Status")
-    st.caption(f"🟢 Ingestion: {'Active' if st.session_state.df is not None else 'Idle'}")
-    st.caption(f"🟢 Vector DB: {'Active' if os.path.exists('faiss_index') else 'Not Built'}")
-    st.caption(f"🟢 Agent: {'Ready' if st.session_state.agent is not None else 'Idle'}")
+    building = job is not None and job.active
+    progress = job.snapshot()["progress"] if building else {}
+    st.caption(f"🟢 Ingestion: {'Running in the background' if building else 'Active' if workspace.dataset_hash is not None else 'Idle'}")
+    if building and readiness == "partial" and progress["total"]:
+        vector_db = f"Building, {min(progress['indexed'] / progress['total'], 1.0):.0%} searchable"
+    elif building:
+        vector_db = "Building"
+    else:
+        vector_db = "Active" if workspace.dataset_hash and os.path.exists(workspace.index_path) else "Not Built"
+    st.caption(f"🟢 Vector DB: {vector_db}")
+    agent_scope = {"data": " (pandas & plots, search pending)", "partial": " (search over a partial index)"}.get(readiness, "")
+    st.caption(f"🟢 Agent: {'Ready' + agent_scope if workspace.agent is not None else 'Idle'}")
+    job_stats = jobs.stats()
+    if job_stats["running"] or job_stats["queued"]:
+        st.caption(f"⚙️ Pipelines: {job_stats['running']} running, {job_stats['queued']} queued")
+    workspace_stats = workspaces.stats()
+    st.caption(f"🗂️ Workspaces: {workspace_stats['sessions']} sessions, {workspace_stats['memory_mb']:,.0f} MB in memory, "
+               f"{workspace_stats['disk_mb']:,.0f} MB on disk")
+    cache_stats = get_response_cache().stats()
+    if cache_stats["lookups"]:
+        st.caption(f"⚡ Response cache: {cache_stats['hit_rate']:.0%} hits ({cache_stats['exact_hits']} exact, "
+                   f"{cache_stats['semantic_hits']} similar), {cache_stats['seconds_saved']:.1f}s saved")
+    sandbox_stats = get_code_sandbox().stats()
+    if sandbox_stats["tasks"]:
+        st.caption(f"🛡️ Code sandbox: {sandbox_stats['tasks']} runs, p50 {sandbox_stats['p50']:.2f}s / p95 {sandbox_stats['p95']:.2f}s, "
+                   f"{sandbox_stats['kills']} stopped")
+    route_stats = router_stats()
+    if route_stats["hits"]:
+        st.caption(f"🧭 Fast path: {route_stats['hit_rate']:.0%} of questions answered without the agent "
+                   f"({route_stats['cube_hits']} from the cube), p50 {route_stats['p50_ms']:.0f} ms / p95 {route_stats['p95_ms']:.0f} ms")
+    chat_stats = turn_stats()
+    if chat_stats["ttft_p50"] is not None:
+        st.caption(f"💬 Chat: first token p50 {chat_stats['ttft_p50']:.1f}s / p95 {chat_stats['ttft_p95']:.1f}s, "
+                   f"answer p50 {chat_stats['total_p50']:.1f}s / p95 {chat_stats['total_p95']:.1f}s, {chat_stats['cancelled']} stopped")
+
+    # Where uploads and chat turns spend their time (spans also go to traces/spans.jsonl and traces/metrics.prom)
+    tracer = get_tracer()
+    if tracer.enabled:
+        with st.expander("📈 Performance"):
+            summary = tracer.summary()
+            if not summary:
+                st.caption("No traced stages yet.")
+            for root, title in (("upload", "Last upload"), ("chat_turn", "Last chat turn")):
+                spans = tracer.last_trace(root)
+                if spans:
+                    st.caption(f"{title}: {spans[0]['wall_s']:.1f}s")
+                    st.dataframe(pd.DataFrame([{
+                        "stage": span["name"], "wall s": span["wall_s"], "cpu s": span["cpu_s"], "rows": span["rows"],
+                        "tokens": span["prompt_tokens"] + span["completion_tokens"] or None, "peak MB": span["peak_mb"],
+                    } for span in spans]), hide_index=True, use_container_width=True)
+            if summary:
+                st.caption("All stages")
+                st.dataframe(pd.DataFrame(summary), hide_index=True, use_container_width=True)
 
 # --- Main Interface ---
 st.title("🤖 Autonomous Agentic Data Analyst")
@@ -116,18 +302,18 @@ tab1, tab2 = st.tabs(["📊 Data Overview", "💬 Chat with Analyst"])
 
 # --- Tab 1: Data Overview ---
 with tab1:
-    if st.session_state.df is not None:
+    if st.session_state.processed_file is not None and workspace.df is not None:
         st.subheader("Dataset Preview (Cleaned)")
-        st.dataframe(st.session_state.df.head(10), use_container_width=True)
+        st.dataframe(workspace.df.head(10), use_container_width=True)
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Global Context Summary")
-            if os.path.exists("data/context.json"):
+            if os.path.exists(workspace.context_path):
                 import json
-                with open("data/context.json", "r") as f: st.json(json.load(f), expanded=False)
+                with open(workspace.context_path, "r") as f: st.json(json.load(f), expanded=False)
         with col2:
             st.subheader("Column Types")
-            st.write(st.session_state.df.dtypes.astype(str))
+            st.write(workspace.df.dtypes.astype(str))
     else:
         st.info("Please upload a dataset and provide an API key to begin.")
 
@@ -140,52 +326,107 @@ with tab2:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
             # If a plot path was associated with this message, display it
-            if "plot_path" in message:
+            if "plot_path" in message and os.path.exists(message["plot_path"]):
                 st.image(message["plot_path"])
 
     # Chat Input
     if prompt := st.chat_input("Ask a question (e.g., 'Plot sales by region', 'What are the main trends?')..."):
-        if st.session_state.agent is None:
+        if workspace.agent is None and job is not None and job.active:
+            st.warning("⏳ Your dataset is still being loaded; questions can be asked as soon as it is cleaned.")
+        elif workspace.agent is None:
             st.error("⚠️ Agent is not ready. Please upload data and provide an API key first.")
+        elif workspace.router is not None and (fast := workspace.router.answer(prompt)) is not None:
+            # Simple aggregate question: answered from the data in milliseconds, without an agent turn
+            st.session_state.messages.append({"role": "user", "content": prompt})
+            with st.chat_message("user"):
+                st.markdown(prompt)
+            with st.chat_message("assistant"):
+                st.markdown(fast["output"])
+                source = "precomputed aggregates" if fast["source"] == "cube" else "the rows"
+                st.caption(f"🧭 Answered directly from {source} in {fast['seconds'] * 1000:.0f} ms")
+            st.session_state.messages.append({"role": "assistant", "content": fast["output"]})
         else:
             # User message
             st.session_state.messages.append({"role": "user", "content": prompt})
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-            # Assistant Response
+            # Assistant Response, streamed: tokens, agent steps and tool calls appear as they happen
             with st.chat_message("assistant"):
-                with st.spinner("Thinking... 🤖"):
-                    try:
-                        # 1. Snapshot existing plots
-                        existing_plots = set(os.listdir("plots")) if os.path.exists("plots") else set()
-                        
-                        # 2. Run Agent
-                        response = st.session_state.agent.invoke({"input": prompt})
-                        output_text = response["output"]
-                        
-                        # 3. Detect new plots
-                        current_plots = set(os.listdir("plots")) if os.path.exists("plots") else set()
-                        new_plots = list(current_plots - existing_plots)
-                        
-                        # Prepare message package
-                        message_package = {"role": "assistant", "content": output_text}
-                        
-                        st.markdown(output_text)
-                        
-                        # If a new plot was created, attach it to the message and display it
-                        if new_plots:
-                            # We take the first new plot found (assumes one plot per turn usually)
-                            # Sorting ensures deterministic behavior if multiple are created
-                            latest_plot = sorted(new_plots)[-1] 
-                            plot_path = os.path.join("plots", latest_plot)
+                # Clicking Stop reruns the script, which interrupts the loop below and stops the turn
+                st.button("⏹️ Stop", key="stop_turn")
+                steps = st.status("Thinking... 🤖", expanded=False)
+                answer = st.empty()
+                # 1. Run Agent (answered from the response cache when the question was seen before)
+                turn = stream_turn(workspace.agent, {"input": prompt})
+                text, synthesis, synthesis_text, finished = "", None, "", False
+                # Pipeline updates wait for the answer instead of rerunning the app under it
+                st.session_state.turn_running = True
+                try:
+                    for event in turn.events():
+                        kind = event["type"]
+                        if kind == "wait":
+                            # Also gives Streamlit the chance to interrupt this run when Stop is clicked
+                            steps.update(label=f"Thinking... 🤖 ({event['elapsed']:.0f}s)")
+                        elif kind == "token" and event["source"] == "synthesis":
+                            synthesis_text += event["text"]
+                            if synthesis is None:
+                                synthesis = steps.empty()
+                            synthesis.markdown(synthesis_text)
+                        elif kind == "token":
+                            text += event["text"]
+                            answer.markdown(text + "▌")
+                        elif kind == "step":
+                            # Text written before a tool call is the model thinking aloud, not the answer
+                            text = ""
+                            answer.empty()
+                            tool_input = event["input"]
+                            if isinstance(tool_input, dict) and len(tool_input) == 1:
+                                tool_input = next(iter(tool_input.values()))
+                            steps.markdown(f"🔧 **{event['tool']}**")
+                            steps.code(str(tool_input), language="python" if event["tool"] != "vector_search_tool" else None)
+                        elif kind == "tool_start":
+                            steps.update(label=f"Running {event['tool']}... 🛠️")
+                            synthesis, synthesis_text = None, ""
+                        elif kind == "tool_end":
+                            if synthesis is None:
+                                output = event["output"]
+                                steps.text(output if len(output) <= 1000 else f"{output[:1000]}...")
+                            steps.caption(f"{event['tool']} took {event['seconds']:.1f}s")
+                        elif kind == "final":
+                            finished = True
+                            response = event["response"]
+                            output_text = response["output"]
+                            
+                            # Prepare message package
+                            message_package = {"role": "assistant", "content": output_text}
+                            
+                            answer.markdown(output_text)
+                            metrics = turn.metrics
+                            steps.update(label=f"✅ Done in {metrics['seconds']:.1f}s ({metrics['tools']} tool calls)", state="complete")
+                            if response.get("cache"):
+                                hit = response["cache"]
+                                match = "same question" if hit["layer"] == "exact" else f"similar question, {hit['similarity']:.2f}"
+                                st.caption(f"⚡ From cache ({match}), saved {hit['seconds_saved']:.1f}s")
+                            else:
+                                st.caption(f"⏱️ First token after {metrics['ttft']:.1f}s, answered in {metrics['seconds']:.1f}s")
+                            
+                            # 2. If a plot was created (or cached with the answer), attach it to the message and display it
+                            plot_path = response.get("plot_path")
+                            if plot_path:
+                                message_package["plot_path"] = plot_path
+                                st.image(plot_path, caption="Generated Plot")
                             
-                            message_package["plot_path"] = plot_path
-                            st.image(plot_path, caption="Generated Plot")
-                        
-                        st.session_state.messages.append(message_package)
-                        
-                    except Exception as e:
-                        error_msg = f"Generation Error: {e}"
-                        st.error(error_msg)
-                        st.session_state.messages.append({"role": "assistant", "content": error_msg})
\ No newline at end of file
+                            st.session_state.messages.append(message_package)
+                        elif kind in ("error", "cancelled"):
+                            finished = True
+                            steps.update(state="error")
+                            error_msg = f"Generation Error: {event['error']}" if kind == "error" else "⏹️ Stopped before the answer was complete."
+                            st.error(error_msg)
+                            st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                finally:
+                    st.session_state.turn_running = False
+                    if not finished:
+                        # Interrupted by a rerun (Stop, or a new question): stop the agent as well
+                        turn.cancel()
+                        st.session_state.messages.append({"role": "assistant", "content": "⏹️ Stopped before the answer was complete."})
@@ -0,0 +1,96 @@
+"""
+Benchmark and checks for the sandboxed pandas tool, without an LLM: the
+snippets the agent writes, run by the previous in-process REPL tool and by the
+worker-pool sandbox.
+
+Checks that outputs match, that a snippet cannot change `df` for the next one,
+and that runaway snippets (sleep, busy loop, cross join) are stopped by the
+wall-clock, CPU and memory limits while the pool keeps serving. Reports the
+latency of each snippet, the cost of pickling the frame per call (what the
+Arrow IPC file avoids) and the pool's latency distribution and kill counts.
+Usage: python benchmarks/bench_code_sandbox.py [--rows 1000000] [--workers 2]
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+from common import synthetic_frame
+
+SNIPPETS = {
+    "mean": "df['Sales'].mean()",
+    "groupby": "df.groupby('Region')['Sales'].sum()",
+    "print + describe": "print(len(df))\ndf[['Sales', 'Quantity']].describe()",
+    "filter": "high = df[df['Discount'] > 0.1]\nlen(high)",
+    "monthly": "df.set_index('Order Date').resample('ME')['Sales'].sum().tail(3)",
+    "error": "df['No Such Column'].sum()",
+}
+RUNAWAY = {
+    "timeout": ("import time\ntime.sleep(600)", "timeout"),
+    "cpu": ("n = 0\nwhile True:\n    n += 1", "cpu"),
+    "memory": ("df.merge(df, how='cross')", "memory"),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    from langchain_experimental.tools.python.tool import PythonAstREPLTool
+    from agents.code_sandbox import CodeSandbox
+
+    df = synthetic_frame(args.rows)
+    os.chdir(tempfile.mkdtemp(prefix="bench_sandbox_"))
+    repl = PythonAstREPLTool(locals={"df": df.copy()})
+    sandbox = CodeSandbox(workers=args.workers, timeout=10, cpu_seconds=3, memory_mb=1024)
+    sandbox.pool.start()
+
+    start = time.perf_counter()
+    payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    pickle.loads(payload)
+    print(f"rows={args.rows:,} workers={args.workers}; pickling the frame per call: "
+          f"{time.perf_counter() - start:.2f}s, {len(payload) / (1024 * 1024):.0f} MB")
+
+    print(f"\n{'snippet':<18} {'in-process s':>12} {'first s':>10} {'warm s':>8}  output")
+    for name, code in SNIPPETS.items():
+        start = time.perf_counter()
+        expected = str(repl.run(code))
+        baseline = time.perf_counter() - start
+        start = time.perf_counter()
+        first = sandbox.run(code, df, "bench")
+        cold = time.perf_counter() - start
+        warm = []
+        for _ in range(args.workers + 1):
+            start = time.perf_counter()
+            sandbox.run(code, df, "bench")
+            warm.append(time.perf_counter() - start)
+        warm = min(warm)
+        # The previous tool dropped what was printed before a final expression; the sandbox returns both
+        assert first.strip().endswith(expected.strip()), f"{name}: {first!r} != {expected!r}"
+        print(f"{name:<18} {baseline:>12.3f} {cold:>10.3f} {warm:>8.3f}  {first.splitlines()[-1][:40]}")
+
+    # A snippet cannot change the frame seen by the next one
+    total = sandbox.run("df['Sales'].sum()", df, "bench")
+    sandbox.run("df['Sales'] = 0\ndf.drop(index=df.index[:10], inplace=True)", df, "bench")
+    assert sandbox.run("df['Sales'].sum()", df, "bench") == total
+    assert sandbox.run("len(df)", df, "bench") == str(len(df))
+    print("\nisolation: changes to df do not carry over between snippets")
+
+    # Runaway snippets are stopped and the pool keeps serving
+    for name, (code, reason) in RUNAWAY.items():
+        before = sandbox.pool.kill_reasons[reason]
+        start = time.perf_counter()
+        output = sandbox.run(code, df, "bench")
+        assert output.startswith("Error") and sandbox.pool.kill_reasons[reason] == before + 1, output
+        assert sandbox.run("len(df)", df, "bench") == str(len(df)), "pool recovered"
+        print(f"{name:<8} stopped after {time.perf_counter() - start:5.2f}s: {output.split('.')[0]}")
+
+    stats = sandbox.stats()
+    print(f"\npool: {stats['tasks']} snippets, p50 {stats['p50']:.3f}s, p95 {stats['p95']:.3f}s, "
+          f"max {stats['max']:.2f}s, {stats['kills']} workers replaced {stats['kill_reasons']}")
+    sandbox.pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Benchmark for the persistent embedding cache in front of `build_vector_store`.
+
+Builds the index three times in a scratch directory: cold, identical re-upload,
+and a re-upload where a fraction of the rows changed.
+Usage: python benchmarks/bench_embedding_cache.py [--rows 20000] [--changed 0.05] [--latency 0.0002]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import synthetic_frame, FakeEmbeddings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--changed", type=float, default=0.05, help="Fraction of rows changed in the third build.")
+    parser.add_argument("--latency", type=float, default=0.0002, help="Simulated embedding seconds per text.")
+    args = parser.parse_args()
+
+    from embedding.embedding_service import iter_row_documents
+    from embedding.vectorstore import build_vector_store
+
+    df = synthetic_frame(args.rows)
+    changed = df.copy()
+    n_changed = int(args.rows * args.changed)
+    changed.loc[:n_changed - 1, "Sales"] += 1.0
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_cache_"))
+    embedder = FakeEmbeddings(latency=args.latency)
+    for label, frame in (("cold", df), ("identical", df), (f"{args.changed:.0%} changed", changed)):
+        report = {}
+        texts_before = embedder.texts
+        start = time.perf_counter()
+        build_vector_store(iter_row_documents(frame), api_key=None, report=report, base_embeddings=embedder)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<12} {elapsed:7.2f}s  hits={report['cache_hits']:<7} misses={report['cache_misses']:<7} "
+              f"embedded={embedder.texts - texts_before}")
+
+if __name__ == "__main__":
+    main()
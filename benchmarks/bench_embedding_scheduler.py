@@ -0,0 +1,92 @@
+"""
+Benchmark for the concurrent embedding scheduler against a local fake
+OpenAI server that injects latency and errors.
+
+Runs the build at several concurrency levels, then simulates a crash
+(the server starts failing mid-build) and resumes from the checkpoint.
+Also fails a small build before its first periodic checkpoint: the batches
+still in flight must be kept and resumed, not embedded again. Exits with
+status 1 if they are not.
+Usage: python benchmarks/bench_embedding_scheduler.py [--rows 20000] [--latency 0.05] [--error-rate 0.05]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from common import synthetic_frame
+from fake_openai_server import FakeOpenAIServer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per request.")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    from langchain_openai import OpenAIEmbeddings
+    from embedding import embedding_scheduler
+    from embedding.embedding_service import iter_row_documents
+    from embedding.embedding_scheduler import embed_documents_concurrently
+
+    embedding_scheduler.BACKOFF_BASE = 0.05   # keep the retry waits short for the benchmark
+    df = synthetic_frame(args.rows)
+    os.chdir(tempfile.mkdtemp(prefix="bench_scheduler_"))
+
+    def docs():
+        return (doc for chunk in iter_row_documents(df) for doc in chunk)
+
+    def client(server):
+        return OpenAIEmbeddings(openai_api_key="sk-fake", openai_api_base=server.url, check_embedding_ctx_length=False, max_retries=0)
+
+    for in_flight in args.concurrency:
+        with FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate) as server:
+            start = time.perf_counter()
+            store = embed_documents_concurrently(docs(), client(server), max_in_flight=in_flight, max_batch_size=500)
+            elapsed = time.perf_counter() - start
+            print(f"in_flight={in_flight:<3} {elapsed:6.2f}s  {args.rows / elapsed:8.0f} rows/s  "
+                  f"requests={server.requests} injected_errors={server.errors} indexed={store.index.ntotal}")
+
+    # Crash half-way, then resume with a healthy server
+    default_min_rows = embedding_scheduler.CHECKPOINT_MIN_ROWS
+    embedding_scheduler.CHECKPOINT_MIN_ROWS = 1_000
+    n_batches = args.rows // 500
+    with FakeOpenAIServer(latency=args.latency, fail_after=n_batches // 2) as server:
+        try:
+            embed_documents_concurrently(docs(), client(server), checkpoint_path="checkpoint", resume_key="bench",
+                                         max_in_flight=4, max_batch_size=500, max_retries=1)
+        except Exception as e:
+            print(f"crashed after {server.requests} requests: {e.__class__.__name__}")
+    with FakeOpenAIServer(latency=args.latency) as server:
+        report = {}
+        store = embed_documents_concurrently(docs(), client(server), checkpoint_path="checkpoint", resume_key="bench",
+                                             on_progress=report.update, max_in_flight=4, max_batch_size=500)
+        print(f"resumed: {report['resumed']} rows from checkpoint, {report['embedded']} embedded now, "
+              f"indexed={store.index.ntotal} (expected {args.rows})")
+
+    # Fail before the first periodic checkpoint: 3,000 rows, batches of 500, the 4th request
+    # fails while the first three are still in flight
+    embedding_scheduler.CHECKPOINT_MIN_ROWS = default_min_rows
+    small = synthetic_frame(3_000)
+    small_docs = lambda: (doc for chunk in iter_row_documents(small) for doc in chunk)
+    with FakeOpenAIServer(latency=args.latency, fail_after=3) as server:
+        try:
+            embed_documents_concurrently(small_docs(), client(server), checkpoint_path="early", resume_key="early",
+                                         max_in_flight=4, max_batch_size=500, max_retries=0)
+        except Exception as e:
+            print(f"\nsmall build crashed after {server.requests} requests: {e.__class__.__name__}")
+    with FakeOpenAIServer(latency=args.latency) as server:
+        report = {}
+        store = embed_documents_concurrently(small_docs(), client(server), checkpoint_path="early", resume_key="early",
+                                             on_progress=report.update, max_in_flight=4, max_batch_size=500)
+        print(f"resumed: {report['resumed']} rows from checkpoint, {report['embedded']} embedded now, "
+              f"indexed={store.index.ntotal} (expected {len(small)})")
+    if report["resumed"] != 1_500 or store.index.ntotal != len(small):
+        print("❌ batches in flight when the build failed were not kept")
+        sys.exit(1)
+    print("✅ Batches in flight when the build failed were kept and resumed")
+
+if __name__ == "__main__":
+    main()
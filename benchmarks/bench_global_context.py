@@ -0,0 +1,123 @@
+"""
+Benchmark for global context generation: the sketch-based profiler versus the
+previous describe()-based function (reproduced below as the baseline), on an
+in-memory frame and streamed in chunks.
+
+Reports time, peak traced memory, the size of the context put into prompts
+(JSON bytes and estimated tokens) and the error of the approximate statistics.
+Usage: python benchmarks/bench_global_context.py [--rows 1000000] [--chunk-size 100000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from common import synthetic_frame
+
+def previous_global_context(df: pd.DataFrame) -> dict:
+    """
+    The describe()-based context this repo generated before the profiler.
+    """
+    return {
+        "columns": list(df.columns),
+        "shape": df.shape,
+        "missing_values": df.isnull().sum().to_dict(),
+        "data_types": df.dtypes.astype(str).to_dict(),
+        "numerical_stats": df.describe().to_dict() if not df.select_dtypes(include='number').empty else {},
+        "categorical_samples": {col: df[col].unique().tolist()[:5] for col in df.select_dtypes(include=['object', 'category']).columns}
+    }
+
+def wide_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    The synthetic sales frame plus a high-cardinality text column, a skewed
+    categorical and missing values, like a preprocessed real export.
+    """
+    rng = np.random.default_rng(seed)
+    df = synthetic_frame(rows, seed)
+    df["Region"] = df["Region"].astype("category")
+    df["Customer"] = np.array([f"Customer {i:06d}" for i in range(rows // 4)], dtype=object)[rng.integers(0, rows // 4, rows)]
+    df["Segment"] = rng.choice(["Consumer", "Corporate", "Home Office", "Unknown"], rows, p=[0.5, 0.3, 0.15, 0.05])
+    df["Profit"] = rng.normal(25, 80, rows).round(2)
+    df.loc[rng.random(rows) < 0.03, "Profit"] = np.nan
+    return df
+
+def measure(function):
+    """
+    Seconds of an untraced run, then peak traced allocations of a second run
+    (tracing slows allocation-heavy code down).
+    """
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def rank_error(values: np.ndarray, estimate: float, q: float) -> float:
+    """
+    Distance between q and the rank range of the estimate (ties span a range).
+    """
+    low, high = np.searchsorted(values, estimate, "left") / len(values), np.searchsorted(values, estimate, "right") / len(values)
+    return 0.0 if low <= q <= high else (low - q if q < low else q - high)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    from embedding.embedding_service import generate_global_context, generate_global_context_from_chunks, format_global_context
+    from embedding.embedding_scheduler import count_tokens
+
+    df = wide_frame(args.rows)
+    os.chdir(tempfile.mkdtemp(prefix="bench_context_"))
+    os.makedirs("data")
+    chunks = lambda: (df.iloc[start:start + args.chunk_size] for start in range(0, len(df), args.chunk_size))
+
+    def run_sketch(function, source):
+        path = function(source)
+        with open(path) as f:
+            return f.read()
+
+    runs = [
+        ("describe() (previous)", lambda: json.dumps(previous_global_context(df), indent=4, default=str), True),
+        ("sketch, in memory", lambda: run_sketch(generate_global_context, df), False),
+        ("sketch, chunked", lambda: run_sketch(generate_global_context_from_chunks, chunks()), False),
+    ]
+    print(f"rows={args.rows:,} columns={df.shape[1]} chunk size={args.chunk_size:,}")
+    print(f"{'method':<24} {'seconds':>8} {'peak MB':>8} {'JSON KB':>8} {'prompt tokens':>14}")
+    contexts = {}
+    for label, function, previous in runs:
+        payload, elapsed, peak = measure(function)
+        context = json.loads(payload)
+        # The previous tool put the context dict into the prompt as is; the new one renders it within a budget
+        prompt = str(context) if previous else format_global_context(context)
+        contexts[label] = context
+        print(f"{label:<24} {elapsed:>8.2f} {peak:>8.1f} {len(payload) / 1024:>8.1f} {sum(count_tokens([prompt])):>14,}")
+
+    # --- Accuracy of the sketches ---
+    print(f"\n{'column':<12} {'distinct':>9} {'estimate':>9} {'error':>7}   quantile rank error (25/50/75%)")
+    sketched = contexts["sketch, chunked"]
+    for col in df.columns:
+        exact = df[col].nunique()
+        estimate = sketched["distinct_counts"][col]
+        line = f"{col:<12} {exact:>9,} {estimate:>9,} {abs(estimate - exact) / exact:>7.2%}"
+        stats = sketched["numerical_stats"].get(col)
+        if stats and pd.api.types.is_numeric_dtype(df[col]):
+            values = np.sort(df[col].dropna().to_numpy())
+            errors = [rank_error(values, stats[q], float(q[:-1]) / 100) for q in ("25%", "50%", "75%")]
+            line += "   " + " / ".join(f"{error:.3%}" for error in errors)
+        print(line)
+    segment = dict(map(tuple, sketched["top_values"]["Segment"]))
+    assert segment == df["Segment"].value_counts().to_dict(), "low-cardinality counts are exact"
+    assert sketched["missing_values"] == df.isnull().sum().to_dict(), "missing counts are exact"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark and checks for grouped documents (`embedding.grouped_documents`)
+against one document per row, offline, with hashed bag-of-words embeddings
+(texts sharing words are similar, like a real embedding model on this data).
+
+For each mode, reports the documents and tokens embedded (tiktoken, or its
+length estimate offline), the build time and the index size on disk, then
+the retrieval quality of the vector search over queries naming a segment
+and a review word: precision@k of the rows returned for the segment alone
+and for both, and with the segment applied as a metadata filter (how the
+app retrieves when a query names a category value) for the word. Grouped
+retrieval finds the best groups first, then embeds and ranks their rows
+(the rows embedded per query are reported). Checks that every row is in
+exactly one grouped document within the token budget, and exits with
+status 1 if the filtered precision of grouped documents is more than
+`--max-drop` below that of one document per row.
+Usage: python benchmarks/bench_grouped_documents.py [--rows 200000] [--tokens 512] [--queries 40] [--k 10] [--max-drop 0.02]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from common import synthetic_dataset, FakeEmbeddings, WORDS
+
+class HashedWordEmbeddings(FakeEmbeddings):
+    """
+    Feature hashing of the content words: each word adds +1 or -1 to one of
+    `size` dimensions; the sum is normalized.
+    """
+
+    def __init__(self, size: int = 512):
+        super().__init__(size=size, model="fake-hashed-words")
+
+    def embed_documents(self, texts):
+        from embedding.hybrid_retrieval import tokenize, STOPWORDS
+        self.calls += 1
+        self.texts += len(texts)
+        vectors = np.zeros((len(texts), self.size), dtype=np.float32)
+        for i, text in enumerate(texts):
+            hashes = np.array([zlib.crc32(word.encode()) for word in tokenize(text) if word not in STOPWORDS], dtype=np.int64)
+            np.add.at(vectors[i], hashes % self.size, np.where(hashes & (1 << 20), 1.0, -1.0))
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+        return vectors.tolist()
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1e6
+
+def build(mode: str, df, max_tokens: int) -> dict:
+    from embedding.embedding_service import iter_row_documents
+    from embedding.grouped_documents import iter_group_documents
+    from embedding.embedding_scheduler import count_tokens
+    from embedding.vectorstore import build_vector_store
+
+    stats = {"documents": 0, "tokens": 0, "max_tokens": 0, "rows": []}
+    def counted(batches):
+        # Measured on the way to the index, without holding every Document
+        for batch in batches:
+            tokens = count_tokens([doc.page_content for doc in batch])
+            stats["documents"] += len(batch)
+            stats["tokens"] += sum(tokens)
+            stats["max_tokens"] = max(stats["max_tokens"], max(tokens))
+            if mode == "grouped":
+                for doc, doc_tokens in zip(batch, tokens):
+                    stats["rows"].extend(doc.metadata["row_index"])
+                    assert doc_tokens <= max_tokens or doc.metadata["rows"] == 1, (doc_tokens, doc.metadata["rows"])
+            yield batch
+
+    report = {}
+    documents = iter_row_documents(df) if mode == "rows" else iter_group_documents(df, max_tokens, report=report)
+    start = time.perf_counter()
+    build_vector_store(counted(documents), None, base_embeddings=HashedWordEmbeddings(), index_path=f"index_{mode}",
+                       checkpoint_path=f"checkpoint_{mode}")
+    stats.update(seconds=time.perf_counter() - start, index_mb=directory_mb(f"index_{mode}"), report=report)
+    return stats
+
+def make_queries(df, n: int, seed: int = 0) -> list:
+    """
+    (query, segment value, review word) triples with matching rows. Only the
+    values of "Segment 3" no other column holds ("Group B1" and up) are named.
+    """
+    rng = np.random.default_rng(seed)
+    others = set(df["Segment 1"].dropna()) | set(df["Segment 2"].dropna())
+    segments = sorted(set(df["Segment 3"].dropna()) - others)
+    return [(f"{word} reviews for {segment}", segment, word)
+            for segment, word in zip(rng.choice(segments, n), rng.choice(WORDS, n))]
+
+def precision(df, positions: list, segment: str, word: str) -> tuple:
+    rows = df.iloc[positions]
+    in_segment = (rows["Segment 3"] == segment).to_numpy()
+    with_word = rows["Review 1"].fillna("").str.split().map(lambda words: word in words).to_numpy()
+    return in_segment.mean(), (in_segment & with_word).mean()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--tokens", type=int, default=512, help="Token budget of a grouped document")
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--k", type=int, default=10, help="Rows returned per query")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="Filtered precision@k grouped documents may lose")
+    args = parser.parse_args()
+
+    from ingestion.preprocessing import preprocess_data
+    from embedding.index_store import load_index
+    from embedding.hybrid_retrieval import HybridRetriever
+
+    workdir = tempfile.mkdtemp(prefix="bench_grouped_")
+    df = preprocess_data(synthetic_dataset(args.rows, text=1))
+    print(f"rows={len(df):,}, {len(df.columns)} columns, grouped budget {args.tokens} tokens")
+
+    results = {}
+    for mode in ("rows", "grouped"):
+        # A directory (and embedding cache) per mode: rows embedded by one are not cached for the other
+        os.makedirs(os.path.join(workdir, mode))
+        os.chdir(os.path.join(workdir, mode))
+        results[mode] = build(mode, df, args.tokens)
+        embeddings = HashedWordEmbeddings()
+        store = load_index(f"index_{mode}", embeddings)
+        retriever = HybridRetriever(df, lambda: store)
+        scores = []
+        for query, segment, word in make_queries(df, args.queries):
+            positions, _ = retriever._vector_search(store, query, args.k)
+            mask = retriever.metadata.mask([{"column": "Segment 3", "op": "in", "value": [segment]}])
+            filtered, _ = retriever._vector_search(store, f"{word} reviews", args.k, mask)
+            scores.append([*precision(df, positions, segment, word), precision(df, filtered, segment, word)[1]])
+        results[mode]["segment"], results[mode]["both"], results[mode]["filtered"] = np.mean(scores, axis=0)
+        results[mode]["query_texts"] = embeddings.texts / (2 * args.queries)
+    grouped = results["grouped"]
+    assert sorted(grouped["rows"]) == df.index.tolist(), "every row must be in exactly one grouped document"
+
+    print(f"\n{'mode':<9} {'documents':>10} {'tokens':>12} {'max/doc':>8} {'build s':>8} {'index MB':>9} "
+          f"{'P@k segment':>12} {'P@k both':>9} {'P@k filtered':>13} {'texts/query':>12}")
+    for mode, stats in results.items():
+        print(f"{mode:<9} {stats['documents']:>10,} {stats['tokens']:>12,} {stats['max_tokens']:>8,} {stats['seconds']:>8.1f} "
+              f"{stats['index_mb']:>9.1f} {stats['segment']:>12.2f} {stats['both']:>9.2f} {stats['filtered']:>13.2f} "
+              f"{stats['query_texts']:>12.0f}")
+    rows = results["rows"]
+    print(f"\ngrouped by {', '.join(grouped['report']['grouped_by'])} ({grouped['report']['groups']:,} groups): "
+          f"{rows['tokens'] / grouped['tokens']:.1f}x fewer tokens, {rows['documents'] / grouped['documents']:.0f}x fewer vectors, "
+          f"index {rows['index_mb'] / grouped['index_mb']:.1f}x smaller")
+    if grouped["filtered"] < rows["filtered"] - args.max_drop:
+        print(f"❌ filtered precision@k {grouped['filtered']:.2f} with grouped documents, {rows['filtered']:.2f} with rows")
+        sys.exit(1)
+    print(f"✅ Filtered precision@k within {args.max_drop:.2f} of one document per row")
+
+if __name__ == "__main__":
+    main()
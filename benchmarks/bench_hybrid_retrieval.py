@@ -0,0 +1,91 @@
+"""
+Benchmark for hybrid retrieval: latency and remote embedding calls per query
+type, for the hybrid engine (cheapest path) versus plain vector search.
+
+Query embeddings cost `--latency` seconds each, like a remote API call.
+Usage: python benchmarks/bench_hybrid_retrieval.py [--rows 100000] [--latency 0.05] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from common import synthetic_frame, FakeEmbeddings
+
+QUERIES = {
+    "filter": "orders in the West region in 2023",
+    "filter+range": "Technology orders with sales over 500",
+    "keyword": "ergonomic stapler",
+    "keyword+filter": "ergonomic stapler in the East",
+    "hybrid": "stapler bought with a heavy markdown",
+    "semantic": "unusually large purchases",
+    "semantic+filter": "unusually large purchases in South 2024",
+}
+
+def product_frame(rows: int, seed: int = 0):
+    """
+    The synthetic sales frame plus a free-text product name column.
+    """
+    rng = np.random.default_rng(seed)
+    df = synthetic_frame(rows, seed)
+    adjectives = ["ergonomic", "compact", "wireless", "premium", "recycled", "heavy duty", "portable", "classic"]
+    nouns = ["stapler", "desk chair", "monitor", "bookcase", "laptop stand", "binder", "headset", "lamp", "printer", "notebook"]
+    brands = [f"Brand{i}" for i in range(200)]
+    df["Product Name"] = (np.array(brands)[rng.integers(0, len(brands), rows)].astype(object) + " "
+                          + np.array(adjectives)[rng.integers(0, len(adjectives), rows)].astype(object) + " "
+                          + np.array(nouns)[rng.integers(0, len(nouns), rows)].astype(object))
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per remote embedding call")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from embedding.embedding_service import iter_row_documents
+    from embedding.vectorstore import build_vector_store
+    from embedding.index_store import load_index
+    from embedding.hybrid_retrieval import HybridRetriever
+
+    df = product_frame(args.rows)
+    os.chdir(tempfile.mkdtemp(prefix="bench_hybrid_"))
+    build_vector_store(iter_row_documents(df), api_key=None, base_embeddings=FakeEmbeddings())
+
+    class RemoteEmbeddings(FakeEmbeddings):
+        def embed_query(self, text):
+            time.sleep(args.latency)
+            return super().embed_query(text)
+
+    embedder = RemoteEmbeddings()
+    store = load_index("faiss_index", embedder)
+    start = time.perf_counter()
+    retriever = HybridRetriever(df, lambda: store)
+    retriever.bm25
+    print(f"rows={args.rows} remote latency={args.latency * 1000:.0f} ms  (BM25 index built in {time.perf_counter() - start:.2f}s)")
+    print(f"{'query type':<16} {'path':<8} {'matches':>8} {'hybrid ms':>10} {'calls':>6} {'vector ms':>10} {'calls':>6}  filters")
+
+    for name, query in QUERIES.items():
+        timings, baseline = [], []
+        calls_before = embedder.calls
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            documents, info = retriever.retrieve(query, k=5)
+            timings.append((time.perf_counter() - start) * 1000)
+        hybrid_calls = (embedder.calls - calls_before) / args.repeat
+
+        calls_before = embedder.calls
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            store.similarity_search(query, k=5)
+            baseline.append((time.perf_counter() - start) * 1000)
+        vector_calls = (embedder.calls - calls_before) / args.repeat
+
+        print(f"{name:<16} {info['path']:<8} {info['matches']:>8,} {statistics.median(timings):>10.2f} {hybrid_calls:>6.1f} "
+              f"{statistics.median(baseline):>10.2f} {vector_calls:>6.1f}  {'; '.join(info['filters'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark for incremental re-uploads: time to bring the index up to date after
+a daily export changed a fraction of the rows, comparing
+- a full rebuild with a cold embedding cache (the old wipe-and-rebuild),
+- a full rebuild with a warm embedding cache,
+- the incremental update (fingerprint diff, delete removed ids, embed added rows
+  and the kept rows whose "(Above/Below Average)" qualifiers change).
+
+Each export removes half of the changed rows from the previous one and appends
+the other half as new orders. Embedding latency is simulated per text.
+Usage: python benchmarks/bench_incremental.py [--rows 20000] [--latency 0.0002]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import synthetic_frame, FakeEmbeddings
+
+def daily_export(df: pd.DataFrame, change_ratio: float, seed: int = 1) -> pd.DataFrame:
+    """
+    Drops `change_ratio / 2` of the rows and appends as many new ones.
+    """
+    changed = int(len(df) * change_ratio / 2)
+    rng = np.random.default_rng(seed)
+    kept = df.drop(df.index[rng.choice(len(df), changed, replace=False)])
+    new = synthetic_frame(changed, seed=seed + 1)
+    new["Order ID"] += int(df["Order ID"].max()) + 1
+    return pd.concat([kept, new], ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.0002, help="Simulated seconds per embedded text")
+    parser.add_argument("--ratios", type=str, default="0.01,0.05,0.2,0.5")
+    args = parser.parse_args()
+
+    from ingestion.fingerprint import fingerprint_rows, fingerprint_ids
+    from embedding.embedding_service import iter_row_documents, generate_global_context
+    from embedding.vectorstore import build_vector_store, load_vector_store
+    from embedding.incremental_index import save_baseline, update_index_incrementally
+
+    base = synthetic_frame(args.rows)
+    os.chdir(tempfile.mkdtemp(prefix="bench_incremental_"))
+    os.makedirs("data", exist_ok=True)
+
+    def full_build(df, embedder):
+        rows, fingerprints = fingerprint_rows(df, df)
+        generate_global_context(rows)
+        build_vector_store(iter_row_documents(rows, ids=fingerprint_ids(fingerprints)), api_key=None, base_embeddings=embedder)
+        save_baseline(rows, fingerprints)
+
+    def snapshot(target):
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree("faiss_index", os.path.join(target, "faiss_index"))
+        shutil.copytree("data", os.path.join(target, "data"))
+
+    def restore(source):
+        for name in ("faiss_index", "data"):
+            shutil.rmtree(name, ignore_errors=True)
+            shutil.copytree(os.path.join(source, name), name)
+
+    # Baseline: yesterday's export, indexed once
+    full_build(base, FakeEmbeddings(latency=args.latency))
+    snapshot("baseline")
+
+    print(f"rows={args.rows} latency={args.latency * 1000:.2f} ms/text")
+    print(f"{'change':>7} {'added':>7} {'removed':>7} {'full cold s':>12} {'full warm s':>12} {'incremental s':>14} {'speedup':>8} {'embedded':>9} {'relabelled':>11}")
+    for run, ratio in enumerate(float(r) for r in args.ratios.split(",")):
+        export = daily_export(base, ratio, seed=run + 1)
+
+        # Full rebuild, cold cache (fresh model name -> no cached vectors)
+        restore("baseline")
+        start = time.perf_counter()
+        full_build(export, FakeEmbeddings(latency=args.latency, model=f"fake-cold-{run}"))
+        full_cold = time.perf_counter() - start
+        with open("data/context.json", "r") as f:
+            expected = json.load(f)["numerical_stats"]
+
+        # Full rebuild, warm cache (unchanged rows are cache hits)
+        restore("baseline")
+        start = time.perf_counter()
+        full_build(export, FakeEmbeddings(latency=args.latency))
+        full_warm = time.perf_counter() - start
+
+        # Incremental update
+        restore("baseline")
+        embedder = FakeEmbeddings(latency=args.latency, model=f"fake-incremental-{run}")
+        start = time.perf_counter()
+        rows, fingerprints = fingerprint_rows(export, export)
+        changes = update_index_incrementally(rows, fingerprints, api_key=None, base_embeddings=embedder)
+        incremental = time.perf_counter() - start
+
+        # The updated index and context must match a rebuild
+        store = load_vector_store("sk-fake")
+        assert store.index.ntotal == len(rows), (store.index.ntotal, len(rows))
+        assert set(store.index_to_docstore_id.values()) == set(fingerprint_ids(fingerprints))
+        sample = store.docstore.documents(store.docstore.live_rows()[::max(1, len(rows) // 200)])
+        assert all(rows.at[doc.metadata["row_index"], "Order ID"] == doc.metadata["Order ID"] for doc in sample)
+        # Every document is described against the new means, like in a rebuild
+        rebuilt = {doc.id: doc.page_content for batch in iter_row_documents(rows, ids=fingerprint_ids(fingerprints)) for doc in batch}
+        documents = store.docstore.documents(store.docstore.live_rows())
+        assert all(doc.page_content == rebuilt[doc.id] for doc in documents), "documents keep the old averages"
+        with open("data/context.json", "r") as f:
+            updated = json.load(f)["numerical_stats"]
+        for col in ("Sales", "Quantity", "Discount"):
+            for stat in ("count", "mean", "std", "min", "max"):
+                assert np.isclose(updated[col][stat], expected[col][stat]), (col, stat, updated[col][stat], expected[col][stat])
+
+        print(f"{ratio:>7.0%} {changes['added']:>7,} {changes['removed']:>7,} {full_cold:>12.2f} {full_warm:>12.2f} "
+              f"{incremental:>14.2f} {full_cold / incremental:>7.1f}x {embedder.texts:>9,} {changes['relabelled']:>11,}")
+
+if __name__ == "__main__":
+    main()
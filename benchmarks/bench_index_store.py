@@ -0,0 +1,134 @@
+"""
+Benchmark for the size-adaptive index store: for each index type, build time,
+on-disk size, resident memory after loading and querying, query latency and
+recall@5 against exact (flat) search. The LangChain pickle format
+(`save_local` / `load_local`) is included as the baseline.
+
+Vectors are drawn around cluster centres, like real text embeddings; each one
+is paired with a row Document of a synthetic dataset. Loading and querying run
+in a fresh subprocess per format so resident memory is not shared.
+Usage: python benchmarks/bench_index_store.py [--rows 200000] [--dim 256] [--queries 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import synthetic_frame, FakeEmbeddings
+
+def clustered_vectors(rows: int, dim: int, clusters: int = 1_000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, rows)] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def current_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / (1024 * 1024)
+
+def child(path: str, queries_path: str, legacy: bool):
+    """
+    Loads one saved store, runs the queries through LangChain and prints JSON.
+    """
+    from langchain_community.vectorstores import FAISS
+    from embedding.index_store import load_index
+
+    queries = np.load(queries_path)
+    embeddings = FakeEmbeddings(size=queries.shape[1])
+    baseline_rss = current_rss_mb()
+    start = time.perf_counter()
+    if legacy:
+        store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    else:
+        store = load_index(path, embeddings)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        docs = store.similarity_search_by_vector(query.tolist(), k=5)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([doc.metadata["row_index"] for doc in docs])
+    print(json.dumps({
+        "load_ms": load_ms,
+        "rss_mb": current_rss_mb() - baseline_rss,
+        "median_ms": statistics.median(latencies),
+        "p95_ms": sorted(latencies)[int(len(latencies) * 0.95) - 1],
+        "results": results,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--types", type=str, default="flat,ivf,hnsw,ivf_sq8,ivf_fp16,ivf_pq")
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "QUERIES"), help=argparse.SUPPRESS)
+    parser.add_argument("--legacy", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child[0], args.child[1], args.legacy)
+
+    import faiss
+    from langchain_community.vectorstores import FAISS
+    from embedding.embedding_service import iter_row_documents
+    from embedding.index_store import save_index, choose_index_type
+
+    workdir = tempfile.mkdtemp(prefix="bench_index_store_")
+    df = synthetic_frame(args.rows)
+    vectors = clustered_vectors(args.rows, args.dim)
+    documents = [doc for batch in iter_row_documents(df) for doc in batch]
+    store = FAISS.from_embeddings([(doc.page_content, vector) for doc, vector in zip(documents, vectors)],
+                                  FakeEmbeddings(size=args.dim), metadatas=[doc.metadata for doc in documents],
+                                  ids=[f"row-{doc.metadata['row_index']}" for doc in documents])
+    del documents
+
+    # Queries: perturbed dataset vectors; exact top-5 as ground truth
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(args.rows, args.queries, replace=False)] + 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    queries_path = os.path.join(workdir, "queries.npy")
+    np.save(queries_path, queries.astype(np.float32))
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    truth = exact.search(queries.astype(np.float32), 5)[1]
+
+    def run_child(path, legacy=False):
+        command = [sys.executable, os.path.abspath(__file__), "--child", path, queries_path] + (["--legacy"] if legacy else [])
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def recall(results):
+        return float(np.mean([len(set(found) & set(expected)) / 5 for found, expected in zip(results, truth.tolist())]))
+
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} auto index type: {choose_index_type(args.rows)}")
+    print(f"{'format':<14} {'build s':>8} {'disk MB':>8} {'load ms':>8} {'RSS MB':>8} {'median ms':>10} {'p95 ms':>8} {'recall@5':>9}")
+
+    rows = []
+    path = os.path.join(workdir, "legacy")
+    start = time.perf_counter()
+    store.save_local(path)
+    rows.append(("pickle (flat)", time.perf_counter() - start, directory_mb(path), run_child(path, legacy=True)))
+    for index_type in args.types.split(","):
+        path = os.path.join(workdir, index_type)
+        start = time.perf_counter()
+        save_index(store, path, index_type=index_type)
+        rows.append((index_type, time.perf_counter() - start, directory_mb(path), run_child(path)))
+
+    for name, build_s, disk_mb, result in rows:
+        print(f"{name:<14} {build_s:>8.2f} {disk_mb:>8.1f} {result['load_ms']:>8.1f} {result['rss_mb']:>8.1f} "
+              f"{result['median_ms']:>10.3f} {result['p95_ms']:>8.3f} {recall(result['results']):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark and checks for background ingestion jobs (`ingestion.jobs`), offline:
+the upload pipeline over a synthetic CSV with local fake embeddings that
+spend `--latency` seconds per text, like a remote API.
+
+Compares when the agent becomes usable: after the whole pipeline (the
+previous, blocking upload) versus as soon as the cleaned frame is published,
+then with vector search over the first index checkpoint, then complete.
+Checks that the partial index is searchable (with and without metadata
+filters) and reports its coverage, that a second session uploading the same
+file follows the running job, and that a job no session follows any more is
+cancelled and resumed from its checkpoint by the next upload.
+Usage: python benchmarks/bench_ingestion_jobs.py [--rows 100000] [--latency 0.0002]
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from common import synthetic_frame, FakeEmbeddings
+
+def upload(workspaces, session_id: str, key: str, csv_path: str):
+    """
+    What the upload handler does: point the session at the dataset and keep the file with it.
+    """
+    workspace = workspaces.open(session_id)
+    dataset_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    workspaces.assign(workspace, dataset_hash)
+    upload_path = workspace.upload_path(csv_path)
+    if not os.path.exists(upload_path):
+        os.link(csv_path, upload_path)
+    return workspace, dataset_hash, upload_path
+
+def follow(job, on_partial=None, poll: float = 0.01) -> dict:
+    """
+    Polls the job like the sidebar does; returns the seconds at which each readiness level was reached.
+    """
+    start = time.perf_counter()
+    reached = {}
+    while True:
+        readiness = job.readiness
+        if readiness not in reached:
+            reached[readiness] = time.perf_counter() - start
+            if readiness == "partial" and on_partial is not None:
+                on_partial()
+        if not job.active:
+            return reached
+        time.sleep(poll)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.0002, help="Seconds per embedded text")
+    args = parser.parse_args()
+
+    from ingestion.workspace import WorkspaceManager
+    from ingestion.jobs import JobExecutor, IngestionJob, run_upload_pipeline
+    from embedding.vectorstore import load_partial_vector_store
+    from embedding.hybrid_retrieval import HybridRetriever
+    from embedding.index_store import load_index
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_jobs_"))
+    synthetic_frame(args.rows).to_csv("upload.csv", index=False)
+    workspaces = WorkspaceManager("workspaces")
+    executor = JobExecutor()
+    print(f"rows={args.rows:,}, {args.latency * 1000:.2f} ms per embedded text")
+
+    # Previous model: the upload blocks until everything is built
+    _, dataset_hash, upload_path = upload(workspaces, "blocking", "blocking", "upload.csv")
+    start = time.perf_counter()
+    run_upload_pipeline(IngestionJob(dataset_hash, "upload.csv", "blocking"), workspaces, upload_path, None,
+                        base_embeddings=FakeEmbeddings(32, args.latency, model="fake-blocking"))
+    blocking = time.perf_counter() - start
+
+    # Background job; a second session uploads the same file while it runs
+    workspace, dataset_hash, upload_path = upload(workspaces, "session-1", "background", "upload.csv")
+    job = executor.submit(dataset_hash, "upload.csv", "session-1", run_upload_pipeline, workspaces, upload_path, None,
+                          base_embeddings=FakeEmbeddings(32, args.latency, model="fake-background"))
+    follower = executor.submit(dataset_hash, "upload.csv", "session-2", run_upload_pipeline, workspaces, upload_path, None)
+    assert follower is job and job.sessions == {"session-1", "session-2"}
+
+    searches = {}
+    def search_partial():
+        # What vector_search_tool does while the build runs
+        store = load_partial_vector_store(None, workspace.checkpoint_path, embeddings=FakeEmbeddings(32))
+        assert store is not None
+        retriever = HybridRetriever(job.df, lambda: store)
+        docs, info = retriever.retrieve("customers unhappy with slow delivery", k=5)
+        assert info["embedding_calls"] == 1 and len(docs) == 5, info
+        filtered, info = retriever.retrieve("orders similar to damaged chairs in the West", k=5)
+        assert info["embedding_calls"] == 1 and filtered and all(doc.metadata["Region"] == "West" for doc in filtered), info
+        searches["coverage"] = store.index.ntotal / len(job.df)
+        searches["rows"] = store.index.ntotal
+
+    reached = follow(job, on_partial=search_partial)
+    assert job.status == "done", job.error
+    assert not os.path.exists(upload_path), "the upload is removed once processed"
+    print(f"\n{'mode':<11} {'agent usable s':>15} {'search (partial) s':>19} {'complete s':>11}")
+    print(f"{'blocking':<11} {blocking:>15.2f} {'-':>19} {blocking:>11.2f}")
+    print(f"{'background':<11} {reached['data']:>15.2f} {reached.get('partial', float('nan')):>19.2f} {reached['ready']:>11.2f}")
+    print(f"partial index searched at {searches['coverage']:.0%} coverage ({searches['rows']:,} rows), "
+          f"{reached['data'] / blocking:.0%} of the blocking wait before the first question")
+    print("stages: " + ", ".join(f"{s['name']} {s['seconds']:.2f}s" for s in job.snapshot()["stages"] if s["seconds"] is not None))
+
+    # A job no session follows is cancelled at its next batch, and the next upload resumes it
+    workspace, dataset_hash, upload_path = upload(workspaces, "session-3", "resumed", "upload.csv")
+    embeddings = FakeEmbeddings(32, args.latency, model="fake-resumed")
+    job = executor.submit(dataset_hash, "upload.csv", "session-3", run_upload_pipeline, workspaces, upload_path, None,
+                          base_embeddings=embeddings)
+    follow(job, on_partial=lambda: executor.detach(job.job_id, "session-3"))
+    assert job.status == "cancelled" and workspace.expired and os.path.exists(upload_path), job.status
+    cancelled_at = embeddings.texts
+    workspaces.assign(workspace, dataset_hash)
+    job = executor.submit(dataset_hash, "upload.csv", "session-3", run_upload_pipeline, workspaces, upload_path, None,
+                          base_embeddings=embeddings)
+    follow(job)
+    assert job.status == "done", job.error
+    resumed = [line for line in job.snapshot()["log"] if line.startswith("⏯️")]
+    store = load_index(workspace.index_path, FakeEmbeddings(32))
+    assert resumed and store.index.ntotal == args.rows, (resumed, store.index.ntotal)
+    print(f"\ncancelled after {cancelled_at:,} embedded rows, resumed: {resumed[0][2:].strip()}; "
+          f"{embeddings.texts - cancelled_at:,} rows embedded after the restart")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark and checks for the intent router (`agents.intent_router`), offline,
+on a synthetic sales dataset (regions, categories, products, order dates).
+
+Runs a corpus of chat questions through the router: simple aggregates it must
+answer (checked against plain pandas on the same data) and questions it must
+leave to the agent (plots, trends, negations, two metrics, ...). Reports the
+hit rate on the corpus, the time to build the aggregate cube and the answer
+latency from the cube and from the rows (router without a cube), and the
+time a question left to the agent spends in the router. Exits with status 1
+on a wrong answer, a question routed that should not be, or a p95 latency
+over the budget.
+Usage: python benchmarks/bench_intent_router.py [--rows 1000000] [--repeats 20] [--budget-ms 100]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import synthetic_dataset
+
+REGIONS = {"Group A": "North", "Group B": "South", "Group C": "East", "Group D": "West"}
+year = lambda d: d["Order Date"].dt.year
+by = lambda d, col, metric, agg: d.groupby(col, observed=True)[metric].agg(agg)
+
+# (question, expected answer from the frame, or None when the agent must answer)
+CORPUS = [
+    ("What is the average sales?", lambda d: d["Sales"].mean()),
+    ("total sales by region", lambda d: by(d, "Region", "Sales", "sum")),
+    ("Average profit by category in 2023", lambda d: by(d[year(d) == 2023], "Category", "Profit", "mean")),
+    ("How many orders in the West?", lambda d: int((d["Region"] == "West").sum())),
+    ("number of rows per year", lambda d: d.groupby(year(d)).size()),
+    ("median quantity by region", lambda d: by(d, "Region", "Quantity", "median")),
+    ("top 5 products by total sales", lambda d: by(d, "Product", "Sales", "sum").sort_values(ascending=False).head(5)),
+    ("bottom 3 categories by average profit in 2022",
+     lambda d: by(d[year(d) == 2022], "Category", "Profit", "mean").sort_values().head(3)),
+    ("Which region has the highest average sales?", lambda d: by(d, "Region", "Sales", "mean").sort_values(ascending=False).head(1)),
+    ("maximum sales for Product B1", lambda d: d.loc[d["Product"] == "Product B1", "Sales"].max()),
+    ("how many orders have sales over 500", lambda d: int((d["Sales"] > 500).sum())),
+    ("average sales where quantity is at least 40 by region", lambda d: by(d[d["Quantity"] >= 40], "Region", "Sales", "mean")),
+    ("minimum profit in East and West", lambda d: d.loc[d["Region"].isin(["East", "West"]), "Profit"].min()),
+    ("number of unique products", lambda d: d["Product"].nunique()),
+    ("total quantity for each category in 2021", lambda d: by(d[year(d) == 2021], "Category", "Quantity", "sum")),
+    ("count by region for Category K", lambda d: d[d["Category"] == "Category K"].groupby("Region", observed=True).size()),
+    ("what's the total profit per year in the North", lambda d: d[d["Region"] == "North"].groupby(year(d)).agg({"Profit": "sum"})["Profit"]),
+    ("which category has the most rows", lambda d: d.groupby("Category", observed=True).size().sort_values(ascending=False).head(1)),
+    ("sum of sales in 2024", lambda d: d.loc[year(d) == 2024, "Sales"].sum()),
+    ("plot total sales by region", None),
+    ("why did sales drop in 2023", None),
+    ("average sales and profit by region", None),
+    ("what are the main themes in the reviews", None),
+    ("sales by region", None),
+    ("total sales excluding the West", None),
+    ("average sales between 2021 and 2023", None),
+    ("how many customers bought twice", None),
+    ("compare average sales of North and South", None),
+    ("average sales per customer", None),
+    ("trend of total sales per year", None),
+    ("count by region and category", None),
+    ("average sales in 2021 and 2022", None),
+]
+
+def sales_dataset(rows: int) -> pd.DataFrame:
+    df = synthetic_dataset(rows, text=1)
+    df = df.rename(columns={"Amount 1": "Sales", "Count 2": "Quantity", "Amount 3": "Profit", "Segment 1": "Region",
+                            "Segment 2": "Category", "Segment 3": "Product", "Review 1": "Review", "Date 1": "Order Date"})
+    df["Region"] = df["Region"].map(REGIONS)
+    df["Category"] = df["Category"].str.replace("Group", "Category")
+    df["Product"] = df["Product"].str.replace("Group", "Product")
+    return df
+
+def same(got, expected, ranked: bool = False) -> bool:
+    """
+    Equal values (to rounding); groups may be listed in another order unless `ranked`.
+    """
+    if not isinstance(expected, pd.Series):
+        return not isinstance(got, pd.Series) and bool(np.isclose(float(got), float(expected), rtol=1e-9, equal_nan=True))
+    if not isinstance(got, pd.Series):
+        return False
+    keys = lambda series: [str(key) for key in series.index]
+    if keys(got) != keys(expected):
+        if ranked or sorted(keys(got)) != sorted(keys(expected)):
+            return False
+        got = got.set_axis(keys(got)).reindex(keys(expected))
+    return np.allclose(got.to_numpy(dtype=float), expected.to_numpy(dtype=float), rtol=1e-9, equal_nan=True)
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs of each question")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="p95 latency of a routed answer")
+    args = parser.parse_args()
+
+    from ingestion.preprocessing import preprocess_data
+    from ingestion.aggregate_cube import save_cube
+    from agents.intent_router import IntentRouter, router_stats
+
+    df = preprocess_data(sales_dataset(args.rows))
+    cube_path = os.path.join(tempfile.mkdtemp(prefix="bench_router_"), "cube.parquet")
+    report = {}
+    start = time.perf_counter()
+    save_cube(df, cube_path, report=report)
+    print(f"rows={len(df):,}; cube: {report['cells']:,} cells over {', '.join(report['dimensions'])} "
+          f"({report['cuboids']} group-bys) built in {time.perf_counter() - start:.2f}s, {os.path.getsize(cube_path) / 1e6:.2f} MB")
+
+    routers = {"cube": IntentRouter(df, cube_path=cube_path), "pandas": IntentRouter(df)}
+    for router in routers.values():
+        router.answer("how many rows")   # Builds the filter indexes, as the first question of a session does
+    failures, latencies, misses = [], {name: [] for name in routers}, []
+    for question, expected in CORPUS:
+        for name, router in routers.items():
+            answer = router.answer(question)
+            if expected is None:
+                if answer is not None:
+                    failures.append(f"{question!r} should be left to the agent, answered {answer['intent']}")
+                continue
+            if answer is None:
+                failures.append(f"{question!r} was left to the agent ({name})")
+                continue
+            if name == "cube" and answer["source"] != "cube" and answer["intent"]["agg"] != "median" \
+                    and answer["intent"]["kind"] != "distinct" and not any(flt["op"] not in ("in", "year") for flt in answer["intent"]["filters"]):
+                failures.append(f"{question!r} was not answered from the cube")
+            if not same(answer["value"], expected(df), ranked=answer["intent"]["kind"] == "top"):
+                failures.append(f"{question!r} ({name}): got\n{answer['value']}\nexpected\n{expected(df)}")
+            for _ in range(args.repeats):
+                latencies[name].append(router.answer(question)["seconds"] * 1000)
+        if expected is None:
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                routers["cube"].answer(question)
+                misses.append((time.perf_counter() - start) * 1000)
+
+    routed = sum(expected is not None for _, expected in CORPUS)
+    print(f"\ncorpus: {len(CORPUS)} questions, {routed} simple aggregates, {len(CORPUS) - routed} for the agent")
+    print(f"\n{'path':<22} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, values in latencies.items():
+        print(f"{'answer from ' + name:<22} {percentile(values, 0.5):>8.2f} {percentile(values, 0.95):>8.2f} {max(values):>8.2f}")
+    print(f"{'left to the agent':<22} {percentile(misses, 0.5):>8.2f} {percentile(misses, 0.95):>8.2f} {max(misses):>8.2f}")
+    stats = router_stats()
+    print(f"\nrouter hit rate over every call: {stats['hit_rate']:.0%} ({stats['cube_hits']:,} of {stats['hits']:,} answers from the cube)")
+
+    slow = [name for name, values in latencies.items() if percentile(values, 0.95) > args.budget_ms]
+    failures += [f"p95 latency from {name} over {args.budget_ms:.0f} ms" for name in slow]
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"✅ {routed} answers match pandas, {len(CORPUS) - routed} questions left to the agent")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark and checks for multi-sheet ingestion (`ingestion.multi_source`),
+offline: a generated workbook with one sheet per month, a lookup sheet keyed
+by a column of the monthly sheets and an unrelated sheet.
+
+Reports the wall time to parse and combine every sheet against the number of
+parsing worker processes (workers are started and warmed up before timing;
+each run starts from an empty sheet cache), next to pandas reading all sheets
+in one process, and the time to load the workbook again from the sheet cache.
+Checks that the monthly sheets are stacked with their sheet name, that the
+lookup sheet is joined on its key and that the unrelated sheet is kept as a
+related table.
+Usage: python benchmarks/bench_multi_source.py [--sheets 12] [--sheet-rows 20000] [--workers 1 2 4]
+"""
+import argparse
+import calendar
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from common import synthetic_dataset
+
+def build_workbook(path: str, sheets: int, sheet_rows: int) -> list:
+    months = [calendar.month_name[i % 12 + 1] + ("" if i < 12 else f" {i // 12 + 1}") for i in range(sheets)]
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for i, month in enumerate(months):
+            df = synthetic_dataset(sheet_rows, text=1, seed=i)
+            df["Record ID"] += i * sheet_rows
+            df.to_excel(writer, sheet_name=month, index=False)
+        levels = sorted(synthetic_dataset(1_000, text=0, missing=0)["Segment 1"].unique())
+        pd.DataFrame({"Segment 1": levels, "Manager": [f"Manager {i}" for i in range(len(levels))]}) \
+            .to_excel(writer, sheet_name="Segments", index=False)
+        pd.DataFrame({"Quarter": ["Q1", "Q2", "Q3", "Q4"], "Target": [1e6, 1.2e6, 1.1e6, 1.4e6]}) \
+            .to_excel(writer, sheet_name="Targets", index=False)
+    return months
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sheets", type=int, default=12, help="Monthly sheets")
+    parser.add_argument("--sheet-rows", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    from agents.worker_pool import WorkerPool
+    from ingestion.multi_source import load_sources
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_sheets_"))
+    start = time.perf_counter()
+    months = build_workbook("workbook.xlsx", args.sheets, args.sheet_rows)
+    print(f"workbook: {args.sheets} sheets x {args.sheet_rows:,} rows + 2 small sheets, "
+          f"{os.path.getsize('workbook.xlsx') / 1e6:.1f} MB (written in {time.perf_counter() - start:.1f}s), {os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    pd.read_excel("workbook.xlsx", sheet_name=None)
+    sequential = time.perf_counter() - start
+    print(f"\n{'mode':<24} {'seconds':>8} {'speedup':>8}")
+    print(f"{'pandas, all sheets':<24} {sequential:>8.2f} {1:>7.1f}x")
+
+    for workers in args.workers:
+        pool = WorkerPool("ingestion.multi_source:parse_source", size=workers, name="sheet-parser")
+        # One small file per worker, so the timing does not include the workers' imports
+        warmup = [f"warmup_{i}.csv" for i in range(workers)]
+        for i, path in enumerate(warmup):
+            synthetic_dataset(10, seed=i).to_csv(path, index=False)
+        load_sources(warmup, cache_dir="warmup", pool=pool)
+        shutil.rmtree("sheets", ignore_errors=True)
+        report = {}
+        start = time.perf_counter()
+        df, related = load_sources(["workbook.xlsx"], cache_dir="sheets", pool=pool, report=report)
+        seconds = time.perf_counter() - start
+        pool.shutdown()
+        print(f"{f'{workers} parse workers':<24} {seconds:>8.2f} {sequential / seconds:>7.1f}x")
+        assert report["parsed"] == args.sheets + 2 and len(df) == args.sheets * args.sheet_rows, report
+    assert list(df["Source"].unique()) == months and report["joined"] == {"Segments": "Segment 1"}, report
+    assert df["Manager"].notna().sum() == df["Segment 1"].notna().sum() and list(related) == ["Targets"], report
+
+    pool = WorkerPool("ingestion.multi_source:parse_source", size=1, name="sheet-parser")
+    report = {}
+    start = time.perf_counter()
+    load_sources(["workbook.xlsx"], cache_dir="sheets", pool=pool, report=report)
+    cached = time.perf_counter() - start
+    assert report["cached"] == args.sheets + 2 and pool.tasks == 0, report
+    print(f"{'from the sheet cache':<24} {cached:>8.2f} {sequential / cached:>7.1f}x")
+    print(f"\n{len(df):,} rows stacked from {args.sheets} sheets, Segments joined on \"Segment 1\", Targets kept as a related table")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark for plot rendering: the previous in-process `exec` on the full frame
+versus the worker-pool renderer (first render, then a cache hit), for small
+and large frames.
+
+Reports render latency, peak resident memory of the process that rendered
+(the Streamlit process for the baseline, the worker for the renderer; the
+worker's peak is cumulative over the run), and the data reduction applied.
+The baseline runs in a fresh subprocess per command.
+Usage: python benchmarks/bench_plot_rendering.py [--small 10000] [--large 2000000] [--timeout 120]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import synthetic_frame, peak_rss_mb
+
+COMMANDS = {
+    "scatter": "sns.scatterplot(data=df, x='Sales', y='Discount', hue='Region')",
+    "line": "sns.lineplot(data=df, x='Order Date', y='Sales')",
+    "bar (aggregate)": "df.groupby('Region')['Sales'].sum().plot(kind='bar')",
+    "hist": "sns.histplot(df['Sales'], bins=50)",
+}
+
+def baseline_child(rows: int, command: str):
+    """
+    The previous plotting_tool body: pyplot in-process on the full frame.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import pandas as pd
+
+    df = synthetic_frame(rows)
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    plt.figure(figsize=(10, 6))
+    exec(command, {'plt': plt, 'sns': sns, 'df': df, 'pd': pd})
+    plt.savefig(os.path.join(tempfile.mkdtemp(), "plot.png"))
+    plt.close()
+    print(json.dumps({"seconds": time.perf_counter() - start, "peak_mb": peak_rss_mb(), "growth_mb": peak_rss_mb() - before}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--small", type=int, default=10_000)
+    parser.add_argument("--large", type=int, default=2_000_000)
+    parser.add_argument("--timeout", type=float, default=120, help="Render timeout (the baseline cannot be stopped)")
+    parser.add_argument("--child", nargs=2, metavar=("ROWS", "COMMAND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return baseline_child(int(args.child[0]), COMMANDS[args.child[1]])
+
+    from agents.plot_renderer import PlotRenderer
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_plots_"))
+    renderer = PlotRenderer(workers=1, timeout=args.timeout)
+    renderer.pool.start()
+    print(f"small={args.small:,} large={args.large:,} rows, worker max points={renderer.max_points:,}")
+    print(f"{'frame':<7} {'plot':<16} {'in-process s':>12} {'peak MB':>8} {'worker s':>9} {'peak MB':>8} {'cached s':>9}  reduction")
+
+    for label, rows in (("small", args.small), ("large", args.large)):
+        df = synthetic_frame(rows)
+        dataset_key = f"bench-{rows}"
+        for name, command in COMMANDS.items():
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(rows), name],
+                                    check=True, capture_output=True, text=True).stdout
+            baseline = json.loads(output.strip().splitlines()[-1])
+
+            first = renderer.render(command, df, dataset_key)
+            cached = renderer.render(command, df, dataset_key)
+            assert cached["cached"] and os.path.getsize(cached["path"]) == os.path.getsize(first["path"])
+            print(f"{label:<7} {name:<16} {baseline['seconds']:>12.2f} {baseline['peak_mb']:>8.0f} {first['seconds']:>9.2f} "
+                  f"{first['worker_peak_mb']:>8.0f} {cached['seconds']:>9.4f}  {first['note'] or '-'}")
+
+    # A render over the timeout is stopped and its worker replaced
+    quick = PlotRenderer(workers=1, timeout=2)
+    try:
+        quick.render("import time; time.sleep(30)", synthetic_frame(10), "bench-timeout")
+        raise AssertionError("render was not stopped")
+    except TimeoutError:
+        pass
+    assert quick.render("plt.plot([1, 2, 3])", synthetic_frame(10), "bench-timeout")["path"], "pool recovered"
+    print(f"timeout: render stopped after 2s, worker replaced (kills={quick.pool.kills})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark and checks for the response cache in front of the agent, with a
+stubbed agent (fixed latency per answer) and stubbed embeddings.
+
+A simulated chat session asks questions drawn with repeats from a pool of
+intents, each phrased several ways; some intents differ only in a filter
+value or a number ("... in the West" / "... in the East"). Reports hit rates,
+latency saved and wrong answers served, with and without the filters in the
+question signature, then checks TTL expiry, LRU eviction, persistence and
+dataset invalidation.
+Usage: python benchmarks/bench_response_cache.py [--turns 200] [--latency 0.2] [--similarity 0.7]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common import synthetic_frame, FakeEmbeddings
+
+# Intent -> phrasings. Intents sharing a template differ only in a filter or number.
+INTENTS = {
+    "sales-west": ["total sales in the West region", "What are the total sales for West?", "Total sales, West region"],
+    "sales-east": ["total sales in the East region", "What are the total sales for East?", "Total sales, East region"],
+    "top5": ["top 5 orders by sales", "Show the top 5 orders ranked by sales", "What are the top 5 orders by sales?"],
+    "top10": ["top 10 orders by sales", "Show the top 10 orders ranked by sales", "What are the top 10 orders by sales?"],
+    "discount-furniture": ["average discount for Furniture", "What is the average discount on Furniture orders?"],
+    "discount-technology": ["average discount for Technology", "What is the average discount on Technology orders?"],
+    "quantity-2023": ["total quantity ordered in 2023", "How many units were ordered in 2023?"],
+    "quantity-2024": ["total quantity ordered in 2024", "How many units were ordered in 2024?"],
+    "trend": ["plot monthly sales trend", "Plot the monthly trend of sales", "plot monthly sales trend!"],
+    "categories": ["which category sells the most", "Which category has the highest sales?"],
+}
+
+class BagOfWordsEmbeddings(FakeEmbeddings):
+    """
+    Stub embeddings where questions sharing words are similar: the normalized
+    sum of one hashed vector per content word.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        super().__init__(size=size, latency=latency, model="fake-bow")
+
+    def embed_documents(self, texts):
+        from embedding.hybrid_retrieval import tokenize, STOPWORDS
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency:
+            time.sleep(self.latency * len(texts))
+        vectors = []
+        for text in texts:
+            words = [word.rstrip("s") for word in tokenize(text) if word not in STOPWORDS] or [text]
+            vector = np.sum([self._vector(word) for word in words], axis=0)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+class StubAgent:
+    """
+    Stands in for the LangChain agent: answers with the intent of the question
+    after `latency` seconds, and writes a plot file for plotting questions.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.intents = {phrasing: intent for intent, phrasings in INTENTS.items() for phrasing in phrasings}
+
+    def invoke(self, inputs):
+        self.calls += 1
+        time.sleep(self.latency)
+        intent = self.intents[inputs["input"]]
+        if intent == "trend":
+            os.makedirs("plots", exist_ok=True)
+            open(os.path.join("plots", f"plot_{self.calls:04d}.png"), "wb").close()
+        return {"input": inputs["input"], "output": f"answer:{intent}"}
+
+def session(turns: int, seed: int):
+    rng = np.random.default_rng(seed)
+    names = list(INTENTS)
+    # Zipf-like popularity: analysts come back to a few questions
+    weights = 1 / np.arange(1, len(names) + 1)
+    intents = rng.choice(names, turns, p=weights / weights.sum())
+    return [(intent, INTENTS[intent][rng.integers(len(INTENTS[intent]))]) for intent in intents]
+
+def run(label, questions, agent, wrapped, cache):
+    wrong = 0
+    start = time.perf_counter()
+    for intent, question in questions:
+        response = wrapped.invoke({"input": question})
+        wrong += response["output"] != f"answer:{intent}"
+    elapsed = time.perf_counter() - start
+    stats = cache.stats() if cache is not None else None
+    if stats is None:
+        print(f"{label:<22} {elapsed:8.2f}s {agent.calls:>7} {'-':>7} {'-':>9} {'-':>9} {'-':>8} {wrong:>6}")
+    else:
+        print(f"{label:<22} {elapsed:8.2f}s {agent.calls:>7} {stats['hit_rate']:>7.0%} {stats['exact_hits']:>9} "
+              f"{stats['semantic_hits']:>9} {stats['seconds_saved']:>7.1f}s {wrong:>6}")
+    return wrong
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per stubbed agent answer")
+    parser.add_argument("--similarity", type=float, default=0.7, help="Semantic hit threshold (the bag-of-words stub is cruder than real embeddings)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from agents.response_cache import ResponseCache, CachedAgent
+    from embedding.hybrid_retrieval import MetadataIndex
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_response_cache_"))
+    metadata = MetadataIndex(synthetic_frame(5_000))
+    questions = session(args.turns, args.seed)
+    embeddings = BagOfWordsEmbeddings()
+
+    print(f"turns={args.turns} agent latency={args.latency * 1000:.0f} ms similarity>={args.similarity}")
+    print(f"{'cache':<22} {'elapsed':>9} {'agent':>7} {'hits':>7} {'exact':>9} {'semantic':>9} {'saved':>8} {'wrong':>6}")
+    agent = StubAgent(args.latency)
+    run("none", questions, agent, agent, None)
+    for label, layers, guard in (("exact only", False, True), ("exact+semantic", True, True), ("semantic, numbers only", True, False)):
+        agent = StubAgent(args.latency)
+        cache = ResponseCache(f"cache-{label}", similarity=args.similarity)
+        # Without the MetadataIndex the signature only holds the numbers of the question
+        wrapped = CachedAgent(agent, "dataset-a", "stub-llm", embeddings if layers else None, metadata if guard else None, cache)
+        wrong = run(label, questions, agent, wrapped, cache)
+        if guard:
+            assert wrong == 0, f"{label}: {wrong} wrong answers served"
+
+    # --- Checks ---
+    cache = ResponseCache("cache-checks", max_entries=3, ttl_seconds=0.5, similarity=args.similarity)
+    for i in range(4):
+        cache.store(f"question {i}", f"answer {i}", "dataset-a", "stub-llm", seconds=1.0)
+    assert len(cache) == 3 and cache.lookup("question 0", "dataset-a", "stub-llm") is None, "LRU eviction"
+    assert cache.lookup("  QUESTION 3 ?", "dataset-a", "stub-llm")["layer"] == "exact", "exact match on the normalized prompt"
+    assert cache.lookup("question 3", "dataset-a", "other-llm") is None, "model is part of the key"
+
+    reopened = ResponseCache("cache-checks", max_entries=3, ttl_seconds=0.5)
+    assert len(reopened) == 3 and reopened.lookup("question 2", "dataset-a", "stub-llm") is not None, "persistence"
+    assert reopened.retain_datasets(["dataset-b"]) == 3 and len(reopened) == 0, "dataset invalidation"
+
+    cache.store("question 5", "answer 5", "dataset-a", "stub-llm")
+    time.sleep(0.6)
+    assert cache.lookup("question 5", "dataset-a", "stub-llm") is None and len(cache) == 0, "TTL expiry"
+
+    # A cached plot answer is recomputed once its plot file is gone
+    agent = StubAgent(0.0)
+    wrapped = CachedAgent(agent, "dataset-a", "stub-llm", cache=ResponseCache("cache-plots"))
+    first = wrapped.invoke({"input": "plot monthly sales trend"})
+    assert wrapped.invoke({"input": "plot monthly sales trend"})["cache"]["extras"]["plot_path"] == first["plot_path"]
+    os.remove(first["plot_path"])
+    assert wrapped.invoke({"input": "plot monthly sales trend"})["cache"] is None and agent.calls == 2, "missing plot"
+    print("checks passed: LRU, normalization, model key, persistence, dataset invalidation, TTL, missing plots")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark for the row-document builder.
+
+Each size runs in a fresh subprocess so peak RSS is measured per size.
+First checks that the text of each row is the one the original `iterrows`
+builder wrote (the embedding cache and fingerprints are keyed on it), on
+the synthetic frame and on frames of float32 columns only, alone and
+mixed with other types; exits with status 1 otherwise.
+Usage: python benchmarks/bench_row_documents.py [--sizes 100000 1000000 5000000] [--list]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import synthetic_frame, peak_rss_mb
+
+def iterrows_contents(df) -> list:
+    """
+    page_content of the original builder, one row at a time with `iterrows`.
+    """
+    num_cols = df.select_dtypes(include='number').columns
+    means = df[num_cols].mean()
+    contents = []
+    for _, row in df.iterrows():
+        parts = []
+        for col in df.columns:
+            val = row[col]
+            qualifier = ""
+            if col in num_cols:
+                if val > means[col]:
+                    qualifier = "(Above Average)"
+                elif val < means[col]:
+                    qualifier = "(Below Average)"
+            parts.append(f"{col}: {val} {qualifier}")
+        contents.append(" | ".join(parts))
+    return contents
+
+def check_text() -> list:
+    """
+    Frames whose row text differs from `iterrows_contents`.
+    """
+    from embedding.embedding_service import iter_row_documents
+
+    rng = np.random.default_rng(0)
+    values = rng.random((2_000, 3)).astype(np.float32)
+    frames = {
+        "synthetic": synthetic_frame(2_000),
+        "float32": pd.DataFrame(values, columns=["a", "b", "c"]),
+        "float32+int8": pd.DataFrame({"a": values[:, 0], "n": rng.integers(0, 100, 2_000).astype(np.int8)}),
+        "float32+text": pd.DataFrame({"a": values[:, 0], "t": rng.choice(["x", "y"], 2_000)}),
+    }
+    failed = []
+    for name, df in frames.items():
+        contents = [doc.page_content for chunk in iter_row_documents(df) for doc in chunk]
+        if contents != iterrows_contents(df):
+            failed.append(name)
+    return failed
+
+def run_single(rows: int, as_list: bool) -> dict:
+    from embedding.embedding_service import iter_row_documents, create_row_documents
+
+    df = synthetic_frame(rows)
+    base_rss = peak_rss_mb()
+    start = time.perf_counter()
+    if as_list:
+        produced = len(create_row_documents(df))
+    else:
+        # Consume chunk by chunk like the indexer does, dropping each chunk afterwards
+        produced = sum(len(chunk) for chunk in iter_row_documents(df))
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "mode": "list" if as_list else "stream",
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(produced / elapsed) if elapsed else None,
+        "frame_rss_mb": round(base_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--list", action="store_true", help="Also measure the materialised list (create_row_documents).")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--as-list", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.single, args.as_list)))
+        return
+
+    failed = check_text()
+    if failed:
+        print(f"❌ row text differs from iterrows for: {', '.join(failed)}")
+        sys.exit(1)
+    print("✅ Row text matches iterrows (synthetic, float32 frames)")
+
+    modes = [False, True] if args.list else [False]
+    for rows in args.sizes:
+        for as_list in modes:
+            cmd = [sys.executable, __file__, "--single", str(rows)] + (["--as-list"] if as_list else [])
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            print(out.strip())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark and checks for restoring a dataset from its stored artifacts
+(`ingestion.workspace`), offline: the upload pipeline over a synthetic CSV
+with local fake embeddings that spend `--latency` seconds per text, like a
+remote API.
+
+Compares the time until a session is ready to answer (frame in memory,
+FAISS index and docstore opened, context read, a first question answered by
+the intent router): cold, running the whole pipeline, versus restored by a
+new workspace manager, as after a server restart, from the artifacts stored
+under the upload's content hash, with the frame memory-mapped from its Arrow
+copy and read from Parquet. Checks that the restored frame and search
+results equal the cold ones, that another pipeline version does not reuse
+the artifacts, and that over the disk budget the least recently used
+dataset is deleted first. Exits with status 1 if a restore takes longer
+than `--budget-s`.
+Usage: python benchmarks/bench_snapshot_restore.py [--rows 200000] [--latency 0.0002] [--repeats 5] [--budget-s 1.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from common import synthetic_frame, FakeEmbeddings
+
+def upload(workspaces, session_id: str, csv_path: str):
+    """
+    What the upload handler does: hash the content, point the session at the dataset and keep the file with it.
+    """
+    from ingestion.workspace import content_hash
+
+    with open(csv_path, "rb") as f:
+        dataset_hash = content_hash([(csv_path, f.read())])
+    workspace = workspaces.open(session_id)
+    reuse = workspaces.is_ready(dataset_hash)
+    workspaces.assign(workspace, dataset_hash)
+    upload_path = workspace.upload_path(csv_path)
+    if not reuse and not os.path.exists(upload_path):
+        os.link(csv_path, upload_path)
+    return workspace, reuse, upload_path
+
+def ready(workspace) -> tuple:
+    """
+    Opens what the agent and the router use (see `build_agent` and `build_router` in app.py).
+
+    Returns:
+        tuple: (frame, vector store, first search results).
+    """
+    from embedding.index_store import load_index
+    from agents.intent_router import IntentRouter
+
+    df = workspace.df
+    store = load_index(workspace.index_path, FakeEmbeddings(32))
+    with open(workspace.context_path) as f:
+        json.load(f)
+    assert IntentRouter(df, cube_path=workspace.cube_path).answer("how many rows")["value"] == len(df)
+    docs = store.similarity_search("slow delivery in the West", k=5)
+    return df, store, [doc.page_content for doc in docs]
+
+def restore(root: str, session_id: str, csv_path: str) -> tuple:
+    """
+    A new manager (nothing in memory) restores the upload. Returns (seconds, ready() result).
+    """
+    from ingestion.workspace import WorkspaceManager
+
+    start = time.perf_counter()
+    workspace, reuse, _ = upload(WorkspaceManager(root), session_id, csv_path)
+    assert reuse, "the dataset must be restored, not built again"
+    result = ready(workspace)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--latency", type=float, default=0.0002, help="Seconds per embedded text")
+    parser.add_argument("--repeats", type=int, default=5, help="Restores timed in each mode")
+    parser.add_argument("--budget-s", type=float, default=1.0, help="Restore time")
+    args = parser.parse_args()
+
+    import ingestion.workspace as workspace_module
+    from ingestion.workspace import WorkspaceManager, content_hash, _dir_size
+    from ingestion.jobs import IngestionJob, run_upload_pipeline
+    from agents.worker_pool import frame_path
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_snapshot_"))
+    synthetic_frame(args.rows).to_csv("upload.csv", index=False)
+    print(f"rows={args.rows:,}, {args.latency * 1000:.2f} ms per embedded text")
+
+    # Cold: the whole pipeline, then the session opens what it built
+    workspaces = WorkspaceManager("workspaces")
+    start = time.perf_counter()
+    workspace, reuse, upload_path = upload(workspaces, "cold", "upload.csv")
+    assert not reuse
+    job = IngestionJob(workspace.dataset_hash, "upload.csv", "cold")
+    run_upload_pipeline(job, workspaces, upload_path, None, base_embeddings=FakeEmbeddings(32, args.latency, model="fake-snapshot"))
+    cold_df, _, cold_docs = ready(workspace)
+    cold = time.perf_counter() - start
+    stored = _dir_size(workspace.dataset_dir) + os.path.getsize(frame_path(workspace.dataset_hash, workspaces.frames_dir))
+
+    # Restored, as after a restart: memory-mapped Arrow copy, then without it (Parquet)
+    timings = {}
+    for mode in ("arrow", "parquet"):
+        if mode == "parquet":
+            os.remove(frame_path(workspace.dataset_hash, workspaces.frames_dir))
+        timings[mode] = []
+        for i in range(args.repeats):
+            seconds, (df, store, docs) = restore("workspaces", f"{mode}-{i}", "upload.csv")
+            timings[mode].append(seconds)
+            pd.testing.assert_frame_equal(df, cold_df)
+            assert docs == cold_docs, "the restored index must return the same results"
+
+    print(f"\nstored artifacts: {stored / 1e6:.1f} MB (Parquet, Arrow copy, context, cube, index, docstore)")
+    print(f"\n{'mode':<26} {'ready s':>9} {'speedup':>8}")
+    print(f"{'cold (pipeline)':<26} {cold:>9.3f} {'1x':>8}")
+    for mode, values in timings.items():
+        median = statistics.median(values)
+        print(f"{'restored (' + mode + ')':<26} {median:>9.3f} {cold / median:>7.0f}x")
+
+    failures = []
+    # Another pipeline version builds its own artifacts
+    with open("upload.csv", "rb") as f:
+        content = f.read()
+    current = content_hash([("upload.csv", content)])
+    workspace_module.PIPELINE_VERSION += 1
+    if content_hash([("upload.csv", content)]) == current:
+        failures.append("a new pipeline version reuses the artifacts of the previous one")
+    workspace_module.PIPELINE_VERSION -= 1
+
+    # Over the disk budget, the dataset restored last is kept
+    synthetic_frame(args.rows // 10, seed=1).to_csv("other.csv", index=False)
+    other, _, upload_path = upload(workspaces, "other", "other.csv")
+    run_upload_pipeline(IngestionJob(other.dataset_hash, "other.csv", "other"), workspaces, upload_path, None,
+                        base_embeddings=FakeEmbeddings(32, model="fake-snapshot"))
+    restore("workspaces", "last", "upload.csv")
+    restarted = WorkspaceManager("workspaces", disk_budget_mb=(_dir_size(workspace.dataset_dir) + _dir_size(other.dataset_dir) / 2) / (1024 * 1024))
+    deleted = restarted.enforce_disk_budget()
+    if not restarted.is_ready(workspace.dataset_hash) or restarted.is_ready(other.dataset_hash):
+        failures.append("the disk budget must delete the least recently used dataset")
+    print(f"\ndisk budget: {deleted / 1e6:.1f} MB deleted, the dataset used last kept")
+
+    slow = max(statistics.median(values) for values in timings.values())
+    if slow > args.budget_s:
+        failures.append(f"restore took {slow:.2f}s, over {args.budget_s:.1f}s")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"✅ Restored {cold / statistics.median(timings['arrow']):.0f}x faster than the cold pipeline, with the same frame and search results")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark and checks for the SQL tool (`agents.sql_engine`), offline: typical
+aggregations over the cleaned Parquet copy of a synthetic dataset, answered
+by DuckDB out of core versus by pandas over the frame in memory (the pandas
+tool's path).
+
+Each engine runs in its own process, so the peak memory is its own: pandas
+first loads the frame (reported separately, the app holds it already), DuckDB
+reads the columns and row groups each query needs. Checks that both engines
+give the same answers, that filters and projections are pushed into the
+Parquet scan, and that the tool only runs a single SELECT over `data`.
+Usage: python benchmarks/bench_sql_tool.py [--rows 2000000] [--repeat 3] [--threads 0]
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import synthetic_dataset
+
+# (name, pandas expression over `df`, SQL over `data`); each returns a small result
+QUERIES = [
+    ("group sum",
+     lambda df: df.groupby("Segment 2", observed=True)["Amount 1"].sum(),
+     'SELECT "Segment 2", SUM("Amount 1") FROM data GROUP BY 1'),
+    ("filtered mean",
+     lambda df: df.loc[(df["Amount 1"] > 500) & (df["Segment 1"] == "Group A"), "Count 2"].mean(),
+     'SELECT AVG("Count 2") FROM data WHERE "Amount 1" > 500 AND "Segment 1" = \'Group A\''),
+    ("top 10",
+     lambda df: df.nlargest(10, "Amount 1")[["Record ID", "Amount 1"]],
+     'SELECT "Record ID", "Amount 1" FROM data ORDER BY "Amount 1" DESC NULLS LAST LIMIT 10'),
+    ("distinct per group",
+     lambda df: df.groupby("Segment 1", observed=True)["Segment 3"].nunique(),
+     'SELECT "Segment 1", COUNT(DISTINCT "Segment 3") FROM data WHERE "Segment 1" IS NOT NULL GROUP BY 1'),
+    ("monthly sum",
+     lambda df: df.groupby(df["Date 1"].dt.to_period("M"))["Amount 1"].sum(),
+     'SELECT date_trunc(\'month\', "Date 1") AS month, SUM("Amount 1") FROM data WHERE "Date 1" IS NOT NULL GROUP BY 1'),
+]
+
+def reset_peak_memory():
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+def peak_memory_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def summary(result) -> list:
+    """
+    The result's numbers, sorted, comparable across engines.
+    """
+    import pandas as pd
+
+    if isinstance(result, pd.DataFrame):
+        values = result.select_dtypes("number").to_numpy().ravel().tolist()
+    elif isinstance(result, pd.Series):
+        values = result.tolist()
+    else:
+        values = [result]
+    return sorted(float(value) for value in values if value == value and value != 0)
+
+def child(engine: str, parquet_path: str, repeat: int, threads: int) -> dict:
+    import pandas as pd
+    from agents.sql_engine import SQLEngine
+
+    reset_peak_memory()
+    report = {"queries": {}}
+    start = time.perf_counter()
+    if engine == "pandas":
+        df = pd.read_parquet(parquet_path)
+        run = lambda query: query[1](df)
+    else:
+        sql_engine = SQLEngine(threads=threads or os.cpu_count() or 1, max_rows=1_000,
+                               temp_dir=os.path.join(os.path.dirname(parquet_path), "sql_tmp"))
+        run = lambda query: sql_engine.query(query[2], parquet_path)
+    report["load_seconds"] = time.perf_counter() - start
+    report["load_peak_mb"] = peak_memory_mb()
+    for query in QUERIES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = run(query)
+            timings.append(time.perf_counter() - start)
+        report["queries"][query[0]] = {"seconds": min(timings), "result": summary(result)}
+    report["peak_mb"] = peak_memory_mb()
+    return report
+
+def run_child(engine: str, parquet_path: str, repeat: int, threads: int) -> dict:
+    output = subprocess.run([sys.executable, __file__, "--child", engine, parquet_path,
+                             "--repeat", str(repeat), "--threads", str(threads)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def check_tool(parquet_path: str):
+    """
+    The tool's safeguards and pushdown, through the engine the agent uses.
+    """
+    from agents.sql_engine import SQLEngine, describe_table
+
+    engine = SQLEngine(max_rows=5, temp_dir=os.path.join(os.path.dirname(parquet_path), "sql_tmp"))
+    text = engine.run('```sql\nSELECT "Record ID" FROM data;\n```', parquet_path)
+    assert text.endswith("(first 5 rows only: aggregate or add a LIMIT)") and len(text.splitlines()) == 7, text
+    for sql in ("DROP VIEW data", "SELECT 1; DROP VIEW data", "COPY data TO 'leak.csv'"):
+        assert engine.run(sql, parquet_path).startswith("Error executing SQL: only a single SELECT"), sql
+    for sql in ("SELECT * FROM read_csv('/etc/passwd')", "SELECT * FROM read_parquet('../other.parquet')"):
+        assert engine.run(sql, parquet_path).startswith("Error executing SQL: Permission Error"), sql
+    assert engine.run("SET enable_external_access = true", parquet_path).startswith("Error executing SQL:")
+    # Only the two columns are read, and the filter is evaluated in the scan
+    plan = engine.connection(parquet_path).sql(
+        'EXPLAIN SELECT SUM("Amount 1") FROM data WHERE "Segment 1" = \'Group A\'').fetchall()[0][1]
+    assert "Filters:" in plan and "Review" not in plan, plan
+    engine.timeout = 0.2
+    slow = engine.run('SELECT COUNT(*) FROM data a, data b WHERE a."Amount 1" < b."Amount 1"', parquet_path)
+    assert slow.startswith("Error: query stopped after"), slow
+    print(f"tool: {engine.stats()}; schema: {describe_table(parquet_path)[:90]}...")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="DuckDB threads (0: all cores)")
+    parser.add_argument("--child", nargs=2, metavar=("ENGINE", "PARQUET"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child[0], args.child[1], args.repeat, args.threads)))
+        return
+
+    from ingestion.preprocessing import preprocess_data
+
+    workdir = tempfile.mkdtemp(prefix="bench_sql_")
+    os.makedirs(os.path.join(workdir, "dataset"))
+    parquet_path = os.path.join(workdir, "dataset", "clean.parquet")
+    start = time.perf_counter()
+    df = preprocess_data(synthetic_dataset(args.rows, text=1))
+    df.to_parquet(parquet_path)
+    print(f"rows={args.rows:,}, {len(df.columns)} columns, Parquet {os.path.getsize(parquet_path) / 1e6:.0f} MB "
+          f"(built in {time.perf_counter() - start:.1f}s), {os.cpu_count()} CPUs")
+    del df
+
+    check_tool(parquet_path)
+    pandas = run_child("pandas", parquet_path, args.repeat, args.threads)
+    duckdb = run_child("duckdb", parquet_path, args.repeat, args.threads)
+
+    print(f"\n{'query':<20} {'pandas s':>9} {'duckdb s':>9} {'speedup':>8}")
+    for name, *_ in QUERIES:
+        p, d = pandas["queries"][name], duckdb["queries"][name]
+        same = len(p["result"]) == len(d["result"]) and all(math.isclose(a, b, rel_tol=1e-9) for a, b in zip(p["result"], d["result"]))
+        assert same, (name, p["result"][:5], d["result"][:5])
+        print(f"{name:<20} {p['seconds']:>9.3f} {d['seconds']:>9.3f} {p['seconds'] / d['seconds']:>7.1f}x")
+    total_p = sum(q["seconds"] for q in pandas["queries"].values())
+    total_d = sum(q["seconds"] for q in duckdb["queries"].values())
+    print(f"{'all queries':<20} {total_p:>9.3f} {total_d:>9.3f} {total_p / total_d:>7.1f}x")
+    print(f"\npeak memory: pandas {pandas['peak_mb']:,.0f} MB (frame loaded in {pandas['load_seconds']:.2f}s, "
+          f"{pandas['load_peak_mb']:,.0f} MB), duckdb {duckdb['peak_mb']:,.0f} MB; same answers for every query")
+
+if __name__ == "__main__":
+    main()
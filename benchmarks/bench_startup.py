@@ -0,0 +1,148 @@
+"""
+Startup benchmark for the Streamlit app, offline: how long `app.py` takes to
+import, to render for the first time and to rerun, with a budget per metric.
+
+Each measurement runs in a fresh process:
+- imports: the app's module-level imports (streamlit and pandas first, they
+  are loaded by the Streamlit server before the script runs), and the heavy
+  modules they pull in, which must be imported on first use instead;
+- first render: the first script run of a new process (Streamlit's testing
+  harness, `AppTest`, which adds its own setup time to the first run);
+- reruns: the script rerun for a session without data and for a session with
+  a processed dataset (built first with local fake embeddings).
+The run exits with status 1 when a metric is over its budget, or a heavy
+module is imported at startup.
+Usage: python benchmarks/bench_startup.py [--rows 100000] [--reruns 20] [--import-budget 1.0]
+                                          [--render-budget 3.0] [--rerun-budget 0.25]
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import synthetic_frame, FakeEmbeddings
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+# Imported by the agent, the pipeline and the tools, never by a rerun of the app
+HEAVY_MODULES = ("langchain", "langchain_openai", "langchain_experimental", "langchain_community", "openai",
+                 "faiss", "tiktoken", "matplotlib", "seaborn", "duckdb")
+
+def app_imports() -> list:
+    """
+    The module-level import statements of app.py, as source lines.
+    """
+    with open(APP_PATH) as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+# --- Children ---
+def measure_imports() -> dict:
+    start = time.perf_counter()
+    import streamlit, pandas
+    preloaded = time.perf_counter() - start
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    start = time.perf_counter()
+    for statement in app_imports():
+        exec(statement, {})
+    return {"preloaded_seconds": preloaded, "seconds": time.perf_counter() - start,
+            "heavy": sorted(name for name in HEAVY_MODULES if name in sys.modules)}
+
+def measure_renders(rows: int, reruns: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_startup_"))
+    report = {}
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    report["first_render_seconds"] = time.perf_counter() - start
+    assert not app.exception, app.exception
+    report["heavy"] = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+    report["idle"] = timings
+
+    # A session whose dataset was processed: overview, column types and context are shown on every rerun
+    import hashlib
+    from ingestion.workspace import get_workspace_manager
+    from ingestion.jobs import IngestionJob, run_upload_pipeline
+
+    synthetic_frame(rows).to_csv("upload.csv", index=False)
+    workspaces = get_workspace_manager()
+    workspace = workspaces.open("bench-session")
+    dataset_hash = hashlib.sha256(b"bench-startup").hexdigest()
+    workspaces.assign(workspace, dataset_hash)
+    upload_path = workspace.upload_path("upload.csv")
+    os.replace("upload.csv", upload_path)
+    run_upload_pipeline(IngestionJob(dataset_hash, "upload.csv", "bench-session"), workspaces, upload_path, None,
+                        base_embeddings=FakeEmbeddings(32))
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    app.session_state["session_id"] = "bench-session"
+    app.session_state["processed_file"] = "upload.csv"
+    app.run()
+    assert not app.exception and app.dataframe, app.exception
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+    report["with_data"] = timings
+    return report
+
+def run_child(*args) -> dict:
+    output = subprocess.run([sys.executable, __file__, "--child", *map(str, args)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows of the processed dataset")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--import-budget", type=float, default=1.0, help="Seconds for the app's imports")
+    parser.add_argument("--render-budget", type=float, default=3.0, help="Seconds for the first render")
+    parser.add_argument("--rerun-budget", type=float, default=0.25, help="Seconds for a rerun (p95)")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        report = measure_imports() if args.child[0] == "imports" else measure_renders(int(args.child[1]), int(args.child[2]))
+        print(json.dumps(report))
+        return
+
+    imports = run_child("imports")
+    renders = run_child("renders", args.rows, args.reruns)
+    failures = []
+    print(f"imports: streamlit + pandas {imports['preloaded_seconds']:.2f}s (loaded by the server), "
+          f"app modules {imports['seconds']:.2f}s (budget {args.import_budget:.2f}s)")
+    if imports["seconds"] > args.import_budget:
+        failures.append("imports")
+    print(f"first render: {renders['first_render_seconds']:.2f}s including the test harness (budget {args.render_budget:.2f}s)")
+    if renders["first_render_seconds"] > args.render_budget:
+        failures.append("first render")
+    for name, label in (("idle", "no data"), ("with_data", f"{args.rows:,} rows loaded")):
+        p50, p95 = percentile(renders[name], 0.5), percentile(renders[name], 0.95)
+        print(f"rerun ({label}): p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms (budget {args.rerun_budget * 1000:.0f} ms)")
+        if p95 > args.rerun_budget:
+            failures.append(f"rerun ({label})")
+    heavy = sorted(set(imports["heavy"]) | set(renders["heavy"]))
+    print(f"heavy modules imported at startup: {', '.join(heavy) or 'none'}")
+    if heavy:
+        failures.append("heavy imports")
+    if failures:
+        print(f"\n❌ Over budget: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ Within budget")
+
+if __name__ == "__main__":
+    main()
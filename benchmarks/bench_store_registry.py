@@ -0,0 +1,72 @@
+"""
+Benchmark for the shared store registry: cold (load per call, as the tool did
+before) versus warm (registry) retrieval latency, plus reload after a rebuild.
+
+The synthesis LLM call is not timed; only the per-call setup and the FAISS search.
+Usage: python benchmarks/bench_store_registry.py [--rows 50000] [--calls 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from common import synthetic_frame, FakeEmbeddings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+
+    from langchain_openai import ChatOpenAI
+    from embedding.embedding_service import iter_row_documents, generate_global_context
+    from embedding.vectorstore import build_vector_store, load_vector_store
+    from embedding.store_registry import get_vector_store, get_global_context, get_chat_llm
+
+    df = synthetic_frame(args.rows)
+    os.chdir(tempfile.mkdtemp(prefix="bench_registry_"))
+    os.makedirs("data", exist_ok=True)
+    embedder = FakeEmbeddings()
+    generate_global_context(df)
+    build_vector_store(iter_row_documents(df), api_key=None, base_embeddings=embedder)
+    query = embedder.embed_query("high sales in the West region")
+    api_key = "sk-fake"
+
+    def cold_call():
+        store = load_vector_store(api_key)
+        with open("data/context.json", "r") as f:
+            json.load(f)
+        ChatOpenAI(model_name="gpt-4o", temperature=0, openai_api_key=api_key)
+        return store.similarity_search_by_vector(query, k=5)
+
+    def warm_call():
+        store = get_vector_store(api_key)
+        get_global_context()
+        get_chat_llm(api_key)
+        return store.similarity_search_by_vector(query, k=5)
+
+    def timed(fn):
+        samples = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    cold = timed(cold_call)
+    first = timed(warm_call)[:1]
+    warm = timed(warm_call)
+    print(f"rows={args.rows}")
+    print(f"cold  median {statistics.median(cold):8.2f} ms  p95 {sorted(cold)[int(len(cold) * 0.95) - 1]:8.2f} ms")
+    print(f"warm  median {statistics.median(warm):8.2f} ms  p95 {sorted(warm)[int(len(warm) * 0.95) - 1]:8.2f} ms  (first registry call {first[0]:.2f} ms)")
+
+    # Rebuild with fewer rows: the registry must notice and reload
+    build_vector_store(iter_row_documents(df.head(100)), api_key=None, base_embeddings=embedder)
+    start = time.perf_counter()
+    store = get_vector_store(api_key)
+    print(f"after rebuild: reloaded in {(time.perf_counter() - start) * 1000:.2f} ms, ntotal={store.index.ntotal}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark and checks for streaming agent turns, without an API key: the
+pandas agent (built like `get_data_analyst_agent`, with the sandboxed pandas
+tool and the real vector_search_tool) driven by a scripted chat model with
+first-token and per-token latency.
+
+Compares a blocking `invoke` (what the chat showed behind a spinner) with a
+streaming turn: time to first token, total latency and the events received.
+Checks that the streamed answer is the blocking one, that agent steps, tool
+calls and the synthesis tokens arrive in order, and that a turn can be
+stopped while the agent writes and while a tool runs.
+Usage: python benchmarks/bench_streaming.py [--turns 5] [--first-token 0.5] [--token 0.02]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import synthetic_frame, ScriptedChatModel
+
+ANSWER = ("Sales are highest in the West, driven by large furniture orders: the retrieved rows are mostly "
+          "chairs and tables with discounts of 10 to 20 percent. The East and North follow with similar totals, "
+          "while the South trails. Office supplies contribute many orders but little revenue, so the regional "
+          "differences come almost entirely from furniture and technology purchases.")
+SYNTHESIS = ("The most relevant rows are furniture orders in the West with high sales and moderate discounts, "
+             "several of them above one thousand in value.")
+SCRIPT = [
+    {"name": "python_repl_ast", "arguments": json.dumps({"query": "df.groupby('Region')['Sales'].sum().round(2)"})},
+    {"name": "vector_search_tool", "arguments": json.dumps({"query": "furniture orders in the West"})},
+    ANSWER,
+]
+
+def build_agent(df, llm, workdir: str):
+    """
+    The agent of `get_data_analyst_agent` with `llm` in place of the OpenAI client.
+    """
+    from langchain_classic.agents import AgentType
+    from langchain_experimental.agents import create_pandas_dataframe_agent
+    from agents.tools import get_vector_search_tool, get_pandas_tool
+    from embedding.embedding_service import generate_global_context
+
+    context_path = os.path.join(workdir, "context.json")
+    generate_global_context(df, context_path)
+    # No index: the scripted query is answered by the metadata filters, so no embeddings are needed
+    vector_tool = get_vector_search_tool("unused", df, None, os.path.join(workdir, "faiss_index"), context_path, llm)
+    agent = create_pandas_dataframe_agent(llm=llm, df=df, agent_type=AgentType.OPENAI_FUNCTIONS, verbose=False,
+                                          extra_tools=[vector_tool], allow_dangerous_code=True)
+    pandas_tool = get_pandas_tool(df, "bench")
+    agent.tools = [pandas_tool if t.name == pandas_tool.name else t for t in agent.tools]
+    return agent
+
+def run_stream(agent, prompt: str, cancel_on=None):
+    """
+    Runs a streaming turn and returns (turn, events, seconds from cancel to the last event).
+    """
+    from agents.streaming import stream_turn
+
+    turn = stream_turn(agent, {"input": prompt})
+    events, cancelled_at = [], None
+    for event in turn.events(poll=0.05):
+        events.append(event)
+        if cancel_on is not None and cancelled_at is None and cancel_on(event):
+            turn.cancel()
+            cancelled_at = time.perf_counter()
+    return turn, events, (time.perf_counter() - cancelled_at) if cancelled_at else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--first-token", type=float, default=0.5, help="Seconds before each response starts")
+    parser.add_argument("--token", type=float, default=0.02, help="Seconds per streamed token")
+    args = parser.parse_args()
+
+    from agents.streaming import turn_stats
+    from agents.code_sandbox import get_code_sandbox
+
+    df = synthetic_frame(args.rows)
+    workdir = tempfile.mkdtemp(prefix="bench_streaming_")
+    os.chdir(workdir)
+    llm = ScriptedChatModel(steps=SCRIPT, synthesis=SYNTHESIS, first_token_latency=args.first_token, token_latency=args.token)
+    agent = build_agent(df, llm, workdir)
+    prompt = "Which region sells the most and why?"
+    # Warm the sandbox workers, so both modes see the same tool latency
+    agent.invoke({"input": prompt})
+
+    print(f"rows={args.rows:,} turns={args.turns} first token {args.first_token}s, {args.token * 1000:.0f} ms per token")
+    print(f"\n{'mode':<10} {'first token s':>14} {'total s':>8}  events")
+    blocking = []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        expected = agent.invoke({"input": prompt})["output"]
+        blocking.append(time.perf_counter() - start)
+    blocking.sort()
+    median = blocking[len(blocking) // 2]
+    print(f"{'blocking':<10} {median:>14.2f} {median:>8.2f}  nothing until the answer")
+
+    for _ in range(args.turns):
+        turn, events, _ = run_stream(agent, prompt)
+        kinds = [event["type"] for event in events if event["type"] != "wait"]
+        assert kinds[-1] == "final" and events[-1]["response"]["output"] == expected
+        streamed = "".join(e["text"] for e in events if e["type"] == "token" and e["source"] == "agent")
+        assert streamed.endswith(expected), "the final answer is streamed token by token"
+        # Steps in order: each tool call is announced, then runs; synthesis tokens stream inside vector_search_tool
+        tools = [(e["type"], e["tool"]) for e in events if e["type"] in ("step", "tool_start", "tool_end")]
+        assert tools == [("step", "python_repl_ast"), ("tool_start", "python_repl_ast"), ("tool_end", "python_repl_ast"),
+                         ("step", "vector_search_tool"), ("tool_start", "vector_search_tool"), ("tool_end", "vector_search_tool")], tools
+        start_index = kinds.index("tool_start", kinds.index("tool_end") + 1)
+        synthesis = [i for i, e in enumerate(e for e in events if e["type"] != "wait")
+                     if e["type"] == "token" and e["source"] == "synthesis"]
+        assert synthesis and start_index < synthesis[0] and synthesis[-1] < kinds.index("tool_end", start_index)
+    stats = turn_stats()
+    counts = {kind: kinds.count(kind) for kind in dict.fromkeys(kinds)}
+    print(f"{'streaming':<10} {stats['ttft_p50']:>14.2f} {stats['total_p50']:>8.2f}  {counts}")
+    print(f"streaming p95: first token {stats['ttft_p95']:.2f}s, total {stats['total_p95']:.2f}s "
+          f"({stats['ttft_p50'] / median:.0%} of the blocking wait before something is shown)")
+
+    # Stopping a turn: while the answer or the synthesis is being written, and while the pandas tool runs
+    cases = {
+        "answer": lambda e: e["type"] == "token" and e["source"] == "agent" and e["text"].strip() == "furniture",
+        "synthesis": lambda e: e["type"] == "token" and e["source"] == "synthesis",
+        "tool": lambda e: e["type"] == "tool_start",
+    }
+    print()
+    for name, cancel_on in cases.items():
+        before = turn_stats()["cancelled"]
+        turn, events, stop_seconds = run_stream(agent, prompt, cancel_on)
+        assert events[-1]["type"] == "cancelled" and turn.metrics["status"] == "cancelled"
+        assert turn_stats()["cancelled"] == before + 1
+        print(f"stopped during {name:<10} after {turn.metrics['seconds']:.2f}s, ended {stop_seconds * 1000:.0f} ms after cancel, "
+              f"{sum(e['type'] == 'tool_start' for e in events)} tool calls made")
+    get_code_sandbox().pool.shutdown()
+
+if __name__ == "__main__":
+    main()
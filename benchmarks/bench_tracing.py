@@ -0,0 +1,136 @@
+"""
+Benchmark and checks for the tracing layer (`monitoring.tracing`), offline.
+
+Measures the cost of a traced call with tracing disabled and enabled, and of
+tracing a full upload pipeline (load, preprocess, global context, row
+documents, FAISS build with local fake embeddings). Runs a chat turn of the
+pandas agent driven by the scripted chat model and checks the span tree:
+LLM calls with token counts, tool calls, and retrieval nested in its tool.
+Checks that every span reaches spans.jsonl and that metrics.prom is valid
+Prometheus text.
+Usage: python benchmarks/bench_tracing.py [--rows 200000] [--index-rows 20000]
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+
+from common import synthetic_frame, FakeEmbeddings, ScriptedChatModel
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="[^"]*",?)*\})? -?[0-9.e+-]+$|^[a-zA-Z_:][a-zA-Z0-9_:]*\{.*le="\+Inf".*\} [0-9]+$')
+
+def per_call_ns(func, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e9
+
+def run_pipeline(csv_path: str, index_rows: int, index_path: str):
+    from ingestion.data_ingestion import load_data
+    from ingestion.preprocessing import preprocess_data
+    from embedding.embedding_service import generate_global_context, iter_row_documents
+    from embedding.vectorstore import build_vector_store
+    from monitoring.tracing import get_tracer
+
+    start = time.perf_counter()
+    with get_tracer().span("upload"):
+        df = preprocess_data(load_data(csv_path))
+        generate_global_context(df, os.path.join(index_path, "context.json"))
+        build_vector_store(iter_row_documents(df.head(index_rows)), None, base_embeddings=FakeEmbeddings(32),
+                           index_path=index_path, checkpoint_path=f"{index_path}_checkpoint")
+    return time.perf_counter() - start
+
+def print_trace(spans: list):
+    depth = {}
+    print(f"{'span':<34} {'wall s':>7} {'cpu s':>7} {'rows':>9} {'tokens':>7} {'peak MB':>8}")
+    for span in spans:
+        depth[span["span_id"]] = depth.get(span["parent_id"], -1) + 1
+        tokens = span["prompt_tokens"] + span["completion_tokens"]
+        rows = f"{span['rows']:,}" if span["rows"] is not None else ""
+        print(f"{'  ' * depth[span['span_id']] + span['name']:<34} {span['wall_s']:>7.3f} {span['cpu_s']:>7.3f} "
+              f"{rows:>9} {tokens or '':>7} {span['peak_mb']:>8.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--index-rows", type=int, default=20_000, help="Rows embedded (keeps the run short)")
+    parser.add_argument("--calls", type=int, default=200_000, help="Calls for the per-call overhead")
+    args = parser.parse_args()
+
+    from monitoring.tracing import get_tracer, traced
+
+    os.chdir(tempfile.mkdtemp(prefix="bench_tracing_"))
+    tracer = get_tracer()
+
+    # Per-call overhead of a traced function
+    def plain(i):
+        return i
+    wrapped = traced("noop")(plain)
+    baseline = per_call_ns(plain, args.calls)
+    tracer.enabled = False
+    disabled = per_call_ns(wrapped, args.calls)
+    tracer.enabled = True
+    with tracer.span("bench"):
+        enabled = per_call_ns(wrapped, args.calls // 20)
+    print(f"per call: plain {baseline:.0f} ns, traced and disabled {disabled:.0f} ns (+{disabled - baseline:.0f} ns), "
+          f"traced and enabled {enabled / 1000:.1f} µs (span recorded and written)")
+
+    # Whole upload pipeline, tracing off and on (best of 3 each, alternating)
+    synthetic_frame(args.rows).to_csv("upload.csv", index=False)
+    timings = {False: [], True: []}
+    for run in range(6):
+        tracer.enabled = bool(run % 2)
+        timings[tracer.enabled].append(run_pipeline("upload.csv", args.index_rows, f"index_{run}"))
+    off, on = min(timings[False]), min(timings[True])
+    print(f"\nupload pipeline ({args.rows:,} rows, {args.index_rows:,} embedded): tracing off {off:.2f}s, "
+          f"on {on:.2f}s ({(on - off) / off:+.1%})\n")
+    upload = tracer.last_trace("upload")
+    print_trace(upload)
+    names = {span["name"] for span in upload}
+    assert {"load_data", "preprocess_data", "generate_global_context", "row_documents", "build_vector_store"} <= names, names
+    documents = next(span for span in upload if span["name"] == "row_documents")
+    build = next(span for span in upload if span["name"] == "build_vector_store")
+    assert documents["rows"] == build["rows"] == args.index_rows and documents["parent_id"] == build["span_id"]
+
+    # A chat turn: LLM calls with tokens, tool calls, retrieval inside vector_search_tool
+    from bench_streaming import build_agent, SCRIPT, SYNTHESIS
+    from agents.streaming import stream_turn
+    from agents.code_sandbox import get_code_sandbox
+
+    df = synthetic_frame(20_000)
+    agent = build_agent(df, ScriptedChatModel(steps=SCRIPT, synthesis=SYNTHESIS), os.getcwd())
+    turn = stream_turn(agent, {"input": "Which region sells the most and why?"})
+    for _ in turn.events():
+        pass
+    assert turn.metrics["status"] == "done"
+    print()
+    spans = tracer.last_trace("chat_turn")
+    print_trace(spans)
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(span)
+    assert len(by_name["llm.agent"]) == 3 and all(span["prompt_tokens"] and span["completion_tokens"] for span in by_name["llm.agent"])
+    tool = by_name["tool.vector_search_tool"][0]
+    assert by_name["retrieval"][0]["parent_id"] == tool["span_id"] and by_name["llm.synthesis"][0]["parent_id"] == tool["span_id"]
+    assert by_name["llm.synthesis"][0]["completion_tokens"] > 0 and "tool.python_repl_ast" in by_name
+    get_code_sandbox().pool.shutdown()
+
+    # Exports
+    with open(os.path.join(tracer.trace_dir, "spans.jsonl")) as f:
+        written = [json.loads(line) for line in f]
+    recorded = sum(stage["count"] for stage in tracer.stages.values())
+    assert len(written) == recorded, (len(written), recorded)
+    with open(os.path.join(tracer.trace_dir, "metrics.prom")) as f:
+        metrics = f.read().splitlines()
+    samples = [line for line in metrics if not line.startswith("#")]
+    bad = [line for line in samples if not SAMPLE_LINE.match(line)]
+    assert not bad, bad[:3]
+    print(f"\nexports: {len(written):,} spans in spans.jsonl, {len(samples)} samples in metrics.prom, e.g.")
+    for line in samples:
+        if line.startswith(('agent_stage_seconds_sum{stage="build_vector_store"', 'agent_llm_tokens_total{stage="llm.agent"')):
+            print(f"  {line}")
+
+if __name__ == "__main__":
+    main()
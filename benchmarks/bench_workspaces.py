@@ -0,0 +1,171 @@
+"""
+Load test for session workspaces: many concurrent sessions upload one of a
+few datasets (several sessions upload the same file), build or reuse its
+artifacts and keep asking questions; sessions go idle over time and some of
+them come back later.
+
+Compares the previous model (every session builds its own artifacts and keeps
+its frame for good) with the workspace manager (artifacts and frames shared
+by content, idle sessions evicted within a memory and a disk budget). Each
+mode runs in a fresh process. Reports peak RSS, frames in memory, pipeline
+runs, evictions and reloads, disk usage and request latency percentiles.
+Usage: python benchmarks/bench_workspaces.py [--sessions 32] [--datasets 6] [--rows 100000] [--memory-mb 64]
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from common import synthetic_frame, peak_rss_mb, FakeEmbeddings
+
+QUESTION = "large furniture orders in the west"
+
+class Simulation:
+    """
+    Runs the sessions of one mode as threads, the way Streamlit runs scripts.
+    """
+
+    def __init__(self, args, shared: bool):
+        from ingestion.workspace import WorkspaceManager
+
+        self.args = args
+        self.shared = shared
+        # Previous model: no budget, nothing is ever evicted
+        budget = args.memory_mb if shared else 1e9
+        disk = args.disk_mb if shared else 1e9
+        self.manager = WorkspaceManager("workspaces", memory_budget_mb=budget, disk_budget_mb=disk, idle_seconds=args.idle)
+        self.latencies = []
+        self.pipelines = 0
+        self.expected = {}
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def dataset_hash(self, dataset: int, session_id: str) -> str:
+        # Previous model: nothing is shared, every upload is processed on its own
+        key = f"dataset-{dataset}" if self.shared else f"dataset-{dataset}-{session_id}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def upload(self, session_id: str, dataset: int):
+        """
+        The app's pipeline: build the dataset's artifacts, or reuse them when ready.
+        """
+        from embedding.embedding_service import generate_global_context, iter_row_documents
+        from embedding.vectorstore import build_vector_store
+
+        workspace = self.manager.open(session_id)
+        self.manager.release(workspace)
+        dataset_hash = self.dataset_hash(dataset, session_id)
+        with self.manager.dataset_lock(dataset_hash):
+            ready = self.manager.is_ready(dataset_hash)
+            self.manager.assign(workspace, dataset_hash)
+            if not ready:
+                df = synthetic_frame(self.args.rows, seed=dataset)
+                generate_global_context(df, workspace.context_path)
+                build_vector_store(iter_row_documents(df.head(self.args.index_rows)), None, base_embeddings=FakeEmbeddings(32),
+                                   index_path=workspace.index_path, checkpoint_path=workspace.checkpoint_path)
+                self.manager.mark_ready(workspace, df)
+                with self._lock:
+                    self.pipelines += 1
+        return workspace
+
+    def store(self, workspace):
+        from embedding.index_store import load_index
+
+        # Stands in for `store_registry.get_vector_store`, which shares a loaded index per path
+        with self._lock:
+            if workspace.index_path not in self._stores:
+                self._stores[workspace.index_path] = load_index(workspace.index_path, FakeEmbeddings(32))
+            return self._stores[workspace.index_path]
+
+    def request(self, session_id: str, dataset: int):
+        workspace = self.manager.open(session_id)
+        start = time.perf_counter()
+        if workspace.dataset_hash is None or workspace.expired:
+            workspace = self.upload(session_id, dataset)
+        totals = workspace.df.groupby("Region")["Sales"].sum().round(2).to_dict()
+        docs = self.store(workspace).similarity_search(QUESTION, k=5)
+        elapsed = time.perf_counter() - start
+        assert totals == self.expected[dataset] and len(docs) == 5
+        with self._lock:
+            self.latencies.append(elapsed)
+
+    def session(self, index: int):
+        session_id = f"session-{index:03d}"
+        dataset = index % self.args.datasets
+        time.sleep(index * self.args.arrival)
+        self.upload(session_id, dataset)
+        for burst in range(2 if index % 4 == 0 else 1):
+            if burst:
+                # Comes back after its frame was likely evicted
+                time.sleep(self.args.idle * 3)
+            for _ in range(self.args.requests):
+                time.sleep(self.args.think)
+                self.request(session_id, dataset)
+
+    def run(self) -> dict:
+        for dataset in range(self.args.datasets):
+            self.expected[dataset] = synthetic_frame(self.args.rows, seed=dataset).groupby("Region")["Sales"].sum().round(2).to_dict()
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self.session, args=(i,)) for i in range(self.args.sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = self.manager.stats()
+        self.manager.enforce_disk_budget()
+        latencies = np.array(self.latencies)
+        return {
+            "seconds": time.perf_counter() - start,
+            "peak_mb": peak_rss_mb(),
+            "frames_mb": stats["memory_mb"],
+            "pipelines": self.pipelines,
+            "evictions": stats["evictions"],
+            "reloads": stats["reloads"],
+            "shared": stats["shared"],
+            "disk_mb": self.manager.stats()["disk_mb"],
+            "requests": len(latencies),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "max": float(latencies.max()),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--datasets", type=int, default=6, help="Distinct files uploaded")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--index-rows", type=int, default=5_000, help="Rows embedded per dataset (keeps the run short)")
+    parser.add_argument("--requests", type=int, default=5, help="Questions per session (and per return)")
+    parser.add_argument("--think", type=float, default=0.2, help="Seconds between questions")
+    parser.add_argument("--arrival", type=float, default=0.3, help="Seconds between session arrivals")
+    parser.add_argument("--idle", type=float, default=1.0, help="Seconds after which a session can be evicted")
+    parser.add_argument("--memory-mb", type=float, default=64)
+    parser.add_argument("--disk-mb", type=float, default=40)
+    parser.add_argument("--mode", choices=["previous", "workspaces"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        os.chdir(tempfile.mkdtemp(prefix="bench_workspaces_"))
+        print(json.dumps(Simulation(args, shared=args.mode == "workspaces").run()))
+        return
+
+    print(f"sessions={args.sessions} datasets={args.datasets} rows={args.rows:,} "
+          f"budget: {args.memory_mb:.0f} MB memory, {args.disk_mb:.0f} MB disk")
+    print(f"{'mode':<11} {'seconds':>8} {'peak MB':>8} {'frames MB':>10} {'pipelines':>10} {'evicted':>8} "
+          f"{'reloaded':>9} {'shared':>7} {'disk MB':>8} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}")
+    for mode in ("previous", "workspaces"):
+        command = [sys.executable, os.path.abspath(__file__), "--mode", mode] + sys.argv[1:]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<11} {r['seconds']:>8.1f} {r['peak_mb']:>8.0f} {r['frames_mb']:>10.0f} {r['pipelines']:>10} {r['evictions']:>8} "
+              f"{r['reloads']:>9} {r['shared']:>7} {r['disk_mb']:>8.0f} {r['p50'] * 1000:>7.1f} {r['p95'] * 1000:>7.1f} {r['max'] * 1000:>7.0f}")
+
+if __name__ == "__main__":
+    main()
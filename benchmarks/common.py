@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import hashlib
+import resource
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, FunctionMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Make the project packages importable when running `python benchmarks/<script>.py`
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds a cleaned-looking sales dataset with numeric, categorical and date columns.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Order ID": np.arange(rows),
+        "Region": rng.choice(["West", "East", "North", "South"], rows),
+        "Category": rng.choice(["Furniture", "Technology", "Office Supplies"], rows),
+        "Order Date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), unit="D"),
+        "Sales": rng.gamma(2.0, 120.0, rows).round(2),
+        "Quantity": rng.integers(1, 15, rows),
+        "Discount": rng.choice([0.0, 0.1, 0.2, 0.5], rows),
+    })
+
+WORDS = ("quality", "delivery", "price", "support", "fast", "slow", "broken", "excellent", "refund", "order",
+         "package", "damaged", "friendly", "late", "recommend", "return", "size", "color", "cheap", "durable",
+         "warranty", "exchange", "missing", "perfect", "comfortable", "noisy", "battery", "screen", "fabric", "wood")
+
+def synthetic_dataset(rows: int, numeric: int = 3, categorical: int = 3, text: int = 2, dates: int = 1,
+                      missing: float = 0.02, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds a raw-looking dataset with a configurable mix of columns: numeric
+    (alternately float amounts and integer counts), categorical (4 to ~50
+    levels), free text (short reviews drawn from a pool of phrases) and dates,
+    with a fraction `missing` of each column set to null. Vectorized, so
+    10M rows take seconds; the same arguments give the same frame.
+    """
+    rng = np.random.default_rng(seed)
+    data = {"Record ID": np.arange(rows)}
+
+    def with_missing(values):
+        if missing <= 0:
+            return values
+        series = pd.Series(values)
+        return series.mask(rng.random(rows) < missing)
+
+    for i in range(numeric):
+        values = rng.gamma(2.0, 150.0, rows).round(2) if i % 2 == 0 else rng.integers(1, 50, rows).astype(float)
+        data[f"Amount {i + 1}" if i % 2 == 0 else f"Count {i + 1}"] = with_missing(values)
+    for i in range(categorical):
+        levels = np.array([f"Group {chr(65 + j % 26)}{j // 26 or ''}" for j in range(4 + 23 * i)], dtype=object)
+        data[f"Segment {i + 1}"] = with_missing(levels[rng.integers(0, len(levels), rows)])
+    if text:
+        lengths = rng.integers(3, 9, 5_000)
+        pool = np.array([" ".join(rng.choice(WORDS, n)) for n in lengths], dtype=object)
+        for i in range(text):
+            data[f"Review {i + 1}"] = with_missing(pool[rng.integers(0, len(pool), rows)])
+    for i in range(dates):
+        data[f"Date {i + 1}"] = with_missing(pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1_826, rows), unit="D"))
+    return pd.DataFrame(data)
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of the current process in MB (Linux reports KB).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic, offline stand-in for OpenAIEmbeddings.
+    Vectors are derived from a hash of the text; `latency` seconds are spent
+    per text to mimic a remote API.
+    """
+
+    def __init__(self, size: int = 64, latency: float = 0.0, model: str = "fake-embedding"):
+        self.size = size
+        self.latency = latency
+        self.model = model
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency:
+            time.sleep(self.latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class ScriptedChatModel(GenericFakeChatModel):
+    """
+    Offline chat model that plays a script, for driving the agent without an API key.
+
+    A call with `functions` (the agent) gets the step matching the number of
+    tool results in its messages: a function call ({"name", "arguments"}) or
+    the final answer (str). Other calls (the vector search synthesis) get
+    `synthesis`. Text streams word by word: `first_token_latency` seconds
+    before a response, then `token_latency` seconds per token. Like OpenAI
+    with `stream_usage`, a last chunk reports the token usage (words in, chunks out).
+    """
+
+    messages: object = iter(())
+    steps: list
+    synthesis: str = "The matching rows are large furniture orders."
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    model_name: str = "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_latency)
+        if "functions" not in kwargs:
+            step = self.synthesis
+        else:
+            step = self.steps[min(sum(isinstance(m, FunctionMessage) for m in messages), len(self.steps) - 1)]
+        if isinstance(step, str):
+            message = AIMessage(content=step)
+        else:
+            message = AIMessage(content="", additional_kwargs={"function_call": dict(step)})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        completion = 0
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            completion += 1
+            yield chunk
+            if chunk.message.content:
+                time.sleep(self.token_latency)
+        prompt = sum(len(str(message.content).split()) for message in messages)
+        usage = {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
@@ -0,0 +1,117 @@
+"""
+Local stand-in for the OpenAI embeddings endpoint, with injectable latency and errors.
+
+Point OpenAIEmbeddings at it with `openai_api_base=server.url` and
+`check_embedding_ctx_length=False` (so plain strings are sent).
+Usage: python benchmarks/fake_openai_server.py [--port 8765] [--latency 0.05] [--error-rate 0.1]
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+class FakeOpenAIServer:
+    """
+    Serves POST /v1/embeddings on localhost in a background thread.
+
+    Args:
+        latency (float): Seconds added to every request.
+        error_rate (float): Probability of answering 500 instead of vectors.
+        fail_after (int, optional): Answer 500 to every request after this many.
+        dim (int): Embedding dimension.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, error_rate: float = 0.0, fail_after: int = None, dim: int = 64, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_after = fail_after
+        self.dim = dim
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def vector(self, text) -> list:
+        seed = int.from_bytes(hashlib.blake2b(json.dumps(text).encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            fail = (self.fail_after is not None and self.requests > self.fail_after) or self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if server.latency:
+                    time.sleep(server.latency)
+                if not self.path.endswith("/embeddings"):
+                    return self._reply(404, {"error": {"message": "not found"}})
+                if server._should_fail():
+                    return self._reply(500, {"error": {"message": "injected failure", "type": "server_error"}})
+                inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+                self._reply(200, {
+                    "object": "list",
+                    "model": request.get("model", "fake"),
+                    "data": [{"object": "embedding", "index": i, "embedding": server.vector(text)} for i, text in enumerate(inputs)],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                })
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.port, args.latency, args.error_rate)
+    print(f"Serving fake embeddings on {server.url}")
+    server._server.serve_forever()
+
+if __name__ == "__main__":
+    main()
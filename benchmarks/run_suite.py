@@ -0,0 +1,319 @@
+"""
+Offline benchmark suite: times and memory-profiles every stage of the app on
+synthetic datasets, with stand-ins for the OpenAI backends (`FakeEmbeddings`
+for OpenAIEmbeddings, `ScriptedChatModel` for ChatOpenAI), so it needs no API
+key or network and gives the same numbers run after run.
+
+Cases: ingestion (CSV and Parquet), preprocessing, global context, row
+documents, index build / load / search, plotting (worker renderer, cache
+missed) and a scripted agent turn (pandas tool and vector search). Each case
+and size runs in a fresh process; its peak memory is measured from the end of
+its setup (VmHWM is reset on Linux, otherwise the process peak is reported).
+
+Results are written as JSON (run metadata and one entry per case and size).
+With --baseline, each result is compared with the same case and size of a
+previous results file, and the run exits with status 1 when a case got slower
+or uses more memory than its threshold allows.
+Usage: python benchmarks/run_suite.py [--rows 10000 100000] [--cases ingest_csv index_build] [--output results.json]
+                                      [--baseline baseline.json] [--threshold 0.25] [--memory-threshold 0.25]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import synthetic_dataset, synthetic_frame, peak_rss_mb, FakeEmbeddings, ScriptedChatModel
+
+CASES = ("ingest_csv", "ingest_parquet", "preprocess", "context", "documents",
+         "index_build", "index_load", "index_search", "plotting", "agent_turn")
+# Relative slowdown / memory growth tolerated per case, over --threshold / --memory-threshold
+THRESHOLDS = {
+    "plotting": {"seconds": 0.5},
+    "agent_turn": {"seconds": 0.5},
+    "index_search": {"seconds": 0.4},
+}
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.05
+MIN_MEMORY_DELTA_MB = 20
+EMBEDDING_SIZE = 64
+SEARCH_QUERIES = 100
+QUERY_WORDS = ("late delivery refund", "excellent quality", "damaged package", "Group A", "cheap fabric", "battery screen")
+
+# --- Memory ---
+def reset_peak_memory() -> bool:
+    """
+    Resets the process's peak RSS to its current RSS (Linux only).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_memory_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+def current_memory_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+# --- Cases ---
+def dataset(args, rows: int):
+    return synthetic_dataset(rows, numeric=args.numeric, categorical=args.categorical, text=args.text,
+                             dates=args.dates, missing=args.missing, seed=args.seed)
+
+def build_index(df, path: str):
+    from embedding.embedding_service import iter_row_documents
+    from embedding.vectorstore import build_vector_store
+
+    return build_vector_store(iter_row_documents(df), None, base_embeddings=FakeEmbeddings(EMBEDDING_SIZE),
+                              index_path=path, checkpoint_path=f"{path}_checkpoint")
+
+def setup_case(case: str, args, rows: int):
+    """
+    Prepares the inputs of `case` (outside the measurement) and returns
+    (run, rows processed, unit of work). `run(i)` does the measured work once.
+    """
+    if case in ("index_build", "index_load", "index_search"):
+        rows = min(rows, args.max_index_rows)
+
+    if case in ("ingest_csv", "ingest_parquet"):
+        from ingestion.data_ingestion import load_data
+
+        path = "data.csv" if case == "ingest_csv" else "data.parquet"
+        df = dataset(args, rows)
+        df.to_csv(path, index=False) if case == "ingest_csv" else df.to_parquet(path, index=False)
+        del df
+        return (lambda i: load_data(path)), rows, "rows"
+
+    if case == "preprocess":
+        from ingestion.preprocessing import preprocess_data
+
+        df = dataset(args, rows)
+        return (lambda i: preprocess_data(df.copy())), rows, "rows"
+
+    if case == "context":
+        from ingestion.preprocessing import preprocess_data
+        from embedding.embedding_service import generate_global_context
+
+        df = preprocess_data(dataset(args, rows))
+        return (lambda i: generate_global_context(df, f"context_{i}.json")), rows, "rows"
+
+    if case == "documents":
+        from ingestion.preprocessing import preprocess_data
+        from embedding.embedding_service import iter_row_documents
+
+        df = preprocess_data(dataset(args, rows))
+        return (lambda i: sum(1 for _ in iter_row_documents(df))), rows, "rows"
+
+    if case == "index_build":
+        from ingestion.preprocessing import preprocess_data
+
+        df = preprocess_data(dataset(args, rows))
+        return (lambda i: build_index(df, f"index_{i}")), rows, "rows"
+
+    if case in ("index_load", "index_search"):
+        from ingestion.preprocessing import preprocess_data
+        from embedding.index_store import load_index
+
+        build_index(preprocess_data(dataset(args, rows)), "index")
+        if case == "index_load":
+            # Loads and answers one query, so the mapped index is actually read
+            return (lambda i: load_index("index", FakeEmbeddings(EMBEDDING_SIZE)).similarity_search("late delivery", k=5)), rows, "rows"
+        store = load_index("index", FakeEmbeddings(EMBEDDING_SIZE))
+        store.similarity_search("warm up", k=5)
+        queries = [f"{QUERY_WORDS[q % len(QUERY_WORDS)]} {q}" for q in range(SEARCH_QUERIES)]
+
+        def search(i):
+            for query in queries:
+                store.similarity_search(query, k=5)
+        return search, SEARCH_QUERIES, "queries"
+
+    if case == "plotting":
+        from agents.plot_renderer import PlotRenderer
+
+        df = dataset(args, rows)
+        renderer = PlotRenderer(workers=1, cache_dir="plot_cache", frames_dir="frames")
+        renderer.pool.start()
+        renderer.render("plt.plot([1, 2, 3])", df, "suite")
+
+        def render(i):
+            # A distinct command per run, so the cache never answers
+            result = renderer.render(f"sns.scatterplot(data=df, x='Amount 1', y='Count 2', s={5 + i})", df, "suite")
+            assert not result["cached"]
+            render.worker_peak_mb = max(render.worker_peak_mb, result["worker_peak_mb"] or 0)
+        render.worker_peak_mb = 0
+        render.close = renderer.pool.shutdown
+        return render, rows, "rows"
+
+    if case == "agent_turn":
+        from bench_streaming import build_agent, SCRIPT, SYNTHESIS
+        from agents.streaming import stream_turn
+        from agents.code_sandbox import get_code_sandbox
+
+        # The scripted steps query the sales columns of `synthetic_frame`
+        agent = build_agent(synthetic_frame(rows), ScriptedChatModel(steps=SCRIPT, synthesis=SYNTHESIS), os.getcwd())
+        agent.invoke({"input": "warm up"})
+
+        def turn(i):
+            streaming = stream_turn(agent, {"input": f"Which region sells the most and why? ({i})"})
+            for _ in streaming.events():
+                pass
+            assert streaming.metrics["status"] == "done", streaming.metrics
+        turn.close = get_code_sandbox().pool.shutdown
+        return turn, 1, "turns"
+
+    raise ValueError(f"Unknown case: {case}")
+
+def run_case(case: str, args, rows: int) -> dict:
+    """
+    Runs one case in this process (the best of --repeat runs) and returns its result.
+    """
+    os.chdir(tempfile.mkdtemp(prefix=f"suite_{case}_"))
+    run, work, unit = setup_case(case, args, rows)
+    baseline_mb = current_memory_mb()
+    exact = reset_peak_memory()
+    timings = []
+    for i in range(args.repeat):
+        start = time.perf_counter()
+        run(i)
+        timings.append(time.perf_counter() - start)
+    peak_mb = peak_memory_mb()
+    if hasattr(run, "close"):
+        run.close()
+    seconds = min(timings)
+    result = {
+        "case": case,
+        "rows": rows,
+        "work": work,
+        "unit": unit,
+        "seconds": seconds,
+        "per_second": work / seconds if seconds else None,
+        "peak_mb": peak_mb,
+        "growth_mb": max(peak_mb - baseline_mb, 0.0) if exact else None,
+    }
+    if getattr(run, "worker_peak_mb", None):
+        result["worker_peak_mb"] = run.worker_peak_mb
+    return result
+
+# --- Suite ---
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "dataset": {"numeric": args.numeric, "categorical": args.categorical, "text": args.text,
+                    "dates": args.dates, "missing": args.missing, "seed": args.seed},
+    }
+
+def compare(results: list, baseline: dict, args) -> list:
+    """
+    Returns the regressions of `results` against the results of `baseline`.
+    """
+    previous = {(r["case"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["case"], result["rows"]))
+        if before is None:
+            continue
+        limits = {"seconds": args.threshold, "peak_mb": args.memory_threshold, **THRESHOLDS.get(result["case"], {})}
+        floors = {"seconds": MIN_SECONDS_DELTA, "peak_mb": MIN_MEMORY_DELTA_MB}
+        for metric, floor in floors.items():
+            old, new = before[metric], result[metric]
+            change = (new - old) / old if old else 0.0
+            result[f"{metric}_change"] = change
+            if change > limits.get(metric, args.threshold) and new - old > floor:
+                regressions.append(f"{result['case']} ({result['rows']:,} rows): {metric} {old:.3f} -> {new:.3f} "
+                                   f"({change:+.0%}, limit +{limits.get(metric, args.threshold):.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000], help="Dataset sizes")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported")
+    parser.add_argument("--max-index-rows", type=int, default=100_000, help="Rows embedded by the index cases")
+    parser.add_argument("--numeric", type=int, default=3)
+    parser.add_argument("--categorical", type=int, default=3)
+    parser.add_argument("--text", type=int, default=2)
+    parser.add_argument("--dates", type=int, default=1)
+    parser.add_argument("--missing", type=float, default=0.02, help="Fraction of null values per column")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Tolerated relative slowdown")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Tolerated relative peak memory growth")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_case(args.child[0], args, int(args.child[1]))))
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    forwarded = [f"--repeat={args.repeat}", f"--max-index-rows={args.max_index_rows}", f"--numeric={args.numeric}",
+                 f"--categorical={args.categorical}", f"--text={args.text}", f"--dates={args.dates}",
+                 f"--missing={args.missing}", f"--seed={args.seed}"]
+    results, failures = [], []
+    print(f"{'case':<15} {'rows':>10} {'seconds':>9} {'per second':>18} {'peak MB':>8} {'growth MB':>10}")
+    for rows in args.rows:
+        for case in args.cases:
+            command = [sys.executable, os.path.abspath(__file__), "--child", case, str(rows)] + forwarded
+            process = subprocess.run(command, capture_output=True, text=True)
+            if process.returncode != 0:
+                failures.append(f"{case} ({rows:,} rows) failed:\n{process.stderr[-2000:]}")
+                print(f"{case:<15} {rows:>10,} failed")
+                continue
+            r = json.loads(process.stdout.strip().splitlines()[-1])
+            results.append(r)
+            growth = f"{r['growth_mb']:.0f}" if r["growth_mb"] is not None else "-"
+            print(f"{case:<15} {r['rows']:>10,} {r['seconds']:>9.3f} {r['per_second']:>10,.0f} {r['unit']:<7} "
+                  f"{r['peak_mb']:>8.0f} {growth:>10}")
+
+    regressions = compare(results, baseline, args) if baseline else []
+    report = {"metadata": metadata(args), "baseline": args.baseline, "results": results,
+              "regressions": regressions, "failures": failures}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if baseline:
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        if not regressions:
+            print(f"✅ No regression against {args.baseline}")
+    if failures or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
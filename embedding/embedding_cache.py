@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# --- Cache Settings ---
+DEFAULT_CACHE_DIR = "embedding_cache"   # Survives `reset_pipeline`, unlike faiss_index
+DEFAULT_MAX_ENTRIES = 2_000_000         # LRU-evicted beyond this many vectors per model
+DEFAULT_MAX_MB = 4096                   # ...or beyond this size on disk per model (~680k vectors of 1536 dimensions)
+KEY_BYTES = 16                          # blake2b digest size used as the content address
+INITIAL_CAPACITY = 4_096                # Slots allocated on first write, doubled when full
+COMPACT_BLOCK = 16_384                  # Slots moved at once when a cache over its size is compacted
+
+def cache_key(text: str, model: str) -> bytes:
+    """
+    Content address of an embedding: hash of the model name plus the text.
+    """
+    return hashlib.blake2b(f"{model}\0{text}".encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of embedding vectors for one model.
+
+    Layout of `<cache_dir>/<model>/`:
+    - vectors.npy: float32 [capacity, dim], memory-mapped
+    - keys.npy: uint8 [capacity, KEY_BYTES], the content address of each slot
+    - last_used.npy: int64 [capacity], LRU clock of each slot
+    - meta.json: dimension, number of used slots and the LRU clock
+
+    The cache lives outside the workspaces' disk budget (see
+    `ingestion.workspace`); it is bounded by `max_entries` and `max_mb` instead.
+    """
+
+    def __init__(self, model: str, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_mb: float = DEFAULT_MAX_MB):
+        if max_entries <= 0 or max_mb <= 0:
+            raise ValueError("max_entries and max_mb must be positive.")
+        self.model = model
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._dim = None
+        self._size = 0
+        self._clock = 0
+        self._vectors = self._keys = self._last_used = None
+        self._slots = {}
+        self._load()
+
+    # --- Persistence ---
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if not os.path.exists(self._file("meta.json")):
+            return
+        try:
+            with open(self._file("meta.json"), "r") as f:
+                meta = json.load(f)
+            self._dim, self._size, self._clock = meta["dim"], meta["size"], meta["clock"]
+            self._vectors = np.load(self._file("vectors.npy"), mmap_mode="r+")
+            self._keys = np.load(self._file("keys.npy"), mmap_mode="r+")
+            self._last_used = np.load(self._file("last_used.npy"), mmap_mode="r+")
+            self._limit_entries()
+            if self._size > self.max_entries:
+                self._compact()
+            keys = self._keys[:self._size].view(f"V{KEY_BYTES}").ravel().tolist()
+            self._slots = dict(zip(keys, range(self._size)))
+        except Exception as e:
+            # A corrupt cache is only a performance loss: start over
+            print(f"⚠️ Embedding cache at {self.path} unreadable, resetting: {e}")
+            self._dim, self._size, self._clock = None, 0, 0
+            self._vectors = self._keys = self._last_used = None
+            self._slots = {}
+
+    def _limit_entries(self):
+        """
+        Lowers `max_entries` to what fits in `max_bytes`, once the dimension is known.
+        """
+        slot_bytes = self._dim * np.dtype(np.float32).itemsize + KEY_BYTES + np.dtype(np.int64).itemsize
+        self.max_entries = max(1, min(self.max_entries, self.max_bytes // slot_bytes))
+
+    def _compact(self):
+        """
+        Keeps the `max_entries` most recently used entries (a cache written
+        with a higher limit) and shrinks the files to them.
+        """
+        keep = np.sort(np.argsort(self._last_used[:self._size], kind="stable")[-self.max_entries:])
+        # Slots only move down (keep[i] >= i), so blocks can be moved in place
+        for start in range(0, len(keep), COMPACT_BLOCK):
+            block = keep[start:start + COMPACT_BLOCK]
+            for array in (self._vectors, self._keys, self._last_used):
+                array[start:start + len(block)] = array[block]
+        self._size = len(keep)
+        self._allocate(self._size)
+        self.flush()
+
+    def _allocate(self, capacity: int):
+        """
+        Creates (or grows) the memory-mapped arrays to `capacity` slots.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        arrays = {}
+        for name, dtype, shape in (
+            ("vectors.npy", np.float32, (capacity, self._dim)),
+            ("keys.npy", np.uint8, (capacity, KEY_BYTES)),
+            ("last_used.npy", np.int64, (capacity,)),
+        ):
+            tmp_path = self._file(name + ".tmp")
+            grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+            old = {"vectors.npy": self._vectors, "keys.npy": self._keys, "last_used.npy": self._last_used}[name]
+            if old is not None and self._size:
+                grown[:self._size] = old[:self._size]
+            grown.flush()
+            del grown
+            os.replace(tmp_path, self._file(name))
+            arrays[name] = np.load(self._file(name), mmap_mode="r+")
+        self._vectors, self._keys, self._last_used = arrays["vectors.npy"], arrays["keys.npy"], arrays["last_used.npy"]
+
+    def flush(self):
+        """
+        Writes the memory-mapped arrays and the metadata to disk.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return
+            for array in (self._vectors, self._keys, self._last_used):
+                array.flush()
+            with open(self._file("meta.json"), "w") as f:
+                json.dump({"model": self.model, "dim": self._dim, "size": self._size, "clock": self._clock}, f)
+
+    # --- Lookup / Insert ---
+    def __len__(self):
+        return self._size
+
+    def get_many(self, keys):
+        """
+        Bulk lookup.
+
+        Returns:
+            tuple: (vectors, missing) where vectors is a float32 array with one row
+            per key (zeros for misses) and missing lists the positions not cached.
+        """
+        with self._lock:
+            self._clock += 1
+            positions, slots, missing = [], [], []
+            for pos, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.append(pos)
+                else:
+                    positions.append(pos)
+                    slots.append(slot)
+            vectors = np.zeros((len(keys), self._dim or 0), dtype=np.float32)
+            if slots:
+                slots = np.asarray(slots)
+                vectors[positions] = self._vectors[slots]
+                self._last_used[slots] = self._clock
+            self.hits += len(positions)
+            self.misses += len(missing)
+            return vectors, missing
+
+    def put_many(self, keys, vectors):
+        """
+        Stores vectors under their keys, evicting least recently used entries
+        once `max_entries` is reached.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._limit_entries()
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension changed from {self._dim} to {vectors.shape[1]} for model {self.model}.")
+
+            # Deduplicate and drop keys that are already cached
+            fresh = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._slots:
+                    fresh[key] = vector
+            if len(fresh) > self.max_entries:
+                fresh = dict(list(fresh.items())[-self.max_entries:])
+            if not fresh:
+                return
+
+            self._clock += 1
+            n_new = len(fresh)
+            free_slots = list(range(self._size, min(self._size + n_new, self.max_entries)))
+            n_evict = n_new - len(free_slots)
+            if n_evict > 0:
+                # Reuse the slots of the least recently used entries
+                victims = np.argpartition(self._last_used[:self._size], n_evict - 1)[:n_evict]
+                for slot in victims.tolist():
+                    del self._slots[self._keys[slot].tobytes()]
+                free_slots += victims.tolist()
+
+            needed = self._size + len(free_slots) - max(n_evict, 0)
+            capacity = 0 if self._vectors is None else len(self._vectors)
+            if needed > capacity:
+                new_capacity = max(INITIAL_CAPACITY, capacity)
+                while new_capacity < needed:
+                    new_capacity *= 2
+                self._allocate(min(new_capacity, max(self.max_entries, needed)))
+
+            slots = np.asarray(free_slots)
+            self._vectors[slots] = np.stack(list(fresh.values()))
+            self._keys[slots] = np.frombuffer(b"".join(fresh.keys()), dtype=np.uint8).reshape(-1, KEY_BYTES)
+            self._last_used[slots] = self._clock
+            self._slots.update(zip(fresh.keys(), free_slots))
+            self._size = max(self._size, int(slots.max()) + 1)
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters since this cache was opened.
+        """
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings backend with an `EmbeddingCache`.
+    Texts are looked up in bulk and only the misses are sent to the backend.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    @property
+    def model(self) -> str:
+        return self.cache.model
+
+    def embed_documents(self, texts):
+        keys = [cache_key(text, self.cache.model) for text in texts]
+        vectors, missing = self.cache.get_many(keys)
+        if missing:
+            # Embed each distinct missing text once
+            unique = {}
+            for pos in missing:
+                unique.setdefault(keys[pos], texts[pos])
+            embedded = np.asarray(self.embeddings.embed_documents(list(unique.values())), dtype=np.float32)
+            self.cache.put_many(list(unique.keys()), embedded)
+            self.cache.flush()
+            by_key = dict(zip(unique.keys(), embedded))
+            if vectors.shape[1] != embedded.shape[1]:
+                vectors = np.zeros((len(texts), embedded.shape[1]), dtype=np.float32)
+                missing = range(len(texts))
+            for pos in missing:
+                vectors[pos] = by_key[keys[pos]]
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+# --- Shared Instances ---
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model: str, cache_dir: str = DEFAULT_CACHE_DIR) -> EmbeddingCache:
+    """
+    Returns the process-wide cache for a model, opening it on first use.
+    """
+    with _caches_lock:
+        key = (os.path.abspath(cache_dir), model)
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(model, cache_dir)
+        return _caches[key]
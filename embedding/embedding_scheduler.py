@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from langchain_community.vectorstores import FAISS
+
+# --- Scheduler Settings ---
+DEFAULT_BATCH_TOKENS = 50_000     # Token budget per embedding request
+DEFAULT_BATCH_SIZE = 1_000        # Max texts per request (OpenAI accepts up to 2048)
+DEFAULT_MAX_IN_FLIGHT = 4         # Concurrent requests; also bounds read-ahead of the document stream
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE = 1.0                # Seconds before the first retry, doubled each attempt
+BACKOFF_CAP = 30.0
+CHECKPOINT_MIN_ROWS = 2_000       # Documents indexed before the first checkpoint, and at least between two
+CHECKPOINT_GROWTH = 0.5           # Then the index grows by this fraction between checkpoints, so rewrites total O(rows)
+PROGRESS_FILE = "progress.json"   # Written last in a checkpoint: its dataset and row count
+TOKEN_ENCODING = "cl100k_base"
+
+_encoding = None
+
+def count_tokens(texts) -> list:
+    """
+    Token counts measured with tiktoken.
+    tiktoken downloads its BPE file on first use; hosts without network access
+    fall back to an estimate of 4 characters per token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable ({e.__class__.__name__}), estimating tokens from length")
+            _encoding = False
+    if _encoding is False:
+        return [len(text) // 4 + 1 for text in texts]
+    return [len(tokens) for tokens in _encoding.encode_ordinary_batch(list(texts))]
+
+def iter_token_batches(documents, max_tokens: int = DEFAULT_BATCH_TOKENS, max_size: int = DEFAULT_BATCH_SIZE,
+                       text=lambda doc: doc.page_content, read_size: int = 2_000):
+    """
+    Groups a stream of Documents into batches bounded by a token budget and a
+    maximum number of texts. Tokens are counted `read_size` documents at a time.
+    `text` extracts the string to measure from each item.
+    """
+    batch, batch_tokens = [], 0
+    buffer = []
+
+    def drain(buffer):
+        nonlocal batch, batch_tokens
+        for doc, tokens in zip(buffer, count_tokens([text(doc) for doc in buffer])):
+            if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_size):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(doc)
+            batch_tokens += tokens
+
+    for doc in documents:
+        buffer.append(doc)
+        if len(buffer) >= read_size:
+            yield from drain(buffer)
+            buffer = []
+    yield from drain(buffer)
+    if batch:
+        yield batch
+
+def document_id(doc, position: int) -> str:
+    """
+    Stable docstore id, so a resumed build can tell which rows are already indexed.
+    An explicit `doc.id` (e.g. a row fingerprint) takes precedence.
+    """
+    if doc.id:
+        return doc.id
+    row_index = doc.metadata.get("row_index")
+    return f"row-{row_index}" if row_index is not None else f"doc-{position}"
+
+def _embed_with_retry(embeddings, texts, max_retries: int, stats: dict):
+    """
+    Embeds one batch, retrying with exponential backoff and jitter.
+    """
+    attempt = 0
+    while True:
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception:
+            if attempt >= max_retries:
+                raise
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2)
+            stats["retries"] += 1
+            attempt += 1
+            time.sleep(delay)
+
+# --- Checkpoints ---
+def remove_checkpoint(checkpoint_path: str):
+    """
+    Deletes a checkpoint, with the directories of a checkpoint being swapped in.
+    """
+    for path in (checkpoint_path, f"{checkpoint_path}.tmp", f"{checkpoint_path}.old"):
+        shutil.rmtree(path, ignore_errors=True)
+
+def _load_checkpoint(checkpoint_path: str, embeddings, resume_key):
+    """
+    Returns the partially built index for `resume_key`, or None.
+    Checkpoints of another dataset, or whose index and id map disagree on the
+    row count, are discarded.
+    """
+    old_path = f"{checkpoint_path}.old"
+    if not os.path.isdir(checkpoint_path) and os.path.isdir(old_path):
+        # Stopped while swapping in a new checkpoint: the previous one is complete
+        os.replace(old_path, checkpoint_path)
+    progress_file = os.path.join(checkpoint_path, PROGRESS_FILE)
+    if resume_key is None or not os.path.exists(progress_file):
+        return None
+    try:
+        with open(progress_file, "r") as f:
+            progress = json.load(f)
+        if progress.get("resume_key") == resume_key:
+            vectorstore = FAISS.load_local(checkpoint_path, embeddings, allow_dangerous_deserialization=True)
+            indexed = progress.get("indexed")
+            if vectorstore.index.ntotal == len(vectorstore.index_to_docstore_id) == indexed:
+                return vectorstore
+            print(f"⚠️ Ignoring inconsistent index checkpoint: {vectorstore.index.ntotal} vectors, "
+                  f"{len(vectorstore.index_to_docstore_id)} ids, {indexed} recorded")
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable index checkpoint: {e}")
+    remove_checkpoint(checkpoint_path)
+    return None
+
+def _save_checkpoint(vectorstore, checkpoint_path: str, resume_key):
+    """
+    Writes the partial index to a temporary directory, then swaps it in: a
+    stop at any point leaves the previous checkpoint or the new one, never
+    the index of one with the id map of the other.
+    """
+    if vectorstore is None or resume_key is None:
+        return
+    tmp_path, old_path = f"{checkpoint_path}.tmp", f"{checkpoint_path}.old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    vectorstore.save_local(tmp_path)
+    with open(os.path.join(tmp_path, PROGRESS_FILE), "w") as f:
+        json.dump({"resume_key": resume_key, "indexed": len(vectorstore.index_to_docstore_id)}, f)
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.isdir(checkpoint_path):
+        os.replace(checkpoint_path, old_path)
+    os.replace(tmp_path, checkpoint_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+# --- Scheduler ---
+def embed_documents_concurrently(documents, embeddings, checkpoint_path: str = None, resume_key: str = None,
+                                 on_progress=None, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                                 max_batch_tokens: int = DEFAULT_BATCH_TOKENS, max_batch_size: int = DEFAULT_BATCH_SIZE,
+                                 max_retries: int = DEFAULT_MAX_RETRIES):
+    """
+    Embeds a stream of Documents in token-budgeted batches with up to
+    `max_in_flight` concurrent requests, adding each finished batch to a FAISS
+    index as soon as it completes.
+    The stream is only read ahead while a request slot is free (backpressure).
+    When `checkpoint_path` and `resume_key` are given, the index is saved
+    after CHECKPOINT_MIN_ROWS rows, then each time it grew by CHECKPOINT_GROWTH,
+    and on failure; a later call with the same `resume_key` skips the
+    documents that are already indexed.
+
+    Args:
+        documents: Iterable of Documents.
+        embeddings (Embeddings): Backend used for the batches.
+        checkpoint_path (str, optional): Directory for partial progress.
+        resume_key (str, optional): Identifies the dataset (e.g. content hash).
+        on_progress (callable, optional): Called with a stats dict after each batch.
+        max_in_flight (int): Concurrent embedding requests.
+        max_batch_tokens (int): Token budget per request.
+        max_batch_size (int): Max texts per request.
+        max_retries (int): Retries per batch before the build fails.
+
+    Returns:
+        FAISS | None: The index, or None if there was nothing to embed.
+    """
+    if max_in_flight <= 0:
+        raise ValueError("max_in_flight must be a positive integer.")
+    if checkpoint_path is None:
+        resume_key = None
+
+    vectorstore = _load_checkpoint(checkpoint_path, embeddings, resume_key) if checkpoint_path else None
+    done_ids = set(vectorstore.index_to_docstore_id.values()) if vectorstore is not None else set()
+    stats = {"embedded": 0, "resumed": len(done_ids), "batches": 0, "retries": 0, "docs_per_sec": 0.0}
+    start = time.perf_counter()
+    checkpointed = len(done_ids)
+
+    def remaining():
+        for position, doc in enumerate(documents):
+            doc_id = document_id(doc, position)
+            if doc_id not in done_ids:
+                yield doc_id, doc
+
+    def add_batch(batch, vectors, notify: bool = True):
+        nonlocal vectorstore, checkpointed
+        ids = [doc_id for doc_id, _ in batch]
+        text_embeddings = [(doc.page_content, vector) for (_, doc), vector in zip(batch, vectors)]
+        metadatas = [doc.metadata for _, doc in batch]
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+        else:
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        stats["embedded"] += len(batch)
+        stats["batches"] += 1
+        stats["docs_per_sec"] = stats["embedded"] / max(time.perf_counter() - start, 1e-9)
+        indexed = len(vectorstore.index_to_docstore_id)
+        if not notify:
+            return
+        if checkpoint_path and indexed - checkpointed >= max(CHECKPOINT_MIN_ROWS, CHECKPOINT_GROWTH * checkpointed):
+            _save_checkpoint(vectorstore, checkpoint_path, resume_key)
+            checkpointed = indexed
+        if on_progress is not None:
+            on_progress(dict(stats))
+
+    pending = {}
+
+    def collect(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            batch = pending.pop(future)
+            add_batch(batch, future.result())
+
+    pool = ThreadPoolExecutor(max_workers=max_in_flight)
+    try:
+        for batch in iter_token_batches(remaining(), max_batch_tokens, max_batch_size, text=lambda pair: pair[1].page_content):
+            while len(pending) >= max_in_flight:
+                collect(FIRST_COMPLETED)
+            pending[pool.submit(_embed_with_retry, embeddings, [doc.page_content for _, doc in batch], max_retries, stats)] = batch
+        while pending:
+            collect(FIRST_COMPLETED)
+    except BaseException:
+        # Keep every batch already paid for so the next attempt can resume from it: queued requests
+        # are cancelled, running ones awaited. `on_progress` is not called: it may raise again (a
+        # cancelled job), and the checkpoint must still be saved.
+        for future in pending:
+            future.cancel()
+        try:
+            wait([future for future in pending if not future.cancelled()])
+            for future, batch in list(pending.items()):
+                if not future.cancelled() and future.exception() is None:
+                    add_batch(batch, future.result(), notify=False)
+        finally:
+            if checkpoint_path:
+                try:
+                    _save_checkpoint(vectorstore, checkpoint_path, resume_key)
+                except Exception as e:
+                    print(f"⚠️ Index checkpoint not saved: {e}")
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return vectorstore
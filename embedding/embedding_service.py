@@ -1,64 +1,218 @@
 import pandas as pd
+import numpy as np
 import json
 import os
 from langchain_core.documents import Document
+from monitoring.tracing import traced, input_rows
 
-def generate_global_context(df: pd.DataFrame) -> str:
+# --- Global Context ---
+DEFAULT_CONTEXT_PATH = "data/context.json"
+DEFAULT_CONTEXT_TOKENS = 800      # Budget of the context text put into prompts
+TOP_VALUES_DETAIL = {0: 0, 1: 3, 2: 5}
+
+def _write_context(context: dict, context_path: str = DEFAULT_CONTEXT_PATH) -> str:
+    # Compact JSON: read on every tool call
+    os.makedirs(os.path.dirname(context_path) or ".", exist_ok=True)
+    with open(context_path, "w") as f:
+        json.dump(context, f, separators=(",", ":"), default=str)
+    return context_path
+
+@traced("generate_global_context", rows=input_rows)
+def generate_global_context(df: pd.DataFrame, context_path: str = DEFAULT_CONTEXT_PATH) -> str:
     """
     Analyzes the entire dataframe to generate a Global Context JSON.
     This helps the Agent understand the 'Big Picture' before looking at specific rows.
+    Every column is read once by the sketch-based profiler (`embedding.profiling`):
+    exact missing counts and moments, approximate quantiles, distinct counts
+    and most frequent values.
+    """
+    from embedding.profiling import profile_frame
+    return _write_context(profile_frame(df).to_context(), context_path)
+
+@traced("generate_global_context")
+def generate_global_context_from_chunks(chunks, context_path: str = DEFAULT_CONTEXT_PATH) -> str:
+    """
+    Chunked equivalent of `generate_global_context` for data streamed from disk.
+    Each chunk is sketched and merged into the running profile, so only one
+    chunk is in memory at a time.
     """
-    context = {
-        "columns": list(df.columns),
-        "shape": df.shape,
-        "missing_values": df.isnull().sum().to_dict(),
-        "data_types": df.dtypes.astype(str).to_dict(),
-        "numerical_stats": df.describe().to_dict() if not df.select_dtypes(include='number').empty else {},
-        "categorical_samples": {col: df[col].unique().tolist()[:5] for col in df.select_dtypes(include='object').columns}
-    }
-    
-    # Save to file
-    with open("data/context.json", "w") as f:
-        json.dump(context, f, indent=4)
-        
-    return "data/context.json"
+    from embedding.profiling import profile_chunks
+    return _write_context(profile_chunks(chunks).to_context(), context_path)
+
+def _format_number(value) -> str:
+    if isinstance(value, str):
+        return value[:10] if value[10:] in ("", " 00:00:00") else value
+    if value is None or value != value:
+        return "n/a"
+    if (float(value).is_integer() or abs(value) >= 1_000) and abs(value) < 1e15:
+        return f"{value:,.0f}"
+    return f"{value:.4g}"
 
+def _column_lines(context: dict, detail: int) -> list:
+    """
+    One line per column. Detail 2: all statistics and top values; 1: range,
+    median and the top 3 values; 0: name and type only.
+    """
+    stats, top_values = context.get("numerical_stats", {}), context.get("top_values", {})
+    missing, distinct = context.get("missing_values", {}), context.get("distinct_counts", {})
+    lines = []
+    for col in context.get("columns", []):
+        line = f"- {col} ({context.get('data_types', {}).get(col, '?')})"
+        if detail:
+            parts = []
+            column_stats = stats.get(col)
+            if column_stats and column_stats.get("count"):
+                names = ("mean", "std", "min", "25%", "50%", "75%", "max") if detail > 1 else ("min", "50%", "max")
+                parts.append(", ".join(f"{name.replace('50%', 'median')} {_format_number(column_stats[name])}"
+                                       for name in names if name in column_stats))
+            if top_values.get(col):
+                samples = top_values[col][:TOP_VALUES_DETAIL[detail]]
+                parts.append("top: " + ", ".join(f"{value} ({count:,})" for value, count in samples))
+            elif col in context.get("categorical_samples", {}):
+                parts.append("e.g. " + ", ".join(str(value) for value in context["categorical_samples"][col][:TOP_VALUES_DETAIL[detail]]))
+            if col in distinct:
+                parts.append(f"~{distinct[col]:,} distinct")
+            if missing.get(col):
+                parts.append(f"{missing[col]:,} missing")
+            if parts:
+                line += ": " + "; ".join(parts)
+        lines.append(line)
+    return lines
+
+def format_global_context(context: dict, max_tokens: int = DEFAULT_CONTEXT_TOKENS) -> str:
+    """
+    Renders the Global Context as compact text for a prompt, within `max_tokens`.
+    Detail is reduced for all columns before any column is left out.
+    """
+    from embedding.embedding_scheduler import count_tokens
+
+    rows, n_columns = context.get("shape", (0, 0))
+    header = f"{rows:,} rows x {n_columns} columns"
+    for detail in (2, 1, 0):
+        lines = _column_lines(context, detail)
+        counts = count_tokens([header] + lines)
+        if sum(counts) <= max_tokens:
+            return "\n".join([header] + lines)
+
+    # Even names alone are over budget: keep the first columns that fit
+    budget, kept = max_tokens - counts[0] - 10, []
+    for line, tokens in zip(lines, counts[1:]):
+        if tokens > budget:
+            break
+        kept.append(line)
+        budget -= tokens
+    return "\n".join([header] + kept + [f"- ... {len(lines) - len(kept)} more columns"])
+
+# Number of rows turned into Documents per chunk by the streaming builder
+DEFAULT_DOCUMENT_CHUNK_SIZE = 10_000
+
+def _row_values(block: pd.DataFrame) -> np.ndarray:
+    """
+    Returns the 2D value array of a block exactly as `iterrows` would see it.
+    Frames made only of datetime columns are boxed to Timestamps so the
+    text matches the per-row Series representation; float32 (and float16)
+    values are upcast, as formatting them in a row's f-string did, so their
+    text keeps the float64 digits the embedding cache and fingerprints saw.
+    """
+    values = block.to_numpy()
+    if values.dtype.kind in "mM":
+        values = block.astype(object).to_numpy()
+    elif values.dtype.kind == "f" and values.dtype.itemsize < 8:
+        values = values.astype(np.float64)
+    return values
+
+@traced("row_documents")
+def iter_row_documents(df: pd.DataFrame, chunk_size: int = DEFAULT_DOCUMENT_CHUNK_SIZE, means: pd.Series = None, ids=None):
+    """
+    Columnar, streaming version of `create_row_documents`.
+    Yields lists of at most `chunk_size` Documents so the index can be fed
+    without materialising one Document per row up front.
+    The "(Above/Below Average)" qualifiers and the `col: val` text are computed
+    for a whole column of the chunk at once instead of cell by cell.
+
+    Args:
+        df (pd.DataFrame): Cleaned DataFrame (or one chunk of it).
+        chunk_size (int): Maximum number of Documents per yielded list.
+        means (pd.Series, optional): Column means to compare against. Defaults
+            to the means of `df`; pass the dataset-wide means when `df` is a chunk.
+        ids (list, optional): Docstore id of each row (e.g. `fingerprint_ids`).
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer.")
+    if ids is not None and len(ids) != len(df):
+        raise ValueError("ids must have one entry per row.")
+
+    columns = list(df.columns)
+    num_cols = df.select_dtypes(include='number').columns
+    if means is None:
+        means = df[num_cols].mean()
+    prefixes = [f"{col}: " for col in columns]
+
+    for start in range(0, len(df), chunk_size):
+        block = df.iloc[start:start + chunk_size]
+        values = _row_values(block)
+
+        # 1. Build Narrative Description column by column
+        page_content = None
+        for pos, col in enumerate(columns):
+            text = values[:, pos].astype(str).astype(object)
+
+            # Qualitative enrichment for numbers (NaN compares False -> no qualifier)
+            if col in num_cols:
+                raw = block.iloc[:, pos].to_numpy(dtype=float, na_value=np.nan)
+                suffix = np.where(
+                    raw > means[col], " (Above Average)",
+                    np.where(raw < means[col], " (Below Average)", " ")
+                ).astype(object)
+            else:
+                suffix = " "
+
+            part = prefixes[pos] + text + suffix
+            page_content = part if page_content is None else page_content + " | " + part
+
+        if page_content is None:
+            page_content = np.full(len(block), "", dtype=object)
+
+        # 2. Store Metadata (The "Source of Truth")
+        documents = []
+        block_ids = ids[start:start + chunk_size] if ids is not None else [None] * len(block)
+        for index, content, row, doc_id in zip(block.index, page_content, values.tolist(), block_ids):
+            metadata = dict(zip(columns, row))
+            metadata["row_index"] = index
+            documents.append(Document(page_content=content, metadata=metadata, id=doc_id))
+
+        yield documents
+
+def iter_chunk_documents(open_chunks, chunk_size: int = DEFAULT_DOCUMENT_CHUNK_SIZE):
+    """
+    Builds row Documents from a chunked source without loading it whole.
+    The first pass computes the dataset-wide column means used for the
+    qualifiers, the second yields the Documents chunk by chunk.
+
+    Args:
+        open_chunks (callable): Returns a fresh iterator of cleaned chunks each
+            time it is called, e.g. `lambda: iter_data_chunks("data/clean.parquet")`.
+        chunk_size (int): Maximum number of Documents per yielded list.
+    """
+    sums, counts = {}, {}
+    for chunk in open_chunks():
+        for col in chunk.select_dtypes(include='number').columns:
+            sums[col] = sums.get(col, 0.0) + float(chunk[col].sum())
+            counts[col] = counts.get(col, 0) + int(chunk[col].count())
+    means = pd.Series({col: sums[col] / counts[col] if counts[col] else np.nan for col in sums}, dtype=float)
+
+    for chunk in open_chunks():
+        yield from iter_row_documents(chunk, chunk_size=chunk_size, means=means)
+
+@traced("create_row_documents", rows=input_rows)
 def create_row_documents(df: pd.DataFrame):
     """
     Converts each DataFrame row into a LangChain Document.
     The 'page_content' is a rich narrative description of the row.
     The 'metadata' holds the original raw values for retrieval.
+    Prefer `iter_row_documents` for large frames, it yields the same Documents in chunks.
     """
     documents = []
-    
-    # We pre-calculate some stats to add qualitative context (e.g., "High" vs "Low")
-    num_cols = df.select_dtypes(include='number').columns
-    means = df[num_cols].mean()
-    
-    for index, row in df.iterrows():
-        # 1. Build Narrative Description (The "Content" for the LLM)
-        description_parts = []
-        for col in df.columns:
-            val = row[col]
-            
-            # Qualitative enrichment for numbers
-            qualifier = ""
-            if col in num_cols:
-                if val > means[col]:
-                    qualifier = "(Above Average)"
-                elif val < means[col]:
-                    qualifier = "(Below Average)"
-            
-            description_parts.append(f"{col}: {val} {qualifier}")
-            
-        page_content = " | ".join(description_parts)
-        
-        # 2. Store Metadata (The "Source of Truth")
-        # We convert the row to a dict and ensure all values are JSON serializable
-        metadata = row.to_dict()
-        metadata["row_index"] = index
-        
-        doc = Document(page_content=page_content, metadata=metadata)
-        documents.append(doc)
-        
-    return documents
\ No newline at end of file
+    for chunk in iter_row_documents(df):
+        documents.extend(chunk)
+    return documents
@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from embedding.embedding_service import _format_number
+from embedding.embedding_scheduler import count_tokens
+from monitoring.tracing import traced
+
+# --- Grouped Document Settings ---
+GROUPED_MIN_ROWS = 100_000      # Datasets from this size can be indexed as grouped documents instead of one per row (opt-in)
+DEFAULT_GROUP_TOKENS = 512      # Token budget of a grouped document (counted with tiktoken)
+DEFAULT_GROUP_BATCH = 1_000     # Documents per yielded list
+MAX_CATEGORY_GROUPS = 200       # Text columns with more distinct values do not group rows
+MAX_CATEGORY_MISSING = 0.5      # ...nor do text columns missing in more than this share of rows
+CLUSTER_ROWS = 1_000            # Rows per k-means cluster when no category or date column groups the rows
+MAX_CLUSTERS = 1_024
+SUMMARY_COLUMNS = 12            # Columns described in the summary of a document
+ENCODE_BLOCK_ROWS = 100_000     # Rows encoded at once while measuring tokens
+SEPARATOR = " | "
+
+def _is_text(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object or pd.api.types.is_string_dtype(series)
+
+# --- Grouping ---
+def choose_grouping(df: pd.DataFrame) -> dict:
+    """
+    Picks the columns rows are grouped by: the text column with the most
+    distinct values up to MAX_CATEGORY_GROUPS (e.g. "Region", "Category"),
+    and the month of the first date column.
+
+    Returns:
+        dict: "category" and "date" column names (None when no column qualifies).
+    """
+    category, best = None, 1
+    for col in df.columns:
+        series = df[col]
+        if not _is_text(series) or pd.api.types.is_bool_dtype(series):
+            continue
+        # A sample rules out free-text columns without counting every value
+        if series.iloc[:10_000].nunique() > MAX_CATEGORY_GROUPS or series.isna().mean() > MAX_CATEGORY_MISSING:
+            continue
+        distinct = series.nunique()
+        if best < distinct <= MAX_CATEGORY_GROUPS:
+            category, best = col, distinct
+    date = next((col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])), None)
+    return {"category": category, "date": date}
+
+def _months(series: pd.Series) -> np.ndarray:
+    if getattr(series.dtype, "tz", None) is not None:
+        series = series.dt.tz_localize(None)
+    return series.to_numpy(dtype="datetime64[ns]").astype("datetime64[M]")
+
+def _clusters(df: pd.DataFrame, seed: int = 0):
+    """
+    k-means clusters of the standardized numeric columns (about CLUSTER_ROWS rows each).
+    """
+    numeric = df.select_dtypes(include="number")
+    k = min(MAX_CLUSTERS, len(df) // CLUSTER_ROWS)
+    if numeric.shape[1] == 0 or k < 2:
+        return np.zeros(len(df), dtype=np.int64), ["all rows"]
+    import faiss
+
+    values = numeric.to_numpy(dtype=np.float32, na_value=np.nan)
+    values = (values - np.nanmean(values, axis=0)) / np.where(np.nanstd(values, axis=0) > 0, np.nanstd(values, axis=0), 1)
+    values = np.ascontiguousarray(np.nan_to_num(values), dtype=np.float32)
+    kmeans = faiss.Kmeans(values.shape[1], k, niter=10, seed=seed, max_points_per_centroid=256)
+    kmeans.train(values)
+    _, assigned = kmeans.index.search(values, 1)
+    codes, uniques = pd.factorize(assigned[:, 0], sort=True)
+    return codes.astype(np.int64), [f"cluster {i + 1} of {len(uniques)}" for i in range(len(uniques))]
+
+def group_rows(df: pd.DataFrame, grouping: dict = None):
+    """
+    Assigns every row to a group: by category and month (see `choose_grouping`),
+    or by k-means cluster of the numeric columns when neither exists.
+
+    Returns:
+        tuple: (group code of each row, label of each group, grouping columns)
+    """
+    grouping = grouping if grouping is not None else choose_grouping(df)
+    keys = {}
+    if grouping.get("category") is not None:
+        keys[grouping["category"]] = df[grouping["category"]].to_numpy(dtype=object)
+    if grouping.get("date") is not None:
+        keys[grouping["date"]] = _months(df[grouping["date"]])
+    if not keys:
+        codes, labels = _clusters(df)
+        return codes, labels, []
+
+    groups = pd.DataFrame(keys).groupby(list(keys), sort=True, dropna=False)
+    codes = groups.ngroup().to_numpy(dtype=np.int64)
+    labels = []
+    for values in groups.size().index:
+        values = values if isinstance(values, tuple) else (values,)
+        parts = []
+        for col, value in zip(keys, values):
+            if value is None or value != value:
+                value = "n/a"
+            elif isinstance(value, (np.datetime64, pd.Timestamp)):
+                value = str(np.datetime64(value, "M"))
+            parts.append(f"{col} = {value}")
+        labels.append(", ".join(parts))
+    return codes, labels, list(keys)
+
+# --- Compact Encoding ---
+def _cell_text(series: pd.Series) -> np.ndarray:
+    """
+    Values of a column as short strings ("" for missing values).
+    """
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_bool_dtype(series):
+        text = series.astype(str).to_numpy(dtype=object)
+    elif pd.api.types.is_numeric_dtype(series):
+        text = np.char.mod("%.6g", series.to_numpy(dtype=float, na_value=np.nan)).astype(object)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dtype, "tz", None) is not None:
+            series = series.dt.tz_localize(None)
+        values = series.to_numpy(dtype="datetime64[ns]")
+        dated = values[~missing]
+        unit = "D" if (dated.astype("datetime64[D]") == dated).all() else "m"
+        text = np.datetime_as_string(values, unit=unit).astype(object)
+    else:
+        text = series.astype(str).to_numpy(dtype=object)
+    text[missing] = ""
+    return text
+
+def encode_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    One compact line per row: the values only, in column order, separated by " | "
+    (the column names are written once per document).
+    """
+    lines = None
+    for col in df.columns:
+        text = _cell_text(df[col])
+        lines = text if lines is None else lines + SEPARATOR + text
+    return lines if lines is not None else np.full(len(df), "", dtype=object)
+
+def summarize(df: pd.DataFrame, codes: np.ndarray, n_groups: int, columns: list) -> list:
+    """
+    One summary line per group of rows: the mean and range of numeric columns,
+    the range of date columns and the most frequent value of categorical ones.
+
+    Args:
+        df (pd.DataFrame): The rows.
+        codes (np.ndarray): Group of each row (0 to `n_groups` - 1).
+        n_groups (int): Number of groups.
+        columns (list): Columns described, in order (at most SUMMARY_COLUMNS).
+
+    Returns:
+        list: Summary text of each group.
+    """
+    parts = [[] for _ in range(n_groups)]
+    for col in columns[:SUMMARY_COLUMNS]:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            stats = series.groupby(codes).agg(["mean", "min", "max"]).dropna()
+            for group, (mean, low, high) in zip(stats.index.tolist(), stats.to_numpy(dtype=float).tolist()):
+                parts[group].append(f"{col} avg {_format_number(mean)} ({_format_number(low)} to {_format_number(high)})")
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            stats = series.groupby(codes).agg(["min", "max"]).dropna()
+            for group, low, high in zip(stats.index.tolist(), stats["min"].astype(str), stats["max"].astype(str)):
+                low, high = _format_number(low), _format_number(high)
+                parts[group].append(f"{col} {low}" if low == high else f"{col} {low} to {high}")
+        elif _is_text(series):
+            values, uniques = pd.factorize(series)
+            if len(uniques) > MAX_CATEGORY_GROUPS or not len(uniques):
+                continue
+            # Count (group, value) pairs, then keep the most frequent value of each group
+            valid = values >= 0
+            pairs, counts = np.unique(codes[valid] * len(uniques) + values[valid], return_counts=True)
+            sizes = np.bincount(codes[valid], minlength=n_groups)
+            order = np.lexsort((-counts, pairs // len(uniques)))
+            pairs, counts = pairs[order], counts[order]
+            first = np.flatnonzero(np.r_[True, pairs[1:] // len(uniques) != pairs[:-1] // len(uniques)])
+            for pair, count in zip(pairs[first].tolist(), counts[first].tolist()):
+                group = pair // len(uniques)
+                parts[group].append(f"{col} mostly {uniques[pair % len(uniques)]} ({count:,} of {sizes[group]:,})")
+    return ["; ".join(group_parts) for group_parts in parts]
+
+# --- Grouped Documents ---
+@traced("group_documents", rows=lambda documents: sum(doc.metadata["rows"] for doc in documents))
+def iter_group_documents(df: pd.DataFrame, max_tokens: int = DEFAULT_GROUP_TOKENS, grouping: dict = None,
+                         batch_size: int = DEFAULT_GROUP_BATCH, report: dict = None):
+    """
+    Alternative to `iter_row_documents` for large datasets: rows are grouped by
+    category and month (or cluster, see `group_rows`) and packed into chunk
+    documents of at most about `max_tokens` tokens, each holding a summary of
+    its rows and the rows themselves in a compact encoding (`encode_rows`).
+    Far fewer, denser texts are embedded; the row Documents are rebuilt from
+    the DataFrame once a group matches a query (see `HybridRetriever`).
+
+    Args:
+        df (pd.DataFrame): Cleaned DataFrame.
+        max_tokens (int): Token budget of a document (tiktoken, see `count_tokens`).
+            A single row longer than the budget gets a document of its own.
+        grouping (dict, optional): "category" / "date" columns; chosen by `choose_grouping` if omitted.
+        batch_size (int): Maximum number of Documents per yielded list.
+        report (dict, optional): Filled, before the first list is yielded, with the
+            number of "rows", "groups" and "documents" and the "grouped_by" columns.
+
+    Yields:
+        list: Documents whose metadata holds the "group" label, its "summary",
+            the number of "rows" and their "row_index" labels.
+    """
+    if max_tokens <= 0 or batch_size <= 0:
+        raise ValueError("max_tokens and batch_size must be positive integers.")
+    codes, labels, grouped_by = group_rows(df, grouping)
+    columns = [col for col in df.columns if col not in grouped_by]
+    header = f"Columns: {SEPARATOR.join(map(str, columns))}"
+    # Identifiers (unique numbers) say nothing about a group
+    described = [col for col in columns if not (pd.api.types.is_numeric_dtype(df[col]) and df[col].is_unique)]
+
+    # 1. Tokens of each row's line, a block at a time (the lines are encoded again when written)
+    tokens = np.empty(len(df), dtype=np.int64)
+    for start in range(0, len(df), ENCODE_BLOCK_ROWS):
+        block = df.iloc[start:start + ENCODE_BLOCK_ROWS][columns]
+        tokens[start:start + len(block)] = count_tokens(encode_rows(block).tolist())
+
+    # 2. Room left for rows in each group's documents: the budget minus the header and a summary
+    group_summaries = summarize(df, codes, len(labels), described)
+    reserved = count_tokens([f"Group: {label} (part 1 of 1, 1,000 rows)\nSummary: {summary}\n{header}"
+                             for label, summary in zip(labels, group_summaries)])
+    room = [max(max_tokens - int(reserve * 1.1), 1) for reserve in reserved]
+
+    # 3. Pack the rows of each group, in their original order, into documents
+    order = np.argsort(codes, kind="stable")
+    chunk_of_sorted = np.empty(len(df), dtype=np.int64)
+    chunk_groups, chunk, used, previous = [], -1, 0, -1
+    for i, (group, row_tokens) in enumerate(zip(codes[order].tolist(), tokens[order].tolist())):
+        if group != previous or (used and used + row_tokens > room[group]):
+            chunk += 1
+            chunk_groups.append(group)
+            used, previous = 0, group
+        chunk_of_sorted[i] = chunk
+        used += row_tokens
+    n_chunks = len(chunk_groups)
+    chunk_of_row = np.empty(len(df), dtype=np.int64)
+    chunk_of_row[order] = chunk_of_sorted
+    summaries = summarize(df, chunk_of_row, n_chunks, described)
+    bounds = np.searchsorted(chunk_of_sorted, np.arange(n_chunks + 1))
+    parts = np.bincount(chunk_groups, minlength=len(labels))
+    first_chunk = np.searchsorted(chunk_groups, np.arange(len(labels)))
+    if report is not None:
+        report.update(rows=len(df), groups=len(labels), documents=n_chunks, grouped_by=grouped_by or ["cluster"])
+
+    # 4. Write the documents, `batch_size` at a time
+    for start in range(0, n_chunks, batch_size):
+        stop = min(start + batch_size, n_chunks)
+        positions = order[bounds[start]:bounds[stop]]
+        lines = encode_rows(df.iloc[positions][columns])
+        row_labels = df.index[positions].tolist()
+        documents = []
+        for chunk in range(start, stop):
+            group = chunk_groups[chunk]
+            first, last = bounds[chunk] - bounds[start], bounds[chunk + 1] - bounds[start]
+            part = f"part {chunk - first_chunk[group] + 1} of {parts[group]}, " if parts[group] > 1 else ""
+            content = "\n".join([f"Group: {labels[group]} ({part}{last - first:,} rows)", f"Summary: {summaries[chunk]}",
+                                 header, *lines[first:last]])
+            metadata = {"group": labels[group], "summary": summaries[chunk], "rows": int(last - first),
+                        "row_index": row_labels[first:last]}
+            documents.append(Document(page_content=content, metadata=metadata, id=f"group-{chunk}"))
+        yield documents
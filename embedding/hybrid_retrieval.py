@@ -0,0 +1,461 @@
+import re
+import time
+import numpy as np
+import pandas as pd
+from embedding.embedding_service import iter_row_documents
+from monitoring.tracing import traced, current_span
+
+# --- Retrieval Settings ---
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60                       # Reciprocal rank fusion damping constant
+FUSION_DEPTH = 50                # Candidates taken from each ranking before fusion
+RERANK_GROUPS = 200              # Groups searched per query in an index of grouped documents...
+RERANK_ROWS = 50                 # ...and rows of theirs ranked by embedding (at least the k asked for)
+MAX_FILTER_VALUES = 5_000        # Text columns with more distinct values are not used as filters
+MAX_VALUE_WORDS = 4              # Longest multi-word value matched in a query ("Office Supplies")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and any are as at be by can did do does for from give had has have how i in is it its list me
+my of on or show tell than that the their them these this those to was were what when where which
+who why with all about find get rows row records record entries entry items item data dataset
+""".split())
+COMPARATORS = {
+    ">": "gt", "above": "gt", "over": "gt", "more than": "gt", "greater than": "gt",
+    ">=": "ge", "at least": "ge",
+    "<": "lt", "below": "lt", "under": "lt", "less than": "lt",
+    "<=": "le", "at most": "le",
+    "=": "eq", "==": "eq", "equal to": "eq",
+}
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+def _is_text(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object or pd.api.types.is_string_dtype(series)
+
+# --- Structured Pre-Filter ---
+class MetadataIndex:
+    """
+    Columnar indexes over the DataFrame used to pre-filter rows:
+    factorized codes for text columns, sorted values for numeric ranges and
+    the year of datetime columns. Each index is built on first use.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._codes = {}
+        self._sorted = {}
+        self._years = {}
+        self._values = None
+
+    def _value_lookup(self) -> dict:
+        """
+        Lower-cased value -> [(column, value)] over the low-cardinality text columns.
+        """
+        if self._values is None:
+            self._values = {}
+            for col in self.df.columns:
+                series = self.df[col]
+                if not _is_text(series):
+                    continue
+                uniques = series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else pd.unique(series.dropna())
+                if len(uniques) > MAX_FILTER_VALUES:
+                    continue
+                for value in uniques:
+                    key = " ".join(tokenize(value))
+                    if key and key not in STOPWORDS:
+                        self._values.setdefault(key, []).append((col, value))
+        return self._values
+
+    def _column_codes(self, col):
+        if col not in self._codes:
+            self._codes[col] = pd.factorize(self.df[col])
+        return self._codes[col]
+
+    def _column_sorted(self, col):
+        if col not in self._sorted:
+            values = self.df[col].to_numpy(dtype=float, na_value=np.nan)
+            order = np.argsort(values, kind="stable")
+            self._sorted[col] = (values[order], order)
+        return self._sorted[col]
+
+    def _column_years(self, col):
+        if col not in self._years:
+            self._years[col] = self.df[col].dt.year.to_numpy(dtype=float, na_value=np.nan)
+        return self._years[col]
+
+    def parse(self, query: str):
+        """
+        Extracts structured constraints from a natural language query.
+
+        Returns:
+            tuple: (filters, remaining query tokens). Filters are dicts with
+            "column", "op" ("in", "gt", "ge", "lt", "le", "eq", "year") and "value".
+        """
+        text = str(query).lower()
+        filters = []
+        column_tokens = {}
+        for col in self.df.columns:
+            column_tokens.setdefault(" ".join(tokenize(col)), col)
+
+        # Numeric comparisons: "<column> [is] <comparator> <number>", matched spans are consumed
+        comparators = "|".join(re.escape(word) for word in sorted(COMPARATORS, key=len, reverse=True))
+        for key, col in column_tokens.items():
+            if not key or not pd.api.types.is_numeric_dtype(self.df[col]):
+                continue
+            pattern = rf"\b{re.escape(key)}\s*(?:is\s+)?({comparators})\s*(-?\d+(?:\.\d+)?)"
+            for match in list(re.finditer(pattern, text)):
+                filters.append({"column": col, "op": COMPARATORS[match.group(1)], "value": float(match.group(2))})
+            text = re.sub(pattern, " ", text)
+
+        tokens = tokenize(text)
+        used = [False] * len(tokens)
+
+        # Years: "2023" constrains the (first) datetime column
+        date_cols = [col for col in self.df.columns if pd.api.types.is_datetime64_any_dtype(self.df[col])]
+        if date_cols:
+            for pos, token in enumerate(tokens):
+                if re.fullmatch(r"(19|20)\d{2}", token):
+                    filters.append({"column": date_cols[0], "op": "year", "value": int(token)})
+                    used[pos] = True
+
+        # Categorical values, longest phrase first; values of one column are OR-ed
+        values = self._value_lookup()
+        matched = {}
+        for width in range(MAX_VALUE_WORDS, 0, -1):
+            for start in range(len(tokens) - width + 1):
+                if any(used[start:start + width]):
+                    continue
+                for col, value in values.get(" ".join(tokens[start:start + width]), []):
+                    matched.setdefault(col, []).append(value)
+                    used[start:start + width] = [True] * width
+        filters.extend({"column": col, "op": "in", "value": vals} for col, vals in matched.items())
+
+        names = {token for key in column_tokens for token in key.split()}
+        remaining = [token for pos, token in enumerate(tokens)
+                     if not used[pos] and token not in STOPWORDS and token not in names and token.rstrip("s") not in names]
+        return filters, remaining
+
+    def mask(self, filters) -> np.ndarray:
+        """
+        Boolean mask of the rows satisfying every filter.
+        """
+        mask = np.ones(len(self.df), dtype=bool)
+        for flt in filters:
+            col, op, value = flt["column"], flt["op"], flt["value"]
+            if op == "in":
+                codes, uniques = self._column_codes(col)
+                wanted = pd.Index(uniques).get_indexer(pd.Index(value))
+                mask &= np.isin(codes, wanted[wanted >= 0])
+            elif op == "year":
+                mask &= self._column_years(col) == value
+            else:
+                values, order = self._column_sorted(col)
+                side = {"gt": ("right", None), "ge": ("left", None), "lt": (None, "left"), "le": (None, "right"), "eq": ("left", "right")}[op]
+                low = np.searchsorted(values, value, side=side[0]) if side[0] else 0
+                high = np.searchsorted(values, value, side=side[1]) if side[1] else np.searchsorted(values, np.inf, side="right")
+                selected = np.zeros(len(self.df), dtype=bool)
+                selected[order[low:high]] = True
+                mask &= selected
+        return mask
+
+def describe_filter(flt: dict) -> str:
+    value = flt["value"]
+    if flt["op"] == "in":
+        return f"{flt['column']} in {list(value)}" if len(value) > 1 else f"{flt['column']} = {value[0]}"
+    symbols = {"gt": ">", "ge": ">=", "lt": "<", "le": "<=", "eq": "=", "year": "year ="}
+    return f"{flt['column']} {symbols[flt['op']]} {value:g}" if flt["op"] != "year" else f"{flt['column']} year = {value}"
+
+# --- Lexical Index ---
+class BM25Index:
+    """
+    In-process BM25 inverted index over the text fields of the row documents.
+    Built column by column from the DataFrame: each distinct value is tokenized
+    once and its postings are expanded to the rows holding it with numpy.
+    Postings are stored CSR-style (term -> rows, term frequencies).
+    """
+
+    def __init__(self, df: pd.DataFrame, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1, self.b = k1, b
+        self.n_rows = len(df)
+        self.vocabulary = {}
+        terms, rows, tfs = [], [], []
+
+        for col in df.columns:
+            if not _is_text(df[col]):
+                continue
+            codes, uniques = pd.factorize(df[col])
+            value_terms, value_tfs, value_ids = [], [], []
+            for code, value in enumerate(uniques):
+                counts = {}
+                for token in tokenize(value):
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    value_ids.append(code)
+                    value_terms.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                    value_tfs.append(count)
+            if not value_ids:
+                continue
+            value_ids = np.asarray(value_ids)
+            # Rows of each distinct value, contiguous in `order`
+            valid = np.flatnonzero(codes >= 0)
+            order = valid[np.argsort(codes[valid], kind="stable")]
+            sizes = np.bincount(codes[valid], minlength=len(uniques))
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            repeat = sizes[value_ids]
+            offsets = np.arange(repeat.sum()) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+            rows.append(order[np.repeat(starts[value_ids], repeat) + offsets])
+            terms.append(np.repeat(np.asarray(value_terms), repeat))
+            tfs.append(np.repeat(np.asarray(value_tfs, dtype=np.float32), repeat))
+
+        if rows:
+            # Merge postings of a term that occurs in several columns of the same row
+            keys = np.concatenate(terms).astype(np.int64) * max(self.n_rows, 1) + np.concatenate(rows)
+            tf = np.concatenate(tfs)
+            order = np.argsort(keys, kind="stable")
+            keys, tf = keys[order], tf[order]
+            unique_keys, first = np.unique(keys, return_index=True)
+            tf = np.add.reduceat(tf, first) if len(first) else tf
+            term_ids = unique_keys // max(self.n_rows, 1)
+            self.rows = (unique_keys % max(self.n_rows, 1)).astype(np.int64)
+            self.tf = tf.astype(np.float32)
+            self.indptr = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(self.vocabulary)))])
+        else:
+            self.rows, self.tf, self.indptr = np.empty(0, np.int64), np.empty(0, np.float32), np.zeros(1, np.int64)
+
+        self.doc_len = np.bincount(self.rows, weights=self.tf, minlength=self.n_rows)
+        self.avg_len = float(self.doc_len.mean()) if self.n_rows else 0.0
+        doc_freq = np.diff(self.indptr)
+        self.idf = np.log(1 + (self.n_rows - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def known(self, terms) -> list:
+        return [term for term in terms if term in self.vocabulary]
+
+    def search(self, terms, k: int, mask: np.ndarray = None):
+        """
+        Top-k rows for the query terms (optionally only rows where `mask` is True).
+
+        Returns:
+            tuple: (row positions, scores), best first; rows without any term are left out.
+        """
+        rows, scores = [], []
+        for term in set(self.known(terms)):
+            term_id = self.vocabulary[term]
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            term_rows, tf = self.rows[start:end], self.tf[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[term_rows] / max(self.avg_len, 1e-9))
+            rows.append(term_rows)
+            scores.append(self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm))
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        totals = np.bincount(np.concatenate(rows), weights=np.concatenate(scores), minlength=self.n_rows)
+        if mask is not None:
+            totals[~mask] = 0
+        hits = np.flatnonzero(totals)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-totals[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-totals[hits], kind="stable")]
+        return hits, totals[hits]
+
+def reciprocal_rank_fusion(rankings, limit: int, k: int = RRF_K) -> list:
+    """
+    Merges ranked lists of row positions: score = sum of 1 / (k + rank).
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda row: -scores[row])[:limit]
+
+# --- Hybrid Retriever ---
+class HybridRetriever:
+    """
+    Answers a retrieval query over the cleaned DataFrame with the cheapest path:
+    - "filter": the query is fully expressed by metadata constraints
+    - "lexical": every remaining keyword is in the BM25 vocabulary
+    - "hybrid": some keywords are known; BM25 and vector results are fused
+    - "vector": nothing lexical to go on; one embedding call
+    Metadata filters restrict every path, including the vector search.
+    """
+
+    def __init__(self, df: pd.DataFrame, get_vectorstore):
+        self.df = df
+        self.get_vectorstore = get_vectorstore
+        self.metadata = MetadataIndex(df)
+        self.means = df.select_dtypes(include='number').mean()
+        self._bm25 = None
+        self._store_rows = (None, None)
+
+    @property
+    def bm25(self) -> BM25Index:
+        if self._bm25 is None:
+            self._bm25 = BM25Index(self.df)
+        return self._bm25
+
+    def plan(self, query: str):
+        """
+        Returns (path, filters, keywords) without running the search.
+        """
+        filters, keywords = self.metadata.parse(query)
+        known = self.bm25.known(keywords)
+        if not keywords:
+            path = "filter" if filters else "vector"
+        elif len(known) == len(keywords):
+            path = "lexical"
+        elif known:
+            path = "hybrid"
+        else:
+            path = "vector"
+        return path, filters, keywords
+
+    def _row_labels(self, store) -> np.ndarray:
+        """
+        The docstore row (FAISS label) holding each DataFrame row, -1 if none.
+        A grouped document (see `embedding.grouped_documents`) holds many rows.
+        """
+        if self._store_rows[0] is not store:
+            docstore = store.docstore
+            if hasattr(docstore, "live_rows"):
+                live = docstore.live_rows()
+                row_index = docstore.table.column("row_index").to_numpy(zero_copy_only=False)[live]
+            else:
+                # In-memory docstore of a partial index (a build in progress)
+                live = np.fromiter(store.index_to_docstore_id.keys(), dtype=np.int64)
+                row_index = [docstore.search(store.index_to_docstore_id[label]).metadata.get("row_index") for label in live]
+            if len(row_index) and isinstance(row_index[0], (list, np.ndarray)):
+                live = np.repeat(live, [len(rows) for rows in row_index])
+                row_index = np.concatenate([np.asarray(rows) for rows in row_index])
+            labels = pd.Series(live, index=row_index)
+            labels = labels[~labels.index.duplicated(keep="last")]
+            self._store_rows = (store, labels.reindex(self.df.index).to_numpy(dtype=float, na_value=-1).astype(np.int64))
+        return self._store_rows[1]
+
+    def _docstore_rows(self, store, positions: np.ndarray) -> np.ndarray:
+        """
+        Maps DataFrame positions to the docstore rows (FAISS labels) holding them.
+        """
+        rows = self._row_labels(store)[positions]
+        return np.unique(rows[rows >= 0])
+
+    def coverage(self, store) -> float:
+        """
+        Share of the DataFrame rows the store's documents hold (of a partial index, while it is built).
+        """
+        if not store.index.ntotal:
+            return 0.0
+        first = next(iter(store.index_to_docstore_id))
+        if not isinstance(store.docstore.search(store.index_to_docstore_id[first]).metadata.get("row_index"), list):
+            return store.index.ntotal / max(len(self.df), 1)
+        return float((self._row_labels(store) >= 0).mean()) if len(self.df) else 0.0
+
+    @traced("faiss_search")
+    def _vector_search(self, store, query: str, k: int, mask: np.ndarray = None) -> tuple:
+        """
+        Embeds the query (the only remote call) and searches the FAISS index,
+        restricted to the filtered rows through an id selector.
+        In an index of grouped documents, the RERANK_GROUPS (or `k`) best groups
+        are found first; then up to RERANK_ROWS of their rows, those matching the
+        query's words (BM25) first and the others taken in turn from each group,
+        are embedded (through the embedding cache) and ranked by their
+        distance to the query: a second call, for these rows only.
+
+        Returns:
+            tuple: (DataFrame positions, "group: summary" of the groups holding them)
+        """
+        import faiss
+
+        vector = np.asarray([store.embedding_function.embed_query(query)], dtype=np.float32)
+        params = None
+        if mask is not None:
+            selector = faiss.IDSelectorBatch(self._docstore_rows(store, np.flatnonzero(mask)))
+            try:
+                ivf = faiss.extract_index_ivf(store.index)
+                # Exhaustive within the filtered rows, so a narrow filter still finds k matches
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist)
+            except RuntimeError:
+                params = faiss.SearchParameters(sel=selector)
+        _, labels = store.index.search(vector, max(k, RERANK_GROUPS), params=params)
+        labels = labels[0][labels[0] >= 0]
+        fetch = store.docstore.documents if hasattr(store.docstore, "documents") else \
+            lambda labels: [store.docstore.search(store.index_to_docstore_id[label]) for label in labels.tolist()]
+        documents = fetch(labels[:1])
+        grouped = bool(documents) and isinstance(documents[0].metadata.get("row_index"), list)
+        documents += fetch(labels[1:] if grouped else labels[1:k])
+        if not grouped:
+            positions = self.df.index.get_indexer([doc.metadata.get("row_index") for doc in documents])
+            return [pos for pos in positions.tolist() if pos >= 0], []
+
+        # Grouped documents: fetch the rows of the matched groups, then rank them
+        from embedding.embedding_cache import CachedEmbeddings, get_embedding_cache
+
+        members, group_of = [], {}
+        for doc in documents:
+            rows = self.df.index.get_indexer(doc.metadata["row_index"])
+            rows = rows[rows >= 0]
+            if mask is not None:
+                rows = rows[mask[rows]]
+            members.append(rows.tolist())
+            for row in members[-1]:
+                group_of.setdefault(row, f"{doc.metadata['group']}: {doc.metadata['summary']}")
+        candidates = [rows[depth] for depth in range(max(map(len, members))) for rows in members if depth < len(rows)]
+        # A group holds many rows: the ones containing the query's words are ranked first
+        in_groups = np.zeros(len(self.df), dtype=bool)
+        in_groups[candidates] = True
+        terms = [term for term in tokenize(query) if term not in STOPWORDS]
+        lexical = self.bm25.search(terms, max(RERANK_ROWS, k), in_groups)[0].tolist()
+        seen = set(lexical)
+        candidates = (lexical + [row for row in candidates if row not in seen])[:max(RERANK_ROWS, k)]
+        if not candidates:
+            return [], []
+        texts = [doc.page_content for chunk in iter_row_documents(self.df.iloc[candidates], means=self.means) for doc in chunk]
+        embeddings = store.embedding_function
+        embeddings = CachedEmbeddings(embeddings, get_embedding_cache(getattr(embeddings, "model", type(embeddings).__name__)))
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        order = np.argsort(((vectors - vector) ** 2).sum(axis=1), kind="stable")
+        positions = [candidates[i] for i in order[:k].tolist()]
+        # The summaries of the groups the returned rows come from, best first
+        return positions, list(dict.fromkeys(group_of[pos] for pos in positions))
+
+    @traced("retrieval")
+    def retrieve(self, query: str, k: int = 5):
+        """
+        Returns:
+            tuple: (Documents, info) where info holds the "path", the parsed
+            "filters", the number of "matches" for the filters, the number of
+            "embedding_calls", the summaries of the matched "groups" (index of
+            grouped documents) and the elapsed "seconds".
+        """
+        start = time.perf_counter()
+        path, filters, keywords = self.plan(query)
+        mask = self.metadata.mask(filters) if filters else None
+        matches = int(mask.sum()) if mask is not None else len(self.df)
+        embedding_calls = 0
+        groups = []
+
+        if path == "filter":
+            positions = np.flatnonzero(mask)[:k].tolist()
+        elif path == "lexical":
+            positions = self.bm25.search(keywords, k, mask)[0].tolist()
+        else:
+            lexical = self.bm25.search(keywords, FUSION_DEPTH, mask)[0].tolist() if path == "hybrid" else []
+            store = self.get_vectorstore() if matches else None
+            vector = []
+            if store is not None:
+                vector, groups = self._vector_search(store, query, FUSION_DEPTH if lexical else k, mask)
+                embedding_calls = 2 if groups else 1
+            elif matches:
+                path = "lexical"    # No index: fall back to keywords only
+            positions = reciprocal_rank_fusion([lexical, vector], k) if lexical else vector[:k]
+
+        documents = [doc for chunk in iter_row_documents(self.df.iloc[positions], means=self.means) for doc in chunk] if positions else []
+        info = {
+            "path": path,
+            "filters": [describe_filter(flt) for flt in filters],
+            "matches": matches,
+            "embedding_calls": embedding_calls,
+            "groups": groups,
+            "seconds": time.perf_counter() - start,
+        }
+        current_span().set(rows=matches, path=path, embedding_calls=embedding_calls)
+        return documents, info
@@ -0,0 +1,134 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from ingestion.fingerprint import fingerprint_ids, diff_fingerprints
+from embedding.embedding_service import iter_row_documents, generate_global_context, DEFAULT_CONTEXT_PATH
+from embedding.vectorstore import update_vector_store
+from monitoring.tracing import traced, input_rows
+
+# --- Incremental Baseline ---
+# What the last indexed upload looked like: its cleaned rows plus one
+# fingerprint per row (same order), stored next to the index they describe.
+DEFAULT_INDEX_PATH = "faiss_index"
+BASELINE_ROWS_PATH = "data/clean.parquet"
+FINGERPRINTS_FILE = "fingerprints.npy"
+BASELINE_META_FILE = "baseline.json"
+
+def _baseline_paths(index_path: str) -> tuple:
+    return os.path.join(index_path, FINGERPRINTS_FILE), os.path.join(index_path, BASELINE_META_FILE)
+
+def has_baseline(columns=None, index_path: str = DEFAULT_INDEX_PATH, rows_path: str = BASELINE_ROWS_PATH) -> bool:
+    """
+    True if the saved index can be updated incrementally (optionally: for a
+    dataset with these columns).
+    """
+    fingerprints_path, meta_path = _baseline_paths(index_path)
+    paths = [rows_path, fingerprints_path, meta_path, os.path.join(index_path, "index.faiss")]
+    if not all(os.path.exists(path) for path in paths):
+        return False
+    if columns is None:
+        return True
+    with open(meta_path, "r") as f:
+        return json.load(f).get("columns") == list(columns)
+
+def save_baseline(rows: pd.DataFrame, fingerprints: np.ndarray, index_path: str = DEFAULT_INDEX_PATH,
+                  rows_path: str = BASELINE_ROWS_PATH) -> bool:
+    """
+    Records the rows that are now indexed so the next upload can be diffed against them.
+    Returns False (and leaves no baseline) if the rows cannot be stored as Parquet.
+    """
+    fingerprints_path, meta_path = _baseline_paths(index_path)
+    try:
+        rows.to_parquet(rows_path)
+    except Exception as e:
+        print(f"⚠️ Incremental baseline not saved: {e}")
+        for path in (fingerprints_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return False
+    np.save(fingerprints_path, np.asarray(fingerprints, dtype=np.uint64))
+    # The means the indexed rows' "(Above/Below Average)" qualifiers refer to
+    means = rows.select_dtypes(include='number').mean()
+    with open(meta_path, "w") as f:
+        json.dump({"columns": list(rows.columns), "rows": len(rows),
+                   "means": {str(col): float(mean) for col, mean in means.items()}}, f)
+    return True
+
+def _baseline_means(num_cols, index_path: str, rows_path: str) -> pd.Series:
+    """
+    Column means of the baseline rows, read from the Parquet file for
+    baselines saved without them.
+    """
+    with open(_baseline_paths(index_path)[1], "r") as f:
+        means = json.load(f).get("means", {})
+    if all(str(col) in means for col in num_cols):
+        return pd.Series([means[str(col)] for col in num_cols], index=num_cols, dtype=float)
+    return pd.read_parquet(rows_path, columns=list(num_cols)).mean()
+
+def _qualifier_changed(rows: pd.DataFrame, old_means: pd.Series, new_means: pd.Series) -> np.ndarray:
+    """
+    Rows whose "(Above/Below Average)" qualifier of some column differs
+    between the two means (see `iter_row_documents`).
+    """
+    changed = np.zeros(len(rows), dtype=bool)
+    for col in new_means.index:
+        raw = rows[col].to_numpy(dtype=float, na_value=np.nan)
+        old, new = old_means.get(col, np.nan), new_means[col]
+        changed |= (np.where(raw > old, 1, np.where(raw < old, -1, 0)) !=
+                    np.where(raw > new, 1, np.where(raw < new, -1, 0)))
+    return changed
+
+@traced("update_index_incrementally", rows=input_rows)
+def update_index_incrementally(rows: pd.DataFrame, fingerprints: np.ndarray, api_key, report: dict = None,
+                               base_embeddings=None, on_progress=None, index_path: str = DEFAULT_INDEX_PATH,
+                               rows_path: str = BASELINE_ROWS_PATH, context_path: str = DEFAULT_CONTEXT_PATH) -> dict:
+    """
+    Brings the saved index, context and baseline in line with a new upload by
+    embedding only the rows whose fingerprint changed, plus the unchanged rows
+    whose "(Above/Below Average)" qualifiers change with the new means.
+
+    The Global Context is not updated from the changed rows only: its
+    quantiles, distinct counts and top values come from sketches that can
+    merge rows in but cannot take removed rows out, so it is profiled again
+    in full from `rows` (one pass, see `generate_global_context`).
+
+    Args:
+        rows (pd.DataFrame): Cleaned rows of the new upload (see `fingerprint_rows`).
+        fingerprints (np.ndarray): Fingerprint of each row of `rows`.
+        api_key (str): OpenAI API key.
+        report (dict, optional): Filled with the embedding stats (see `update_vector_store`).
+        base_embeddings (Embeddings, optional): Backend to use instead of OpenAIEmbeddings.
+        on_progress (callable, optional): Receives scheduler stats after each batch.
+        index_path (str): Directory of the index and its baseline.
+        rows_path (str): Parquet file of the baseline rows.
+        context_path (str): Global context JSON to rewrite.
+
+    Returns:
+        dict: Number of rows "added", "removed", "unchanged" and "relabelled"
+            (unchanged rows embedded again because an average qualifier changed).
+    """
+    previous_fingerprints = np.load(_baseline_paths(index_path)[0])
+    added_mask, removed_mask = diff_fingerprints(fingerprints, previous_fingerprints)
+    generate_global_context(rows, context_path)
+
+    # Rows are described against the means of the new dataset: unchanged rows whose qualifier
+    # flips with the new means are embedded again, so no document keeps the old baseline
+    num_cols = rows.select_dtypes(include='number').columns
+    means = rows[num_cols].mean()
+    relabel_mask = ~added_mask
+    relabel_mask[relabel_mask] = _qualifier_changed(rows[relabel_mask], _baseline_means(num_cols, index_path, rows_path), means)
+    described = added_mask | relabel_mask
+    ids = fingerprint_ids(fingerprints)
+    documents = iter_row_documents(rows[described], means=means, ids=[ids[pos] for pos in np.flatnonzero(described)])
+    update_vector_store(documents, fingerprint_ids(previous_fingerprints[removed_mask]), api_key,
+                        report=report, base_embeddings=base_embeddings, on_progress=on_progress,
+                        index_path=index_path, row_index=(ids, rows.index.to_numpy()))
+
+    save_baseline(rows, fingerprints, index_path, rows_path)
+    return {
+        "added": int(added_mask.sum()),
+        "removed": int(removed_mask.sum()),
+        "unchanged": int(len(rows) - added_mask.sum()),
+        "relabelled": int(relabel_mask.sum()),
+    }
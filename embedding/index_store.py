@@ -0,0 +1,480 @@
+import os
+import json
+import math
+from collections.abc import Mapping
+import faiss
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+# --- Index Selection ---
+FLAT_MAX_ROWS = 50_000          # Exact search below this many vectors
+IVF_MAX_ROWS = 1_000_000        # IVF (full vectors) below this, quantized IVF above
+MEDIUM_INDEX = "ivf"            # "ivf" or "hnsw"
+LARGE_INDEX = "ivf_sq8"         # "ivf_sq8" (int8), "ivf_fp16" or "ivf_pq"
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivf_sq8", "ivf_fp16", "ivf_pq")
+
+# --- Recall / Speed Settings ---
+DEFAULT_NPROBE = 32             # IVF lists scanned per query (higher = better recall, slower)
+HNSW_M = 32                     # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64             # Candidate list size per query
+PQ_SUBVECTOR_DIMS = 4           # Dimensions per PQ sub-quantizer (8 bits each): 1 byte per 4 dims
+TRAINING_POINTS_PER_LIST = 40   # Training sample size relative to the number of IVF lists
+
+# --- On-Disk Layout ---
+INDEX_FILE = "index.faiss"      # Vectors, labelled by docstore row
+DOCSTORE_FILE = "docstore.arrow"  # Arrow IPC file: page_content + one column per metadata key
+IDS_FILE = "ids.npy"            # Docstore id of every row (row order, removed rows included)
+LOOKUP_FILES = ("sorted_ids.npy", "sorted_rows.npy")  # Live ids sorted, for binary search
+META_FILE = "index.json"
+CONTENT_COLUMN = "__page_content__"
+WRITE_BATCH_ROWS = 65_536
+
+def choose_index_type(n_rows: int) -> str:
+    """
+    Picks the index type for a dataset size.
+    """
+    if n_rows < FLAT_MAX_ROWS:
+        return "flat"
+    if n_rows < IVF_MAX_ROWS:
+        return MEDIUM_INDEX
+    return LARGE_INDEX
+
+def _nlist(n_rows: int) -> int:
+    return int(min(65_536, max(16, 4 * math.sqrt(n_rows))))
+
+def _pq_subquantizers(dim: int) -> int:
+    m = max(1, dim // PQ_SUBVECTOR_DIMS)
+    while dim % m:
+        m -= 1
+    return m
+
+def _empty_index(n_rows: int, dim: int, index_type: str = None, nprobe: int = DEFAULT_NPROBE,
+                 ef_search: int = HNSW_EF_SEARCH):
+    """
+    An empty L2 index of `index_type` (chosen from the row count if omitted)
+    sized for `n_rows` vectors; IVF indexes still have to be trained.
+
+    Returns:
+        tuple: (faiss.Index, settings dict stored in index.json)
+    """
+    index_type = index_type or choose_index_type(n_rows)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}.")
+    settings = {"index_type": index_type, "dim": dim}
+
+    if index_type == "flat":
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    elif index_type == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, HNSW_M)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index = faiss.IndexIDMap2(hnsw)
+        settings["ef_search"] = ef_search
+    else:
+        nlist = min(_nlist(n_rows), max(1, n_rows // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        elif index_type == "ivf_pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), 8)
+        else:
+            qtype = faiss.ScalarQuantizer.QT_8bit if index_type == "ivf_sq8" else faiss.ScalarQuantizer.QT_fp16
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype)
+        settings.update({"nlist": nlist, "nprobe": nprobe})
+    return index, settings
+
+def _training_rows(n_rows: int, settings: dict, seed: int = 0):
+    """
+    Positions of the vectors an IVF index is trained on: a sample of
+    TRAINING_POINTS_PER_LIST per list, or all of them when there are fewer.
+    """
+    sample_size = settings["nlist"] * TRAINING_POINTS_PER_LIST
+    if n_rows <= sample_size:
+        return slice(None)
+    return np.sort(np.random.default_rng(seed).choice(n_rows, sample_size, replace=False))
+
+def build_faiss_index(vectors: np.ndarray, labels: np.ndarray, index_type: str = None, nprobe: int = DEFAULT_NPROBE,
+                      ef_search: int = HNSW_EF_SEARCH, seed: int = 0):
+    """
+    Builds an L2 index of `index_type` (chosen from the row count if omitted)
+    whose search results are the given int64 `labels`.
+
+    Returns:
+        tuple: (faiss.Index, settings dict stored in index.json)
+    """
+    index, settings = _empty_index(len(vectors), vectors.shape[1], index_type, nprobe, ef_search)
+    if not index.is_trained:
+        index.train(vectors[_training_rows(len(vectors), settings, seed)])
+    index.add_with_ids(vectors, labels)
+    set_search_params(index, settings)
+    return index, settings
+
+def set_search_params(index, settings: dict):
+    """
+    Applies the recall settings (nprobe / efSearch) stored with an index.
+    """
+    if "nprobe" in settings:
+        faiss.extract_index_ivf(index).nprobe = min(settings["nprobe"], settings.get("nlist", settings["nprobe"]))
+    if "ef_search" in settings:
+        faiss.downcast_index(index.index).hnsw.efSearch = settings["ef_search"]
+
+def _reconstruct(index, labels: np.ndarray) -> np.ndarray:
+    """
+    Vectors stored under `labels` (approximate for quantized indexes).
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    except RuntimeError:
+        pass
+    return index.reconstruct_batch(np.ascontiguousarray(labels, dtype=np.int64))
+
+# --- Columnar Docstore ---
+def _arrow_column(series: pd.Series) -> pa.Array:
+    """
+    Arrow array of a metadata column; mixed-type columns are stored as text.
+    """
+    try:
+        return pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.array(series.map(lambda value: None if pd.isna(value) else str(value)), type=pa.string())
+
+def documents_to_table(documents) -> pa.Table:
+    """
+    Lays out Documents column by column: page_content plus one column per metadata key.
+    """
+    metadata = pd.DataFrame.from_records([doc.metadata for doc in documents])
+    columns = {CONTENT_COLUMN: pa.array([doc.page_content for doc in documents], type=pa.large_string())}
+    for col in metadata.columns:
+        columns[str(col)] = _arrow_column(metadata[col])
+    return pa.table(columns)
+
+def _concat_tables(old: pa.Table, new: pa.Table) -> pa.Table:
+    try:
+        return pa.concat_tables([old, new], promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Same metadata key with incompatible types: fall back to text for those columns
+        columns = set(old.column_names) | set(new.column_names)
+        def as_text(table):
+            for name in columns & set(table.column_names):
+                if name != CONTENT_COLUMN and (name not in old.column_names or name not in new.column_names
+                                               or old.schema.field(name).type != new.schema.field(name).type):
+                    table = table.set_column(table.column_names.index(name), name, table[name].cast(pa.string()))
+            return table
+        return pa.concat_tables([as_text(old), as_text(new)], promote_options="permissive")
+
+def _unified_schema(schemas) -> pa.Schema:
+    """
+    One schema for docstore slices written separately: columns of all slices,
+    types promoted as `_concat_tables` does (text when they cannot be).
+    """
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            types.setdefault(field.name, []).append(field.type)
+    fields = []
+    for name, kinds in types.items():
+        kinds = [kind for kind in kinds if kind != pa.null()] or [pa.null()]
+        try:
+            fields.append(pa.unify_schemas([pa.schema([(name, kind)]) for kind in kinds], promote_options="permissive").field(0))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    columns = [table[field.name].cast(field.type) if field.name in table.column_names else pa.nulls(len(table), field.type)
+               for field in schema]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def _write_tables(tables, path: str):
+    """
+    Writes docstore slices (in row order) as one Arrow IPC file without holding
+    them all in memory: each slice is spilled to a part file, then the parts
+    are read back memory-mapped and written under their unified schema.
+    """
+    parts, schemas = [], []
+    try:
+        for table in tables:
+            part = f"{path}.part{len(parts)}"
+            parts.append(part)
+            with pa.OSFile(part, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=WRITE_BATCH_ROWS)
+            schemas.append(table.schema)
+        schema = _unified_schema(schemas)
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            for part in parts:
+                with pa.memory_map(part) as source:
+                    writer.write_table(_conform(pa.ipc.open_file(source).read_all(), schema), max_chunksize=WRITE_BATCH_ROWS)
+        os.replace(tmp_path, path)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+def _write_table(table: pa.Table, path: str):
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=WRITE_BATCH_ROWS)
+    os.replace(tmp_path, path)
+
+def _save_array(array: np.ndarray, path: str):
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def _write_lookup(path: str, ids: np.ndarray, live_rows: np.ndarray):
+    """
+    Sorted (id, row) pairs of the live rows, so an id resolves by binary search
+    without loading a dictionary.
+    """
+    live_ids = ids[live_rows]
+    order = np.argsort(live_ids, kind="stable")
+    _save_array(live_ids[order], os.path.join(path, LOOKUP_FILES[0]))
+    _save_array(live_rows[order].astype(np.int64), os.path.join(path, LOOKUP_FILES[1]))
+
+class ColumnarDocstore(Docstore):
+    """
+    Read-only docstore backed by a memory-mapped Arrow IPC file.
+    Opening it maps the file without reading rows; `search` materialises only
+    the rows that are returned. Row positions double as the FAISS labels.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._source = pa.memory_map(os.path.join(path, DOCSTORE_FILE))
+        self.table = pa.ipc.open_file(self._source).read_all()
+        self.ids = np.load(os.path.join(path, IDS_FILE), mmap_mode="r")
+        self._sorted_ids = np.load(os.path.join(path, LOOKUP_FILES[0]), mmap_mode="r")
+        self._sorted_rows = np.load(os.path.join(path, LOOKUP_FILES[1]), mmap_mode="r")
+
+    def __len__(self):
+        return len(self._sorted_rows)
+
+    def live_rows(self) -> np.ndarray:
+        """
+        Sorted row positions that are still indexed.
+        """
+        return np.sort(self._sorted_rows).astype(np.int64)
+
+    def rows(self, ids) -> np.ndarray:
+        """
+        Row positions of `ids` (-1 for ids that are not stored).
+        """
+        keys = np.array([str(doc_id).encode("utf-8") for doc_id in ids], dtype=bytes)
+        if not len(keys) or not len(self._sorted_ids):
+            return np.full(len(keys), -1, dtype=np.int64)
+        found = np.searchsorted(self._sorted_ids, keys).clip(max=len(self._sorted_ids) - 1)
+        hit = self._sorted_ids[found] == keys
+        return np.where(hit, self._sorted_rows[found], -1).astype(np.int64)
+
+    def documents(self, rows) -> list:
+        """
+        Materialises the Documents stored at `rows`.
+        """
+        documents = []
+        for row in np.asarray(rows, dtype=np.int64).tolist():
+            # A one-row slice is zero-copy; `take` would concatenate the record batches
+            record = self.table.slice(row, 1).to_pylist()[0]
+            content = record.pop(CONTENT_COLUMN)
+            documents.append(Document(page_content=content, metadata=record, id=self.ids[row].decode()))
+        return documents
+
+    def search(self, search: str):
+        row = self.rows([search])[0]
+        if row < 0:
+            return f"ID {search} not found."
+        return self.documents([row])[0]
+
+    def delete(self, ids):
+        raise NotImplementedError("ColumnarDocstore is read-only; use `update_index`.")
+
+class RowIdMap(Mapping):
+    """
+    FAISS label -> docstore id, read lazily from the memory-mapped id column.
+    Iterates over live rows only.
+    """
+
+    def __init__(self, docstore: ColumnarDocstore):
+        self.docstore = docstore
+
+    def __getitem__(self, label):
+        if label < 0 or label >= len(self.docstore.ids):
+            raise KeyError(label)
+        return self.docstore.ids[label].decode()
+
+    def __iter__(self):
+        return iter(self.docstore.live_rows().tolist())
+
+    def __len__(self):
+        return len(self.docstore)
+
+# --- Save / Load / Update ---
+def _read_meta(path: str) -> dict:
+    with open(os.path.join(path, META_FILE), "r") as f:
+        return json.load(f)
+
+def _write_meta(path: str, meta: dict):
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+def _store_vectors(vectorstore, labels: np.ndarray) -> np.ndarray:
+    """
+    Vectors of an in-memory LangChain FAISS store at sorted `labels`; a
+    contiguous run (the usual case) is copied in one call.
+    """
+    if len(labels) and labels[-1] - labels[0] + 1 == len(labels):
+        return vectorstore.index.reconstruct_n(int(labels[0]), len(labels))
+    return vectorstore.index.reconstruct_batch(np.ascontiguousarray(labels, dtype=np.int64))
+
+def _store_contents(vectorstore):
+    """
+    (ids, vectors, Documents) of an in-memory LangChain FAISS store, in label
+    order. For small stores (the rows added by an update); `save_index` reads
+    large ones in slices.
+    """
+    labels = np.array(sorted(vectorstore.index_to_docstore_id), dtype=np.int64)
+    ids = [vectorstore.index_to_docstore_id[label] for label in labels.tolist()]
+    documents = [vectorstore.docstore.search(doc_id) for doc_id in ids]
+    return ids, _store_vectors(vectorstore, labels), documents
+
+def save_index(vectorstore, path: str, index_type: str = None, nprobe: int = DEFAULT_NPROBE, ef_search: int = HNSW_EF_SEARCH) -> dict:
+    """
+    Persists an in-memory LangChain FAISS store (as built by the scheduler) as a
+    size-adaptive FAISS index plus a columnar docstore, replacing `save_local`.
+    Vectors and documents are copied WRITE_BATCH_ROWS at a time in label order,
+    so saving needs little memory beyond the store itself.
+
+    Args:
+        vectorstore (FAISS): Store with a flat index and an in-memory docstore.
+        path (str): Target directory (e.g. "faiss_index").
+        index_type (str, optional): One of INDEX_TYPES; chosen from the row count if omitted.
+        nprobe (int): IVF lists scanned per query.
+        ef_search (int): HNSW candidate list size per query.
+
+    Returns:
+        dict: The index settings written to index.json.
+    """
+    labels = np.array(sorted(vectorstore.index_to_docstore_id), dtype=np.int64)
+    ids = np.array([str(vectorstore.index_to_docstore_id[label]) for label in labels.tolist()], dtype=bytes)
+    os.makedirs(path, exist_ok=True)
+    index, settings = _empty_index(len(labels), vectorstore.index.d, index_type, nprobe, ef_search)
+    if not index.is_trained:
+        index.train(_store_vectors(vectorstore, labels[_training_rows(len(labels), settings)]))
+
+    def slices():
+        # Rows are labelled by their position in the docstore
+        for start in range(0, len(labels), WRITE_BATCH_ROWS):
+            block = labels[start:start + WRITE_BATCH_ROWS]
+            index.add_with_ids(_store_vectors(vectorstore, block), np.arange(start, start + len(block), dtype=np.int64))
+            yield documents_to_table([vectorstore.docstore.search(doc_id.decode()) for doc_id in ids[start:start + len(block)]])
+
+    _write_tables(slices(), os.path.join(path, DOCSTORE_FILE))
+    set_search_params(index, settings)
+    _save_array(ids, os.path.join(path, IDS_FILE))
+    _write_lookup(path, ids, np.arange(len(ids), dtype=np.int64))
+    faiss.write_index(index, os.path.join(path, INDEX_FILE))
+    settings.update({"rows": len(ids), "live": len(ids)})
+    _write_meta(path, settings)
+    for legacy in ("index.pkl",):
+        if os.path.exists(os.path.join(path, legacy)):
+            os.remove(os.path.join(path, legacy))
+    return settings
+
+def load_index(path: str, embeddings, mmap: bool = True, **search_settings):
+    """
+    Opens a saved index as a LangChain FAISS store for searching.
+    With `mmap` the vectors and the docstore stay on disk and are paged in on use.
+    `search_settings` (nprobe / ef_search) override the saved recall settings.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    meta = _read_meta(path)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+    set_search_params(index, {**meta, **{k: v for k, v in search_settings.items() if v is not None}})
+    docstore = ColumnarDocstore(path)
+    return FAISS(embeddings, index, docstore, RowIdMap(docstore))
+
+def _relabel(table: pa.Table, ids: np.ndarray, new_ids, labels) -> pa.Table:
+    """
+    Sets the "row_index" column of the rows whose id is in `new_ids` to the matching label.
+    """
+    new_ids = np.array([str(doc_id).encode("utf-8") for doc_id in new_ids], dtype=bytes)
+    labels = np.asarray(labels)
+    if not len(new_ids) or not len(ids):
+        return table
+    order = np.argsort(new_ids, kind="stable")
+    found = np.searchsorted(new_ids[order], ids).clip(max=len(new_ids) - 1)
+    hit = new_ids[order][found] == ids
+    column = table["row_index"].to_numpy(zero_copy_only=False).copy()
+    column[hit] = labels[order][found][hit]
+    return table.set_column(table.column_names.index("row_index"), "row_index", pa.array(column))
+
+def update_index(path: str, added=None, removed_ids=(), row_index=None) -> dict:
+    """
+    Applies a change set to a saved index in place: rows of `removed_ids` are
+    removed from the vectors (their docstore rows become unreachable) and the
+    contents of `added` (an in-memory LangChain FAISS store) are appended.
+    Once removed rows outnumber live ones, the store is rewritten compactly.
+    `row_index` ((ids, labels) arrays) refreshes the "row_index" metadata of
+    rows whose DataFrame label changed between uploads.
+
+    Returns:
+        dict: Number of rows "added" and "deleted".
+    """
+    meta = _read_meta(path)
+    index = faiss.read_index(os.path.join(path, INDEX_FILE))
+    docstore = ColumnarDocstore(path)
+    live_rows = docstore.live_rows()
+    ids = np.asarray(docstore.ids)
+    table = docstore.table
+
+    new_ids, new_vectors, new_documents = _store_contents(added) if added is not None else ([], None, [])
+    removed_rows = docstore.rows(removed_ids)
+    deleted = int((removed_rows >= 0).sum())
+    # Re-added ids replace their old row
+    removed_rows = np.concatenate([removed_rows, docstore.rows(new_ids)])
+    removed_rows = np.unique(removed_rows[removed_rows >= 0])
+    if len(removed_rows):
+        live_rows = np.setdiff1d(live_rows, removed_rows)
+        try:
+            index.remove_ids(removed_rows)
+        except RuntimeError:
+            # HNSW cannot remove vectors: rebuild it from the remaining ones
+            index, _ = build_faiss_index(_reconstruct(index, live_rows), live_rows, meta["index_type"],
+                                         meta.get("nprobe", DEFAULT_NPROBE), meta.get("ef_search", HNSW_EF_SEARCH))
+
+    if new_ids:
+        new_rows = np.arange(len(ids), len(ids) + len(new_ids), dtype=np.int64)
+        index.add_with_ids(np.ascontiguousarray(new_vectors, dtype=np.float32), new_rows)
+        table = _concat_tables(table, documents_to_table(new_documents))
+        ids = np.concatenate([ids, np.array(new_ids, dtype=bytes)])
+        live_rows = np.concatenate([live_rows, new_rows])
+
+    if len(ids) - len(live_rows) > len(live_rows):
+        # Mostly tombstones: rewrite vectors and rows without them
+        vectors = _reconstruct(index, live_rows)
+        index, settings = build_faiss_index(vectors, np.arange(len(live_rows), dtype=np.int64), meta["index_type"],
+                                            meta.get("nprobe", DEFAULT_NPROBE), meta.get("ef_search", HNSW_EF_SEARCH))
+        meta.update(settings)
+        table = table.take(pa.array(live_rows))
+        ids = ids[live_rows]
+        live_rows = np.arange(len(live_rows), dtype=np.int64)
+
+    if row_index is not None and "row_index" in table.column_names:
+        table = _relabel(table, ids, *row_index)
+
+    del docstore
+    _write_table(table, os.path.join(path, DOCSTORE_FILE))
+    _save_array(ids, os.path.join(path, IDS_FILE))
+    _write_lookup(path, ids, live_rows)
+    tmp_path = os.path.join(path, INDEX_FILE + ".tmp")
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, os.path.join(path, INDEX_FILE))
+    meta.update({"rows": len(ids), "live": len(live_rows)})
+    _write_meta(path, meta)
+    return {"added": len(new_ids), "deleted": deleted}
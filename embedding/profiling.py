@@ -0,0 +1,326 @@
+import numpy as np
+import pandas as pd
+
+# --- Sketch Settings ---
+HLL_PRECISION = 12              # 4,096 one-byte registers per column: ~1.6% error on distinct counts
+HLL_BLOCK = 65_536              # Hashes processed at a time
+KLL_K = 200                     # Top compactor size: ~1% rank error on quantiles
+HEAVY_HITTER_CAPACITY = 64      # Misra-Gries counters per column: counts exact to within n / 65
+TOP_VALUES = 5                  # Most frequent values reported per text column
+QUANTILES = (0.25, 0.5, 0.75)
+KLL_DECAY = 2 / 3               # Capacity ratio between consecutive compactor levels
+PROFILE_CHUNK_ROWS = 250_000    # Row slice profiled at a time by `profile_frame`
+
+def _hash_values(series: pd.Series) -> np.ndarray:
+    """
+    64-bit hashes of the non-null numbers or dates. Numbers hash as float64 so
+    int and float chunks of a column agree.
+    """
+    values = series.dropna() if series.hasnans else series
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return pd.util.hash_array(values.to_numpy(dtype="datetime64[ns]").view(np.int64))
+    return pd.util.hash_array(values.to_numpy(dtype=np.float64))
+
+def _value_counts(series: pd.Series):
+    """
+    Distinct non-null values and their counts, from a single factorization
+    (categoricals reuse their codes).
+
+    Returns:
+        tuple: (values, counts, nulls) with values as an object array.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, values = series.cat.codes.to_numpy(), series.cat.categories.to_numpy(dtype=object)
+    else:
+        codes, values = pd.factorize(series, use_na_sentinel=True)
+        values = np.asarray(values, dtype=object)
+    valid = codes >= 0
+    counts = np.bincount(codes[valid], minlength=len(values))
+    present = counts > 0
+    return values[present], counts[present], int(len(codes) - valid.sum())
+
+class HyperLogLog:
+    """
+    Distinct-count sketch: one register per hash bucket holding the longest
+    run of leading zeros seen. Merging is an element-wise maximum.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        if not len(hashes):
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        # Blocks bound the temporaries to a few MB whatever the input length
+        for start in range(0, len(hashes), HLL_BLOCK):
+            block = hashes[start:start + HLL_BLOCK]
+            buckets = (block >> np.uint64(64 - self.precision)).astype(np.intp)
+            # Remaining bits, with a sentinel bit bounding the run of zeros
+            rest = (block << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+            # Leading zeros from the float exponent (values just below 2^64 round up to it)
+            ranks = (65 - np.minimum(np.frexp(rest.astype(np.float64))[1], 64)).astype(np.uint8)
+            np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            # Small range: linear counting over the empty registers
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class KLLSketch:
+    """
+    Quantile sketch (Karnin, Lang & Liberty): a stack of compactors, where
+    level h holds items of weight 2^h. A full level is sorted and every other
+    item (random offset) is promoted, so ~3k values summarize any stream.
+    """
+
+    def __init__(self, k: int = KLL_K, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(int(np.ceil(self.k * KLL_DECAY ** depth)), 2)
+
+    def _compress(self):
+        while True:
+            full = [level for level, items in enumerate(self.levels) if len(items) > self._capacity(level)]
+            if not full:
+                return
+            level = full[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            odd = len(items) % 2
+            promoted = items[odd + int(self._rng.integers(2))::2]
+            self.levels[level] = items[:odd].copy()     # A view would keep the whole sorted buffer alive
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values: np.ndarray):
+        if not len(values):
+            return
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64)])
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+
+    def quantiles(self, qs=QUANTILES) -> list:
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return [float("nan")] * len(qs)
+        weights = np.concatenate([np.full(len(level_items), 2.0 ** level) for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        ranks = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1], side="left")
+        return items[order][np.minimum(ranks, len(items) - 1)].tolist()
+
+class HeavyHitters:
+    """
+    Misra-Gries summary: at most `capacity` (value, count) pairs. When full, the
+    (capacity+1)-th largest count is subtracted from all and non-positive
+    entries dropped, so counts are underestimates by at most n / (capacity + 1).
+    Summaries merge by adding counts and pruning the same way.
+    """
+
+    def __init__(self, capacity: int = HEAVY_HITTER_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.error = 0      # Upper bound of the undercount of every value
+
+    def _prune(self, values, counts):
+        if len(counts) > self.capacity:
+            threshold = np.partition(counts, len(counts) - self.capacity - 1)[len(counts) - self.capacity - 1]
+            keep = counts > threshold
+            values, counts = values[keep], counts[keep] - threshold
+            self.error += int(threshold)
+        return dict(zip(values.tolist(), counts.tolist()))
+
+    def merge_counts(self, values: np.ndarray, counts: np.ndarray):
+        # The chunk alone may hold millions of distinct values: prune it before building dicts
+        chunk = self._prune(values, counts)
+        for value, count in self.counts.items():
+            chunk[value] = chunk.get(value, 0) + count
+        self.counts = self._prune(np.array(list(chunk.keys()), dtype=object), np.array(list(chunk.values()), dtype=np.int64))
+
+    def merge(self, other: "HeavyHitters"):
+        self.error += other.error
+        self.merge_counts(np.array(list(other.counts.keys()), dtype=object), np.array(list(other.counts.values()), dtype=np.int64))
+
+    def top(self, n: int = TOP_VALUES, reliable: bool = False) -> list:
+        """
+        The `n` largest counters. With `reliable`, only values whose count is
+        at least the error bound, i.e. genuinely frequent ones.
+        """
+        top = sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+        return [item for item in top if item[1] >= self.error] if reliable else top
+
+def _column_kind(dtype) -> str:
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        return "numeric"
+    return "text"
+
+class ColumnProfile:
+    """
+    Mergeable summary of one column: row and null counts, a distinct-count
+    sketch, and either exact moments with a quantile sketch (numbers, dates)
+    or heavy hitters (text, categories, booleans).
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.rows = 0
+        self.nulls = 0
+        self.distinct = HyperLogLog()
+        # Chan et al. parallel moments of the non-null values
+        self.count, self.mean, self.m2 = 0, 0.0, 0.0
+        self.min = self.max = None
+        self.quantile_sketch = KLLSketch() if kind != "text" else None
+        self.heavy_hitters = HeavyHitters() if kind == "text" else None
+
+    @classmethod
+    def from_series(cls, series: pd.Series, kind: str = None) -> "ColumnProfile":
+        profile = cls(kind or _column_kind(series.dtype))
+        profile.rows = len(series)
+        if profile.kind == "text":
+            # Distinct counting only needs each value once: hash the uniques, not the rows
+            values, counts, profile.nulls = _value_counts(series)
+            profile.distinct.update(pd.util.hash_array(values, categorize=False))
+            profile.heavy_hitters.merge_counts(values, counts.astype(np.int64))
+            return profile
+
+        profile.distinct.update(_hash_values(series))
+
+        if profile.kind == "datetime":
+            values = series.dropna().to_numpy(dtype="datetime64[ns]").view(np.int64).astype(np.float64)
+        else:
+            values = series.dropna().to_numpy(dtype=np.float64)
+        profile.nulls = profile.rows - len(values)
+        if len(values):
+            profile.count, profile.mean = len(values), float(values.mean())
+            profile.m2 = float(((values - profile.mean) ** 2).sum())
+            profile.min, profile.max = float(values.min()), float(values.max())
+            profile.quantile_sketch.update(values)
+        return profile
+
+    def merge(self, other: "ColumnProfile"):
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        if self.heavy_hitters is not None and other.heavy_hitters is not None:
+            self.heavy_hitters.merge(other.heavy_hitters)
+        if other.count:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+            self.mean += delta * other.count / total
+            self.count = total
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            if self.quantile_sketch is not None and other.quantile_sketch is not None:
+                self.quantile_sketch.merge(other.quantile_sketch)
+
+    def stats(self) -> dict:
+        """
+        describe()-style statistics; datetimes as ISO strings.
+        """
+        if not self.count:
+            return {"count": 0.0}
+        quantiles = self.quantile_sketch.quantiles(QUANTILES)
+        std = float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float("nan")
+        values = {"count": float(self.count), "mean": self.mean, "std": std, "min": self.min,
+                  "25%": quantiles[0], "50%": quantiles[1], "75%": quantiles[2], "max": self.max}
+        if self.kind == "datetime":
+            del values["std"]
+            return {name: value if name == "count" else str(pd.Timestamp(int(value)).floor("s")) for name, value in values.items()}
+        return values
+
+class DatasetProfile:
+    """
+    One-pass profile of a DataFrame or a stream of chunks. `update` sketches a
+    chunk and merges it in; profiles of separately read chunks can be combined
+    with `merge`.
+    """
+
+    def __init__(self):
+        self.n_rows = 0
+        self.columns = {}
+        self.dtypes = {}
+
+    def update(self, chunk: pd.DataFrame) -> "DatasetProfile":
+        chunk_profile = DatasetProfile()
+        chunk_profile.n_rows = len(chunk)
+        for col in chunk.columns:
+            kind = self.columns[col].kind if col in self.columns else None
+            chunk_profile.columns[col] = ColumnProfile.from_series(chunk[col], kind)
+        chunk_profile.dtypes = chunk.dtypes.astype(str).to_dict()
+        return self.merge(chunk_profile)
+
+    def merge(self, other: "DatasetProfile") -> "DatasetProfile":
+        self.n_rows += other.n_rows
+        for col, column in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(column)
+            else:
+                self.columns[col] = column
+        self.dtypes.update(other.dtypes)
+        return self
+
+    def to_context(self) -> dict:
+        """
+        The Global Context dictionary: the keys of the original describe()-based
+        context plus approximate distinct counts and the most frequent values.
+        """
+        numerical, samples, top_values = {}, {}, {}
+        for col, column in self.columns.items():
+            if column.kind == "text":
+                samples[col] = [value for value, _ in column.heavy_hitters.top(TOP_VALUES)]
+                # Near-uniform columns have no meaningful counts: only the samples are kept
+                top_values[col] = [[value, count] for value, count in column.heavy_hitters.top(TOP_VALUES, reliable=True)]
+            else:
+                numerical[col] = column.stats()
+        return {
+            "columns": list(self.columns),
+            "shape": (self.n_rows, len(self.columns)),
+            "missing_values": {col: column.nulls for col, column in self.columns.items()},
+            "data_types": self.dtypes,
+            "numerical_stats": numerical,
+            "categorical_samples": samples,
+            "distinct_counts": {col: column.distinct.estimate() for col, column in self.columns.items()},
+            "top_values": top_values,
+        }
+
+def profile_frame(df: pd.DataFrame, chunk_size: int = PROFILE_CHUNK_ROWS) -> DatasetProfile:
+    """
+    Profiles an in-memory frame in row slices, which bounds the temporary
+    arrays (hashes, float copies, sort buffers) to one slice per column.
+    """
+    profile = DatasetProfile()
+    for start in range(0, max(len(df), 1), chunk_size):
+        profile.update(df.iloc[start:start + chunk_size])
+    return profile
+
+def profile_chunks(chunks) -> DatasetProfile:
+    profile = DatasetProfile()
+    for chunk in chunks:
+        profile.update(chunk)
+    return profile
@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import threading
+
+# --- Shared In-Process Registry ---
+# Streamlit runs every session's script in its own thread; everything cached here
+# is shared by all of them and guarded by per-entry locks.
+DEFAULT_INDEX_PATH = "faiss_index"
+DEFAULT_CONTEXT_PATH = "data/context.json"
+HASH_BLOCK_SIZE = 1 << 20
+
+_entries = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+def _entry_lock(key) -> threading.Lock:
+    with _registry_lock:
+        return _locks.setdefault(key, threading.Lock())
+
+def _signature(files) -> tuple:
+    """
+    Cheap change detector: (mtime_ns, size) of every file. Raises if one is missing.
+    """
+    signature = []
+    for path in files:
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def _content_hash(files) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for path in files:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _secret_key(secret: str) -> str:
+    """
+    Registry keys never hold the raw API key.
+    """
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16]
+
+def _get_or_load(key, files, loader):
+    """
+    Returns the cached value for `key`, reloading it when the backing files changed.
+    The content hash is only computed when mtime/size differ, so a `touch` or a
+    rewrite with identical bytes does not trigger a reload.
+    """
+    with _entry_lock(key):
+        signature = _signature(files)
+        entry = _entries.get(key)
+        if entry is not None and entry["signature"] == signature:
+            return entry["value"]
+        content_hash = _content_hash(files)
+        if entry is not None and entry["hash"] == content_hash:
+            entry["signature"] = signature
+            return entry["value"]
+        value = loader()
+        if value is not None:
+            with _registry_lock:
+                _entries[key] = {"signature": signature, "hash": content_hash, "value": value}
+        return value
+
+def get_vector_store(api_key: str, index_path: str = DEFAULT_INDEX_PATH):
+    """
+    Returns the loaded FAISS index (with its docstore), shared across tool calls
+    and sessions. Reloaded automatically when the index on disk is rebuilt.
+    Returns None if no index exists.
+    """
+    from embedding.vectorstore import load_vector_store
+
+    files = [os.path.join(index_path, name) for name in ("index.faiss", "docstore.arrow", "sorted_ids.npy", "index.json")]
+    if not all(os.path.exists(path) for path in files):
+        return None
+    key = ("faiss", os.path.abspath(index_path), _secret_key(api_key))
+    try:
+        return _get_or_load(key, files, lambda: load_vector_store(api_key, index_path))
+    except FileNotFoundError:
+        # Index deleted between the existence check and the load (pipeline reset)
+        return None
+
+def get_partial_vector_store(api_key: str, checkpoint_path: str):
+    """
+    Returns the rows indexed so far by a build in progress (its checkpoint),
+    reloaded when the checkpoint is rewritten; None when there is no usable checkpoint.
+    """
+    from embedding.embedding_scheduler import PROGRESS_FILE
+    from embedding.vectorstore import load_partial_vector_store
+
+    files = [os.path.join(checkpoint_path, name) for name in ("index.faiss", "index.pkl", PROGRESS_FILE)]
+    if not all(os.path.exists(path) for path in files):
+        return None
+    key = ("faiss_partial", os.path.abspath(checkpoint_path), _secret_key(api_key))
+    try:
+        return _get_or_load(key, files, lambda: load_partial_vector_store(api_key, checkpoint_path))
+    except FileNotFoundError:
+        # Checkpoint removed between the existence check and the load (build complete)
+        return None
+
+def get_global_context(context_path: str = DEFAULT_CONTEXT_PATH):
+    """
+    Returns the parsed global context JSON, or None if it has not been generated.
+    """
+    if not os.path.exists(context_path):
+        return None
+
+    def load():
+        with open(context_path, "r") as f:
+            return json.load(f)
+
+    try:
+        return _get_or_load(("context", os.path.abspath(context_path)), [context_path], load)
+    except FileNotFoundError:
+        return None
+
+def get_chat_llm(api_key: str, model_name: str = "gpt-4o", temperature: float = 0):
+    """
+    Returns a shared ChatOpenAI client (they hold connection pools, so reuse is cheaper).
+    """
+    key = ("llm", model_name, temperature, _secret_key(api_key))
+    with _entry_lock(key):
+        entry = _entries.get(key)
+        if entry is None:
+            from langchain_openai import ChatOpenAI
+            entry = {"value": ChatOpenAI(model_name=model_name, temperature=temperature, openai_api_key=api_key)}
+            with _registry_lock:
+                _entries[key] = entry
+        return entry["value"]
+
+def get_embeddings(api_key: str):
+    """
+    Returns a shared OpenAI embeddings client behind the persistent embedding
+    cache, for embedding questions (a repeated question is never re-embedded).
+    """
+    key = ("embeddings", _secret_key(api_key))
+    with _entry_lock(key):
+        entry = _entries.get(key)
+        if entry is None:
+            from langchain_openai import OpenAIEmbeddings
+            from embedding.embedding_cache import CachedEmbeddings, get_embedding_cache
+            embeddings = OpenAIEmbeddings(openai_api_key=api_key)
+            entry = {"value": CachedEmbeddings(embeddings, get_embedding_cache(embeddings.model))}
+            with _registry_lock:
+                _entries[key] = entry
+        return entry["value"]
+
+def clear_registry(kinds=("faiss", "faiss_partial", "context"), under: str = None):
+    """
+    Drops cached file-backed objects (used on pipeline reset); LLM and embedding clients are kept.
+    With `under`, only objects loaded from files inside that directory are dropped.
+    """
+    prefix = os.path.join(os.path.abspath(under), "") if under else None
+    with _registry_lock:
+        for key in [key for key in _entries if key[0] in kinds]:
+            if prefix is None or key[1].startswith(prefix):
+                del _entries[key]
@@ -1,33 +1,163 @@
 import os
-from langchain_community.vectorstores import FAISS
+import json
 from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
+from embedding.embedding_cache import CachedEmbeddings, get_embedding_cache
+from embedding.embedding_scheduler import embed_documents_concurrently, remove_checkpoint, PROGRESS_FILE
+from embedding.index_store import save_index, load_index, update_index
+from monitoring.tracing import traced, current_span
 
-def build_vector_store(documents, api_key):
+# Partial index of an interrupted build (kept across pipeline resets so it can resume)
+CHECKPOINT_PATH = "faiss_checkpoint"
+
+def _iter_document_batches(documents):
     """
-    Takes a list of Documents, embeds them using OpenAI, 
-    and saves a FAISS index to disk.
+    Normalises the input of `build_vector_store` into non-empty batches.
+    Accepts either a flat list of Documents or an iterable of Document lists
+    (e.g. the generator returned by `iter_row_documents`).
     """
-    if not documents:
-        raise ValueError("No documents to index.")
+    if isinstance(documents, list) and (not documents or isinstance(documents[0], Document)):
+        if documents:
+            yield documents
+        return
+    for batch in documents:
+        if batch:
+            yield batch
 
-    embeddings = OpenAIEmbeddings(openai_api_key=api_key)
-    
-    # Create VectorStore
-    vectorstore = FAISS.from_documents(documents, embeddings)
+@traced("build_vector_store")
+def build_vector_store(documents, api_key, report: dict = None, base_embeddings=None, on_progress=None, resume_key: str = None,
+                       index_type: str = None, index_path: str = "faiss_index", checkpoint_path: str = CHECKPOINT_PATH):
+    """
+    Takes a list of Documents (or an iterable of Document chunks), embeds them
+    using OpenAI, and saves a FAISS index to disk.
+    Documents are streamed into token-budgeted batches embedded concurrently
+    (see `embed_documents_concurrently`), so the full Document list never has
+    to be held in memory and a failed build can resume from its checkpoint.
+    Vectors are served from the persistent embedding cache when the same text
+    was embedded before; only cache misses reach the OpenAI API.
+    The saved index type depends on the row count (see `index_store.choose_index_type`)
+    and documents go to a memory-mapped columnar docstore instead of a pickle.
+
+    Args:
+        documents: List of Documents or iterable of Document lists.
+        api_key (str): OpenAI API key.
+        report (dict, optional): Filled with the cache hits/misses and scheduler stats of this build.
+        base_embeddings (Embeddings, optional): Backend to use instead of
+            OpenAIEmbeddings (e.g. a local fake for offline runs).
+        on_progress (callable, optional): Receives scheduler stats after each batch.
+        resume_key (str, optional): Dataset identity (e.g. file hash); enables
+            checkpointing and resuming an interrupted build.
+        index_type (str, optional): Force an index type ("flat", "ivf", "hnsw",
+            "ivf_sq8", "ivf_fp16", "ivf_pq") instead of choosing by size.
+        index_path (str): Directory the index is saved to.
+        checkpoint_path (str): Directory of the partial index while building.
+    """
+    embeddings = _cached_embeddings(api_key, base_embeddings)
+    vectorstore = _embed(documents, embeddings, report, on_progress, checkpoint_path=checkpoint_path, resume_key=resume_key)
+
+    if vectorstore is None:
+        raise ValueError("No documents to index.")
     
     # Save to disk
-    save_path = "faiss_index"
-    vectorstore.save_local(save_path)
+    settings = save_index(vectorstore, index_path, index_type=index_type)
+    remove_checkpoint(checkpoint_path)
+    if report is not None:
+        report["index_type"] = settings["index_type"]
+    current_span().set(rows=vectorstore.index.ntotal, index_type=settings["index_type"])
     
     return True
 
-def load_vector_store(api_key):
+@traced("update_vector_store")
+def update_vector_store(documents, removed_ids, api_key, report: dict = None, base_embeddings=None, on_progress=None,
+                        index_path: str = "faiss_index", row_index=None):
+    """
+    Applies a row-level change set to the saved FAISS index instead of rebuilding it:
+    the vectors of `removed_ids` are deleted through the docstore ids and only
+    `documents` are embedded and added.
+
+    Args:
+        documents: List of Documents or iterable of Document lists to add (with ids).
+        removed_ids (list): Docstore ids to delete; ids not in the index are ignored.
+        api_key (str): OpenAI API key.
+        report (dict, optional): Filled like in `build_vector_store`, plus "deleted".
+        base_embeddings (Embeddings, optional): Backend to use instead of OpenAIEmbeddings.
+        on_progress (callable, optional): Receives scheduler stats after each batch.
+        index_path (str): Directory of the index to update.
+        row_index (tuple, optional): (ids, labels) of all current rows, so kept
+            rows point to their label in the new DataFrame.
+    """
+    embeddings = _cached_embeddings(api_key, base_embeddings)
+    added = _embed(documents, embeddings, report, on_progress)
+    changes = update_index(index_path, added, removed_ids, row_index=row_index)
+    if report is not None:
+        report["deleted"] = changes["deleted"]
+    return True
+
+def _cached_embeddings(api_key, base_embeddings=None) -> CachedEmbeddings:
     """
-    Loads an existing FAISS index.
+    Wraps the embedding backend (OpenAI unless given) in the persistent embedding cache.
+    """
+    if base_embeddings is None:
+        base_embeddings = OpenAIEmbeddings(openai_api_key=api_key)
+    cache = get_embedding_cache(getattr(base_embeddings, "model", type(base_embeddings).__name__))
+    return CachedEmbeddings(base_embeddings, cache)
+
+def _embed(documents, embeddings: CachedEmbeddings, report: dict = None, on_progress=None, **scheduler_args):
+    """
+    Runs the concurrent scheduler over `documents` and fills `report` with its
+    stats and the cache hits/misses of this run.
+    """
+    cache = embeddings.cache
+    hits, misses = cache.hits, cache.misses
+
+    # Embed batches concurrently; each finished batch is added to the index right away
+    scheduler_stats = {}
+    def track(stats):
+        scheduler_stats.update(stats)
+        if on_progress is not None:
+            on_progress(stats)
+
+    stream = (doc for batch in _iter_document_batches(documents) for doc in batch)
+    vectorstore = embed_documents_concurrently(stream, embeddings, on_progress=track, **scheduler_args)
+
+    if report is not None:
+        report.update({"embedded": 0, "resumed": 0, "batches": 0, "retries": 0, "docs_per_sec": 0.0})
+        report.update(scheduler_stats)
+        report.update({"cache_hits": cache.hits - hits, "cache_misses": cache.misses - misses})
+    return vectorstore
+
+def load_vector_store(api_key, index_path: str = "faiss_index", nprobe: int = None, ef_search: int = None):
+    """
+    Loads an existing FAISS index from disk. Vectors and documents are memory-mapped,
+    so only the rows returned by a search are read.
+    Tools should use `store_registry.get_vector_store`, which keeps it loaded.
+    `nprobe` / `ef_search` override the saved recall settings.
     """
     embeddings = OpenAIEmbeddings(openai_api_key=api_key)
     try:
-        vectorstore = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
+        vectorstore = load_index(index_path, embeddings, nprobe=nprobe, ef_search=ef_search)
         return vectorstore
     except Exception as e:
-        return None
\ No newline at end of file
+        return None
+
+def load_partial_vector_store(api_key, checkpoint_path: str = CHECKPOINT_PATH, embeddings=None):
+    """
+    Loads the checkpoint of a build in progress, so the rows indexed so far
+    can be searched before the build completes. Returns None when there is no
+    checkpoint or it is being rewritten (its files disagree on the row count).
+    Tools should use `store_registry.get_partial_vector_store`.
+    `embeddings` embeds the queries (OpenAIEmbeddings by default).
+    """
+    from langchain_community.vectorstores import FAISS
+
+    if embeddings is None:
+        embeddings = OpenAIEmbeddings(openai_api_key=api_key)
+    try:
+        with open(os.path.join(checkpoint_path, PROGRESS_FILE), "r") as f:
+            indexed = json.load(f)["indexed"]
+        vectorstore = FAISS.load_local(checkpoint_path, embeddings, allow_dangerous_deserialization=True)
+    except Exception:
+        return None
+    if vectorstore.index.ntotal != indexed or len(vectorstore.index_to_docstore_id) != indexed:
+        return None
+    return vectorstore
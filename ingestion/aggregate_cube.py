@@ -0,0 +1,213 @@
+import os
+import threading
+import itertools
+import numpy as np
+import pandas as pd
+from monitoring.tracing import traced, input_rows
+
+# --- Cube Settings ---
+MAX_CUBE_VALUES = 100           # Text columns with more distinct values are not dimensions of the cube
+MAX_CUBE_DIMENSIONS = 8         # Dimensions kept, fewest distinct values first
+MAX_CUBE_CELLS = 20_000         # Pairs of dimensions with more combinations are not precomputed together
+MAX_CUBE_MEASURES = 50          # Numeric columns aggregated
+YEAR_SUFFIX = " (year)"         # The dimension holding the year of the first date column
+ROWS = "count(*)"               # Rows of a cell, whatever their missing values
+CUBOID = "cuboid"               # Which dimensions a cell is grouped by
+CUBOID_SEPARATOR = " × "
+STATS = ("count", "sum", "min", "max")
+
+def _is_text(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object or pd.api.types.is_string_dtype(series)
+
+def year_dimension(column: str) -> str:
+    return f"{column}{YEAR_SUFFIX}"
+
+def measure(stat: str, column: str) -> str:
+    return f"{stat}({column})"
+
+def cube_dimensions(df: pd.DataFrame) -> dict:
+    """
+    The columns rows are grouped by in the cube: text columns with at most
+    MAX_CUBE_VALUES distinct values (the ones questions name values of, e.g.
+    "Region"), and the year of the first date column.
+
+    Returns:
+        dict: Dimension name -> (codes, values), as `pd.factorize` returns them (sorted).
+    """
+    candidates = []
+    for col in df.columns:
+        series = df[col]
+        if not _is_text(series) and not pd.api.types.is_bool_dtype(series):
+            continue
+        # A sample rules out free-text columns without counting every value
+        if series.iloc[:10_000].nunique() > MAX_CUBE_VALUES:
+            continue
+        codes, values = pd.factorize(series, sort=True)
+        if 1 < len(values) <= MAX_CUBE_VALUES:
+            candidates.append((len(values), col, codes, np.asarray(values, dtype=object)))
+    dimensions = {col: (codes, values) for _, col, codes, values in sorted(candidates, key=lambda c: c[0])[:MAX_CUBE_DIMENSIONS]}
+    date = next((col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])), None)
+    if date is not None:
+        codes, values = pd.factorize(df[date].dt.year, sort=True)
+        if len(values):
+            dimensions[year_dimension(date)] = (codes, values.astype(np.int64))
+    return dimensions
+
+@traced("build_cube", rows=input_rows)
+def build_cube(df: pd.DataFrame, report: dict = None) -> pd.DataFrame:
+    """
+    Precomputes the aggregates that simple questions ask for ("average Sales
+    by Region", "row count for 2023"): rows, and the count, sum, min and max
+    of every numeric column, for all rows, by each dimension (see
+    `cube_dimensions`) and by each pair of dimensions with at most
+    MAX_CUBE_CELLS combinations. Rows missing a dimension's value are left
+    out of its cells, as `DataFrame.groupby` does.
+
+    Args:
+        df (pd.DataFrame): The cleaned data.
+        report (dict, optional): Filled with the dimensions, cuboids and cells.
+
+    Returns:
+        pd.DataFrame: One row per cell: the cuboid name, the value of each of
+        its dimensions (empty for the others), ROWS and `measure(stat, column)` columns.
+    """
+    numeric = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+    values = df[numeric[:MAX_CUBE_MEASURES]]
+    dimensions = cube_dimensions(df)
+    cuboids = [()] + [(name,) for name in dimensions]
+    cuboids += [pair for pair in itertools.combinations(dimensions, 2)
+                if len(dimensions[pair[0]][1]) * len(dimensions[pair[1]][1]) <= MAX_CUBE_CELLS]
+
+    frames = []
+    for dims in cuboids:
+        # One integer key per combination of values: grouping by it is much faster than by the columns
+        key = np.zeros(len(df), dtype=np.int64)
+        valid = np.ones(len(df), dtype=bool)
+        for name in dims:
+            codes, uniques = dimensions[name]
+            key = key * len(uniques) + codes
+            valid &= codes >= 0
+        # Rows missing a value are grouped under -1 and dropped, rather than copying the others
+        grouped = values.groupby(np.where(valid, key, -1), sort=True)
+        cells = grouped.agg(list(STATS))
+        cells.columns = [measure(stat, col) for col, stat in cells.columns]
+        cells.insert(0, ROWS, grouped.size())
+        cells = cells[cells.index >= 0]
+        # The dimension values back from the key, last dimension first
+        rest = cells.index.to_numpy()
+        for name in reversed(dims):
+            uniques = dimensions[name][1]
+            cells.insert(0, name, uniques[rest % len(uniques)])
+            rest = rest // len(uniques)
+        cells.insert(0, CUBOID, CUBOID_SEPARATOR.join(dims))
+        frames.append(cells.reset_index(drop=True))
+    cube = pd.concat(frames, ignore_index=True)
+    for name in dimensions:
+        if name.endswith(YEAR_SUFFIX):
+            cube[name] = cube[name].astype("Int64")
+    if report is not None:
+        report.update(dimensions=list(dimensions), cuboids=len(cuboids), cells=len(cube), measures=values.shape[1])
+    return cube
+
+def save_cube(df: pd.DataFrame, cube_path: str, report: dict = None) -> str:
+    """
+    Builds the cube of `df` (see `build_cube`) and writes it as Parquet, atomically.
+    """
+    cube = build_cube(df, report=report)
+    os.makedirs(os.path.dirname(cube_path) or ".", exist_ok=True)
+    tmp_path = f"{cube_path}.{threading.get_ident()}.tmp"
+    cube.to_parquet(tmp_path)
+    os.replace(tmp_path, cube_path)
+    return cube_path
+
+# --- Queries ---
+class AggregateCube:
+    """
+    Answers aggregates from the precomputed cells of `build_cube` instead of
+    scanning the rows: the cuboid grouped by exactly the dimensions a question
+    groups and filters by is selected, its cells filtered, and their counts,
+    sums, minimums and maximums combined.
+    """
+
+    def __init__(self, cells: pd.DataFrame):
+        self.cuboids = {}
+        for name, frame in cells.groupby(CUBOID, sort=False):
+            dims = frozenset(name.split(CUBOID_SEPARATOR)) if name else frozenset()
+            self.cuboids[dims] = frame.reset_index(drop=True)
+        self.dimensions = set().union(*self.cuboids)
+        self.rows = int(self.cuboids[frozenset()][ROWS].sum())
+        self.measures = {col[len("sum("):-1] for col in cells.columns if col.startswith("sum(")}
+
+    @classmethod
+    def load(cls, cube_path: str, rows: int = None):
+        """
+        The cube stored at `cube_path`, or None if there is none or it was built from
+        a different number of rows than `rows` (the data changed since).
+        """
+        if not os.path.exists(cube_path):
+            return None
+        cube = cls(pd.read_parquet(cube_path))
+        return cube if rows is None or cube.rows == rows else None
+
+    def _dimension(self, flt: dict):
+        if flt["op"] == "in":
+            return flt["column"]
+        if flt["op"] == "year":
+            return year_dimension(flt["column"])
+        return None
+
+    def _cells(self, group, filters):
+        dims = {self._dimension(flt) for flt in filters}
+        if None in dims:
+            return None
+        cells = self.cuboids.get(frozenset(dims | ({group} if group else set())))
+        if cells is None:
+            return None
+        keep = np.ones(len(cells), dtype=bool)
+        for flt in filters:
+            dim = self._dimension(flt)
+            keep &= cells[dim].isin(flt["value"] if flt["op"] == "in" else [flt["value"]]).to_numpy()
+        return cells[keep]
+
+    def covers(self, agg: str, metric: str, group: str, filters: list) -> bool:
+        return (agg in ("count", "sum", "mean", "min", "max") and (agg == "count" or metric in self.measures)
+                and (group is None or group in self.dimensions) and self._cells(group, filters) is not None)
+
+    def query(self, agg: str, metric: str = None, group: str = None, filters: list = ()):
+        """
+        Args:
+            agg (str): "count" (rows), "sum", "mean", "min" or "max" of `metric`.
+            metric (str, optional): The numeric column aggregated.
+            group (str, optional): The dimension results are grouped by.
+            filters (list): `MetadataIndex.parse` filters: "in" on text dimensions or "year" on the date column.
+
+        Returns:
+            tuple: (value, or a Series by group value; matching rows), or None
+            when the cube does not hold the question's dimensions or measure.
+        """
+        if not self.covers(agg, metric, group, filters):
+            return None
+        cells = self._cells(group, filters)
+        rows = int(self._cells(None, filters)[ROWS].sum())
+        if agg == "count":
+            columns = {"value": ROWS}
+            how = {"value": "sum"}
+        elif agg == "mean":
+            columns = {"sum": measure("sum", metric), "count": measure("count", metric)}
+            how = {"sum": "sum", "count": "sum"}
+        else:
+            columns = {"value": measure(agg, metric)}
+            how = {"value": agg}
+        frame = cells[list(columns.values())].set_axis(list(columns), axis=1)
+        if group is not None:
+            frame = frame.groupby(cells[group].to_numpy(), sort=True).agg(how)
+        else:
+            frame = frame.agg(how).to_frame().T
+        if agg == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                value = frame["sum"] / frame["count"].where(frame["count"] > 0)
+        else:
+            value = frame["value"]
+        if agg == "count":
+            value = value.astype(np.int64)
+        return (value.iloc[0] if group is None else value), rows
@@ -1,9 +1,24 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
+from monitoring.tracing import traced, result_rows
 
+# --- Streaming Ingestion Settings ---
+DEFAULT_CHUNK_SIZE = 100_000    # Rows per chunk yielded by `iter_data_chunks`
+DEFAULT_SAMPLE_ROWS = 50_000    # Rows read up front to infer the schema
+MAX_CATEGORIES = 1_000          # Above this many distinct values a column stays `object`
+CATEGORY_RATIO = 0.5            # Sample unique/rows ratio below which strings become `category`
+
+ARROW_EXTENSIONS = ['.parquet', '.feather', '.arrow']
+
+@traced("load_data", rows=result_rows)
 def load_data(file_path: str) -> pd.DataFrame:
     """
-    Loads a dataset from a given file path (CSV or Excel).
+    Loads a dataset from a given file path (CSV, Excel, Parquet or Feather).
+    Parquet and Feather files are memory-mapped and converted through Arrow
+    without an intermediate copy.
     
     Args:
         file_path (str): Path to the file.
@@ -25,10 +40,233 @@ def load_data(file_path: str) -> pd.DataFrame:
             df = pd.read_csv(file_path)
         elif file_ext in ['.xlsx', '.xls']:
             df = pd.read_excel(file_path)
+        elif file_ext in ARROW_EXTENSIONS:
+            df = _arrow_to_pandas(_read_arrow_table(file_path, file_ext))
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
             
         return df
         
     except Exception as e:
-        raise Exception(f"Error loading data: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error loading data: {str(e)}")
+
+# --- Arrow Helpers ---
+def _read_arrow_table(file_path: str, file_ext: str) -> pa.Table:
+    """
+    Opens a Parquet or Feather file as a memory-mapped Arrow table.
+    """
+    if file_ext == '.parquet':
+        return pq.read_table(file_path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(file_path, 'r')).read_all()
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    """
+    Converts Arrow data to pandas reusing the Arrow buffers where possible
+    (one block per column, no consolidation copy).
+    """
+    return table.to_pandas(split_blocks=True)
+
+def _iter_arrow_chunks(file_path: str, file_ext: str, chunk_size: int):
+    """
+    Yields DataFrames of at most `chunk_size` rows from a Parquet or Feather file.
+    """
+    if file_ext == '.parquet':
+        batches = pq.ParquetFile(file_path, memory_map=True).iter_batches(batch_size=chunk_size)
+    else:
+        batches = _read_arrow_table(file_path, file_ext).to_batches(max_chunksize=chunk_size)
+
+    offset = 0
+    for batch in batches:
+        chunk = _arrow_to_pandas(pa.Table.from_batches([batch]))
+        # Files without a stored index restart at 0 for every batch; keep labels global
+        if isinstance(chunk.index, pd.RangeIndex) and chunk.index.start == 0 and offset:
+            chunk.index = chunk.index + offset
+        offset += len(chunk)
+        yield chunk
+
+# --- Schema Inference ---
+def _int_dtype_for(low, high) -> np.dtype:
+    """
+    Smallest signed integer dtype that holds [low, high].
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+def _is_float32_lossless(values: np.ndarray) -> bool:
+    """
+    True if every value survives a float64 -> float32 -> float64 round trip.
+    """
+    with np.errstate(over='ignore'):
+        return bool(np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True))
+
+def _compact_dtype(series: pd.Series, category_ratio: float = None):
+    """
+    Returns the most compact lossless dtype for a single column.
+    `category_ratio` only applies when inferring from a sample; widening a
+    known categorical column only checks the cardinality cap.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return dtype if len(dtype.categories) <= MAX_CATEGORIES else np.dtype(object)
+    if dtype.kind in 'iu' and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        if series.empty or (dtype.kind == 'u' and series.max() > np.iinfo(np.int64).max):
+            return dtype
+        return _int_dtype_for(series.min(), series.max())
+    if dtype.kind == 'f' and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        if dtype.itemsize <= 4:
+            return dtype
+        return np.dtype(np.float32) if _is_float32_lossless(series.to_numpy()) else np.dtype(np.float64)
+    if dtype == object or pd.api.types.is_string_dtype(dtype):
+        uniques = series.dropna().unique()
+        if len(uniques) <= MAX_CATEGORIES and (category_ratio is None or len(uniques) <= category_ratio * len(series)):
+            return pd.CategoricalDtype(uniques)
+        return np.dtype(object)
+    return dtype
+
+def _merge_dtypes(current, incoming):
+    """
+    Widens `current` just enough to also hold values of dtype `incoming`.
+    """
+    if isinstance(current, pd.CategoricalDtype) or isinstance(incoming, pd.CategoricalDtype):
+        if isinstance(current, pd.CategoricalDtype) and isinstance(incoming, pd.CategoricalDtype):
+            categories = current.categories.append(incoming.categories.difference(current.categories))
+            if len(categories) <= MAX_CATEGORIES:
+                return pd.CategoricalDtype(categories)
+        return np.dtype(object)
+    if current == incoming:
+        return current
+    if getattr(current, 'kind', None) in 'iuf' and getattr(incoming, 'kind', None) in 'iuf':
+        return np.promote_types(current, incoming)
+    return np.dtype(object)
+
+def infer_schema(sample: pd.DataFrame) -> dict:
+    """
+    Infers compact dtypes from a sample of the data.
+    
+    - Integers are downcast to the smallest width holding the sample range.
+    - Floats become float32 when the round trip is exact.
+    - Low-cardinality strings become `category`.
+    
+    Args:
+        sample (pd.DataFrame): A bounded sample of the dataset.
+        
+    Returns:
+        dict: Mapping of column name to target dtype.
+    """
+    return {col: _compact_dtype(sample[col], CATEGORY_RATIO) for col in sample.columns}
+
+def widen_schema(schema: dict, chunk: pd.DataFrame) -> dict:
+    """
+    Returns a copy of `schema` widened so every value in `chunk` fits losslessly.
+    Columns already stored as `object` are not re-inspected.
+    """
+    widened = dict(schema)
+    for col in chunk.columns:
+        current = widened.get(col)
+        if current is None:
+            widened[col] = _compact_dtype(chunk[col], CATEGORY_RATIO)
+        elif current != object:
+            widened[col] = _merge_dtypes(current, _compact_dtype(chunk[col]))
+    return widened
+
+def apply_schema(chunk: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """
+    Casts the columns of `chunk` to the dtypes in `schema`.
+    The schema must already cover the chunk (see `widen_schema`).
+    """
+    for col, dtype in schema.items():
+        if col in chunk.columns and chunk[col].dtype != dtype:
+            chunk[col] = chunk[col].astype(dtype)
+    return chunk
+
+# --- Streaming Ingestion ---
+@traced("load_data_chunks")
+def iter_data_chunks(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, sample_rows: int = DEFAULT_SAMPLE_ROWS):
+    """
+    Reads a dataset in bounded chunks with compact, lossless dtypes.
+    The schema is inferred from a sample and widened as later chunks need it,
+    so a file larger than RAM can be processed chunk by chunk.
+    Excel files cannot be read incrementally; they are loaded once and sliced.
+    
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int): Maximum rows per chunk.
+        sample_rows (int): Rows used to infer the initial schema (CSV only,
+            other formats use the first chunk).
+        
+    Yields:
+        pd.DataFrame: Chunks carrying the original row labels.
+        
+    Raises:
+        FileNotFoundError: If file doesn't exist.
+        ValueError: If file format is not supported.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"The file {file_path} does not exist.")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer.")
+
+    file_ext = os.path.splitext(file_path)[1].lower()
+    schema = None
+
+    if file_ext == '.csv':
+        schema = infer_schema(pd.read_csv(file_path, nrows=sample_rows))
+        # Keep string columns as strings in every chunk instead of re-guessing per chunk
+        string_cols = {col: object for col, dtype in schema.items() if dtype == object or isinstance(dtype, pd.CategoricalDtype)}
+        raw_chunks = pd.read_csv(file_path, chunksize=chunk_size, dtype=string_cols)
+    elif file_ext in ['.xlsx', '.xls']:
+        df = pd.read_excel(file_path)
+        raw_chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    elif file_ext in ARROW_EXTENSIONS:
+        raw_chunks = _iter_arrow_chunks(file_path, file_ext, chunk_size)
+    else:
+        raise ValueError(f"Unsupported file format: {file_ext}")
+
+    for chunk in raw_chunks:
+        schema = infer_schema(chunk) if schema is None else widen_schema(schema, chunk)
+        yield apply_schema(chunk.copy() if file_ext in ['.xlsx', '.xls'] else chunk, schema)
+
+def concat_chunks(chunks) -> pd.DataFrame:
+    """
+    Concatenates chunks into one DataFrame, unifying categorical columns whose
+    categories grew between chunks so they stay `category` instead of `object`.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    for col in chunks[0].columns:
+        dtypes = [chunk[col].dtype for chunk in chunks]
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            merged = dtypes[0]
+            for dtype in dtypes[1:]:
+                merged = _merge_dtypes(merged, dtype)
+            for chunk in chunks:
+                chunk[col] = chunk[col].astype(merged)
+    return pd.concat(chunks)
+
+def write_parquet(chunks, file_path: str) -> str:
+    """
+    Streams DataFrame chunks into a single Parquet file (row labels preserved).
+    All chunks must share the first chunk's column types.
+    
+    Returns:
+        str: The path written.
+    """
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=True)
+            if writer is None:
+                writer = pq.ParquetWriter(file_path, table.schema)
+            elif not table.schema.equals(writer.schema):
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("No data to write.")
+    return file_path
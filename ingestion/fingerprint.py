@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# --- Fingerprint Settings ---
+FINGERPRINT_DECIMALS = 9     # Floats are rounded so re-exported values hash the same
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Canonical form of the raw values used for hashing: floats rounded,
+    text stripped, categoricals reduced to their values.
+    """
+    normalized = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_float_dtype(series):
+            series = series.round(FINGERPRINT_DECIMALS)
+        elif isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object or pd.api.types.is_string_dtype(series):
+            series = series.astype(str).str.strip().where(series.notna())
+        normalized[col] = series
+    return pd.DataFrame(normalized, index=df.index)
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """
+    One 64-bit hash per row, computed from the normalized values only (the
+    index is ignored), so the same record hashes the same in every export.
+
+    Returns:
+        np.ndarray: uint64 array aligned with the rows of `df`.
+    """
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(_normalize(df), index=False).to_numpy(dtype=np.uint64)
+
+def fingerprint_rows(raw_df: pd.DataFrame, clean_df: pd.DataFrame):
+    """
+    Fingerprints the cleaned rows by the raw values they came from, so filled
+    values (which depend on the whole dataset) never change a row's identity.
+    Rows that normalize to the same fingerprint are kept once.
+
+    Args:
+        raw_df (pd.DataFrame): DataFrame as loaded, before preprocessing.
+        clean_df (pd.DataFrame): Output of `preprocess_data(raw_df)`.
+
+    Returns:
+        tuple: (rows, fingerprints) - the unique cleaned rows and their uint64 fingerprints.
+    """
+    if raw_df.index.is_unique:
+        positions = raw_df.index.get_indexer(clean_df.index)
+        fingerprints = row_fingerprints(raw_df)[positions]
+    else:
+        fingerprints = row_fingerprints(clean_df)
+
+    _, first = np.unique(fingerprints, return_index=True)
+    if len(first) < len(fingerprints):
+        first.sort()
+        return clean_df.iloc[first], fingerprints[first]
+    return clean_df, fingerprints
+
+def fingerprint_ids(fingerprints) -> list:
+    """
+    Docstore ids of fingerprinted rows.
+    """
+    return [f"fp-{fp:016x}" for fp in np.asarray(fingerprints, dtype=np.uint64).tolist()]
+
+def diff_fingerprints(new: np.ndarray, old: np.ndarray):
+    """
+    Compares the fingerprints of a new upload with the stored ones.
+
+    Returns:
+        tuple: (added, removed) boolean masks over `new` and `old` respectively.
+    """
+    added = ~np.isin(new, old)
+    removed = ~np.isin(old, new)
+    return added, removed
@@ -0,0 +1,403 @@
+import os
+import time
+import shutil
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from monitoring.tracing import get_tracer
+
+# --- Job Settings ---
+DEFAULT_JOB_WORKERS = 2         # Pipelines running at once; later uploads wait in the queue
+JOB_HISTORY = 200               # Finished jobs kept, so sessions can still read how theirs ended
+STAGES = (
+    ("load", "📥 Loading data"),
+    ("clean", "🧹 Cleaning & Preprocessing"),
+    ("context", "🌍 Generating Global Context"),
+    ("index", "🧠 Building Knowledge Base"),
+)
+# How far the data is usable, in order: nothing yet, cleaned frame, partial index, complete
+READINESS = ("none", "data", "partial", "ready")
+
+class JobCancelled(Exception):
+    """
+    Raised inside a pipeline, at its next stage or embedding batch, once no session follows it.
+    """
+
+class IngestionJob:
+    """
+    One upload pipeline running in the background, independent of the
+    Streamlit script runs that follow it. Stages publish their status, log
+    lines and the indexing progress as they go; sessions read `snapshot()`
+    on every rerun. `readiness` tells how much the agent can already use.
+    """
+
+    def __init__(self, dataset_hash: str, file_name: str, session_id: str):
+        self.job_id = uuid.uuid4().hex
+        self.dataset_hash = dataset_hash
+        self.file_name = file_name
+        self.sessions = {session_id}
+        self.status = "queued"          # queued, running, done, failed, cancelled
+        self.readiness = "none"
+        self.stages = {name: {"label": label, "status": "pending", "seconds": None} for name, label in STAGES}
+        self.log_lines = []
+        self.progress = {"indexed": 0, "total": None, "docs_per_sec": 0.0}
+        self.error = None
+        self.df = None
+        self.created = time.time()
+        self.finished = None
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled("No session follows this upload any more")
+
+    def log(self, line: str):
+        with self._lock:
+            self.log_lines.append(line)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Marks stage `name` running for the duration of the block, then done (or failed).
+        """
+        self.check()
+        entry = self.stages[name]
+        self.log(f"{entry['label']}...")
+        start = time.perf_counter()
+        with self._lock:
+            entry["status"] = "running"
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                entry.update(status="failed", seconds=time.perf_counter() - start)
+            raise
+        with self._lock:
+            entry.update(status="done", seconds=time.perf_counter() - start)
+
+    def publish_frame(self, df):
+        """
+        Shares the cleaned frame: quantitative questions can be answered from now on.
+        """
+        self.df = df
+        self.advance("data")
+        with self._lock:
+            self.progress["total"] = len(df)
+
+    def advance(self, readiness: str):
+        with self._lock:
+            if READINESS.index(readiness) > READINESS.index(self.readiness):
+                self.readiness = readiness
+
+    def close(self, status: str, error: str = None):
+        with self._lock:
+            self.status, self.error, self.finished = status, error, time.time()
+            for entry in self.stages.values():
+                if entry["status"] == "pending":
+                    entry["status"] = "skipped"
+
+    def update_progress(self, **values):
+        with self._lock:
+            self.progress.update(values)
+
+    def snapshot(self) -> dict:
+        """
+        A consistent copy of the job's state for the UI.
+        """
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "file_name": self.file_name,
+                "status": self.status,
+                "readiness": self.readiness,
+                "stages": [{"name": name, **entry} for name, entry in self.stages.items()],
+                "log": list(self.log_lines),
+                "progress": dict(self.progress),
+                "error": self.error,
+                "seconds": (self.finished or time.time()) - self.created,
+            }
+
+class JobExecutor:
+    """
+    Runs upload pipelines on a small pool of background threads, so they
+    outlive the script run (and the browser tab) that started them.
+
+    Jobs are shared by content: a session uploading a file that is already
+    being processed follows the running job instead of starting another.
+    A job that no session follows any more is cancelled at its next stage
+    or embedding batch; the index checkpoint lets a later upload resume it.
+    """
+
+    def __init__(self, workers: int = DEFAULT_JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingestion")
+        self._jobs = OrderedDict()      # job id -> job, oldest first
+        self._active = {}               # dataset hash -> its queued or running job
+        self._lock = threading.Lock()
+
+    def submit(self, dataset_hash: str, file_name: str, session_id: str, pipeline, *args, **kwargs) -> IngestionJob:
+        """
+        Starts `pipeline(job, *args, **kwargs)` in the background for
+        `dataset_hash`, or adds the session to the job already processing it.
+        """
+        with self._lock:
+            job = self._active.get(dataset_hash)
+            if job is not None and not job.cancelled.is_set():
+                job.sessions.add(session_id)
+                return job
+            job = IngestionJob(dataset_hash, file_name, session_id)
+            self._jobs[job.job_id] = job
+            self._active[dataset_hash] = job
+            while len(self._jobs) > JOB_HISTORY:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.active:
+                    break
+                self._jobs.popitem(last=False)
+        self._pool.submit(self._run, job, pipeline, args, kwargs)
+        return job
+
+    def _run(self, job: IngestionJob, pipeline, args, kwargs):
+        job.status = "running"
+        try:
+            pipeline(job, *args, **kwargs)
+            job.close("done")
+        except JobCancelled:
+            job.close("cancelled")
+        except Exception as e:
+            traceback.print_exc()
+            job.close("failed", str(e))
+        finally:
+            # Sessions attach the shared frame from the workspace manager
+            job.df = None
+            with self._lock:
+                if self._active.get(job.dataset_hash) is job:
+                    del self._active[job.dataset_hash]
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def detach(self, job_id: str, session_id: str):
+        """
+        The session moved on (new upload or reset): the job is cancelled if no other session follows it.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.sessions.discard(session_id)
+            if not job.sessions and job.active:
+                job.cancelled.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "queued": sum(job.status == "queued" for job in jobs),
+            "running": sum(job.status == "running" for job in jobs),
+            "failed": sum(job.status == "failed" for job in jobs),
+        }
+
+# --- Upload Pipeline ---
+def run_upload_pipeline(job: IngestionJob, workspaces, upload_path: str, api_key: str, streaming: bool = False,
+                        incremental: bool = False, fingerprint: bool = False, source_hash: str = None,
+                        grouped: bool = False, base_embeddings=None):
+    """
+    The upload pipeline (load, clean, global context, knowledge base), run as
+    a background job. The cleaned frame is published as soon as it exists and
+    the index is searchable from its first checkpoint (see `IngestionJob.readiness`).
+
+    Args:
+        job (IngestionJob): The job publishing the pipeline's status.
+        workspaces (WorkspaceManager): Owner of the dataset's artifacts.
+        upload_path (str): The raw upload (see `Workspace.upload_path`), or a directory of files
+            whose sheets are combined into one dataset (see `Workspace.uploads_dir`); removed once processed.
+        api_key (str): OpenAI API key.
+        streaming (bool): Clean, profile and index in bounded chunks, with the frame memory-mapped (large files).
+        incremental (bool): Update the index of `source_hash` from the changed rows.
+        fingerprint (bool): Keep row fingerprints, so a later upload can be incremental.
+        source_hash (str, optional): Dataset the incremental update starts from.
+        grouped (bool): Index datasets of GROUPED_MIN_ROWS rows or more as grouped documents
+            (fewer tokens and a smaller index, but less precise retrieval than one document per row).
+        base_embeddings (Embeddings, optional): Backend to use instead of OpenAIEmbeddings.
+    """
+    from ingestion.workspace import Workspace
+    from ingestion.data_ingestion import load_data, iter_data_chunks, write_parquet
+    from ingestion.multi_source import load_sources, save_related_tables
+    from ingestion.preprocessing import preprocess_data, preprocess_chunks
+    from ingestion.fingerprint import fingerprint_rows, fingerprint_ids
+    from ingestion.aggregate_cube import save_cube
+    from embedding.embedding_service import (iter_row_documents, iter_chunk_documents, generate_global_context,
+                                             generate_global_context_from_chunks)
+    from embedding.grouped_documents import iter_group_documents, GROUPED_MIN_ROWS
+    from embedding.vectorstore import build_vector_store
+    from embedding.incremental_index import has_baseline, save_baseline, update_index_incrementally
+    from embedding.embedding_scheduler import PROGRESS_FILE
+    from embedding.store_registry import clear_registry
+
+    # Paths of the shared artifacts, independent of the sessions following the job
+    build = Workspace(workspaces, f"job-{job.job_id}")
+    combine = os.path.isdir(upload_path)
+    # Files another session is still writing (".part") are not part of the upload yet
+    upload_paths = sorted(os.path.join(upload_path, name) for name in os.listdir(upload_path)
+                          if not name.endswith(".part")) if combine else [upload_path]
+    file_mb = sum(os.path.getsize(path) for path in upload_paths) / (1024 * 1024)
+    with workspaces.dataset_lock(job.dataset_hash), get_tracer().span("upload", file_mb=round(file_mb, 1)) as upload_span:
+        try:
+            job.check()
+            reuse = workspaces.is_ready(job.dataset_hash)
+            workspaces.assign(build, job.dataset_hash, source_hash=source_hash if incremental and not reuse else None)
+            upload_span.set(reuse=reuse, incremental=incremental, streaming=streaming)
+
+            index_report, groups_report = {}, {}
+            def show_index_progress(stats):
+                job.check()
+                job.update_progress(indexed=stats["embedded"] + stats["resumed"], docs_per_sec=stats["docs_per_sec"],
+                                    retries=stats["retries"])
+                if groups_report:
+                    # Grouped documents: progress counts documents, not rows
+                    job.update_progress(total=groups_report["documents"], unit="groups")
+                if os.path.exists(os.path.join(build.checkpoint_path, PROGRESS_FILE)):
+                    job.advance("partial")
+
+            def precompute_aggregates(df):
+                # For the intent router: simple aggregate questions are answered from it without the agent
+                cube_report = {}
+                start = time.perf_counter()
+                try:
+                    save_cube(df, build.cube_path, report=cube_report)
+                except Exception as e:
+                    job.log(f"⚠️ Aggregate cube skipped, questions are answered from the rows: {e}")
+                    return
+                job.log(f"🧊 Precomputed {cube_report['cells']:,} aggregates by {', '.join(cube_report['dimensions']) or 'all rows'} "
+                        f"({time.perf_counter() - start:.1f}s)")
+
+            fingerprints = None
+            if reuse:
+                # Built by an earlier job while this one waited in the queue
+                job.log("♻️ Reusing the cleaned data, Global Context & Knowledge Base of an identical upload...")
+                clean_df = workspaces.load_frame(build)
+                job.publish_frame(clean_df)
+                if not os.path.exists(build.cube_path):
+                    precompute_aggregates(clean_df)
+                documents = None
+            elif streaming and not combine:
+                # Large file: cleaned chunk by chunk into Parquet; the context and the row documents are built from
+                # its chunks, and the frame the agent uses is memory-mapped from the Arrow copy instead of loaded
+                job.log("📥 Streaming data in chunks...")
+                with job.stage("clean"):
+                    clean_path = write_parquet(preprocess_chunks(lambda: iter_data_chunks(upload_path)), build.clean_path)
+                    clean_df = workspaces.map_clean(build)
+                job.publish_frame(clean_df)
+                precompute_aggregates(clean_df)
+                with job.stage("context"):
+                    generate_global_context_from_chunks(iter_data_chunks(clean_path), build.context_path)
+                if grouped and len(clean_df) >= GROUPED_MIN_ROWS:
+                    documents = iter_group_documents(clean_df, report=groups_report)
+                else:
+                    documents = iter_chunk_documents(lambda: iter_data_chunks(clean_path))
+            else:
+                related = {}
+                with job.stage("load"):
+                    if combine:
+                        # Several files, or every sheet of a workbook: parsed in parallel, then stacked / joined
+                        sources_report = {}
+                        raw_df, related = load_sources(upload_paths, cache_dir=workspaces.sheets_dir, report=sources_report)
+                        stacked = sum(len(names) for names in sources_report["stacked"])
+                        joined = "".join(f", {name} joined on {key}" for name, key in sources_report["joined"].items())
+                        job.log(f"📚 Combined {sources_report['sources']} sheets ({sources_report['cached']} from cache): "
+                                f"{stacked} stacked{joined}, {len(related)} kept as related tables")
+                    else:
+                        raw_df = load_data(upload_path)
+                with job.stage("clean"):
+                    preprocess_report = {}
+                    clean_df = preprocess_data(raw_df, report=preprocess_report)
+                    if related:
+                        names = save_related_tables(related, build.tables_dir)
+                        job.log(f"🔗 Related tables for SQL: {', '.join(names)}")
+                    if preprocess_report:
+                        slowest = max(preprocess_report, key=lambda col: preprocess_report[col]["seconds"])
+                        job.log(f"⏱️ Typed {len(preprocess_report)} columns in {sum(c['seconds'] for c in preprocess_report.values()):.2f}s (slowest: {slowest})")
+                job.publish_frame(clean_df)
+                # The SQL tool queries the Parquet copy while the knowledge base is built
+                workspaces.save_clean(build, clean_df)
+                precompute_aggregates(clean_df)
+                documents = None
+                if fingerprint:
+                    rows, fingerprints = fingerprint_rows(raw_df, clean_df)
+                    if incremental and has_baseline(clean_df.columns, build.index_path, build.baseline_path):
+                        # Only the changed rows are embedded
+                        job.update_progress(total=None)
+                        with job.stage("index"):
+                            job.log("🔁 Updating Global Context & Knowledge Base from changed rows...")
+                            changes = update_index_incrementally(rows, fingerprints, api_key, report=index_report,
+                                                                 base_embeddings=base_embeddings, on_progress=show_index_progress,
+                                                                 index_path=build.index_path, rows_path=build.baseline_path,
+                                                                 context_path=build.context_path)
+                        job.log(f"➕ {changes['added']:,} added · ➖ {changes['removed']:,} removed · 🟰 {changes['unchanged']:,} unchanged rows "
+                                f"({changes['relabelled']:,} described again against the new averages)")
+                    else:
+                        documents = iter_row_documents(rows, ids=fingerprint_ids(fingerprints))
+                elif grouped and len(clean_df) >= GROUPED_MIN_ROWS:
+                    # Large dataset, opted in: rows are embedded in grouped documents (fingerprints need one document per row)
+                    documents = iter_group_documents(clean_df, report=groups_report)
+                else:
+                    documents = iter_row_documents(clean_df)
+                del raw_df
+                if documents is not None:
+                    with job.stage("context"):
+                        generate_global_context(clean_df, build.context_path)
+            if documents is not None:
+                with job.stage("index"):
+                    build_vector_store(documents, api_key, report=index_report, base_embeddings=base_embeddings,
+                                       on_progress=show_index_progress, resume_key=job.dataset_hash,
+                                       index_path=build.index_path, checkpoint_path=build.checkpoint_path)
+                    if fingerprints is not None:
+                        save_baseline(rows, fingerprints, build.index_path, build.baseline_path)
+            if not reuse:
+                # Shared with the sessions following the job and later uploads of the same file
+                workspaces.mark_ready(build, clean_df)
+            job.advance("ready")
+            if index_report.get("resumed"):
+                job.log(f"⏯️ Resumed interrupted build: {index_report['resumed']:,} rows were already indexed")
+            if "cache_hits" in index_report:
+                job.log(f"♻️ Embedding cache: {index_report['cache_hits']} reused, {index_report['cache_misses']} embedded")
+            if index_report.get("index_type"):
+                job.log(f"🗂️ Vector index: {index_report['index_type']}")
+            if groups_report:
+                job.log(f"🧩 Grouped {groups_report['rows']:,} rows into {groups_report['documents']:,} documents "
+                        f"({groups_report['groups']:,} groups by {', '.join(groups_report['grouped_by'])})")
+        except BaseException:
+            workspaces.build_failed(job.dataset_hash)
+            raise
+        finally:
+            # The partial index is not searched any more once the build ended
+            clear_registry(kinds=("faiss_partial",), under=build.dataset_dir)
+    try:
+        if combine:
+            shutil.rmtree(upload_path)
+        else:
+            os.remove(upload_path)
+    except OSError:
+        pass
+
+# --- Shared Executor ---
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_job_executor() -> JobExecutor:
+    """
+    Returns the process-wide job executor (Streamlit reruns and sessions all share it).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor()
+        return _executor
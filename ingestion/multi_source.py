@@ -0,0 +1,271 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from ingestion.data_ingestion import load_data, ARROW_EXTENSIONS
+from monitoring.tracing import traced, get_tracer
+
+# --- Multi-Source Settings ---
+DEFAULT_PARSE_WORKERS = max(1, min(4, os.cpu_count() or 1))
+DEFAULT_PARSE_TIMEOUT = 900     # Wall-clock seconds to parse one sheet or file
+SHEETS_DIR = os.path.join("workspaces", "sheets")   # Parsed sheets and files, as Parquet keyed by content
+PARSER_VERSION = "1"            # Part of the cache key: bump when parsing changes
+UNION_OVERLAP = 0.8             # Share of columns two tables must have in common to be stacked
+KEY_COVERAGE = 0.9              # Share of a table's key values a lookup table must contain to be joined
+SOURCE_COLUMN = "Source"        # Which sheet or file a stacked row came from
+EXCEL_EXTENSIONS = ['.xlsx', '.xls']
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Spreadsheet columns often mix numbers and text; Parquet needs one type per
+    column, so the non-text values of such columns are stored as text (typed
+    again by preprocessing).
+    """
+    for col in df.columns[df.dtypes == object]:
+        kinds = df[col].dropna().map(type).unique()
+        if len(kinds) > 1:
+            df[col] = df[col].map(lambda value: value if value is None or value != value or isinstance(value, str) else str(value))
+    df.columns = [str(col) for col in df.columns]
+    return df
+
+# --- Worker Side ---
+def parse_source(task: dict) -> dict:
+    """
+    Worker handler: parses one sheet of a workbook (or one CSV file) and
+    writes it to the cache as Parquet.
+
+    Args:
+        task (dict): "path", "sheet" (None for a CSV) and "cache_path".
+
+    Returns:
+        dict: Rows, columns and seconds spent parsing.
+    """
+    start = time.perf_counter()
+    if task["sheet"] is None:
+        df = pd.read_csv(task["path"])
+    else:
+        df = pd.read_excel(task["path"], sheet_name=task["sheet"])
+    df = _parquet_safe(df)
+    tmp_path = f"{task['cache_path']}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, task["cache_path"])
+    return {"rows": len(df), "columns": len(df.columns), "seconds": time.perf_counter() - start}
+
+# --- Parsing ---
+def list_sources(paths: list) -> list:
+    """
+    The tables in a set of uploaded files: every sheet of a workbook, one table per other file.
+
+    Returns:
+        list: Dicts with "path", "sheet" (None outside workbooks) and "name"
+            (the sheet name, prefixed with the file name when several files are uploaded).
+    """
+    sources = []
+    for path in paths:
+        ext = os.path.splitext(path)[1].lower()
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if ext in EXCEL_EXTENSIONS:
+            with pd.ExcelFile(path) as workbook:
+                sheets = workbook.sheet_names
+            for sheet in sheets:
+                sources.append({"path": path, "sheet": sheet, "name": sheet if len(paths) == 1 else f"{stem} / {sheet}"})
+        elif ext == '.csv' or ext in ARROW_EXTENSIONS:
+            sources.append({"path": path, "sheet": None, "name": stem})
+        else:
+            raise ValueError(f"Unsupported file format: {ext}")
+    return sources
+
+def parse_sources(sources: list, cache_dir: str = SHEETS_DIR, pool=None, report: dict = None) -> dict:
+    """
+    Parses sources in parallel in a pool of worker processes (openpyxl reads
+    one sheet at a time on one core). Each parsed sheet is cached as Parquet
+    under its file's content hash and its sheet name, so re-uploading a
+    workbook only parses the sheets that are new.
+
+    Args:
+        sources (list): From `list_sources`.
+        cache_dir (str): Where parsed sheets are kept.
+        pool (WorkerPool, optional): Defaults to the shared parse pool.
+        report (dict, optional): Filled with the number of sources parsed and read from the cache.
+
+    Returns:
+        dict: Source name -> DataFrame, in source order.
+    """
+    pool = pool if pool is not None else get_parse_pool()
+    os.makedirs(cache_dir, exist_ok=True)
+    hashes = {path: _file_hash(path) for path in {source["path"] for source in sources}}
+    tasks = []
+    for source in sources:
+        ext = os.path.splitext(source["path"])[1].lower()
+        if ext in ARROW_EXTENSIONS:
+            # Already columnar: read directly, nothing to parse
+            source["cache_path"] = source["path"]
+            continue
+        key = hashlib.blake2b(f"{hashes[source['path']]}:{source['sheet']}:{PARSER_VERSION}".encode("utf-8"), digest_size=16).hexdigest()
+        source["cache_path"] = os.path.abspath(os.path.join(cache_dir, f"{key}.parquet"))
+        if not os.path.exists(source["cache_path"]):
+            tasks.append({"path": os.path.abspath(source["path"]), "sheet": source["sheet"], "cache_path": source["cache_path"]})
+
+    with get_tracer().span("parse_sources", rows=None, sources=len(sources), parsed=len(tasks)):
+        if tasks:
+            # One thread per worker hands out the sheets; the parsing happens in the worker processes
+            with ThreadPoolExecutor(max_workers=min(pool.size, len(tasks))) as threads:
+                list(threads.map(lambda task: pool.run(task, timeout=DEFAULT_PARSE_TIMEOUT), tasks))
+        tables = {}
+        for source in sources:
+            tables[source["name"]] = load_data(source["cache_path"])
+    if report is not None:
+        report.update(sources=len(sources), parsed=len(tasks), cached=len(sources) - len(tasks))
+    return tables
+
+# --- Combining ---
+def _overlap(left, right) -> float:
+    left, right = set(left), set(right)
+    return len(left & right) / max(len(left | right), 1)
+
+def detect_key(table: pd.DataFrame, lookup: pd.DataFrame):
+    """
+    Finds the column joining `lookup` to `table` (many-to-one): a column of
+    both whose values are unique in `lookup` and cover most of `table`'s.
+
+    Returns:
+        str: The key column, or None if no column qualifies.
+    """
+    best, best_coverage = None, KEY_COVERAGE
+    for col in table.columns.intersection(lookup.columns):
+        keys = lookup[col]
+        if keys.isna().any() or not keys.is_unique:
+            continue
+        values = table[col].dropna()
+        if values.empty:
+            continue
+        coverage = values.isin(keys).mean()
+        # Ties go to the column that looks like an identifier
+        named = bool(re.search(r"(^|[\s_])(id|key|code)$", str(col), re.IGNORECASE))
+        if coverage > best_coverage or (coverage == best_coverage and named):
+            best, best_coverage = col, coverage
+    return best
+
+@traced("combine_tables")
+def combine_tables(tables: dict, report: dict = None) -> tuple:
+    """
+    Turns the tables of a multi-sheet / multi-file upload into the dataset:
+    1. Tables with (nearly) the same columns, e.g. one sheet per month, are
+       stacked, with a `Source` column naming the sheet or file of each row.
+    2. The largest result is the main table; every other table that has a key
+       into it (see `detect_key`) is joined as a lookup (left join).
+    3. Tables that fit neither way are returned as related tables, which the
+       SQL tool exposes next to the main table.
+
+    Args:
+        tables (dict): Name -> DataFrame, from `parse_sources`.
+        report (dict, optional): Filled with what was stacked, joined and kept apart.
+
+    Returns:
+        tuple: (main DataFrame, dict of related name -> DataFrame)
+    """
+    # 1. Stack tables sharing their columns
+    groups = []
+    for name, df in tables.items():
+        group = next((g for g in groups if _overlap(g["columns"], df.columns) >= UNION_OVERLAP), None)
+        if group is None:
+            groups.append({"names": [name], "columns": list(df.columns), "frames": [df]})
+        else:
+            group["names"].append(name)
+            group["columns"] += [col for col in df.columns if col not in group["columns"]]
+            group["frames"].append(df)
+    stacked = {}
+    for group in groups:
+        if len(group["frames"]) == 1:
+            stacked[group["names"][0]] = group["frames"][0]
+            continue
+        source = SOURCE_COLUMN if SOURCE_COLUMN not in group["columns"] else f"{SOURCE_COLUMN} (upload)"
+        frames = [df.assign(**{source: name}) for name, df in zip(group["names"], group["frames"])]
+        stacked[group["names"][0]] = pd.concat(frames, ignore_index=True)[[source] + group["columns"]]
+
+    # 2. Join lookups into the largest table
+    main_name = max(stacked, key=lambda name: len(stacked[name]))
+    main = stacked.pop(main_name)
+    joined, related = {}, {}
+    for name, df in sorted(stacked.items(), key=lambda item: -len(item[1])):
+        key = detect_key(main, df) if len(df) < len(main) else None
+        if key is None:
+            related[name] = df
+            continue
+        main = main.merge(df, on=key, how="left", suffixes=("", f" ({name})"), validate="many_to_one")
+        joined[name] = key
+    if report is not None:
+        report.update(stacked=[g["names"] for g in groups if len(g["names"]) > 1], main=main_name,
+                      joined=joined, related=list(related))
+    return main, related
+
+def load_sources(paths: list, cache_dir: str = SHEETS_DIR, pool=None, report: dict = None) -> tuple:
+    """
+    Loads several files, or every sheet of a workbook, as one dataset: sheets
+    are parsed in parallel (see `parse_sources`) and combined (see `combine_tables`).
+
+    Args:
+        paths (list): The uploaded files.
+        cache_dir (str): Where parsed sheets are kept.
+        pool (WorkerPool, optional): Defaults to the shared parse pool.
+        report (dict, optional): Filled with the parsing and combining steps.
+
+    Returns:
+        tuple: (main DataFrame, dict of related name -> DataFrame)
+    """
+    sources = list_sources(paths)
+    if not sources:
+        raise ValueError("No data to load.")
+    tables = parse_sources(sources, cache_dir, pool, report)
+    return combine_tables(tables, report)
+
+def table_name(name: str) -> str:
+    """
+    A SQL-friendly name for a related table ("2024 / Returns" -> "t2024_returns").
+    """
+    name = re.sub(r"\W+", "_", name).strip("_").lower() or "table"
+    return name if not name[0].isdigit() else f"t{name}"
+
+def save_related_tables(related: dict, tables_dir: str) -> list:
+    """
+    Cleans the related tables of an upload and stores them as Parquet for the
+    SQL tool (see `Workspace.tables_dir`).
+
+    Returns:
+        list: The table names written.
+    """
+    from ingestion.preprocessing import preprocess_data
+
+    os.makedirs(tables_dir, exist_ok=True)
+    names = []
+    for name, df in related.items():
+        name = table_name(name)
+        preprocess_data(df).to_parquet(os.path.join(tables_dir, f"{name}.parquet"))
+        names.append(name)
+    return names
+
+# --- Shared Parse Pool ---
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_parse_pool():
+    """
+    Returns the process-wide pool of parsing workers (started on first use).
+    """
+    from agents.worker_pool import WorkerPool
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool("ingestion.multi_source:parse_source", size=DEFAULT_PARSE_WORKERS, name="sheet-parser")
+        return _pool
@@ -1,49 +1,151 @@
+import time
 import pandas as pd
 import numpy as np
+from ingestion.type_inference import infer_and_convert
+from monitoring.tracing import traced, result_rows
 
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
+def _fill_unknown(series: pd.Series) -> pd.Series:
+    """
+    Fills missing values with "Unknown", registering the category first for
+    categorical columns (fillna on a category rejects unseen values).
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype) and "Unknown" not in series.cat.categories:
+        series = series.cat.add_categories("Unknown")
+    return series.fillna("Unknown")
+
+@traced("preprocess_data", rows=result_rows)
+def preprocess_data(df: pd.DataFrame, report: dict = None) -> pd.DataFrame:
     """
     Cleans and preprocesses the DataFrame:
     1. Removes duplicates.
-    2. Infers and converts data types (Date, Numeric).
-    3. Handles missing values (simple strategies).
+    2. Infers and converts data types (Date, Numeric, Category) from a sample,
+       parsing each column once with the detected format.
+    3. Handles missing values (simple strategies), column by column.
+    
+    Args:
+        df (pd.DataFrame): Raw DataFrame (left unmodified).
+        report (dict, optional): Filled with per-column timings:
+            {col: {"kind", "format", "seconds"}}.
     """
     # 1. Remove exact duplicates
-    df = df.drop_duplicates()
+    # Without duplicates only a shallow copy is taken: columns are replaced below, never written in place
+    duplicated = df.duplicated().to_numpy()
+    df = df.take(np.flatnonzero(~duplicated)) if duplicated.any() else df.copy(deep=False)
     
-    # 2. Smart Type Inference
-    for col in df.columns:
-        # Attempt to convert to datetime
-        if df[col].dtype == 'object':
-            try:
-                df[col] = pd.to_datetime(df[col])
-            except (ValueError, TypeError):
-                # If it fails, check if it's numeric but stored as string
-                try:
-                    df[col] = pd.to_numeric(df[col])
-                except (ValueError, TypeError):
-                    pass # Keep as object (string)
+    # 2. Smart Type Inference (sample-based, one parse per column)
+    columns = infer_and_convert(df)
 
     # 3. Handle Missing Values
     # Strategy: 
     # - Numeric: Fill with mean
     # - Categorical: Fill with 'Unknown'
     # - DateTime: Fill with forward fill or drop (here we drop rows with missing dates for safety)
-    
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-    datetime_cols = df.select_dtypes(include=['datetime64']).columns
+    # Columns are replaced one at a time instead of round-tripping df[cols] copies.
+    datetime_cols = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            datetime_cols.append(col)
+            continue
+        if not series.hasnans:
+            continue
+        start = time.perf_counter()
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            # Fill numeric NaNs with mean
+            df[col] = series.fillna(series.mean())
+        elif series.dtype == 'object' or isinstance(series.dtype, pd.CategoricalDtype):
+            # Fill categorical NaNs with "Unknown"
+            df[col] = _fill_unknown(series)
+        else:
+            continue
+        entry = columns.setdefault(col, {"kind": None, "format": None, "seconds": 0.0})
+        entry["seconds"] += time.perf_counter() - start
+        
+    # Drop rows where datetime is missing (dates are usually critical for trends)
+    if datetime_cols:
+        keep = df[datetime_cols].notna().all(axis=1)
+        if not keep.all():
+            df = df[keep]
 
-    # Fill numeric NaNs with mean
-    if not numeric_cols.empty:
-        df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].mean())
+    if report is not None:
+        report.update(columns)
+    return df
+
+# --- Chunked Preprocessing ---
+def _drop_seen_rows(chunk: pd.DataFrame, seen: np.ndarray):
+    """
+    Drops rows already seen in this or a previous chunk, tracked as a sorted
+    array of 64-bit row hashes (8 bytes per kept row).
+    """
+    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    if len(seen):
+        pos = np.searchsorted(seen, hashes).clip(max=len(seen) - 1)
+        keep &= seen[pos] != hashes
+    return chunk[keep], np.union1d(seen, hashes[keep])
+
+@traced("preprocess_chunks")
+def preprocess_chunks(open_chunks):
+    """
+    Chunked equivalent of `preprocess_data` for data that does not fit in memory.
+    Column kinds are classified on the first chunk and reused for the rest.
+    Makes two passes over the source: the first converts types, removes
+    duplicates and gathers the column means and final dtypes; the second
+    applies the same steps, fills missing values and yields the cleaned chunks.
     
-    # Fill categorical NaNs with "Unknown"
-    if not categorical_cols.empty:
-        df[categorical_cols] = df[categorical_cols].fillna("Unknown")
+    Args:
+        open_chunks (callable): Returns a fresh iterator of raw chunks each time
+            it is called, e.g. `lambda: iter_data_chunks(path)`.
         
-    # Drop rows where datetime is missing (dates are usually critical for trends)
-    if not datetime_cols.empty:
-        df = df.dropna(subset=datetime_cols)
+    Yields:
+        pd.DataFrame: Cleaned chunks with identical dtypes.
+    """
+    from ingestion.data_ingestion import widen_schema, apply_schema
+
+    # Pass 1: statistics and final dtypes (column kinds are decided on the first chunk)
+    kinds = None
+    seen = np.empty(0, dtype=np.uint64)
+    sums, counts, missing, schema = {}, {}, {}, {}
+    for chunk in open_chunks():
+        report = infer_and_convert(chunk, kinds=kinds)
+        if kinds is None:
+            kinds = {col: (entry["kind"], entry["format"]) for col, entry in report.items()}
+        chunk, seen = _drop_seen_rows(chunk, seen)
+        for col in chunk.select_dtypes(include=[np.number]).columns:
+            sums[col] = sums.get(col, 0.0) + float(chunk[col].sum())
+            counts[col] = counts.get(col, 0) + int(chunk[col].count())
+        for col, n_missing in chunk.isnull().sum().items():
+            missing[col] = missing.get(col, 0) + int(n_missing)
+        schema = widen_schema(schema, chunk)
+    if kinds is None:
+        return
+
+    means = {col: sums[col] / counts[col] for col in sums if counts[col]}
+    for col, dtype in schema.items():
+        if not missing.get(col):
+            continue
+        # Filled columns must hold the fill value exactly
+        if isinstance(dtype, pd.CategoricalDtype) and "Unknown" not in dtype.categories:
+            schema[col] = pd.CategoricalDtype(dtype.categories.append(pd.Index(["Unknown"])))
+        elif getattr(dtype, 'kind', None) in 'iuf':
+            schema[col] = np.dtype(np.float64)
 
-    return df
\ No newline at end of file
+    # Pass 2: clean and emit
+    seen = np.empty(0, dtype=np.uint64)
+    for chunk in open_chunks():
+        infer_and_convert(chunk, kinds=kinds)
+        chunk, seen = _drop_seen_rows(chunk, seen)
+        chunk = chunk.copy()
+        for col in chunk.columns:
+            if not chunk[col].hasnans:
+                continue
+            kind = chunk[col].dtype.kind
+            if col in means and kind in 'iuf':
+                chunk[col] = chunk[col].fillna(means[col])
+            elif kind not in 'mM':
+                chunk[col] = _fill_unknown(chunk[col])
+        datetime_cols = chunk.select_dtypes(include=['datetime64']).columns
+        if not datetime_cols.empty:
+            chunk = chunk.dropna(subset=datetime_cols)
+        if len(chunk):
+            yield apply_schema(chunk, schema)
@@ -0,0 +1,186 @@
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+from ingestion.data_ingestion import MAX_CATEGORIES, CATEGORY_RATIO
+
+# --- Inference Settings ---
+DEFAULT_SAMPLE_SIZE = 1_000     # Non-null values inspected per column
+GUESS_VALUES = 5                # Distinct sample values used to guess a date format
+REPETITIVE_RATIO = 0.9          # Unique/rows ratio below which only distinct dates are parsed
+
+# Formats tried when the guesser has no opinion (checked in order)
+COMMON_DATETIME_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%m/%d/%Y %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%b %d %Y",
+    "%d %b %Y",
+]
+
+def is_text_column(series: pd.Series) -> bool:
+    """
+    True for object columns and categoricals whose categories are strings.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories.dtype == object
+    return series.dtype == 'object'
+
+def sample_values(series: pd.Series, sample_size: int = DEFAULT_SAMPLE_SIZE) -> pd.Series:
+    """
+    Returns up to `sample_size` non-null values spread evenly over the column
+    (head-only samples miss formats that change later in the file).
+    Categoricals are sampled from their categories.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = pd.Series(series.cat.categories, dtype=object)
+    else:
+        values = series
+    if len(values) > sample_size * 4:
+        positions = np.linspace(0, len(values) - 1, sample_size * 4).astype(np.int64)
+        values = values.iloc[positions]
+    return values.dropna().astype(object).iloc[:sample_size]
+
+def detect_datetime_format(sample: pd.Series):
+    """
+    Finds one explicit format that parses every value of the sample.
+    
+    Returns:
+        str | None: The strftime format, or None if the sample is not dates.
+    """
+    if sample.empty or not all(isinstance(v, str) for v in sample.iloc[:GUESS_VALUES]):
+        return None
+
+    candidates = []
+    with warnings.catch_warnings():
+        # The guesser warns when a value contradicts the dayfirst hint; both hints are tried anyway
+        warnings.simplefilter("ignore", UserWarning)
+        for value in pd.unique(sample.to_numpy())[:GUESS_VALUES]:
+            for dayfirst in (False, True):
+                fmt = guess_datetime_format(value, dayfirst=dayfirst)
+                if fmt and fmt not in candidates:
+                    candidates.append(fmt)
+    candidates += [fmt for fmt in COMMON_DATETIME_FORMATS if fmt not in candidates]
+
+    # Reject formats on a few values first so non-date columns stay cheap
+    head = sample.iloc[:GUESS_VALUES]
+    for fmt in candidates:
+        if pd.to_datetime(head, format=fmt, errors='coerce').notna().all() and \
+                pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+            return fmt
+    return None
+
+def classify_column(series: pd.Series, sample_size: int = DEFAULT_SAMPLE_SIZE):
+    """
+    Classifies a text column from a bounded sample, without parsing the full column.
+    
+    Returns:
+        tuple: (kind, fmt) where kind is "datetime", "numeric", "category" or
+        "text", and fmt is the datetime format for "datetime" columns.
+    """
+    sample = sample_values(series, sample_size)
+    if sample.empty:
+        return "text", None
+
+    fmt = detect_datetime_format(sample)
+    if fmt is not None:
+        return "datetime", fmt
+    if pd.to_numeric(sample, errors='coerce').notna().all():
+        return "numeric", None
+
+    # Estimate cardinality from the sample; the full column confirms it on conversion
+    n_unique = sample.nunique()
+    if n_unique <= MAX_CATEGORIES and n_unique <= CATEGORY_RATIO * len(sample):
+        return "category", None
+    return "text", None
+
+def _parse(values: pd.Series, kind: str, fmt: str) -> pd.Series:
+    if kind == "datetime":
+        return pd.to_datetime(values, format=fmt, errors='coerce')
+    return pd.to_numeric(values, errors='coerce')
+
+def _parse_distinct(series: pd.Series, kind: str, fmt: str) -> pd.Series:
+    """
+    Parses each distinct value once and broadcasts the result back by code.
+    Used for repetitive columns, where hashing is far cheaper than strptime.
+    """
+    codes, uniques = pd.factorize(series)
+    parsed = _parse(pd.Series(uniques, dtype=object), kind, fmt).to_numpy()
+    if not len(parsed):
+        return _parse(series, kind, fmt)
+    converted = pd.Series(parsed[np.where(codes < 0, 0, codes)], index=series.index)
+    converted[codes < 0] = None
+    return converted
+
+def _is_repetitive(series: pd.Series, sample_size: int = DEFAULT_SAMPLE_SIZE) -> bool:
+    """
+    True if a leading sample repeats values often enough that parsing only the
+    distinct values pays for the extra factorize pass.
+    """
+    head = series.iloc[:sample_size]
+    return head.nunique() <= REPETITIVE_RATIO * len(head)
+
+def convert_column(series: pd.Series, kind: str, fmt: str = None) -> pd.Series:
+    """
+    Converts a column with a known kind in a single parse.
+    Categoricals are converted by parsing their categories only, and
+    repetitive date columns by parsing their distinct values only.
+    Returns the original series if the full column does not match the kind
+    (more values fail to parse than were missing to begin with).
+    """
+    if kind == "text":
+        return series
+    if kind == "category":
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        converted = series.astype('category')
+        return converted if len(converted.cat.categories) <= MAX_CATEGORIES else series
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        parsed = _parse(pd.Series(series.cat.categories, dtype=object), kind, fmt)
+        codes = series.cat.codes.to_numpy()
+        converted = pd.Series(parsed.to_numpy()[np.where(codes < 0, 0, codes)], index=series.index)
+        converted[codes < 0] = None
+    elif kind == "datetime" and _is_repetitive(series):
+        converted = _parse_distinct(series, kind, fmt)
+    else:
+        converted = _parse(series, kind, fmt)
+
+    if converted.isna().sum() > series.isna().sum():
+        return series
+    return converted
+
+def infer_and_convert(df: pd.DataFrame, sample_size: int = DEFAULT_SAMPLE_SIZE, kinds: dict = None) -> dict:
+    """
+    Classifies and converts every text column of `df` in place.
+    
+    Args:
+        df (pd.DataFrame): Frame whose columns are replaced one at a time.
+        sample_size (int): Non-null values sampled per column.
+        kinds (dict, optional): Previously decided {col: (kind, fmt)} to reuse
+            instead of sampling again (used for later chunks of a stream).
+        
+    Returns:
+        dict: Per-column report {col: {"kind", "format", "seconds"}}.
+    """
+    report = {}
+    for col in df.columns:
+        if not is_text_column(df[col]) and (kinds is None or col not in kinds):
+            continue
+        start = time.perf_counter()
+        kind, fmt = kinds[col] if kinds and col in kinds else classify_column(df[col], sample_size)
+        df[col] = convert_column(df[col], kind, fmt)
+        report[col] = {"kind": kind, "format": fmt, "seconds": time.perf_counter() - start}
+    return report
@@ -0,0 +1,514 @@
+import os
+import json
+import time
+import hashlib
+import shutil
+import threading
+import pandas as pd
+
+# --- Workspace Settings ---
+PIPELINE_VERSION = 1                # Part of every dataset hash: bumped when the artifacts change, so older ones are not reused
+WORKSPACES_DIR = "workspaces"
+SESSIONS_DIR = "sessions"           # Per session: plots
+DATASETS_DIR = "datasets"           # Per upload content: raw upload, cleaned frame, global context and index, shared by sessions
+FRAMES_DIR = "frames"               # Arrow copies read by the worker pools (see `agents.worker_pool.FRAMES_DIR`)
+SHEETS_DIR = "sheets"               # Parsed sheets of multi-file uploads (see `ingestion.multi_source.SHEETS_DIR`)
+READY_FILE = "ready.json"           # Written once a dataset's artifacts are complete
+DEFAULT_MEMORY_BUDGET_MB = 2048     # DataFrames held in memory over all sessions (a shared frame counts once)
+DEFAULT_DISK_BUDGET_MB = 10240      # Everything under workspaces/
+DEFAULT_IDLE_SECONDS = 900          # Sessions inactive for this long can be evicted
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def content_hash(files: list, combined: bool = False, grouped: bool = False) -> str:
+    """
+    The hash a dataset's artifacts are stored under: the uploaded content and
+    PIPELINE_VERSION. The same upload finds its artifacts again in any session
+    and after a restart; a new pipeline version builds its own.
+
+    Args:
+        files (list): (name, content) of each uploaded file.
+        combined (bool): The files (or all sheets of one workbook) are combined
+            into one dataset; their names count, as they name the stacked rows.
+        grouped (bool): Indexed as grouped documents (see `embedding.grouped_documents`),
+            a different index for the same content.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256(f"pipeline {PIPELINE_VERSION}".encode("utf-8"))
+    if grouped:
+        digest.update(b"grouped")
+    if not combined:
+        digest.update(files[0][1])
+        return digest.hexdigest()
+    digest.update(b"combined")
+    for name, content in sorted(files, key=lambda f: f[0]):
+        digest.update(name.encode("utf-8") + hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """
+    Memory held by a DataFrame, including the strings of object columns.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class Workspace:
+    """
+    One session's namespace: its own plot directory, the shared
+    artifacts of the dataset it analyses (addressed by the upload's content
+    hash) and its in-memory frame, agent and intent router, which the manager may evict.
+    """
+
+    def __init__(self, manager, session_id: str):
+        self.manager = manager
+        self.session_id = session_id
+        self.root = os.path.join(manager.root, SESSIONS_DIR, session_id)
+        self.dataset_hash = None
+        self.agent = None
+        self.router = None
+        self.last_active = time.time()
+        self._df = None
+
+    # Session directories
+    @property
+    def plots_dir(self) -> str:
+        return os.path.join(self.root, "plots")
+
+    # Shared dataset artifacts
+    @property
+    def dataset_dir(self) -> str:
+        return self.manager.dataset_dir(self.dataset_hash) if self.dataset_hash else None
+
+    def upload_path(self, file_name: str) -> str:
+        """
+        Where the raw upload is kept until its pipeline finished (the same
+        content is stored once, whichever session uploaded it).
+        """
+        return os.path.join(self.dataset_dir, "upload" + os.path.splitext(file_name)[1].lower())
+
+    @property
+    def uploads_dir(self) -> str:
+        """
+        Where several uploaded files (or a workbook read sheet by sheet) are kept
+        under their own names, to be combined into one dataset (see `ingestion.multi_source`).
+        """
+        return os.path.join(self.dataset_dir, "uploads")
+
+    @property
+    def tables_dir(self) -> str:
+        """
+        Tables of a multi-file upload that are not part of the main frame, as
+        Parquet; the SQL tool queries them next to it (see `agents.sql_engine`).
+        """
+        return os.path.join(self.dataset_dir, "tables")
+
+    @property
+    def clean_path(self) -> str:
+        return os.path.join(self.dataset_dir, "clean.parquet")
+
+    @property
+    def context_path(self) -> str:
+        return os.path.join(self.dataset_dir, "context.json")
+
+    @property
+    def cube_path(self) -> str:
+        """
+        Precomputed group-by aggregates the intent router answers from (see `ingestion.aggregate_cube`).
+        """
+        return os.path.join(self.dataset_dir, "cube.parquet")
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.dataset_dir, "faiss_index")
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.dataset_dir, "checkpoint")
+
+    @property
+    def baseline_path(self) -> str:
+        return os.path.join(self.dataset_dir, "baseline.parquet")
+
+    @property
+    def df(self):
+        """
+        The session's DataFrame; reloaded from the shared artifacts after an
+        eviction. None without a dataset, or once its artifacts were removed.
+        """
+        if self._df is None and self.dataset_hash:
+            self.manager.load_frame(self)
+        return self._df
+
+    @property
+    def expired(self) -> bool:
+        """
+        True when the session had a dataset whose artifacts were removed to stay within the disk budget.
+        """
+        return bool(self.dataset_hash) and not self.manager.is_ready(self.dataset_hash) and not self.manager.is_building(self.dataset_hash)
+
+    def touch(self):
+        self.last_active = time.time()
+
+class WorkspaceManager:
+    """
+    Gives each session its own workspace and keeps all of them within a memory
+    and a disk budget.
+
+    Sessions that uploaded identical content share one set of artifacts on disk
+    and one DataFrame in memory (read-only). The artifacts on disk outlive the
+    process: after a restart, a ready dataset is restored from them, its frame
+    memory-mapped from its Arrow copy. When the frames in memory exceed
+    the memory budget, frames no session uses are dropped first, then the
+    frames and agents of the least recently active idle sessions; an evicted
+    session reloads its frame from disk when it comes back. Over the disk
+    budget, unused Arrow copies and parsed sheets, then evicted sessions'
+    directories, then datasets no active session uses are deleted, least
+    recently used first.
+    """
+
+    def __init__(self, root: str = WORKSPACES_DIR, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                 disk_budget_mb: float = DEFAULT_DISK_BUDGET_MB, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        self.root = root
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.disk_budget = int(disk_budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self.frames_dir = os.path.join(root, FRAMES_DIR)
+        self.sheets_dir = os.path.join(root, SHEETS_DIR)
+        self._workspaces = {}
+        self._frames = {}           # dataset hash -> {"df", "bytes", "last_used"}
+        self._dataset_locks = {}
+        self._building = set()
+        self._lock = threading.RLock()
+        self._disk_usage = 0
+        self.counters = {"evictions": 0, "reloads": 0, "shared": 0, "deleted": 0}
+
+    # --- Sessions ---
+    def open(self, session_id: str) -> Workspace:
+        """
+        Returns the session's workspace (a new, empty one if it was never
+        opened or was removed) and marks the session active.
+        """
+        with self._lock:
+            workspace = self._workspaces.get(session_id)
+            if workspace is None:
+                workspace = self._workspaces[session_id] = Workspace(self, session_id)
+            workspace.touch()
+        os.makedirs(workspace.plots_dir, exist_ok=True)
+        return workspace
+
+    def release(self, workspace: Workspace):
+        """
+        Detaches the session from its dataset (pipeline reset): frame and agent
+        are dropped, plots are deleted. The shared artifacts stay for other
+        sessions, and a build in progress goes on (see `ingestion.jobs`).
+        """
+        with self._lock:
+            workspace.dataset_hash, workspace._df, workspace.agent, workspace.router = None, None, None, None
+        shutil.rmtree(workspace.plots_dir, ignore_errors=True)
+        os.makedirs(workspace.plots_dir, exist_ok=True)
+
+    # --- Datasets ---
+    def dataset_dir(self, dataset_hash: str) -> str:
+        return os.path.join(self.root, DATASETS_DIR, dataset_hash)
+
+    def dataset_lock(self, dataset_hash: str) -> threading.Lock:
+        """
+        Held while a dataset's artifacts are built, so sessions uploading the
+        same content concurrently build it once.
+        """
+        with self._lock:
+            return self._dataset_locks.setdefault(dataset_hash, threading.Lock())
+
+    def is_ready(self, dataset_hash: str) -> bool:
+        return os.path.exists(os.path.join(self.dataset_dir(dataset_hash), READY_FILE))
+
+    def is_building(self, dataset_hash: str) -> bool:
+        with self._lock:
+            return dataset_hash in self._building
+
+    def assign(self, workspace: Workspace, dataset_hash: str, source_hash: str = None):
+        """
+        Points the session at a dataset before its pipeline runs (or to reuse
+        it when it is ready). With `source_hash`, the context, index and
+        baseline of that dataset are copied first so they can be updated
+        incrementally.
+        """
+        with self._lock:
+            workspace.dataset_hash, workspace._df, workspace.agent, workspace.router = dataset_hash, None, None, None
+            ready = self.is_ready(dataset_hash)
+            if not ready:
+                self._building.add(dataset_hash)
+        target = self.dataset_dir(dataset_hash)
+        if ready:
+            # Reused: the disk budget deletes the least recently used datasets first
+            os.utime(target)
+        if source_hash and not self.is_ready(dataset_hash) and os.path.isdir(self.dataset_dir(source_hash)):
+            shutil.copytree(self.dataset_dir(source_hash), target, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns("checkpoint*", "clean.parquet", READY_FILE))
+        os.makedirs(target, exist_ok=True)
+
+    def build_failed(self, dataset_hash: str):
+        """
+        Records that a dataset's build stopped before completion; sessions
+        pointing at it are then `expired`, its frame (published early, see
+        `ingestion.jobs`) is dropped and its files may be deleted.
+        """
+        with self._lock:
+            self._building.discard(dataset_hash)
+            if not self.is_ready(dataset_hash):
+                self._frames.pop(dataset_hash, None)
+
+    def save_clean(self, workspace: Workspace, df: pd.DataFrame) -> bool:
+        """
+        Keeps the cleaned frame as Parquet (once), so it can be reloaded after an
+        eviction and queried out of core by the SQL tool (see `agents.sql_engine`).
+        Written under a temporary name, readers never see a partial file.
+        Returns False if it cannot be stored (the frame is then never evicted).
+        """
+        if os.path.exists(workspace.clean_path):
+            return True
+        tmp_path = f"{workspace.clean_path}.{threading.get_ident()}.tmp"
+        try:
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, workspace.clean_path)
+            return True
+        except Exception as e:
+            print(f"⚠️ Cleaned data not saved, the session will stay in memory: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def mark_ready(self, workspace: Workspace, df: pd.DataFrame):
+        """
+        Records that the session's dataset is complete and shares `df` as its
+        frame. The cleaned frame is kept as Parquet (see `save_clean`) and as the
+        Arrow copy the worker pools read, which later sessions memory-map.
+        """
+        from agents.worker_pool import publish_frame
+
+        self.save_clean(workspace, df)
+        try:
+            publish_frame(df, workspace.dataset_hash, self.frames_dir)
+        except Exception as e:
+            print(f"⚠️ Arrow copy not saved, the frame will be read from Parquet: {e}")
+        with open(os.path.join(workspace.dataset_dir, READY_FILE), "w") as f:
+            json.dump({"rows": len(df), "columns": list(map(str, df.columns)), "created": time.time(),
+                       "pipeline_version": PIPELINE_VERSION}, f)
+        with self._lock:
+            self._building.discard(workspace.dataset_hash)
+        self.attach_frame(workspace, df)
+        self.enforce_disk_budget()
+
+    def map_clean(self, workspace: Workspace) -> pd.DataFrame:
+        """
+        The frame of a dataset cleaned in chunks straight to Parquet: its Arrow
+        copy is written batch by batch and memory-mapped, so the frame is not
+        loaded twice and its columns without missing values are not copied.
+        """
+        from agents.worker_pool import publish_parquet
+
+        try:
+            publish_parquet(workspace.clean_path, workspace.dataset_hash, self.frames_dir)
+        except Exception as e:
+            print(f"⚠️ Arrow copy not saved, the frame will be read from Parquet: {e}")
+        return self._read_frame(workspace.dataset_hash)
+
+    # --- Frames ---
+    def attach_frame(self, workspace: Workspace, df: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Gives the session the shared frame of its dataset: the one already in
+        memory if a session loaded it, otherwise `df`.
+        """
+        with self._lock:
+            entry = self._frames.get(workspace.dataset_hash)
+            if entry is None:
+                entry = self._frames[workspace.dataset_hash] = {"df": df, "bytes": frame_bytes(df)}
+            else:
+                self.counters["shared"] += 1
+            entry["last_used"] = time.time()
+            workspace._df = entry["df"]
+        self.enforce_memory_budget(protect=workspace)
+        return workspace._df
+
+    def load_frame(self, workspace: Workspace):
+        """
+        Attaches the session's frame, reading it from disk if no session holds it.
+        """
+        dataset_hash = workspace.dataset_hash
+        # Checked before taking the dataset lock, which a build holds until it completes
+        if not self.is_ready(dataset_hash):
+            return None
+        with self.dataset_lock(dataset_hash):
+            with self._lock:
+                entry = self._frames.get(dataset_hash)
+            if entry is not None:
+                return self.attach_frame(workspace, None)
+            if not os.path.exists(workspace.clean_path):
+                return None
+            df = self._read_frame(dataset_hash)
+            with self._lock:
+                self.counters["reloads"] += 1
+            return self.attach_frame(workspace, df)
+
+    def _read_frame(self, dataset_hash: str) -> pd.DataFrame:
+        """
+        The cleaned frame on disk, memory-mapped from its Arrow copy when there is
+        one (columns without missing values are not copied), from Parquet otherwise.
+        """
+        from agents.worker_pool import frame_path
+        import pyarrow as pa
+
+        path = frame_path(dataset_hash, self.frames_dir)
+        try:
+            with pa.memory_map(path, "r") as source:
+                df = pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+            os.utime(path)
+            return df
+        except (OSError, pa.ArrowInvalid):
+            return pd.read_parquet(os.path.join(self.dataset_dir(dataset_hash), "clean.parquet"))
+
+    def _holders(self, dataset_hash: str) -> list:
+        return [w for w in self._workspaces.values() if w.dataset_hash == dataset_hash and w._df is not None]
+
+    def _reloadable(self, dataset_hash: str) -> bool:
+        return os.path.exists(os.path.join(self.dataset_dir(dataset_hash), "clean.parquet"))
+
+    def _drop_frame(self, dataset_hash: str):
+        from embedding.store_registry import clear_registry
+        self._frames.pop(dataset_hash, None)
+        # Loaded index and context of the dataset go with it
+        clear_registry(under=self.dataset_dir(dataset_hash))
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._frames.values())
+
+    def enforce_memory_budget(self, protect: Workspace = None) -> int:
+        """
+        Evicts frames until the budget is met (or only active sessions are
+        left). Returns the number of sessions evicted.
+        """
+        evicted = 0
+        now = time.time()
+        with self._lock:
+            used = self.memory_usage()
+            # Frames no session holds any more
+            for dataset_hash in sorted(self._frames, key=lambda h: self._frames[h]["last_used"]):
+                if used <= self.memory_budget:
+                    break
+                if not self._holders(dataset_hash) and self._reloadable(dataset_hash):
+                    used -= self._frames[dataset_hash]["bytes"]
+                    self._drop_frame(dataset_hash)
+            # Least recently active idle sessions
+            idle = [w for w in self._workspaces.values()
+                    if w._df is not None and w is not protect and now - w.last_active >= self.idle_seconds
+                    and self._reloadable(w.dataset_hash)]
+            for workspace in sorted(idle, key=lambda w: w.last_active):
+                if used <= self.memory_budget:
+                    break
+                dataset_hash = workspace.dataset_hash
+                workspace._df, workspace.agent, workspace.router = None, None, None
+                evicted += 1
+                if not self._holders(dataset_hash) and dataset_hash in self._frames:
+                    used -= self._frames[dataset_hash]["bytes"]
+                    self._drop_frame(dataset_hash)
+            self.counters["evictions"] += evicted
+        return evicted
+
+    # --- Disk ---
+    def enforce_disk_budget(self) -> int:
+        """
+        Deletes unused artifacts until the workspaces fit the disk budget.
+        Returns the number of bytes deleted.
+        """
+        usage = _dir_size(self.root)
+        deleted = 0
+        if usage > self.disk_budget:
+            now = time.time()
+            with self._lock:
+                loaded = set(self._frames)
+                active = {w.dataset_hash for w in self._workspaces.values()
+                          if w.dataset_hash and (w._df is not None or now - w.last_active < self.idle_seconds)}
+                candidates = []
+                # 1. Arrow copies of frames not in memory (rewritten on the next use)
+                if os.path.isdir(self.frames_dir):
+                    for name in os.listdir(self.frames_dir):
+                        if not any(name.startswith(h[:32]) for h in loaded):
+                            path = os.path.join(self.frames_dir, name)
+                            candidates.append((0, os.path.getmtime(path), path, None))
+                # 1b. Parsed sheets (parsed again if the workbook is uploaded again)
+                if os.path.isdir(self.sheets_dir):
+                    for name in os.listdir(self.sheets_dir):
+                        if name.endswith(".tmp"):
+                            continue
+                        path = os.path.join(self.sheets_dir, name)
+                        candidates.append((0, os.path.getmtime(path), path, None))
+                # 2. Plots of evicted sessions
+                for workspace in self._workspaces.values():
+                    if workspace._df is None and now - workspace.last_active >= self.idle_seconds:
+                        candidates.append((1, workspace.last_active, workspace.root, workspace.session_id))
+                # 3. Datasets no active session uses
+                datasets_dir = os.path.join(self.root, DATASETS_DIR)
+                if os.path.isdir(datasets_dir):
+                    for dataset_hash in os.listdir(datasets_dir):
+                        if dataset_hash in active or dataset_hash in loaded or dataset_hash in self._building:
+                            continue
+                        path = self.dataset_dir(dataset_hash)
+                        candidates.append((2, os.path.getmtime(path), path, None))
+                for _, _, path, session_id in sorted(candidates):
+                    if usage - deleted <= self.disk_budget:
+                        break
+                    size = os.path.getsize(path) if os.path.isfile(path) else _dir_size(path)
+                    if os.path.isfile(path):
+                        os.remove(path)
+                    else:
+                        shutil.rmtree(path, ignore_errors=True)
+                    if session_id is not None:
+                        self._workspaces.pop(session_id, None)
+                    deleted += size
+                self.counters["deleted"] += deleted
+        self._disk_usage = usage - deleted
+        return deleted
+
+    def datasets(self) -> set:
+        """
+        Datasets attached to a session (the response cache keeps their entries).
+        """
+        with self._lock:
+            return {w.dataset_hash for w in self._workspaces.values() if w.dataset_hash}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._workspaces),
+                "in_memory": sum(1 for w in self._workspaces.values() if w._df is not None),
+                "frames": len(self._frames),
+                "memory_mb": self.memory_usage() / (1024 * 1024),
+                "disk_mb": self._disk_usage / (1024 * 1024),
+                **self.counters,
+            }
+
+# --- Shared Instance ---
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_workspace_manager() -> WorkspaceManager:
+    """
+    Returns the process-wide workspace manager (Streamlit runs every session in this process).
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager()
+            # Datasets of earlier runs are kept for identical uploads, within the budget
+            _manager.enforce_disk_budget()
+        return _manager
@@ -0,0 +1,410 @@
+import os
+import sys
+import json
+import time
+import uuid
+import resource
+import threading
+import functools
+import inspect
+import contextvars
+from contextlib import contextmanager
+from collections import deque
+import numpy as np
+
+# --- Tracing Settings ---
+TRACE_DIR = "traces"                    # spans.jsonl and metrics.prom are written here
+SPANS_FILE = "spans.jsonl"
+METRICS_FILE = "metrics.prom"           # Prometheus text format (e.g. for node_exporter's textfile collector)
+TRACING_ENV = "AGENT_TRACING"           # Set to "0" to disable tracing
+MAX_SPANS_MB = 50                       # spans.jsonl is rotated to spans.jsonl.1 beyond this
+RECENT_SPANS = 2000                     # Finished spans kept in memory for the performance panel
+STAGE_HISTORY = 1000                    # Durations kept per stage for the percentiles
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRIC_PREFIX = "agent"
+
+_current = contextvars.ContextVar("current_span", default=None)
+_statm = None
+
+def _rss_mb() -> float:
+    global _statm
+    try:
+        # Kept open: reopening /proc per span costs more than the rest of the span
+        if _statm is None:
+            _statm = os.open("/proc/self/statm", os.O_RDONLY)
+        return int(os.pread(_statm, 128, 0).split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+def _peak_mb() -> float:
+    # Linux reports KB, macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+# --- Spans ---
+class Span:
+    """
+    One timed stage: wall and thread CPU time, process memory, rows processed
+    and LLM tokens, plus free-form attributes. Spans of one upload or chat turn
+    share a trace id and point to their parent.
+
+    Memory is per process: `peak_mb` is the peak RSS when the span ended and
+    `peak_growth_mb` how much the span raised it (0 when it stayed below an
+    earlier peak). Work done in worker processes (sandboxed code, plots) shows
+    in wall time, not in CPU time or memory.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_time", "wall", "cpu",
+                 "rss_mb", "peak_mb", "peak_growth_mb", "rows", "prompt_tokens", "completion_tokens", "status", "error",
+                 "_start", "_cpu_start", "_peak_start")
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.wall = self.cpu = None
+        self.rss_mb = self.peak_mb = self.peak_growth_mb = None
+        self.rows = None
+        self.prompt_tokens = self.completion_tokens = 0
+        self.status = "ok"
+        self.error = None
+        self._start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._peak_start = _peak_mb()
+
+    def set(self, **attributes):
+        """
+        Adds attributes; `rows` sets the rows processed.
+        """
+        if "rows" in attributes:
+            self.rows = attributes.pop("rows")
+        self.attributes.update(attributes)
+
+    def add_rows(self, rows: int):
+        self.rows = (self.rows or 0) + int(rows)
+
+    def add_tokens(self, prompt: int = 0, completion: int = 0):
+        self.prompt_tokens += int(prompt or 0)
+        self.completion_tokens += int(completion or 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start": self.start_time, "wall_s": self.wall, "cpu_s": self.cpu, "rss_mb": self.rss_mb,
+            "peak_mb": self.peak_mb, "peak_growth_mb": self.peak_growth_mb, "rows": self.rows,
+            "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            "status": self.status, "error": self.error, "attributes": self.attributes,
+        }
+
+class _NoopSpan:
+    """
+    Returned while tracing is disabled: accepts the Span calls and records nothing.
+    """
+    __slots__ = ()
+    trace_id = span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def add_rows(self, rows: int):
+        pass
+
+    def add_tokens(self, prompt: int = 0, completion: int = 0):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+# --- Tracer ---
+class Tracer:
+    """
+    Records spans to `trace_dir`/spans.jsonl (one JSON object per span) and
+    keeps per-stage aggregates that are exported in the Prometheus text format
+    to `trace_dir`/metrics.prom whenever a root span (an upload, a chat turn)
+    ends; spans.jsonl is flushed at the same time. While disabled, `span` and
+    `traced` cost a flag check.
+    """
+
+    def __init__(self, trace_dir: str = TRACE_DIR, enabled: bool = None):
+        # Absolute, so a later change of the working directory does not move the traces
+        self.trace_dir = os.path.abspath(trace_dir)
+        self.enabled = os.environ.get(TRACING_ENV, "1") != "0" if enabled is None else enabled
+        self.recent = deque(maxlen=RECENT_SPANS)
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    # --- Recording ---
+    def start(self, name: str, parent=None, **attributes):
+        """
+        Opens a span under `parent` (by default the current span of this
+        context); close it with `finish`. Prefer `span` unless the start and
+        end happen in different calls (callbacks).
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            parent = _current.get()
+        return Span(name, parent if isinstance(parent, Span) else None, attributes)
+
+    def finish(self, span, error: BaseException = None, wall: float = None, cpu: float = None):
+        """
+        Closes `span` and records it. `wall` and `cpu` override the measured
+        times (for spans that accumulate time across calls, see `trace_iter`).
+        """
+        if not isinstance(span, Span):
+            return
+        span.wall = wall if wall is not None else time.perf_counter() - span._start
+        span.cpu = cpu if cpu is not None else time.thread_time() - span._cpu_start
+        span.rss_mb = round(_rss_mb(), 1)
+        span.peak_mb = round(_peak_mb(), 1)
+        span.peak_growth_mb = round(max(span.peak_mb - span._peak_start, 0.0), 1)
+        if error is not None:
+            span.status = "error"
+            span.error = f"{type(error).__name__}: {error}"
+        self._record(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Times the enclosed block as a child of the current span.
+
+        Example:
+            with tracer.span("load_data", file=name) as span:
+                df = load_data(path)
+                span.set(rows=len(df))
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self.start(name, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current.reset(token)
+            self.finish(span, error=e)
+            raise
+        _current.reset(token)
+        self.finish(span)
+
+    def activate(self, span):
+        """
+        Makes `span` the parent of spans opened in this context; returns the
+        previous one for `deactivate`.
+        """
+        previous = _current.get()
+        if isinstance(span, Span):
+            _current.set(span)
+        return previous
+
+    def deactivate(self, previous):
+        _current.set(previous)
+
+    def trace_iter(self, name: str, iterable, rows=len, **attributes):
+        """
+        Wraps an iterator (a generator of chunks) in a span that counts only
+        the time spent producing items, and the rows of each item (`rows(item)`).
+        The span opens at the first item, under the span current at that point.
+        """
+        if not self.enabled:
+            return iterable
+        return self._trace_iter(name, iterable, rows, attributes)
+
+    def _trace_iter(self, name, iterable, rows, attributes):
+        span = self.start(name, **attributes)
+        span.rows = 0
+        iterator = iter(iterable)
+        wall = cpu = 0.0
+        error = None
+        try:
+            while True:
+                start, cpu_start = time.perf_counter(), time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    wall += time.perf_counter() - start
+                    cpu += time.thread_time() - cpu_start
+                if rows is not None:
+                    span.rows += rows(item)
+                yield item
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish(span, error=error if not isinstance(error, GeneratorExit) else None, wall=wall, cpu=cpu)
+
+    def _record(self, span: Span):
+        record = span.to_dict()
+        with self._lock:
+            self.recent.append(record)
+            stage = self.stages.get(span.name)
+            if stage is None:
+                stage = self.stages[span.name] = {
+                    "count": 0, "errors": 0, "wall": 0.0, "cpu": 0.0, "rows": 0, "prompt_tokens": 0,
+                    "completion_tokens": 0, "buckets": [0] * len(LATENCY_BUCKETS), "durations": deque(maxlen=STAGE_HISTORY),
+                }
+            stage["count"] += 1
+            stage["errors"] += span.status == "error"
+            stage["wall"] += span.wall
+            stage["cpu"] += span.cpu
+            stage["rows"] += span.rows or 0
+            stage["prompt_tokens"] += span.prompt_tokens
+            stage["completion_tokens"] += span.completion_tokens
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if span.wall <= bound:
+                    stage["buckets"][i] += 1
+            stage["durations"].append(span.wall)
+            try:
+                self._write_span(record)
+                if span.parent_id is None:
+                    self._file.flush()
+                    self._write_metrics()
+            except OSError as e:
+                print(f"⚠️ Could not write traces: {e}")
+
+    # --- Export ---
+    def _write_span(self, record: dict):
+        path = os.path.join(self.trace_dir, SPANS_FILE)
+        if self._file is not None and self._file.tell() > MAX_SPANS_MB * 1024 * 1024:
+            self._file.close()
+            os.replace(path, f"{path}.1")
+            self._file = None
+        if self._file is None:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, default=str) + "\n")
+
+    def _write_metrics(self):
+        path = os.path.join(self.trace_dir, METRICS_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(self.trace_dir, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self._prometheus_text())
+        os.replace(tmp_path, path)
+
+    def _prometheus_text(self) -> str:
+        p = METRIC_PREFIX
+        lines = [f"# HELP {p}_stage_seconds Wall time of traced stages.", f"# TYPE {p}_stage_seconds histogram"]
+        for name, stage in sorted(self.stages.items()):
+            label = f'stage="{name}"'
+            for bound, count in zip(LATENCY_BUCKETS, stage["buckets"]):
+                lines.append(f'{p}_stage_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{p}_stage_seconds_bucket{{{label},le="+Inf"}} {stage["count"]}')
+            lines.append(f"{p}_stage_seconds_sum{{{label}}} {stage['wall']:.6f}")
+            lines.append(f"{p}_stage_seconds_count{{{label}}} {stage['count']}")
+        counters = [
+            ("stage_cpu_seconds_total", "Thread CPU time of traced stages.", lambda stage: f"{stage['cpu']:.6f}"),
+            ("stage_rows_total", "Rows processed by traced stages.", lambda stage: stage["rows"]),
+            ("stage_errors_total", "Traced stages that raised.", lambda stage: stage["errors"]),
+        ]
+        for metric, text, value in counters:
+            lines += [f"# HELP {p}_{metric} {text}", f"# TYPE {p}_{metric} counter"]
+            lines += [f'{p}_{metric}{{stage="{name}"}} {value(stage)}' for name, stage in sorted(self.stages.items())]
+        lines += [f"# HELP {p}_llm_tokens_total LLM tokens used by traced stages.", f"# TYPE {p}_llm_tokens_total counter"]
+        for name, stage in sorted(self.stages.items()):
+            if stage["prompt_tokens"] or stage["completion_tokens"]:
+                lines.append(f'{p}_llm_tokens_total{{stage="{name}",kind="prompt"}} {stage["prompt_tokens"]}')
+                lines.append(f'{p}_llm_tokens_total{{stage="{name}",kind="completion"}} {stage["completion_tokens"]}')
+        return "\n".join(lines) + "\n"
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            return self._prometheus_text()
+
+    # --- Reading ---
+    def summary(self) -> list:
+        """
+        Per-stage aggregates for the performance panel, slowest total first.
+        """
+        with self._lock:
+            stages = [(name, dict(stage, durations=np.array(stage["durations"]))) for name, stage in self.stages.items()]
+        rows = []
+        for name, stage in stages:
+            rows.append({
+                "stage": name,
+                "calls": stage["count"],
+                "p50 s": float(np.percentile(stage["durations"], 50)),
+                "p95 s": float(np.percentile(stage["durations"], 95)),
+                "total s": stage["wall"],
+                "cpu s": stage["cpu"],
+                "rows": stage["rows"],
+                "tokens": stage["prompt_tokens"] + stage["completion_tokens"],
+                "errors": stage["errors"],
+            })
+        return sorted(rows, key=lambda row: -row["total s"])
+
+    def last_trace(self, root_name: str) -> list:
+        """
+        The spans of the latest finished trace whose root is named `root_name`
+        (e.g. "upload", "chat_turn"), in start order.
+        """
+        with self._lock:
+            spans = list(self.recent)
+        roots = [span for span in spans if span["parent_id"] is None and span["name"] == root_name]
+        if not roots:
+            return []
+        trace_id = roots[-1]["trace_id"]
+        return sorted((span for span in spans if span["trace_id"] == trace_id), key=lambda span: span["start"])
+
+def traced(name: str, rows=None):
+    """
+    Decorator: runs the function in a span of the shared tracer. `rows`, if
+    given, is called with the result and the call's arguments and returns the
+    rows processed. A generator function is traced with `trace_iter` instead
+    (`rows` then counts the rows of each item, `len` by default).
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                tracer = _tracer if _tracer is not None else get_tracer()
+                if not tracer.enabled:
+                    return func(*args, **kwargs)
+                return tracer.trace_iter(name, func(*args, **kwargs), rows=rows or len)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer if _tracer is not None else get_tracer()
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name) as span:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    span.set(rows=rows(result, *args, **kwargs))
+                return result
+        return wrapper
+    return decorator
+
+def result_rows(result, *args, **kwargs) -> int:
+    return len(result)
+
+def input_rows(result, df, *args, **kwargs) -> int:
+    return len(df)
+
+def current_span():
+    """
+    The span of the enclosing block (to add rows or attributes), or a no-op span.
+    """
+    span = _current.get()
+    return span if span is not None and get_tracer().enabled else NOOP_SPAN
+
+# --- Shared Instance ---
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """
+    Returns the process-wide tracer (enabled unless AGENT_TRACING=0).
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer